@@ -75,6 +75,8 @@ class Properties:
         "pegasus.monitord.stdout.disable.parsing",
         "pegasus.monitord.encoding",
         "pegasus.monitord.arguments",
+        "pegasus.monitord.watcher",
+        "pegasus.monitord.db.async",
         "pegasus.clusterer.job.aggregator",
         "pegasus.clusterer.job.aggregator.seqexec.log",
         "pegasus.clusterer.job.aggregator.seqexec.firstjobfail",
@@ -194,6 +196,7 @@ class Properties:
         "pegasus.selector.replica.*.ignore.stagein.sites",
         "pegasus.catalog.replica.output.*",
         "pegasus.catalog.*.timeout",
+        "pegasus.catalog.*.sqlite.*",
         "pegasus.catalog.*.db.*",
         "pegasus.catalog.*.db.password",
         "pegasus.catalog.*.db.user",
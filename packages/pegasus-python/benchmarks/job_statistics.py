@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+
+"""
+Job statistics benchmark for pegasus-statistics.
+
+Creates a stampede database holding one workflow with the requested
+number of jobs, each with a pre script, a job and a post script, and
+times StampedeStatistics.get_job_statistics against the correlated
+subquery version it replaced.
+
+Usage: job_statistics.py [--jobs N] [--db URI] [--skip-old]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import orm
+from sqlalchemy.sql.expression import cast, func, or_
+from sqlalchemy.types import Float
+
+from Pegasus.db import connection
+from Pegasus.db.schema import Host, Invocation, Job, JobInstance, Jobstate, Workflow
+from Pegasus.db.workflow.stampede_statistics import StampedeStatistics
+
+START = 1600000000
+BATCH_SIZE = 10000
+
+# state, seconds after the job was submitted
+STATES = [
+    ("PRE_SCRIPT_STARTED", 0),
+    ("PRE_SCRIPT_TERMINATED", 1),
+    ("PRE_SCRIPT_SUCCESS", 1),
+    ("SUBMIT", 2),
+    ("GRID_SUBMIT", 4),
+    ("EXECUTE", 7),
+    ("JOB_TERMINATED", 27),
+    ("JOB_SUCCESS", 27),
+    ("POST_SCRIPT_STARTED", 28),
+    ("POST_SCRIPT_TERMINATED", 30),
+    ("POST_SCRIPT_SUCCESS", 30),
+]
+
+# task_submit_seq, remote_duration
+INVOCATIONS = [(-1, 1.0), (1, 15.0), (2, 5.0), (-2, 2.0)]
+
+
+def insert(session, table, rows):
+    session.execute(table.__table__.insert(), rows)
+    del rows[:]
+
+
+def generate_db(dburi, jobs):
+    """
+    Writes a workflow with the given number of jobs to the database.
+    Returns the wf_uuid of the workflow.
+    """
+    session = connection.connect(dburi, create=True)
+    try:
+        wf = Workflow()
+        wf.wf_uuid = str(uuid.uuid4())
+        wf.dax_label = "bench"
+        wf.timestamp = START
+        wf.submit_hostname = "localhost"
+        wf.submit_dir = "/tmp"
+        wf.planner_arguments = "--sites condorpool"
+        wf.user = "pegasus"
+        wf.grid_dn = ""
+        wf.planner_version = "5.0.0"
+        wf.dag_file_name = "bench.dag"
+        session.add(wf)
+        session.flush()
+        wf.root_wf_id = wf.wf_id
+
+        host = Host()
+        host.wf_id = wf.wf_id
+        host.site = "condorpool"
+        host.hostname = "worker.example.com"
+        host.ip = "10.0.0.1"
+        session.add(host)
+        session.flush()
+
+        job_rows = []
+        instance_rows = []
+        state_rows = []
+        invocation_rows = []
+        for i in range(1, jobs + 1):
+            submitted = START + i
+            job_rows.append(
+                {
+                    "job_id": i,
+                    "wf_id": wf.wf_id,
+                    "exec_job_id": "job_%d" % i,
+                    "submit_file": "job_%d.sub" % i,
+                    "type_desc": "compute",
+                    "clustered": 0,
+                    "max_retries": 3,
+                    "executable": "/bin/true",
+                    "task_count": 2,
+                }
+            )
+            instance_rows.append(
+                {
+                    "job_instance_id": i,
+                    "job_id": i,
+                    "host_id": host.host_id,
+                    "job_submit_seq": i,
+                    "site": "condorpool",
+                    "local_duration": 20.0,
+                    "multiplier_factor": 1 + i % 4,
+                    "exitcode": 0,
+                }
+            )
+            for seq, (state, offset) in enumerate(STATES):
+                state_rows.append(
+                    {
+                        "job_instance_id": i,
+                        "state": state,
+                        "timestamp": submitted + offset,
+                        "jobstate_submit_seq": seq,
+                    }
+                )
+            for task_submit_seq, duration in INVOCATIONS:
+                invocation_rows.append(
+                    {
+                        "wf_id": wf.wf_id,
+                        "job_instance_id": i,
+                        "task_submit_seq": task_submit_seq,
+                        "start_time": submitted + 7,
+                        "remote_duration": duration,
+                        "remote_cpu_time": duration / 2,
+                        "exitcode": 0,
+                        "transformation": "bench::task",
+                        "executable": "/bin/true",
+                    }
+                )
+
+            if len(state_rows) >= BATCH_SIZE or i == jobs:
+                insert(session, Job, job_rows)
+                insert(session, JobInstance, instance_rows)
+                insert(session, Jobstate, state_rows)
+                insert(session, Invocation, invocation_rows)
+
+        session.commit()
+        return wf.wf_uuid
+    finally:
+        session.close()
+
+
+def get_job_statistics_old(stats):
+    """
+    The correlated subquery version of StampedeStatistics.get_job_statistics
+    it replaced, running eleven scalar subqueries per job instance.
+    """
+    if stats._expand:
+        return []
+    sq_1 = stats.session.query(func.min(Jobstate.timestamp))
+    sq_1 = sq_1.filter(
+        Jobstate.job_instance_id == JobInstance.job_instance_id
+    ).correlate(JobInstance)
+    sq_1 = sq_1.filter(
+        or_(
+            Jobstate.state == "GRID_SUBMIT",
+            Jobstate.state == "GLOBUS_SUBMIT",
+            Jobstate.state == "EXECUTE",
+        )
+    )
+    sq_1 = sq_1.subquery()
+
+    sq_2 = stats.session.query(Jobstate.timestamp)
+    sq_2 = sq_2.filter(
+        Jobstate.job_instance_id == JobInstance.job_instance_id
+    ).correlate(JobInstance)
+    sq_2 = sq_2.filter(Jobstate.state == "SUBMIT")
+    sq_2 = sq_2.subquery()
+
+    sq_3 = stats.session.query(func.min(Jobstate.timestamp))
+    sq_3 = sq_3.filter(
+        Jobstate.job_instance_id == JobInstance.job_instance_id
+    ).correlate(JobInstance)
+    sq_3 = sq_3.filter(Jobstate.state == "EXECUTE")
+    sq_3 = sq_3.subquery()
+
+    sq_4 = stats.session.query(func.min(Jobstate.timestamp))
+    sq_4 = sq_4.filter(
+        Jobstate.job_instance_id == JobInstance.job_instance_id
+    ).correlate(JobInstance)
+    sq_4 = sq_4.filter(
+        or_(Jobstate.state == "GRID_SUBMIT", Jobstate.state == "GLOBUS_SUBMIT")
+    )
+    sq_4 = sq_4.subquery()
+
+    sq_5 = stats.session.query(func.sum(Invocation.remote_duration))
+    sq_5 = sq_5.filter(
+        Invocation.job_instance_id == JobInstance.job_instance_id
+    ).correlate(JobInstance)
+    sq_5 = sq_5.filter(Invocation.wf_id == Job.wf_id).correlate(Job)
+    sq_5 = sq_5.filter(Invocation.task_submit_seq >= 0)
+    sq_5 = sq_5.group_by().subquery()
+
+    sq_6 = stats.session.query(Jobstate.timestamp)
+    sq_6 = sq_6.filter(
+        Jobstate.job_instance_id == JobInstance.job_instance_id
+    ).correlate(JobInstance)
+    sq_6 = sq_6.filter(Jobstate.state == "POST_SCRIPT_TERMINATED")
+    sq_6 = sq_6.subquery()
+
+    sq_7 = stats.session.query(func.max(Jobstate.timestamp))
+    sq_7 = sq_7.filter(
+        Jobstate.job_instance_id == JobInstance.job_instance_id
+    ).correlate(JobInstance)
+    sq_7 = sq_7.filter(
+        or_(
+            Jobstate.state == "POST_SCRIPT_STARTED", Jobstate.state == "JOB_TERMINATED",
+        )
+    )
+    sq_7 = sq_7.subquery()
+
+    sq_8 = stats.session.query(func.max(Invocation.exitcode))
+    sq_8 = sq_8.filter(
+        Invocation.job_instance_id == JobInstance.job_instance_id
+    ).correlate(JobInstance)
+    sq_8 = sq_8.filter(Invocation.wf_id == Job.wf_id).correlate(Job)
+    # PM-704 the task submit sequence needs to be >= -1 to include prescript status
+    sq_8 = sq_8.filter(Invocation.task_submit_seq >= -1)
+    sq_8 = sq_8.group_by().subquery()
+
+    JobInstanceSub = orm.aliased(JobInstance)
+
+    sq_9 = stats.session.query(Host.hostname)
+    sq_9 = sq_9.filter(
+        JobInstanceSub.job_instance_id == JobInstance.job_instance_id
+    ).correlate(JobInstance)
+    sq_9 = sq_9.filter(Host.host_id == JobInstanceSub.host_id)
+    sq_9 = sq_9.subquery()
+
+    JI = orm.aliased(JobInstance)
+    sq_10 = stats.session.query(
+        func.sum(Invocation.remote_duration * JI.multiplier_factor)
+    )
+    sq_10 = sq_10.filter(
+        Invocation.job_instance_id == JobInstance.job_instance_id
+    ).correlate(JobInstance)
+    sq_10 = sq_10.filter(Invocation.job_instance_id == JI.job_instance_id)
+    sq_10 = sq_10.filter(Invocation.wf_id == Job.wf_id).correlate(Job)
+    sq_10 = sq_10.filter(Invocation.task_submit_seq >= 0)
+    sq_10 = sq_10.group_by().subquery()
+
+    sq_11 = stats.session.query(func.sum(Invocation.remote_cpu_time))
+    sq_11 = sq_11.filter(
+        Invocation.job_instance_id == JobInstance.job_instance_id
+    ).correlate(JobInstance)
+    sq_11 = sq_11.filter(Invocation.wf_id == Job.wf_id).correlate(Job)
+    sq_11 = sq_11.filter(Invocation.task_submit_seq >= 0)
+    sq_11 = sq_11.group_by().subquery()
+
+    q = stats.session.query(
+        Job.job_id,
+        JobInstance.job_instance_id,
+        JobInstance.job_submit_seq,
+        Job.exec_job_id.label("job_name"),
+        JobInstance.site,
+        cast(sq_1.as_scalar() - sq_2.as_scalar(), Float).label("condor_q_time"),
+        cast(sq_3.as_scalar() - sq_4.as_scalar(), Float).label("resource_delay"),
+        cast(JobInstance.local_duration, Float).label("runtime"),
+        cast(sq_5.as_scalar(), Float).label("kickstart"),
+        cast(sq_6.as_scalar() - sq_7.as_scalar(), Float).label("post_time"),
+        cast(JobInstance.cluster_duration, Float).label("seqexec"),
+        sq_8.as_scalar().label("exit_code"),
+        sq_9.as_scalar().label("host_name"),
+        JobInstance.multiplier_factor,
+        cast(sq_10.as_scalar(), Float).label("kickstart_multi"),
+        sq_11.as_scalar().label("remote_cpu_time"),
+    )
+    q = q.filter(JobInstance.job_id == Job.job_id)
+    q = q.filter(Job.wf_id.in_(stats._wfs))
+    q = q.order_by(JobInstance.job_submit_seq)
+
+    return q.all()
+
+
+def bench(dburi, wf_uuid, skip_old):
+    stats = StampedeStatistics(dburi, expand_workflow=False)
+    stats.initialize(wf_uuid)
+
+    methods = [("single-pass", stats.get_job_statistics)]
+    if not skip_old:
+        methods.append(("subqueries", lambda: get_job_statistics_old(stats)))
+
+    results = []
+    for name, method in methods:
+        start = time.time()
+        rows = method()
+        elapsed = time.time() - start
+        results.append([tuple(row) for row in rows])
+        print("%-12s %10d rows %10.2f s" % (name, len(rows), elapsed))
+
+    stats.close()
+
+    if len(results) == 2 and results[0] != results[1]:
+        raise SystemExit("the job statistics of the two queries differ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--jobs", type=int, default=100000, help="number of jobs")
+    parser.add_argument(
+        "--db",
+        help="database URI to use instead of a temporary SQLite database, "
+        "it has to be empty",
+    )
+    parser.add_argument(
+        "--skip-old",
+        action="store_true",
+        help="only time the single-pass query, the old one takes a long time",
+    )
+    args = parser.parse_args()
+
+    tmp_dir = None
+    dburi = args.db
+    if dburi is None:
+        tmp_dir = tempfile.mkdtemp(prefix="job-statistics-")
+        dburi = "sqlite:///%s" % os.path.join(tmp_dir, "workflow.db")
+
+    try:
+        start = time.time()
+        wf_uuid = generate_db(dburi, args.jobs)
+        print(
+            "%s: %d jobs, generated in %.2f s" % (dburi, args.jobs, time.time() - start)
+        )
+        bench(dburi, wf_uuid, args.skip_old)
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
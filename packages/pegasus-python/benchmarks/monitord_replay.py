@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+"""
+Replay benchmark for pegasus-monitord.
+
+Generates a synthetic workflow submit directory whose dagman.out file
+contains the requested number of events, replays it with
+``pegasus-monitord -r`` and reports the number of dagman.out lines
+processed per second.
+
+Usage: monitord_replay.py [--events N] [--read-size BYTES] [--reader-only]
+"""
+
+import argparse
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+from Pegasus.monitoring.reader import DEFAULT_READ_SIZE, LineReader
+
+MONITORD = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..",
+    "src",
+    "Pegasus",
+    "cli",
+    "pegasus-monitord.py",
+)
+
+DAG_NAME = "bench-0"
+TIMESTAMP = "10/18/20 10:00:00"
+EVENTS_PER_JOB = 3  # ULOG_SUBMIT, ULOG_EXECUTE, ULOG_JOB_TERMINATED
+
+
+def generate_workflow(submit_dir, events):
+    """
+    Writes braindump.yml, the .dag file and the dagman.out file of a
+    workflow with enough jobs to produce the requested number of events.
+    Returns the path to the dagman.out file and the number of lines in it.
+    """
+    jobs = max(1, events // EVENTS_PER_JOB)
+    wf_uuid = str(uuid.uuid4())
+
+    with open(os.path.join(submit_dir, "braindump.yml"), "w") as f:
+        f.write("wf_uuid: %s\n" % wf_uuid)
+        f.write("root_wf_uuid: %s\n" % wf_uuid)
+        f.write("dag: %s.dag\n" % DAG_NAME)
+        f.write("submit_dir: %s\n" % submit_dir)
+        f.write("properties: pegasus.properties\n")
+        f.write("user: %s\n" % os.environ.get("USER", "pegasus"))
+        f.write("planner_version: 5.0.0dev\n")
+        f.write("timestamp: 20201018T100000-0700\n")
+
+    open(os.path.join(submit_dir, "pegasus.properties"), "w").close()
+
+    with open(os.path.join(submit_dir, "%s.dag" % DAG_NAME), "w") as f:
+        for i in range(jobs):
+            f.write("JOB job_{0} job_{0}.sub\n".format(i))
+
+    dagman_out = os.path.join(submit_dir, "%s.dag.dagman.out" % DAG_NAME)
+    lines = 0
+    with open(dagman_out, "w") as f:
+        header = [
+            "******************************************************",
+            "** condor_scheduniv_exec.1.0 (CONDOR_DAGMAN) STARTING UP",
+            "** $CondorVersion: 8.8.9 May 06 2020 BuildID: 503806 $",
+            "** PID = 1",
+            "Parsing 1 dagfiles",
+            "Parsing %s.dag ..." % DAG_NAME,
+        ]
+        for line in header:
+            f.write("%s %s\n" % (TIMESTAMP, line))
+        lines += len(header)
+
+        for i in range(jobs):
+            sched_id = "%d.0.0" % (100 + i)
+            f.write("%s Submitting HTCondor Node job_%d job(s)...\n" % (TIMESTAMP, i))
+            for event in ("SUBMIT", "EXECUTE", "JOB_TERMINATED"):
+                f.write(
+                    "%s Event: ULOG_%s for HTCondor Node job_%d (%s) {%s}\n"
+                    % (TIMESTAMP, event, i, sched_id, TIMESTAMP)
+                )
+            f.write(
+                "%s Node job_%d job proc (%s) completed successfully.\n"
+                % (TIMESTAMP, i, sched_id)
+            )
+            lines += 5
+
+        f.write(
+            "%s **** condor_scheduniv_exec.1.0 (condor_DAGMAN) pid 1 "
+            "EXITING WITH STATUS 0\n" % TIMESTAMP
+        )
+        lines += 1
+
+    return dagman_out, lines
+
+
+def split_by_slicing(fp, read_size):
+    """
+    The way pegasus-monitord used to split its read buffer into lines,
+    kept here for comparison.
+    """
+    count = 0
+    buf = ""
+    while True:
+        chunk = fp.read(read_size)
+        if not chunk:
+            break
+        buf = buf + chunk
+        pos = buf.find("\n")
+        while pos >= 0:
+            buf[0:pos]
+            buf = buf[pos + 1 :]
+            pos = buf.find("\n")
+            count += 1
+    return count
+
+
+def split_by_reader(fp, read_size):
+    count = 0
+    for _ in LineReader(fp, read_size):
+        count += 1
+    return count
+
+
+def bench_reader(dagman_out, read_size):
+    with open(dagman_out) as f:
+        data = f.read()
+
+    for name, func in (("slicing", split_by_slicing), ("LineReader", split_by_reader)):
+        start = time.time()
+        count = func(io.StringIO(data), read_size)
+        elapsed = time.time() - start
+        print(
+            "%-10s %10d lines %8.2f s %12.0f lines/s"
+            % (name, count, elapsed, count / elapsed)
+        )
+
+
+def bench_replay(submit_dir, dagman_out, lines, read_size):
+    cmd = [
+        sys.executable,
+        MONITORD,
+        "-r",
+        "--no-events",
+        "--no-notifications",
+        "--read-size",
+        str(read_size),
+        dagman_out,
+    ]
+    with open(os.path.join(submit_dir, "monitord.log"), "w") as log:
+        start = time.time()
+        subprocess.check_call(cmd, cwd=submit_dir, stdout=log, stderr=log)
+        elapsed = time.time() - start
+
+    print(
+        "replay     %10d lines %8.2f s %12.0f lines/s"
+        % (lines, elapsed, lines / elapsed)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "--events", type=int, default=1000000, help="number of ULOG events"
+    )
+    parser.add_argument(
+        "--read-size",
+        type=int,
+        default=DEFAULT_READ_SIZE,
+        help="dagman.out read size in bytes",
+    )
+    parser.add_argument(
+        "--reader-only",
+        action="store_true",
+        help="only compare line splitting, do not run pegasus-monitord",
+    )
+    parser.add_argument(
+        "--keep", action="store_true", help="keep the generated submit directory"
+    )
+    args = parser.parse_args()
+
+    submit_dir = tempfile.mkdtemp(prefix="monitord-replay-")
+    try:
+        dagman_out, lines = generate_workflow(submit_dir, args.events)
+        print(
+            "%s: %d events, %d lines, %d bytes"
+            % (dagman_out, args.events, lines, os.path.getsize(dagman_out))
+        )
+        bench_reader(dagman_out, args.read_size)
+        if not args.reader_only:
+            bench_replay(submit_dir, dagman_out, lines, args.read_size)
+    finally:
+        if args.keep:
+            print("submit directory kept in %s" % submit_dir)
+        else:
+            shutil.rmtree(submit_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+"""
+Cache benchmark for the monitoring REST API.
+
+Creates a stampede database holding one workflow with the requested
+number of invocations, and reads a page of the invocations of the
+workflow repeatedly with a warm cache. Reports the time spent computing
+the cache keys of the statements of the query, as the cache keys were
+computed before they were derived from the arguments of the query
+methods, and the latency of a cached page.
+
+Usage: monitoring_cache.py [--invocations N] [--requests N] [--cache-type T]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from monitoring_stream import generate_db
+
+from Pegasus.db.schema import Invocation
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "--invocations", type=int, default=10000, help="number of invocations"
+    )
+    parser.add_argument(
+        "--requests", type=int, default=2000, help="number of cached requests"
+    )
+    parser.add_argument(
+        "--cache-type", default="SimpleCache", help="Flask-Caching CACHE_TYPE"
+    )
+    args = parser.parse_args()
+
+    from Pegasus.service.monitoring.queries import StampedeWorkflowQueries
+    from Pegasus.service.server import create_app
+
+    tmp_dir = tempfile.mkdtemp(prefix="monitoring-cache-")
+    dburi = "sqlite:///%s" % os.path.join(tmp_dir, "workflow.stampede.db")
+    config = {"CACHE_TYPE": args.cache_type, "CACHE_DIR": tmp_dir}
+
+    try:
+        wf_id = generate_db(dburi, args.invocations)
+        app = create_app(config=config, env="testing")
+
+        with app.app_context():
+            queries = StampedeWorkflowQueries(dburi)
+
+            # the statements of a page: the count, and the page itself
+            q = queries.session.query(Invocation)
+            q = q.filter(Invocation.wf_id == wf_id)
+            statements = [q, q.order_by(Invocation.invocation_id).limit(101)]
+
+            start = time.time()
+            for _ in range(args.requests):
+                for s in statements:
+                    queries._cache_key_from_query(s)
+            statement_keys = time.time() - start
+
+            queries.get_workflow_invocations(wf_id, max_results=100)
+            start = time.time()
+            for _ in range(args.requests):
+                queries.get_workflow_invocations(wf_id, max_results=100)
+            cached = time.time() - start
+
+            queries.close()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    print(
+        "statement cache keys %8.3f ms/request"
+        % (statement_keys * 1000.0 / args.requests)
+    )
+    print(
+        "cached page          %8.3f ms/request (%s)"
+        % (cached * 1000.0 / args.requests, args.cache_type)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+
+"""
+Streaming benchmark for the monitoring REST API.
+
+Creates a stampede database holding one workflow with the requested
+number of invocations, and encodes the unpaged invocations collection of
+the workflow as the REST API does, buffered as one JSON document, and
+streamed as chunked JSON and as newline delimited JSON. Each run is done
+in a process of its own, and reports its time and the growth of the peak
+memory of the process.
+
+Usage: monitoring_stream.py [--invocations N] [--mode buffered|json|ndjson|all]
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+import uuid
+
+from Pegasus.db import connection
+from Pegasus.db.schema import Invocation, Job, JobInstance, Workflow
+
+START = 1600000000
+BATCH_SIZE = 10000
+TASKS_PER_JOB = 10
+
+MODES = {
+    "buffered": ("/", {}),
+    "json": ("/?stream=true", {}),
+    "ndjson": ("/", {"Accept": "application/x-ndjson"}),
+}
+
+
+def generate_db(dburi, invocations):
+    """
+    Writes a workflow with the given number of invocations to the database.
+    Returns the wf_id of the workflow.
+    """
+    session = connection.connect(dburi, create=True, verbose=False)
+    try:
+        wf = Workflow()
+        wf.wf_uuid = str(uuid.uuid4())
+        wf.dax_label = "bench"
+        wf.timestamp = START
+        wf.submit_hostname = "localhost"
+        wf.submit_dir = "/tmp"
+        wf.planner_arguments = "--sites condorpool"
+        wf.user = "pegasus"
+        wf.grid_dn = ""
+        wf.planner_version = "5.0.0"
+        wf.dag_file_name = "bench.dag"
+        session.add(wf)
+        session.flush()
+        wf.root_wf_id = wf.wf_id
+
+        job_rows = []
+        instance_rows = []
+        invocation_rows = []
+        jobs = (invocations + TASKS_PER_JOB - 1) // TASKS_PER_JOB
+        for i in range(1, jobs + 1):
+            job_rows.append(
+                {
+                    "job_id": i,
+                    "wf_id": wf.wf_id,
+                    "exec_job_id": "job_%d" % i,
+                    "submit_file": "job_%d.sub" % i,
+                    "type_desc": "compute",
+                    "clustered": 1,
+                    "max_retries": 3,
+                    "executable": "/bin/true",
+                    "task_count": TASKS_PER_JOB,
+                }
+            )
+            instance_rows.append(
+                {
+                    "job_instance_id": i,
+                    "job_id": i,
+                    "job_submit_seq": i,
+                    "site": "condorpool",
+                    "local_duration": 20.0,
+                    "exitcode": 0,
+                }
+            )
+            for seq in range(min(TASKS_PER_JOB, invocations - len(invocation_rows))):
+                invocation_rows.append(
+                    {
+                        "wf_id": wf.wf_id,
+                        "job_instance_id": i,
+                        "task_submit_seq": seq + 1,
+                        "start_time": START + i,
+                        "remote_duration": 2.0,
+                        "remote_cpu_time": 1.0,
+                        "exitcode": 0,
+                        "transformation": "bench::task",
+                        "executable": "/usr/bin/bench-task",
+                        "argv": "--input f.%d.in --output f.%d.out" % (i, i),
+                        "abs_task_id": "ID%07d" % i,
+                    }
+                )
+
+            if len(invocation_rows) >= BATCH_SIZE or i == jobs:
+                session.execute(Job.__table__.insert(), job_rows)
+                session.execute(JobInstance.__table__.insert(), instance_rows)
+                session.execute(Invocation.__table__.insert(), invocation_rows)
+                invocations -= len(invocation_rows)
+                del job_rows[:]
+                del instance_rows[:]
+                del invocation_rows[:]
+
+        session.commit()
+        return wf.wf_id
+    finally:
+        session.close()
+
+
+def encode(dburi, wf_id, mode, results):
+    from Pegasus.service._serialize import jsonify
+    from Pegasus.service.monitoring.queries import StampedeWorkflowQueries
+    from Pegasus.service.server import create_app
+
+    app = create_app(env="testing")
+    path, headers = MODES[mode]
+
+    with app.app_context(), app.test_request_context(path, headers=headers):
+        queries = StampedeWorkflowQueries(dburi)
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        start = time.time()
+        paged_response = queries.get_workflow_invocations(
+            wf_id, use_cache=False, stream=mode != "buffered"
+        )
+        size = 0
+        for chunk in jsonify(paged_response).response:
+            size += len(chunk)
+        elapsed = time.time() - start
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        queries.close()
+
+    results.put((mode, elapsed, size, (peak - baseline) / 1024.0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "--invocations", type=int, default=500000, help="number of invocations"
+    )
+    parser.add_argument(
+        "--mode",
+        choices=sorted(MODES) + ["all"],
+        default="all",
+        help="response encoding to benchmark",
+    )
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="monitoring-stream-")
+    dburi = "sqlite:///%s" % os.path.join(tmp_dir, "workflow.stampede.db")
+
+    try:
+        start = time.time()
+        wf_id = generate_db(dburi, args.invocations)
+        print(
+            "%d invocations, generated in %.2f s"
+            % (args.invocations, time.time() - start)
+        )
+
+        modes = ["buffered", "json", "ndjson"] if args.mode == "all" else [args.mode]
+        for mode in modes:
+            results = multiprocessing.Queue()
+            p = multiprocessing.Process(
+                target=encode, args=(dburi, wf_id, mode, results)
+            )
+            p.start()
+            mode, elapsed, size, peak = results.get()
+            p.join()
+            print(
+                "%-9s %8.2f s %10.1f MB sent %10.1f MB peak memory growth"
+                % (mode, elapsed, size / 1024.0 / 1024.0, peak)
+            )
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+
+"""
+SQLite concurrency benchmark for the workflow database.
+
+One writer process replays the job events of a workflow into a stampede
+database, committing them in batches as pegasus-monitord does, while
+reader processes run the queries of the dashboard against it. The run is
+done with the default SQLite settings and with the WAL profile turned on
+with the pegasus.catalog.workflow.sqlite.wal property, and reports the
+event and query rates, the query latencies and the number of "database
+is locked" errors.
+
+Usage: sqlite_concurrency.py [--events N] [--readers N] [--batch N]
+                             [--profile default|wal|both]
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import exc
+
+from Pegasus.db import connection
+from Pegasus.db.schema import Host, Job, JobInstance, Jobstate, Workflow, Workflowstate
+from Pegasus.service.dashboard.queries import WorkflowInfo
+
+START = 1600000000
+
+STATES = [
+    "SUBMIT",
+    "GRID_SUBMIT",
+    "EXECUTE",
+    "JOB_TERMINATED",
+    "POST_SCRIPT_STARTED",
+    "POST_SCRIPT_TERMINATED",
+    "POST_SCRIPT_SUCCESS",
+]
+
+PROFILES = {
+    "default": {},
+    "wal": {connection.SQLITE_WAL: "true"},
+}
+
+
+def job_rows(job, wf_id, host_id):
+    return (
+        {
+            "job_id": job,
+            "wf_id": wf_id,
+            "exec_job_id": "job_%d" % job,
+            "submit_file": "job_%d.sub" % job,
+            "type_desc": "compute",
+            "clustered": 0,
+            "max_retries": 3,
+            "executable": "/bin/true",
+            "task_count": 1,
+        },
+        {
+            "job_instance_id": job,
+            "job_id": job,
+            "host_id": host_id,
+            "job_submit_seq": job,
+            "site": "condorpool",
+            "local_duration": 20.0,
+            "exitcode": 0,
+        },
+    )
+
+
+def state_row(job, seq, timestamp):
+    return {
+        "job_instance_id": job,
+        "state": STATES[seq],
+        "timestamp": timestamp,
+        "jobstate_submit_seq": seq,
+    }
+
+
+def generate_db(dburi, connect_args):
+    """
+    Writes a running workflow, with one job done, to the database. Returns
+    its wf_id and the host_id of its host.
+    """
+    session = connection.connect(
+        dburi, create=True, verbose=False, connect_args=dict(connect_args)
+    )
+    try:
+        wf = Workflow()
+        wf.wf_uuid = str(uuid.uuid4())
+        wf.dax_label = "bench"
+        wf.timestamp = START
+        wf.submit_hostname = "localhost"
+        wf.submit_dir = "/tmp"
+        wf.planner_arguments = "--sites condorpool"
+        wf.user = "pegasus"
+        wf.grid_dn = ""
+        wf.planner_version = "5.0.0"
+        wf.dag_file_name = "bench.dag"
+        session.add(wf)
+        session.flush()
+        wf.root_wf_id = wf.wf_id
+
+        ws = Workflowstate()
+        ws.wf_id = wf.wf_id
+        ws.state = "WORKFLOW_STARTED"
+        ws.timestamp = START
+        ws.restart_count = 0
+        session.add(ws)
+
+        host = Host()
+        host.wf_id = wf.wf_id
+        host.site = "condorpool"
+        host.hostname = "worker.example.com"
+        host.ip = "10.0.0.1"
+        session.add(host)
+        session.flush()
+
+        # the dashboard does not count the jobs of empty workflows
+        job, instance = job_rows(1, wf.wf_id, host.host_id)
+        session.execute(Job.__table__.insert(), [job])
+        session.execute(JobInstance.__table__.insert(), [instance])
+        session.execute(
+            Jobstate.__table__.insert(),
+            [state_row(1, seq, START) for seq in range(len(STATES))],
+        )
+        session.commit()
+        return wf.wf_id, host.host_id
+    finally:
+        session.close()
+
+
+def writer(dburi, wf_id, host_id, events, batch, connect_args, results):
+    session = connection.connect(
+        dburi, connect_args=dict(connect_args), print_version=False
+    )
+    jobs = []
+    instances = []
+    states = []
+    locked = 0
+    commit_times = []
+
+    def flush():
+        nonlocal locked
+        while True:
+            start = time.time()
+            try:
+                if jobs:
+                    session.execute(Job.__table__.insert(), jobs)
+                    session.execute(JobInstance.__table__.insert(), instances)
+                session.execute(Jobstate.__table__.insert(), states)
+                session.commit()
+                break
+            except exc.OperationalError as e:
+                # pegasus-monitord retries the batch too
+                session.rollback()
+                if "locked" not in str(e):
+                    raise
+                locked += 1
+        commit_times.append(time.time() - start)
+        del jobs[:]
+        del instances[:]
+        del states[:]
+
+    start = time.time()
+    for n in range(events):
+        job, seq = divmod(n, len(STATES))
+        job += 2
+        if seq == 0:
+            job_row, instance_row = job_rows(job, wf_id, host_id)
+            jobs.append(job_row)
+            instances.append(instance_row)
+        states.append(state_row(job, seq, START + n))
+        if len(states) >= batch:
+            flush()
+    if states:
+        flush()
+    elapsed = time.time() - start
+
+    session.close()
+    connection.checkpoint(session)
+    results.put(("writer", events, elapsed, locked, commit_times))
+
+
+def reader(dburi, wf_id, done, results):
+    queries = 0
+    locked = 0
+    latencies = []
+    start = time.time()
+    while not done.is_set():
+        # a dashboard request
+        t = time.time()
+        try:
+            info = WorkflowInfo(dburi, wf_id=wf_id)
+            try:
+                info.get_workflow_information()
+                info.get_workflow_job_counts()
+                info.get_successful_jobs(limit=10, offset=0)
+            finally:
+                info.close()
+        except exc.OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            locked += 1
+            continue
+        latencies.append(time.time() - t)
+        queries += 3
+    results.put(("reader", queries, time.time() - start, locked, latencies))
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def bench(profile, events, readers, batch):
+    tmp_dir = tempfile.mkdtemp(prefix="sqlite-concurrency-")
+    dburi = "sqlite:///%s" % os.path.join(tmp_dir, "workflow.stampede.db")
+    try:
+        wf_id, host_id = generate_db(dburi, PROFILES[profile])
+
+        results = multiprocessing.Queue()
+        done = multiprocessing.Event()
+        procs = [
+            multiprocessing.Process(target=reader, args=(dburi, wf_id, done, results))
+            for _ in range(readers)
+        ]
+        for p in procs:
+            p.start()
+        w = multiprocessing.Process(
+            target=writer,
+            args=(dburi, wf_id, host_id, events, batch, PROFILES[profile], results),
+        )
+        w.start()
+
+        writer_result = results.get()
+        done.set()
+        reader_results = [results.get() for _ in procs]
+        w.join()
+        for p in procs:
+            p.join()
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    _, count, elapsed, locked, commit_times = writer_result
+    print(
+        "%-8s writer  %10.0f events/s   %4d locked   commit p50 %7.1f ms   "
+        "max %7.1f ms"
+        % (
+            profile,
+            count / elapsed,
+            locked,
+            percentile(commit_times, 50) * 1000,
+            max(commit_times) * 1000,
+        )
+    )
+    queries = sum(r[1] for r in reader_results)
+    elapsed = max(r[2] for r in reader_results)
+    locked = sum(r[3] for r in reader_results)
+    latencies = [lat for r in reader_results for lat in r[4]]
+    print(
+        "%-8s readers %10.0f queries/s  %4d locked   request p50 %6.1f ms   "
+        "p99 %7.1f ms"
+        % (
+            profile,
+            queries / elapsed,
+            locked,
+            percentile(latencies, 50) * 1000,
+            percentile(latencies, 99) * 1000,
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "--events", type=int, default=200000, help="number of job events to write"
+    )
+    parser.add_argument(
+        "--readers", type=int, default=4, help="number of reader processes"
+    )
+    parser.add_argument(
+        "--batch", type=int, default=1000, help="number of events per commit"
+    )
+    parser.add_argument(
+        "--profile",
+        choices=["default", "wal", "both"],
+        default="both",
+        help="SQLite settings to benchmark",
+    )
+    args = parser.parse_args()
+
+    profiles = ["default", "wal"] if args.profile == "both" else [args.profile]
+    for profile in profiles:
+        bench(profile, args.events, args.readers, args.batch)
+
+
+if __name__ == "__main__":
+    main()
@@ -39,7 +39,7 @@ import traceback
 
 from Pegasus.db import connection
 from Pegasus.monitoring import event_output as eo
-from Pegasus.monitoring import notifications
+from Pegasus.monitoring import notifications, reader, replay, watcher
 from Pegasus.monitoring.workflow import MONITORD_RECOVER_FILE, Workflow
 from Pegasus.tools import properties, utils
 
@@ -109,7 +109,7 @@ MONITORD_WF_RETRY_FILE = (
 MAX_SLEEP_TIME = 10  # in seconds
 SLEEP_WAIT_NOTIFICATION = 5  # in seconds
 DAGMAN_OUT_MAX_READ_SIZE = (
-    32768  # at most the maximum bytes to read while parsing dagman.out file
+    reader.DEFAULT_READ_SIZE  # at most the maximum bytes to read while parsing dagman.out file
 )
 DEFAULT_ENCODING = "bp"  # default way of encoding events generated
 
@@ -131,6 +131,7 @@ keep_state = (
     0  # Flag for keeping a Workflow's state across several DAGMan start/stop cycles
 )
 db_stats = False  # collect and print database stats at the end of execution
+db_async = False  # load events into databases from a separate writer thread
 no_events = False  # Flag for disabling event output altogether
 event_dest = None  # URL containing the destination of the events
 dashboard_event_dest = (
@@ -153,6 +154,11 @@ run = None  # run directory from command-line dagman.out file
 output_dir = None  # output_dir for all files written by monitord
 jsd = None  # location of jobstate.log file
 millisleep = None  # emulated run mode delay
+read_size = DAGMAN_OUT_MAX_READ_SIZE  # bytes to read from dagman.out at a time
+file_watcher = None  # Watcher telling us which dagman.out files changed
+watcher_kind = watcher.WATCHER_AUTO  # Kind of watcher to use (auto, inotify, poll)
+replay_workers = 1  # Number of processes replaying sub-workflows in replay mode
+replay_pool = None  # Parallel replay pool (or worker handle, in a worker process)
 adjustment = 0  # time zone adjustment (@#~! Condor)
 
 #
@@ -188,6 +194,14 @@ def finish_notifications():
         monitord_notifications.finish_notifications()
 
 
+def close_file_watcher():
+    """
+    This function releases the resources held by the file watcher.
+    """
+    if file_watcher is not None:
+        file_watcher.close()
+
+
 def finish_stampede_loader():
     """
     This function is called by the atexit module when monitord exits.
@@ -223,7 +237,7 @@ class WorkflowEntry:
     n_retries = 0  # Number of retries for looking for the dagman.out file
     wf = None  # Pointer to the Workflow class for this Workflow
     DMOF = None  # File pointer once we open the dagman.out file
-    ml_buffer = ""  # Buffer for reading the dagman.out file
+    ml_reader = None  # Line reader for the dagman.out file
     ml_retries = 0  # Keep track of how many times we have looked for new content
     ml_current = 0  # Keep track of where we are in the dagman.out file
     delete_workflow = False  # Flag for dropping this workflow
@@ -327,6 +341,14 @@ parser.add_option(
     dest="millisleep",
     help="Developer: simulate delays between reads by sleeping ms milliseconds",
 )
+parser.add_option(
+    "--read-size",
+    action="store",
+    type="int",
+    dest="read_size",
+    help="read the dagman.out file in chunks of n bytes, default is %d"
+    % (DAGMAN_OUT_MAX_READ_SIZE),
+)
 parser.add_option(
     "-r",
     "--replay",
@@ -335,6 +357,14 @@ parser.add_option(
     dest="replay_mode",
     help="disables checking for DAGMan's pid while running %s" % (prog_base),
 )
+parser.add_option(
+    "--replay-workers",
+    action="store",
+    type="int",
+    dest="replay_workers",
+    help="replay sub-workflows in parallel using n worker processes (replay mode "
+    "only), default is %d" % (replay_workers),
+)
 parser.add_option(
     "--db-stats",
     action="store_true",
@@ -515,6 +545,16 @@ if options.jsd is not None:
     jsd = options.jsd
 if options.millisleep is not None:
     millisleep = options.millisleep
+if options.read_size is not None:
+    read_size = options.read_size
+    if read_size <= 0:
+        logger.critical("read-size must be integer > 0")
+        sys.exit(1)
+if options.replay_workers is not None:
+    replay_workers = options.replay_workers
+    if replay_workers <= 0:
+        logger.critical("replay-workers must be integer > 0")
+        sys.exit(1)
 if options.replay_mode is not None:
     replay_mode = options.replay_mode
     # Replay mode always runs in foreground
@@ -587,6 +627,20 @@ fast_start_property = props.property("pegasus.monitord.fast_start")
 if fast_start_property is not None:
     fast_start_mode = utils.make_boolean(fast_start_property)
 
+# Check if database events should be loaded by a writer thread
+db_async_property = props.property("pegasus.monitord.db.async")
+if db_async_property is not None:
+    db_async = utils.make_boolean(db_async_property)
+
+# Parse file watcher property
+if props.property("pegasus.monitord.watcher") is not None:
+    watcher_kind = props.property("pegasus.monitord.watcher").strip().lower()
+    if watcher_kind not in watcher.WATCHERS:
+        logger.critical(
+            "pegasus.monitord.watcher must be one of: %s" % ", ".join(watcher.WATCHERS)
+        )
+        sys.exit(1)
+
 dashboard_event_dest = connection.url_by_properties(
     options.config_properties,
     connection.DBType.MASTER,
@@ -614,6 +668,19 @@ if jsd is not None:
             "jsd file is an absolute filename, disabling sub-workflow tracking"
         )
 
+# Sub-workflows are only replayed in parallel in replay mode
+if replay_workers > 1:
+    if not replay_mode:
+        logger.warning("--replay-workers only applies to replay mode, ignoring it")
+        replay_workers = 1
+    elif not follow_subworkflows:
+        replay_workers = 1
+
+# The parallel replay workers are forked, and a DB writer thread running
+# at that time could leave locks held in the workers, so the main process
+# loads its events itself. The workers can still use writer threads.
+main_db_async = db_async and replay_workers == 1
+
 #
 # --- functions ---------------------------------------------------------------------------
 #
@@ -1056,6 +1123,121 @@ def process_dagman_out(wf, log_line):
         logger.info("time stamp format not recognized")
 
 
+def watch_workflow(workflow_entry):
+    """
+    This function registers the directories containing the files of
+    a workflow entry with the file watcher. Directories that are not
+    there yet, such as the run directory of a sub-workflow, are watched
+    once they are created.
+    """
+    if file_watcher is None or workflow_entry.wf is None:
+        return
+
+    for directory in workflow_entry.wf.get_watch_directories():
+        file_watcher.watch(workflow_entry.dagman_out, directory)
+
+
+def needs_check(workflow_entry, changed, now):
+    """
+    This function returns True if we need to look at a workflow entry
+    in this pass of the main loop. changed is the set of dagman.out
+    files the watcher reported as changed, or None if the watcher
+    cannot tell (polling), in which case all entries are checked.
+    Entries we have not caught up with, and entries whose sleep time
+    has expired (so we still detect dead DAGMans and missing files),
+    are always checked.
+    """
+    if changed is None:
+        return True
+    if not workflow_entry.caught_up_with_dagman_out:
+        return True
+    if workflow_entry.sleep_time is None or workflow_entry.sleep_time <= now:
+        return True
+    return workflow_entry.dagman_out in changed
+
+
+def replay_subworkflow(task, worker):
+    """
+    This function replays a sub-workflow (and the sub-workflows it
+    finds, through worker) in a parallel replay worker process. It
+    creates the worker's own event sink, and returns the sub-workflow's
+    wf_uuid along with the sub-workflow retry information it collected.
+    """
+    global wfs, tracked_workflows, wf_retry_dict, replay_pool, root_wf_id
+    global wf_event_sink, dashboard_event_sink
+
+    # Start from a clean slate, only the parent process writes the
+    # monitord.subwf file, and the dashboard only has root workflows
+    wfs = []
+    tracked_workflows = []
+    wf_retry_dict = {}
+    replay_pool = worker
+    root_wf_id = task.root_wf_uuid
+    dashboard_event_sink = None
+    wf_event_sink = None
+
+    if not no_events:
+        wf_event_sink = eo.create_wf_event_sink(
+            event_dest,
+            db_stats=db_stats,
+            async_writer=db_async,
+            enc=encoding,
+            props=props,
+            db_type=connection.DBType.WORKFLOW,
+        )
+
+    try:
+        new_run_dir = os.path.dirname(task.dagman_out)
+        # The link to the parent job is sent by the parent process,
+        # once the parent job is in the database
+        new_wf = Workflow(
+            new_run_dir,
+            task.dagman_out,
+            database=wf_event_sink,
+            parent_id=task.parent_wf_uuid,
+            root_id=root_wf_id,
+            jsd=jsd,
+            replay_mode=replay_mode,
+            enable_notifications=False,
+            output_dir=output_dir,
+            store_stdout_stderr=store_stdout_stderr,
+        )
+
+        if new_wf._monitord_exit_code == 0:
+            new_workflow_entry = WorkflowEntry()
+            new_workflow_entry.run_dir = new_run_dir
+            new_workflow_entry.dagman_out = task.dagman_out
+            new_workflow_entry.wf = new_wf
+
+            wfs.append(new_workflow_entry)
+            tracked_workflows.append(task.dagman_out)
+
+            monitor_workflows()
+    finally:
+        finish_stampede_loader()
+
+    return new_wf._wf_uuid, dict(wf_retry_dict)
+
+
+def link_subworkflows(links):
+    """
+    This function sends the events linking the sub-workflows replayed
+    by the parallel replay workers to the jobs that started them.
+    """
+    if wf_event_sink is None:
+        return
+
+    for link in links:
+        kwargs = {}
+        kwargs["xwf__id"] = link.parent_wf_uuid
+        kwargs["subwf__id"] = link.wf_uuid
+        kwargs["job__id"] = link.parent_jobid
+        kwargs["job_inst__id"] = link.parent_jobseq
+        wf_event_sink.send("xwf.map.subwf_job", kwargs)
+
+    logger.info("linked %d sub-workflows to their parent jobs" % (len(links)))
+
+
 def sleeptime(retries):
     """
     purpose: compute suggested sleep time as a function of retries
@@ -1183,6 +1365,7 @@ else:
         wf_event_sink = eo.create_wf_event_sink(
             event_dest,
             db_stats=db_stats,
+            async_writer=main_db_async,
             restart=restart_logging,
             enc=encoding,
             props=props,
@@ -1215,6 +1398,7 @@ else:
             restart=restart_logging,
             prefix=eo.DASHBOARD_NS,
             db_stats=db_stats,
+            async_writer=main_db_async,
             props=props,
             db_type=connection.DBType.MASTER,
         )
@@ -1240,12 +1424,34 @@ else:
             "cannot create dashboard events output... disabling dashboard event output!"
         )
 
+# Workers write events concurrently, which only a database server can
+# handle, SQLite locks the whole database file for each write
+if (
+    replay_workers > 1
+    and wf_event_sink is not None
+    and (
+        not isinstance(wf_event_sink, eo.DBEventSink)
+        or event_dest.startswith("sqlite:")
+    )
+):
+    logger.warning(
+        "parallel replay needs a MySQL or PostgreSQL destination, replaying "
+        "sub-workflows sequentially"
+    )
+    replay_workers = 1
+
 if millisleep is not None:
     logger.info("using simulation delay of %d ms" % (millisleep))
 
 if fast_start_mode:
     logger.info("monitord started in fast start mode")
 
+# Replay mode never sleeps, so there is nothing to watch
+if not replay_mode:
+    file_watcher = watcher.create_watcher(watcher_kind)
+    atexit.register(close_file_watcher)
+    logger.info("monitord using the %s file watcher" % (file_watcher.name))
+
 # Build sub-workflow retry filename
 if output_dir is None:
     wf_retry_fn = os.path.join(run, MONITORD_WF_RETRY_FILE)
@@ -1313,6 +1519,7 @@ if wf._monitord_exit_code == 0:
 
     # And add it to our list of workflows
     wfs.append(workflow_entry)
+    watch_workflow(workflow_entry)
     if replay_mode:
         tracked_workflows.append(out)
 
@@ -1323,42 +1530,40 @@ if wf._monitord_exit_code == 0:
 # --- main loop begin --------------------------------------------------------------------
 #
 
-# Loop while we have workflows to follow...
-while len(wfs) > 0:
-    # Go through each of our workflows
-    for workflow_entry in wfs:
 
-        # Check if we are waiting for the dagman.out file to appear...
-        if workflow_entry.DMOF is None:
+def monitor_workflows():
+    """
+    This function is the main loop of pegasus-monitord. It follows all
+    the workflows in wfs (and the sub-workflows it finds along the way)
+    until there are no more workflows to track.
+    """
+    # dagman.out files with changes, None means check all of them
+    changed_workflows = None
 
-            # Yes... check if it has shown up...
+    # Loop while we have workflows to follow...
+    while len(wfs) > 0:
+        loop_start_time = time.time()
+        # Go through each of our workflows
+        for workflow_entry in wfs:
 
-            # First, we test if the file is already there, in case we are running in replay mode
-            if replay_mode:
-                try:
-                    f_stat = os.stat(workflow_entry.dagman_out)
-                except OSError:
-                    logger.critical(
-                        "error: workflow not started, %s does not exist, dropping this workflow..."
-                        % (workflow_entry.dagman_out)
-                    )
-                    workflow_entry.delete_workflow = True
-                    # Close jobstate.log, if any
-                    if workflow_entry.wf is not None:
-                        workflow_entry.wf.end_workflow()
-                    # Go to the next workflow_entry in the for loop
-                    continue
+            # Skip workflows the file watcher knows have not changed
+            if not needs_check(workflow_entry, changed_workflows, loop_start_time):
+                continue
 
-            try:
-                f_stat = os.stat(workflow_entry.dagman_out)
-            except OSError as e:
-                if errno.errorcode[e.errno] == "ENOENT":
-                    # File doesn't exist yet, keep looking
-                    workflow_entry.n_retries = workflow_entry.n_retries + 1
-                    if workflow_entry.n_retries > 100:
-                        # We tried too long, just exit
+            # Check if we are waiting for the dagman.out file to appear...
+            if workflow_entry.DMOF is None:
+
+                # Yes... check if it has shown up...
+
+                # First, we test if the file is already there, in case we are running in
+                # replay mode
+                if replay_mode:
+                    try:
+                        f_stat = os.stat(workflow_entry.dagman_out)
+                    except OSError:
                         logger.critical(
-                            "%s never made an appearance" % (workflow_entry.dagman_out)
+                            "error: workflow not started, %s does not exist, dropping "
+                            "this workflow..." % (workflow_entry.dagman_out)
                         )
                         workflow_entry.delete_workflow = True
                         # Close jobstate.log, if any
@@ -1366,16 +1571,44 @@ while len(wfs) > 0:
                             workflow_entry.wf.end_workflow()
                         # Go to the next workflow_entry in the for loop
                         continue
-                    # Continue waiting
-                    logger.info(
-                        "waiting for dagman.out file, retry %d"
-                        % (workflow_entry.n_retries)
-                    )
-                    workflow_entry.sleep_time = time.time() + sleeptime(
-                        workflow_entry.n_retries
-                    )
-                else:
-                    # Another error
+
+                try:
+                    f_stat = os.stat(workflow_entry.dagman_out)
+                except OSError as e:
+                    if errno.errorcode[e.errno] == "ENOENT":
+                        # File doesn't exist yet, keep looking
+                        workflow_entry.n_retries = workflow_entry.n_retries + 1
+                        if workflow_entry.n_retries > 100:
+                            # We tried too long, just exit
+                            logger.critical(
+                                "%s never made an appearance"
+                                % (workflow_entry.dagman_out)
+                            )
+                            workflow_entry.delete_workflow = True
+                            # Close jobstate.log, if any
+                            if workflow_entry.wf is not None:
+                                workflow_entry.wf.end_workflow()
+                            # Go to the next workflow_entry in the for loop
+                            continue
+                        # Continue waiting
+                        logger.info(
+                            "waiting for dagman.out file, retry %d"
+                            % (workflow_entry.n_retries)
+                        )
+                        workflow_entry.sleep_time = time.time() + sleeptime(
+                            workflow_entry.n_retries
+                        )
+                    else:
+                        # Another error
+                        logger.critical("stat %s" % (workflow_entry.dagman.out))
+                        workflow_entry.delete_workflow = True
+                        # Close jobstate.log, if any
+                        if workflow_entry.wf is not None:
+                            workflow_entry.wf.end_workflow()
+                        # Go to the next workflow_entry in the for loop
+                        continue
+                except Exception:
+                    # Another exception
                     logger.critical("stat %s" % (workflow_entry.dagman.out))
                     workflow_entry.delete_workflow = True
                     # Close jobstate.log, if any
@@ -1383,22 +1616,30 @@ while len(wfs) > 0:
                         workflow_entry.wf.end_workflow()
                     # Go to the next workflow_entry in the for loop
                     continue
-            except Exception:
-                # Another exception
-                logger.critical("stat %s" % (workflow_entry.dagman.out))
-                workflow_entry.delete_workflow = True
-                # Close jobstate.log, if any
-                if workflow_entry.wf is not None:
-                    workflow_entry.wf.end_workflow()
-                # Go to the next workflow_entry in the for loop
-                continue
-            else:
-                # Found it, open dagman.out file
+                else:
+                    # Found it, open dagman.out file
+                    try:
+                        workflow_entry.DMOF = open(workflow_entry.dagman_out)
+                        workflow_entry.ml_reader = reader.LineReader(
+                            workflow_entry.DMOF, read_size
+                        )
+                        workflow_entry.dagman_out_appeared = True
+                    except OSError:
+                        logger.critical("opening %s" % (workflow_entry.dagman_out))
+                        workflow_entry.delete_workflow = True
+                        # Close jobstate.log, if any
+                        if workflow_entry.wf is not None:
+                            workflow_entry.wf.end_workflow()
+                        # Go to the next workflow_entry in the for loop
+                        continue
+
+            if workflow_entry.DMOF is not None:
                 try:
-                    workflow_entry.DMOF = open(workflow_entry.dagman_out)
-                    workflow_entry.dagman_out_appeared = True
+                    logger.trace("stating file: %s" % (workflow_entry.dagman_out))
+                    f_stat = os.stat(workflow_entry.dagman_out)
                 except OSError:
-                    logger.critical("opening %s" % (workflow_entry.dagman_out))
+                    # stat error
+                    logger.critical("stat %s" % (workflow_entry.dagman_out))
                     workflow_entry.delete_workflow = True
                     # Close jobstate.log, if any
                     if workflow_entry.wf is not None:
@@ -1406,42 +1647,49 @@ while len(wfs) > 0:
                     # Go to the next workflow_entry in the for loop
                     continue
 
-        if workflow_entry.DMOF is not None:
-            try:
-                logger.trace("stating file: %s" % (workflow_entry.dagman_out))
-                f_stat = os.stat(workflow_entry.dagman_out)
-            except OSError:
-                # stat error
-                logger.critical("stat %s" % (workflow_entry.dagman_out))
-                workflow_entry.delete_workflow = True
-                # Close jobstate.log, if any
-                if workflow_entry.wf is not None:
-                    workflow_entry.wf.end_workflow()
-                # Go to the next workflow_entry in the for loop
-                continue
-
-            # f_stat[6] is the file size
-            if f_stat[6] == workflow_entry.ml_current:
-                # Death by natural causes
-                if workflow_entry.wf._dagman_exit_code is not None and not replay_mode:
-                    logger.info("workflow %s ended" % (workflow_entry.dagman_out))
-                    workflow_entry.delete_workflow = True
-                    # Close jobstate.log, if any
-                    if workflow_entry.wf is not None:
-                        workflow_entry.wf.end_workflow()
-                    # Go to the next workflow_entry in the for loop
-                    continue
+                # f_stat[6] is the file size
+                if f_stat[6] == workflow_entry.ml_current:
+                    # Death by natural causes
+                    if (
+                        workflow_entry.wf._dagman_exit_code is not None
+                        and not replay_mode
+                    ):
+                        logger.info("workflow %s ended" % (workflow_entry.dagman_out))
+                        workflow_entry.delete_workflow = True
+                        # Close jobstate.log, if any
+                        if workflow_entry.wf is not None:
+                            workflow_entry.wf.end_workflow()
+                        # Go to the next workflow_entry in the for loop
+                        continue
 
-                # Check if DAGMan is alive -- if we know where it lives
-                if workflow_entry.ml_retries > 10 and workflow_entry.wf._dagman_pid > 0:
-                    # Just send signal 0 to check if the pid is ours
-                    try:
-                        os.kill(int(workflow_entry.wf._dagman_pid), 0)
-                    except OSError:
+                    # Check if DAGMan is alive -- if we know where it lives
+                    if (
+                        workflow_entry.ml_retries > 10
+                        and workflow_entry.wf._dagman_pid > 0
+                    ):
+                        # Just send signal 0 to check if the pid is ours
+                        try:
+                            os.kill(int(workflow_entry.wf._dagman_pid), 0)
+                        except OSError:
+                            logger.critical(
+                                "DAGMan is gone! Sudden death syndrome detected!"
+                            )
+                            workflow_entry.wf._monitord_exit_code = 42
+                            workflow_entry.delete_workflow = True
+                            # Close jobstate.log, if any
+                            if workflow_entry.wf is not None:
+                                workflow_entry.wf.end_workflow()
+                            # Go to the next workflow_entry in the for loop
+                            continue
+
+                    # No change, wait a while
+                    workflow_entry.ml_retries = workflow_entry.ml_retries + 1
+                    if workflow_entry.ml_retries > 17280:
+                        # Too long without change
                         logger.critical(
-                            "DAGMan is gone! Sudden death syndrome detected!"
+                            "too long without action, stopping workflow %s"
+                            % (workflow_entry.dagman_out)
                         )
-                        workflow_entry.wf._monitord_exit_code = 42
                         workflow_entry.delete_workflow = True
                         # Close jobstate.log, if any
                         if workflow_entry.wf is not None:
@@ -1449,28 +1697,25 @@ while len(wfs) > 0:
                         # Go to the next workflow_entry in the for loop
                         continue
 
-                # No change, wait a while
-                workflow_entry.ml_retries = workflow_entry.ml_retries + 1
-                if workflow_entry.ml_retries > 17280:
-                    # Too long without change
-                    logger.critical(
-                        "too long without action, stopping workflow %s"
-                        % (workflow_entry.dagman_out)
-                    )
-                    workflow_entry.delete_workflow = True
-                    # Close jobstate.log, if any
-                    if workflow_entry.wf is not None:
-                        workflow_entry.wf.end_workflow()
-                    # Go to the next workflow_entry in the for loop
-                    continue
+                    # In replay mode, we can be a little more aggresive
+                    # FIXME Why would you have to wait for 5 tries in replay mode?
+                    if replay_mode and workflow_entry.ml_retries > 5:
+                        # We are in replay mode, so we should have everything here
+                        logger.info(
+                            "no more action, stopping workflow %s"
+                            % (workflow_entry.dagman_out)
+                        )
+                        workflow_entry.delete_workflow = True
+                        # Close jobstate.log, if any
+                        if workflow_entry.wf is not None:
+                            workflow_entry.wf.end_workflow()
+                        # Go to the next workflow_entry in the for loop
+                        continue
 
-                # In replay mode, we can be a little more aggresive
-                # FIXME Why would you have to wait for 5 tries in replay mode?
-                if replay_mode and workflow_entry.ml_retries > 5:
-                    # We are in replay mode, so we should have everything here
-                    logger.info(
-                        "no more action, stopping workflow %s"
-                        % (workflow_entry.dagman_out)
+                elif f_stat[6] < workflow_entry.ml_current:
+                    # Truncated file, booh!
+                    logger.critical(
+                        "%s file truncated, time to exit" % (workflow_entry.dagman_out)
                     )
                     workflow_entry.delete_workflow = True
                     # Close jobstate.log, if any
@@ -1479,242 +1724,278 @@ while len(wfs) > 0:
                     # Go to the next workflow_entry in the for loop
                     continue
 
-            elif f_stat[6] < workflow_entry.ml_current:
-                # Truncated file, booh!
-                logger.critical(
-                    "%s file truncated, time to exit" % (workflow_entry.dagman_out)
-                )
-                workflow_entry.delete_workflow = True
-                # Close jobstate.log, if any
-                if workflow_entry.wf is not None:
-                    workflow_entry.wf.end_workflow()
-                # Go to the next workflow_entry in the for loop
-                continue
-
-            elif f_stat[6] > workflow_entry.ml_current:
-                # We have something to read!
-                try:
-                    ml_rbuffer = workflow_entry.DMOF.read(DAGMAN_OUT_MAX_READ_SIZE)
-                except Exception:
-                    # Error while reading
-                    logger.critical("while reading %s" % (workflow_entry.dagman_out))
-                    workflow_entry.wf._monitord_exit_code = 42
-                    workflow_entry.delete_workflow = True
-                    # Close jobstate.log, if any
-                    if workflow_entry.wf is not None:
-                        workflow_entry.wf.end_workflow()
-                    # Go to the next workflow_entry in the for loop
-                    continue
+                elif f_stat[6] > workflow_entry.ml_current:
+                    # We have something to read!
+                    try:
+                        ml_rsize, ml_lines = workflow_entry.ml_reader.read()
+                    except Exception:
+                        # Error while reading
+                        logger.critical(
+                            "while reading %s" % (workflow_entry.dagman_out)
+                        )
+                        workflow_entry.wf._monitord_exit_code = 42
+                        workflow_entry.delete_workflow = True
+                        # Close jobstate.log, if any
+                        if workflow_entry.wf is not None:
+                            workflow_entry.wf.end_workflow()
+                        # Go to the next workflow_entry in the for loop
+                        continue
 
-                if len(ml_rbuffer) < DAGMAN_OUT_MAX_READ_SIZE:
-                    # PM-947 we have caught up with the workflow
-                    logger.debug(
-                        "monitord has caught up with dagman out file %s"
-                        % (workflow_entry.dagman_out)
-                    )
-                    workflow_entry.caught_up_with_dagman_out = True
+                    if ml_rsize < read_size:
+                        # PM-947 we have caught up with the workflow
+                        logger.debug(
+                            "monitord has caught up with dagman out file %s"
+                            % (workflow_entry.dagman_out)
+                        )
+                        workflow_entry.caught_up_with_dagman_out = True
 
-                if len(ml_rbuffer) == 0:
-                    # Detected EOF
-                    logger.critical(
-                        "detected EOF, resetting position to %d"
-                        % (workflow_entry.ml_current)
-                    )
-                    workflow_entry.DMOF.seek(workflow_entry.ml_current)
-                else:
-                    # Something in the read buffer, merge it with our buffer
-                    workflow_entry.ml_buffer = workflow_entry.ml_buffer + ml_rbuffer
-                    # Look for end of line
-                    ml_pos = workflow_entry.ml_buffer.find("\n")
-                    while ml_pos >= 0:
-                        # Take out 1 line, and adjust buffer
-                        process_output = process_dagman_out(
-                            workflow_entry.wf, workflow_entry.ml_buffer[0:ml_pos]
+                    if ml_rsize == 0:
+                        # Detected EOF
+                        logger.critical(
+                            "detected EOF, resetting position to %d"
+                            % (workflow_entry.ml_current)
                         )
-                        workflow_entry.ml_buffer = workflow_entry.ml_buffer[
-                            ml_pos + 1 :
-                        ]
-                        ml_pos = workflow_entry.ml_buffer.find("\n")
-
-                        # Do we need to start following another workflow?
-                        if (
-                            type(process_output) is tuple
-                            and len(process_output) == 3
-                            and process_output[0] is not None
-                        ):
-                            # Unpack the output tuple
-                            new_dagman_out = process_output[0]
-                            parent_jobid = process_output[1]
-                            parent_jobseq = process_output[2]
-                            # Only if we are not already tracking it...
-                            tracking_already = False
-                            new_dagman_out = os.path.abspath(new_dagman_out)
-                            # Add the current run directory in case this is a relative path
-                            new_dagman_out = os.path.join(
-                                workflow_entry.run_dir, new_dagman_out
+                        workflow_entry.DMOF.seek(workflow_entry.ml_current)
+                    else:
+                        # Process each complete line in the chunk we just read
+                        for ml_line in ml_lines:
+                            process_output = process_dagman_out(
+                                workflow_entry.wf, ml_line
                             )
-                            if replay_mode:
-                                # Check if we started tracking this subworkflow in the past
-                                if new_dagman_out in tracked_workflows:
-                                    # Yes, no need to do it again...
-                                    logger.info(
-                                        "already tracking workflow: %s, not adding"
-                                        % (new_dagman_out)
-                                    )
-                                    tracking_already = True
-                            else:
-                                # Not in replay mode, let's check if we are currently tracking this subworkflow
-                                for my_wf in wfs:
-                                    if (
-                                        my_wf.dagman_out == new_dagman_out
-                                        and not my_wf.delete_workflow
-                                    ):
-                                        # Found it, exit loop
-                                        tracking_already = True
+
+                            # Do we need to start following another workflow?
+                            if (
+                                type(process_output) is tuple
+                                and len(process_output) == 3
+                                and process_output[0] is not None
+                            ):
+                                # Unpack the output tuple
+                                new_dagman_out = process_output[0]
+                                parent_jobid = process_output[1]
+                                parent_jobseq = process_output[2]
+                                # Only if we are not already tracking it...
+                                tracking_already = False
+                                new_dagman_out = os.path.abspath(new_dagman_out)
+                                # Add the current run directory in case this is a
+                                # relative path
+                                new_dagman_out = os.path.join(
+                                    workflow_entry.run_dir, new_dagman_out
+                                )
+                                if replay_mode:
+                                    # Check if we started tracking this subworkflow in
+                                    # the past
+                                    if new_dagman_out in tracked_workflows:
+                                        # Yes, no need to do it again...
                                         logger.info(
                                             "already tracking workflow: %s, not adding"
                                             % (new_dagman_out)
                                         )
-                                        break
-                            if not tracking_already:
-                                logger.info(
-                                    "found new workflow to track: %s" % (new_dagman_out)
-                                )
-                                # Not tracking this workflow, let's try to add it to our list
-                                new_run_dir = os.path.dirname(new_dagman_out)
-                                parent_wf_id = workflow_entry.wf._wf_uuid
-                                new_wf = Workflow(
-                                    new_run_dir,
-                                    new_dagman_out,
-                                    database=wf_event_sink,
-                                    parent_id=parent_wf_id,
-                                    parent_jobid=parent_jobid,
-                                    parent_jobseq=parent_jobseq,
-                                    root_id=root_wf_id,
-                                    jsd=jsd,
-                                    replay_mode=replay_mode,
-                                    enable_notifications=do_notifications,
-                                    output_dir=output_dir,
-                                    store_stdout_stderr=store_stdout_stderr,
-                                    notifications_manager=monitord_notifications,
-                                )
-
-                                if new_wf._monitord_exit_code == 0:
-                                    new_workflow_entry = WorkflowEntry()
-                                    new_workflow_entry.run_dir = new_run_dir
-                                    new_workflow_entry.dagman_out = new_dagman_out
-                                    new_workflow_entry.wf = new_wf
-
-                                    # And add it to our list of workflows
-                                    wfs.append(new_workflow_entry)
-                                    # Don't forget to add it to our list, so we don't do it again in replay mode
-                                    if replay_mode:
-                                        tracked_workflows.append(new_dagman_out)
-
-                            else:
-                                # Just make sure we link the workflow to its parent job,
-                                # which in this case is a job retry...
-                                if os.path.dirname(new_dagman_out) in Workflow.wf_list:
-                                    workflow_entry.wf.map_subwf(
+                                        tracking_already = True
+                                else:
+                                    # Not in replay mode, let's check if we are
+                                    # currently tracking this subworkflow
+                                    for my_wf in wfs:
+                                        if (
+                                            my_wf.dagman_out == new_dagman_out
+                                            and not my_wf.delete_workflow
+                                        ):
+                                            # Found it, exit loop
+                                            tracking_already = True
+                                            logger.info(
+                                                "already tracking workflow: %s, not "
+                                                "adding" % (new_dagman_out)
+                                            )
+                                            break
+                                if replay_pool is not None:
+                                    # Parallel replay, let the replay pool decide
+                                    # who replays it, it will also link it to
+                                    # its parent job at the end
+                                    replay_pool.subworkflow_found(
+                                        new_dagman_out,
+                                        workflow_entry.wf._wf_uuid,
                                         parent_jobid,
                                         parent_jobseq,
-                                        Workflow.wf_list[
-                                            os.path.dirname(new_dagman_out)
-                                        ],
+                                        root_wf_id,
+                                    )
+                                elif not tracking_already:
+                                    logger.info(
+                                        "found new workflow to track: %s"
+                                        % (new_dagman_out)
                                     )
+                                    # Not tracking this workflow, let's try to add it to
+                                    # our list
+                                    new_run_dir = os.path.dirname(new_dagman_out)
+                                    parent_wf_id = workflow_entry.wf._wf_uuid
+                                    new_wf = Workflow(
+                                        new_run_dir,
+                                        new_dagman_out,
+                                        database=wf_event_sink,
+                                        parent_id=parent_wf_id,
+                                        parent_jobid=parent_jobid,
+                                        parent_jobseq=parent_jobseq,
+                                        root_id=root_wf_id,
+                                        jsd=jsd,
+                                        replay_mode=replay_mode,
+                                        enable_notifications=do_notifications,
+                                        output_dir=output_dir,
+                                        store_stdout_stderr=store_stdout_stderr,
+                                        notifications_manager=monitord_notifications,
+                                    )
+
+                                    if new_wf._monitord_exit_code == 0:
+                                        new_workflow_entry = WorkflowEntry()
+                                        new_workflow_entry.run_dir = new_run_dir
+                                        new_workflow_entry.dagman_out = new_dagman_out
+                                        new_workflow_entry.wf = new_wf
+
+                                        # And add it to our list of workflows
+                                        wfs.append(new_workflow_entry)
+                                        watch_workflow(new_workflow_entry)
+                                        # Don't forget to add it to our list, so we
+                                        # don't do it again in replay mode
+                                        if replay_mode:
+                                            tracked_workflows.append(new_dagman_out)
+
                                 else:
-                                    logger.warning(
-                                        "cannot link job %s:%s to its subwf because we don't have info for dir: %s"
-                                        % (
+                                    # Just make sure we link the workflow to its parent
+                                    # job, which in this case is a job retry...
+                                    if (
+                                        os.path.dirname(new_dagman_out)
+                                        in Workflow.wf_list
+                                    ):
+                                        workflow_entry.wf.map_subwf(
                                             parent_jobid,
                                             parent_jobseq,
-                                            os.path.dirname(new_dagman_out),
+                                            Workflow.wf_list[
+                                                os.path.dirname(new_dagman_out)
+                                            ],
+                                        )
+                                    else:
+                                        logger.warning(
+                                            "cannot link job %s:%s to its subwf "
+                                            "because we don't have info for dir: %s"
+                                            % (
+                                                parent_jobid,
+                                                parent_jobseq,
+                                                os.path.dirname(new_dagman_out),
+                                            )
                                         )
-                                    )
 
-                        if millisleep is not None:
-                            time.sleep(millisleep / 1000.0)
+                            if millisleep is not None:
+                                time.sleep(millisleep / 1000.0)
 
-                    ml_pos = workflow_entry.DMOF.tell()
-                    logger.debug(
-                        "processed chunk of %d bytes"
-                        % (
-                            ml_pos
-                            - workflow_entry.ml_current
-                            - len(workflow_entry.ml_buffer)
+                        ml_pos = workflow_entry.DMOF.tell()
+                        logger.debug(
+                            "processed chunk of %d bytes"
+                            % (
+                                ml_pos
+                                - workflow_entry.ml_current
+                                - workflow_entry.ml_reader.pending
+                            )
                         )
-                    )
-                    workflow_entry.ml_current = ml_pos
-                    workflow_entry.ml_retries = 0
-                    # Write workflow progress for recovery mode
-                    workflow_entry.wf.write_workflow_progress()
+                        workflow_entry.ml_current = ml_pos
+                        workflow_entry.ml_retries = 0
+                        # Write workflow progress for recovery mode
+                        workflow_entry.wf.write_workflow_progress()
 
-            workflow_entry.sleep_time = time.time() + sleeptime(
-                workflow_entry.ml_retries
-            )
-
-    # End of main for loop, still in the while loop...
-
-    logger.trace("currently tracking %d workflow(s)..." % (len(wfs)))
+                workflow_entry.sleep_time = time.time() + sleeptime(
+                    workflow_entry.ml_retries
+                )
 
-    # Go through the workflows again, and finish any marked ones
-    wf_index = 0
-    while wf_index < len(wfs):
-        workflow_entry = wfs[wf_index]
-        if workflow_entry.delete_workflow is True:
-            logger.info("finishing workflow: %s" % (workflow_entry.dagman_out))
-            # Close dagman.out file, if any
-            if workflow_entry.DMOF is not None:
-                workflow_entry.DMOF.close()
-            #            # Close jobstate.log, if any
-            #            if workflow_entry.wf is not None:
-            #                workflow_entry.wf.end_workflow()
-            # Delete this workflow from our list
-            deleted_entry = wfs.pop(wf_index)
-            # Don't move index to next one
+        # End of main for loop, still in the while loop...
+
+        logger.trace("currently tracking %d workflow(s)..." % (len(wfs)))
+
+        # Go through the workflows again, and finish any marked ones
+        wf_index = 0
+        while wf_index < len(wfs):
+            workflow_entry = wfs[wf_index]
+            if workflow_entry.delete_workflow is True:
+                logger.info("finishing workflow: %s" % (workflow_entry.dagman_out))
+                # Close dagman.out file, if any
+                if workflow_entry.DMOF is not None:
+                    workflow_entry.DMOF.close()
+                # Stop watching its files
+                if file_watcher is not None:
+                    file_watcher.unwatch(workflow_entry.dagman_out)
+                #            # Close jobstate.log, if any
+                #            if workflow_entry.wf is not None:
+                #                workflow_entry.wf.end_workflow()
+                # Delete this workflow from our list
+                wfs.pop(wf_index)
+                # Don't move index to next one
+            else:
+                # Mode index to next workflow
+                wf_index = wf_index + 1
+
+        # Service notifications once per while loop, in the future we can
+        # move this into the for loop and service notifications more often
+        if do_notifications is True and monitord_notifications is not None:
+            monitord_notifications.service_notifications()
+
+        # Dispatch the sub-workflows found by the parallel replay workers
+        if replay_pool is not None:
+            replay_pool.poll()
+
+        # Skip sleeping, if we have no more workflow to track...
+        if len(wfs) == 0:
+            continue
+
+        # All done... let's figure out how long to sleep...
+        time_to_sleep = time.time() + MAX_SLEEP_TIME
+        sleep_for_some_time = True
+
+        # Try to flush the sinks
+        for sink in (wf_event_sink, dashboard_event_sink):
+            if sink:
+                sink.flush()
+
+        for workflow_entry in wfs:
+            # PM-947 we want to sleep if either dagman out has not appeared or we have
+            # caught up with the dagman.out
+            sleep_for_some_time = sleep_for_some_time and (
+                workflow_entry.caught_up_with_dagman_out
+                or not workflow_entry.dagman_out_appeared
+            )
+            # Figure out if we have anything more urgent to do
+            if (
+                workflow_entry.sleep_time is not None
+                and workflow_entry.sleep_time < time_to_sleep
+            ):
+                time_to_sleep = workflow_entry.sleep_time
+
+        # PM-947 Sleep if not in replay mode AND (we have caught up with all workflows
+        # or are in default/normal mode)
+        if not replay_mode and (sleep_for_some_time or not fast_start_mode):
+            time_to_sleep = time_to_sleep - time.time()
+            if time_to_sleep < 0:
+                time_to_sleep = 0
+            # Wait until a tracked file changes, or until it is time to check
+            # on a workflow anyway
+            changed_workflows = file_watcher.wait(time_to_sleep)
         else:
-            # Mode index to next workflow
-            wf_index = wf_index + 1
-
-    # Service notifications once per while loop, in the future we can
-    # move this into the for loop and service notifications more often
-    if do_notifications is True and monitord_notifications is not None:
-        monitord_notifications.service_notifications()
-
-    # Skip sleeping, if we have no more workflow to track...
-    if len(wfs) == 0:
-        continue
-
-    # All done... let's figure out how long to sleep...
-    time_to_sleep = time.time() + MAX_SLEEP_TIME
-    sleep_for_some_time = True
+            changed_workflows = None
 
-    # Try to flush the sinks
-    for sink in (wf_event_sink, dashboard_event_sink):
-        if sink:
-            sink.flush()
-
-    for workflow_entry in wfs:
-        # PM-947 we want to sleep if either dagman out has not appeared or we have caught up with the dagman.out
-        sleep_for_some_time = sleep_for_some_time and (
-            workflow_entry.caught_up_with_dagman_out
-            or not workflow_entry.dagman_out_appeared
-        )
-        # Figure out if we have anything more urgent to do
-        if workflow_entry.sleep_time < time_to_sleep:
-            time_to_sleep = workflow_entry.sleep_time
-
-    # PM-947 Sleep if not in replay mode AND (we have caught up with all workflows or are in default/normal mode)
-    if not replay_mode and (sleep_for_some_time or not fast_start_mode):
-        time_to_sleep = time_to_sleep - time.time()
-        if time_to_sleep < 0:
-            time_to_sleep = 0
-        time.sleep(time_to_sleep)
 
 #
 # --- main loop end -----------------------------------------------------------------------
 #
 
+# Hand sub-workflows to a pool of workers, if replaying in parallel
+if replay_workers > 1 and len(wfs) > 0:
+    logger.info("replaying sub-workflows using %d workers" % (replay_workers))
+    replay_pool = replay.ParallelReplay(replay_subworkflow, replay_workers)
+    replay_pool.start(out)
+
+monitor_workflows()
+
+if replay_pool is not None:
+    # Wait for the workers to finish, all workflows are in the
+    # database now, so we can link sub-workflows to their parent jobs
+    link_subworkflows(replay_pool.finish())
+    for my_dir, my_retry in replay_pool.retries.items():
+        wf_retry_dict[my_dir] = my_retry
+
 if do_notifications is True and monitord_notifications is not None:
     logger.info("finishing notifications...")
     while (
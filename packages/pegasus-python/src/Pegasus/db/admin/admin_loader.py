@@ -39,7 +39,7 @@ log = logging.getLogger(__name__)
 # -------------------------------------------------------------------
 # DB Admin configuration
 # -------------------------------------------------------------------
-CURRENT_DB_VERSION = 13
+CURRENT_DB_VERSION = 14
 DB_MIN_VERSION = 8
 
 COMPATIBILITY = {
@@ -67,7 +67,7 @@ COMPATIBILITY = {
     "4.9.1": 11,
     "4.9.2": 11,
     "4.9.3": 11,
-    "5.0.0": 13,
+    "5.0.0": 14,
 }
 
 
@@ -307,6 +307,7 @@ def db_downgrade(db, pegasus_version=None, force=False, verbose=True):
 
     # backup the database before making changes
     _backup_db(db)
+    connection.invalidate_schema_check(db.get_bind().url)
 
     for i in range(int(current_version), int(version) - 1, -1):
 
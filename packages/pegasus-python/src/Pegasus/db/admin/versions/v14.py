@@ -0,0 +1,46 @@
+import logging
+
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from Pegasus.db import workflow_summary
+from Pegasus.db.admin.admin_loader import DBAdminError
+from Pegasus.db.admin.versions.base_version import BaseVersion
+from Pegasus.db.schema import Job, WorkflowSummary, check_table_exists
+
+DB_VERSION = 14
+
+log = logging.getLogger(__name__)
+
+
+class Version(BaseVersion):
+    def __init__(self, connection):
+        super().__init__(connection)
+
+    def update(self, force=False):
+        """."""
+        log.debug("Updating to version %s" % DB_VERSION)
+        if not check_table_exists(self.db.get_bind(), Job):
+            # a master database
+            return
+
+        try:
+            WorkflowSummary.__table__.create(self.db.get_bind(), checkfirst=True)
+
+            # fill the summary of the workflows already loaded
+            wf_ids = [row.wf_id for row in self.db.query(Job.wf_id).distinct()]
+            workflow_summary.rebuild(self.db, wf_ids)
+            self.db.commit()
+        except (OperationalError, ProgrammingError) as e:
+            self.db.rollback()
+            raise DBAdminError(e)
+
+    def downgrade(self, force=False):
+        """."""
+        log.debug("Downgrading from version %s" % DB_VERSION)
+        try:
+            WorkflowSummary.__table__.drop(self.db.get_bind(), checkfirst=True)
+        except (OperationalError, ProgrammingError):
+            pass
+        except Exception as e:
+            self.db.rollback()
+            raise DBAdminError(e)
@@ -100,6 +100,8 @@ class BaseLoader:
 
     def disconnect(self):
         self.session.close()
+        # the workflow is over, fold the SQLite write-ahead log into the database
+        connection.checkpoint(self.session)
 
     def check_connection(self, sub=False):
         self.log.debug("Checking connection")
@@ -128,10 +130,11 @@ class BaseLoader:
         """
         try:
             if merge:
+                # merge() adds a copy of the event to the session
                 event.merge_to_db(self.session)
             else:
                 event.commit_to_db(self.session)
-            self.session.expunge(event)
+                self.session.expunge(event)
         except exc.IntegrityError as e:
             self.log.error("Insert failed for event %s : %s", event, e)
             self.session.rollback()
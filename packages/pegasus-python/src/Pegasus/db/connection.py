@@ -16,16 +16,22 @@
 #
 __author__ = "Rafael Ferreira da Silva"
 
+import copy
+import functools
 import getpass
 import logging
 import os
+import sqlite3
 import subprocess
+import threading
+import weakref
 from sqlite3 import Connection as SQLite3Connection
 from stat import ST_MODE
 from urllib.parse import urlparse
 
 from sqlalchemy import create_engine, event, exc, orm
 from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
 
 from Pegasus import user as users
 from Pegasus.tools import properties, utils
@@ -50,6 +56,40 @@ PROP_CATALOG_WORKFLOW_DB_TIMEOUT = "pegasus.catalog.workflow.db.timeout"
 PROP_DASHBOARD_OUTPUT = "pegasus.dashboard.output"
 PROP_MONITORD_OUTPUT = "pegasus.monitord.output"
 
+# Connection pool of MySQL and PostgreSQL engines, sized for the threads of
+# the dashboard service. SQLite engines open a connection per session.
+POOL_SIZE = 10
+POOL_MAX_OVERFLOW = 20
+POOL_RECYCLE = 3600
+
+# SQLite tuning, set with the pegasus.catalog.[master|workflow|replica|*].sqlite.*
+# properties. sqlite.wal=true turns on the profile for concurrent monitord
+# writers and service readers, the other properties override its defaults.
+SQLITE_WAL = "sqlite.wal"
+SQLITE_SYNCHRONOUS = "sqlite.synchronous"
+SQLITE_MMAP_SIZE = "sqlite.mmap_size"
+SQLITE_CACHE_SIZE = "sqlite.cache_size"
+SQLITE_CHECKPOINT = "sqlite.checkpoint"
+SQLITE_OPTIONS = [
+    SQLITE_WAL,
+    SQLITE_SYNCHRONOUS,
+    SQLITE_MMAP_SIZE,
+    SQLITE_CACHE_SIZE,
+    SQLITE_CHECKPOINT,
+]
+
+SQLITE_WAL_DEFAULTS = {
+    SQLITE_SYNCHRONOUS: "NORMAL",
+    SQLITE_MMAP_SIZE: 256 * 1024 * 1024,
+    SQLITE_CACHE_SIZE: -64 * 1024,  # negative values are in KiB
+    SQLITE_CHECKPOINT: "TRUNCATE",
+}
+# busy timeout in seconds of the WAL profile, if pegasus.catalog.*.timeout is not set
+SQLITE_WAL_TIMEOUT = 30
+
+SQLITE_SYNCHRONOUS_MODES = ["OFF", "NORMAL", "FULL", "EXTRA"]
+SQLITE_CHECKPOINT_MODES = ["NONE", "PASSIVE", "FULL", "RESTART", "TRUNCATE"]
+
 CONNECTION_PROPERTIES = [
     PROP_CATALOG_MASTER_URL,
     PROP_CATALOG_REPLICA_DB_URL,
@@ -85,6 +125,129 @@ class DBKey:
     TIMEOUT = "timeout"
 
 
+class _EngineRegistry:
+    """
+    Engines shared by all the connections of the process, one per normalized
+    database URL, and the database schemas already verified with them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._engines = {}
+        self._verified = {}
+        self._checkpoints = weakref.WeakKeyDictionary()
+
+    def engine(self, dburi, echo=False, connect_args=None, pragmas=(), checkpoint=None):
+        """
+        Get the engine, and its session factory, for a database URL.
+        :param dburi: DB URI
+        :param echo:
+        :param connect_args:
+        :param pragmas: (name, value) SQLite pragmas to set on new connections
+        :param checkpoint: SQLite checkpoint mode to use at the end of a workflow
+        :return: (key, engine, Session, created) tuple, where created tells
+                 whether the engine was just created, and tested with a first
+                 connection. Key is None for engines which are not shared, such
+                 as in-memory SQLite databases.
+        """
+        url = _normalize_url(dburi)
+        key = None
+        if not _is_memory_db(url):
+            key = (
+                str(url),
+                echo,
+                repr(sorted((connect_args or {}).items())),
+                pragmas,
+                checkpoint,
+            )
+
+        with self._lock:
+            self._check_pid()
+            if key in self._engines:
+                return (key,) + self._engines[key] + (False,)
+
+        kwargs = {"pool_recycle": POOL_RECYCLE}
+        if not url.drivername.startswith("sqlite"):
+            kwargs.update(
+                pool_size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW, pool_pre_ping=True
+            )
+        engine = create_engine(url, echo=echo, connect_args=connect_args, **kwargs)
+        if pragmas:
+            event.listen(
+                engine, "connect", functools.partial(_set_sqlite_profile, pragmas)
+            )
+        engine.connect().close()
+        Session = orm.sessionmaker(
+            bind=engine, autoflush=False, autocommit=False, expire_on_commit=False
+        )
+        if key is None:
+            return key, engine, Session, True
+
+        with self._lock:
+            if key in self._engines:
+                # another thread connected first
+                engine.dispose()
+                return (key,) + self._engines[key] + (False,)
+            self._engines[key] = (engine, Session)
+            if checkpoint:
+                self._checkpoints[engine] = checkpoint
+        return key, engine, Session, True
+
+    def checkpoint_mode(self, engine):
+        with self._lock:
+            return self._checkpoints.get(engine)
+
+    def is_verified(self, key, pegasus_version):
+        """
+        Whether the schema of the database was verified for the given Pegasus
+        version. SQLite database files replaced since are verified again.
+        """
+        if key is None:
+            return False
+        with self._lock:
+            self._check_pid()
+            file_id = self._verified.get((key, pegasus_version))
+        return file_id is not None and file_id == _db_file_id(key[0])
+
+    def set_verified(self, key, pegasus_version):
+        if key is None:
+            return
+        with self._lock:
+            self._verified[(key, pegasus_version)] = _db_file_id(key[0])
+
+    def invalidate(self, dburi):
+        """
+        Forget the schema verifications of a database, after it was changed.
+        """
+        url = str(_normalize_url(dburi))
+        with self._lock:
+            for k in [k for k in self._verified if k[0][0] == url]:
+                del self._verified[k]
+
+    def dispose(self):
+        """
+        Close the connections of all the engines, and forget them.
+        """
+        with self._lock:
+            for engine, _ in self._engines.values():
+                engine.dispose()
+            self._engines.clear()
+            self._verified.clear()
+            self._checkpoints.clear()
+
+    def _check_pid(self):
+        # connections cannot be shared with a forked child, which starts over
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._engines = {}
+            self._verified = {}
+            self._checkpoints = weakref.WeakKeyDictionary()
+
+
+_registry = _EngineRegistry()
+
+
 def connect(
     dburi,
     echo=False,
@@ -131,11 +294,19 @@ def connect(
         # PM-898 monitord sends props as None and connect_args has the
         # right values for the connection
         connect_args = _parse_props(dburi, props, db_type, connect_args)
+        pragmas, checkpoint_mode = _parse_sqlite_options(
+            dburi, props, db_type, connect_args
+        )
 
-        engine = create_engine(
-            dburi, echo=echo, pool_recycle=True, connect_args=connect_args
+        key, engine, Session, created = _registry.engine(
+            dburi,
+            echo=echo,
+            connect_args=connect_args,
+            pragmas=pragmas,
+            checkpoint=checkpoint_mode,
         )
-        engine.connect()
+        if not created and not init:
+            engine.connect().close()
         if backup or not init:
             _check_db_permissions(dburi, db_type, mask)
 
@@ -154,9 +325,6 @@ def connect(
             "{} ({})".format(e, dburi), given_version=pegasus_version, db_type=db_type
         )
 
-    Session = orm.sessionmaker(
-        bind=engine, autoflush=False, autocommit=False, expire_on_commit=False
-    )
     db = orm.scoped_session(Session)
 
     # Database creation
@@ -172,6 +340,7 @@ def connect(
                 force=force,
                 verbose=verbose,
             )
+            _registry.invalidate(dburi)
 
         except exc.OperationalError as e:
             if "database is locked" in str(e).lower():
@@ -215,11 +384,10 @@ def connect(
                     db_type=db_type,
                 )
 
-    if not create and schema_check:
+    if not create and schema_check and not _registry.is_verified(key, pegasus_version):
         try:
             from Pegasus.db.admin.admin_loader import DBAdminError, db_verify
 
-            db = orm.scoped_session(Session)
             db_verify(
                 db,
                 check=True,
@@ -227,6 +395,7 @@ def connect(
                 force=force,
                 print_version=print_version,
             )
+            _registry.set_verified(key, pegasus_version)
         except DBAdminError as e:
             e.db_type = db_type
             raise (e)
@@ -234,6 +403,50 @@ def connect(
     return db
 
 
+def invalidate_schema_check(dburi):
+    """
+    Make the next connection to the database verify its schema again. To be
+    called after the schema was changed, e.g., downgraded.
+    :param dburi: DB URI
+    """
+    _registry.invalidate(_parse_jdbc_uri(str(dburi)))
+
+
+def checkpoint(db):
+    """
+    Checkpoint the write-ahead log of a SQLite database connected to with the
+    sqlite.wal or sqlite.checkpoint properties, e.g., at the end of a workflow,
+    so that readers do not have to go through a large log.
+    :param db: DB session object
+    """
+    engine = db.get_bind()
+    mode = _registry.checkpoint_mode(engine)
+    if not mode or mode == "NONE":
+        return
+
+    try:
+        with engine.connect() as conn:
+            busy, frames, checkpointed = conn.execute(
+                "PRAGMA wal_checkpoint(%s);" % mode
+            ).fetchone()
+        log.debug(
+            "Checkpoint %s of %s: %s of %s frames"
+            % (mode, engine.url, checkpointed, frames)
+        )
+        if busy:
+            log.warning(
+                "Unable to complete the checkpoint of %s, the database is in use"
+                % engine.url
+            )
+    except exc.SQLAlchemyError as e:
+        log.warning("Unable to checkpoint %s: %s" % (engine.url, e))
+
+
+def dispose_engines():
+    """Close the connections of all the engines shared by the process"""
+    _registry.dispose()
+
+
 def connect_by_submitdir(
     submit_dir,
     db_type,
@@ -417,6 +630,21 @@ def _set_sqlite_pragma(conn, record):
         cursor.close()
 
 
+def _set_sqlite_profile(pragmas, conn, record):
+    cursor = conn.cursor()
+    try:
+        for name, value in pragmas:
+            log.debug("Setting PRAGMA {}={}".format(name, value))
+            try:
+                cursor.execute("PRAGMA {}={};".format(name, value))
+            except sqlite3.OperationalError as e:
+                # e.g., the journal mode cannot be changed while the
+                # database is locked, the next connection will try again
+                log.warning("Unable to set PRAGMA {}={}: {}".format(name, value, e))
+    finally:
+        cursor.close()
+
+
 def _merge_properties(props, cl_properties):
     if cl_properties:
         for property in cl_properties:
@@ -604,6 +832,46 @@ def _validate(dburi):
         raise ConnectionError("Missing Python module: {} ({})".format(e, dburi))
 
 
+def _normalize_url(dburi):
+    """
+    Parse a DB URI, with the path of SQLite database files made absolute, so
+    that all the URIs of a database are the same.
+    """
+    url = make_url(dburi)
+    if url.drivername.startswith("sqlite") and not _is_memory_db(url):
+        database = os.path.realpath(url.database)
+        if hasattr(url, "set"):
+            # SQLAlchemy >= 1.4 URLs are immutable
+            url = url.set(database=database)
+        else:
+            url = copy.copy(url)
+            url.database = database
+    return url
+
+
+def _is_memory_db(url):
+    return url.drivername.startswith("sqlite") and url.database in (
+        None,
+        "",
+        ":memory:",
+    )
+
+
+def _db_file_id(dburi):
+    """
+    Identity of a SQLite database file, which changes when the file is
+    replaced, e.g., rotated. Other databases always have the same.
+    """
+    url = make_url(dburi)
+    if not url.drivername.startswith("sqlite"):
+        return True
+    try:
+        st = os.stat(url.database)
+    except OSError:
+        return False
+    return (st.st_dev, st.st_ino)
+
+
 def _check_db_permissions(dburi, db_type, mask=None):
     if urlparse(dburi).scheme == "sqlite" and dburi.lower() != "sqlite://":
         path = urlparse(dburi).path[1:]
@@ -669,6 +937,75 @@ def _parse_props(dburi, props, db_type=None, connect_args=None):
     return connect_args
 
 
+def _parse_sqlite_options(dburi, props, db_type=None, connect_args=None):
+    """
+    Get the SQLite tuning from the sqlite.* properties. pegasus-monitord passes
+    them in connect_args, from which they are removed, as they are not
+    arguments of the driver.
+    :param dburi: DB URI
+    :param props: properties
+    :param db_type: DB type (JDBCRC, MASTER, or WORKFLOW)
+    :param connect_args: connection arguments, a busy timeout is added to them
+                         for the WAL profile
+    :return: tuple of (name, value) pragmas to set on new connections, and
+             the checkpoint mode to use at the end of the workflow
+    """
+    options = {}
+    if connect_args:
+        for key in list(connect_args.keys()):
+            if key.startswith("sqlite."):
+                options[key] = connect_args.pop(key)
+
+    if props and db_type:
+        catalog = {
+            DBType.MASTER: "master",
+            DBType.WORKFLOW: "workflow",
+            DBType.JDBCRC: "replica",
+        }.get(db_type.upper())
+        for name in SQLITE_OPTIONS:
+            value = props.property("pegasus.catalog.{}.{}".format(catalog, name))
+            if value is None:
+                value = props.property("pegasus.catalog.*.%s" % name)
+            if value is not None:
+                options[name] = value
+
+    if not dburi.lower().startswith("sqlite") or not options:
+        return (), None
+
+    pragmas = []
+    if str(options.get(SQLITE_WAL, "false")).lower() == "true":
+        for name, value in SQLITE_WAL_DEFAULTS.items():
+            options.setdefault(name, value)
+        pragmas.append(("journal_mode", "WAL"))
+        if connect_args is not None and DBKey.TIMEOUT not in connect_args:
+            connect_args[DBKey.TIMEOUT] = SQLITE_WAL_TIMEOUT
+
+    try:
+        if SQLITE_SYNCHRONOUS in options:
+            synchronous = str(options[SQLITE_SYNCHRONOUS]).upper()
+            if synchronous not in SQLITE_SYNCHRONOUS_MODES:
+                raise ValueError("invalid %s '%s'" % (SQLITE_SYNCHRONOUS, synchronous))
+            pragmas.append(("synchronous", synchronous))
+        if SQLITE_MMAP_SIZE in options:
+            pragmas.append(("mmap_size", int(options[SQLITE_MMAP_SIZE])))
+        if SQLITE_CACHE_SIZE in options:
+            pragmas.append(("cache_size", int(options[SQLITE_CACHE_SIZE])))
+
+        checkpoint_mode = None
+        if SQLITE_CHECKPOINT in options:
+            checkpoint_mode = str(options[SQLITE_CHECKPOINT]).upper()
+            if checkpoint_mode not in SQLITE_CHECKPOINT_MODES:
+                raise ValueError(
+                    "invalid %s '%s'" % (SQLITE_CHECKPOINT, checkpoint_mode)
+                )
+    except ValueError as e:
+        raise ConnectionError(
+            "Invalid SQLite properties: {} ({})".format(e, dburi), db_type=db_type
+        )
+
+    return tuple(pragmas), checkpoint_mode
+
+
 def _get_timeout_property(props, prop_name1, prop_name2):
     """
 
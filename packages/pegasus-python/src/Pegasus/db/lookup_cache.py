@@ -0,0 +1,128 @@
+"""
+Size-bounded caches for the id lookups done by the database loaders.
+
+The keys of a LookupCache are tuples that start with the id of the
+workflow the entry belongs to, so that all the entries of a workflow
+can be dropped at once when it finishes. When the cache is full, the
+least recently used entry is evicted, whichever workflow it belongs to.
+"""
+
+##
+#  Copyright 2007-2020 University Of Southern California
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing,
+#  software distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##
+
+import sys
+from collections import OrderedDict
+
+DEFAULT_MAX_SIZE = 100000  # entries per cache
+
+
+class LookupCache:
+    """
+    Maps (wf_id, ...) keys to values, keeping at most max_size entries.
+    """
+
+    def __init__(self, name, max_size=DEFAULT_MAX_SIZE):
+        if max_size < 1:
+            raise ValueError("max_size must be a positive integer")
+
+        self.name = name
+        self.max_size = max_size
+        self._entries = OrderedDict()  # key --> value, least recently used first
+        self._partitions = {}  # wf_id --> keys of the workflow
+        self._evicted = set()  # wf_ids that lost entries to eviction
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __getitem__(self, key):
+        return self._entries[key]
+
+    def __setitem__(self, key, value):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        else:
+            self._partitions.setdefault(key[0], set()).add(key)
+        self._entries[key] = value
+
+        while len(self._entries) > self.max_size:
+            old_key, _ = self._entries.popitem(last=False)
+            self._discard(old_key)
+            self._evicted.add(old_key[0])
+            self.evictions += 1
+
+    def get(self, key, default=None):
+        """
+        Returns the value cached for key, or default if there is none.
+        Only lookups done with get count as hits or misses, and mark the
+        entry as recently used.
+        """
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def _discard(self, key):
+        keys = self._partitions[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self._partitions[key[0]]
+
+    def complete(self, wf_id):
+        """
+        Returns False if entries of workflow wf_id were evicted, in which
+        case a missing key does not mean there is no such row.
+        """
+        return wf_id not in self._evicted
+
+    def purge(self, wf_id):
+        """
+        Removes all the entries of workflow wf_id.
+        """
+        for key in self._partitions.pop(wf_id, ()):
+            del self._entries[key]
+        self._evicted.discard(wf_id)
+
+    def memory(self):
+        """
+        Returns an estimate of the number of bytes used by the entries.
+        """
+        size = sys.getsizeof(self._entries)
+        for key, value in self._entries.items():
+            size += sys.getsizeof(key) + sys.getsizeof(value)
+            size += sum(sys.getsizeof(item) for item in key)
+        return size
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "max_size": self.max_size,
+            "workflows": len(self._partitions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "memory": self.memory(),
+        }
@@ -61,6 +61,7 @@ __all__ = (
     "TaskEdge",
     "TaskMeta",
     "Invocation",
+    "WorkflowSummary",
     "WorkflowFiles",
     "IntegrityMetrics",
     "MasterWorkflow",
@@ -87,6 +88,7 @@ KeyInteger = KeyInteger.with_variant(sqlite.INTEGER(), "sqlite")
 
 TimestampType = Numeric(precision=16, scale=6)
 DurationType = Numeric(precision=10, scale=3)
+SummaryDurationType = Numeric(precision=20, scale=3)
 
 
 # --------------------------------------------------------------------
@@ -166,6 +168,7 @@ def get_missing_tables(db):
         TaskMeta,
         Invocation,
         IntegrityMetrics,
+        WorkflowSummary,
         # MASTER
         MasterWorkflow,
         MasterWorkflowstate,
@@ -343,6 +346,12 @@ class Workflow(Base):
         cascade="all, delete-orphan",
         passive_deletes=True,
     )
+    summary = relation(
+        lambda: WorkflowSummary,
+        backref="workflow",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
 
 
 Workflow.__table_args__ = (
@@ -846,6 +855,40 @@ IntegrityMetrics.__table_args__ = (
 )
 
 
+class WorkflowSummary(Base):
+    """
+    Job and task counts and cumulative wall times of a workflow, per
+    job type, kept up to date by the workflow loader so that status
+    queries do not have to scan the job instances and invocations.
+    """
+
+    __tablename__ = "workflow_summary"
+    __table_args__ = (table_keywords,)
+
+    wf_id = Column(
+        "wf_id",
+        KeyInteger,
+        ForeignKey(Workflow.wf_id, ondelete="CASCADE"),
+        primary_key=True,
+    )
+    type_desc = Column("type_desc", String(255), primary_key=True)
+    jobs = Column("jobs", Integer, nullable=False, default=0)
+    # jobs with at least one job instance
+    started_jobs = Column("started_jobs", Integer, nullable=False, default=0)
+    job_instances = Column("job_instances", Integer, nullable=False, default=0)
+    # status of the last job instance of the jobs
+    succeeded_jobs = Column("succeeded_jobs", Integer, nullable=False, default=0)
+    failed_jobs = Column("failed_jobs", Integer, nullable=False, default=0)
+    # tasks mapped to a job
+    tasks = Column("tasks", Integer, nullable=False, default=0)
+    # invocations of the jobs, and the sums of their
+    # remote_duration * multiplier_factor
+    invocations = Column("invocations", Integer, nullable=False, default=0)
+    wall_time = Column("wall_time", SummaryDurationType, nullable=False, default=0)
+    goodput = Column("goodput", SummaryDurationType, nullable=False, default=0)
+    badput = Column("badput", SummaryDurationType, nullable=False, default=0)
+
+
 # ---------------------------------------------
 # JDBCRC
 # ---------------------------------------------
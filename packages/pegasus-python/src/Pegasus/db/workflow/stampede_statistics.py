@@ -164,6 +164,7 @@ from sqlalchemy.types import Float, Integer
 from Pegasus.db import connection
 from Pegasus.db.errors import StampedeDBNotFoundError
 from Pegasus.db.schema import *
+from Pegasus.db.schema import check_table_exists
 
 # Main stats class.
 
@@ -189,6 +190,7 @@ class StampedeStatistics:
         self._xform_filter = {"include": None, "exclude": None}
 
         self._wfs = []
+        self._summary = None
 
     def initialize(self, root_wf_uuid=None, root_wf_id=None):
         if root_wf_uuid is None and root_wf_id is None:
@@ -385,6 +387,33 @@ class StampedeStatistics:
         }
         return filters[self._job_filter_mode]
 
+    def _use_summary(self):
+        """
+        Returns True if the database has the workflow_summary table that
+        the workflow loader keeps up to date, in which case the job and
+        task totals are read from it instead of being counted.
+        """
+        if self._summary is None:
+            self._summary = check_table_exists(self.session.get_bind(), WorkflowSummary)
+        return self._summary
+
+    def _summary_query(self, *columns):
+        q = self.session.query(*columns)
+        if self._expand and self._is_root_wf:
+            q = q.filter(Workflow.root_wf_id == self._root_wf_id)
+        elif self._expand and not self._is_root_wf:
+            q = q.filter(Workflow.wf_id.in_(self._wfs))
+        else:
+            q = q.filter(Workflow.wf_id == self._wfs[0])
+        q = q.filter(WorkflowSummary.wf_id == Workflow.wf_id)
+        if self._get_job_filter(WorkflowSummary) is not None:
+            q = q.filter(self._get_job_filter(WorkflowSummary))
+        return q
+
+    def _summary_total(self, column):
+        q = self._summary_query(func.sum(column))
+        return int(q.scalar() or 0)
+
     def _max_job_seq_subquery(self):
         """
         Creates the following subquery that is used in
@@ -408,6 +437,9 @@ class StampedeStatistics:
         https://confluence.pegasus.isi.edu/display/pegasus/Workflow+Summary#WorkflowSummary-Totaljobs
         https://confluence.pegasus.isi.edu/display/pegasus/Workflow+Statistics+file#WorkflowStatisticsfile-Totaljobs
         """
+        if self._use_summary():
+            return self._summary_total(WorkflowSummary.jobs)
+
         q = self.session.query(Job.job_id)
         if self._expand and self._is_root_wf:
             q = q.filter(Workflow.root_wf_id == self._root_wf_id)
@@ -426,6 +458,19 @@ class StampedeStatistics:
         https://confluence.pegasus.isi.edu/display/pegasus/Workflow+Summary#WorkflowSummary-Totalsucceeded_failed_jobs
         https://confluence.pegasus.isi.edu/display/pegasus/Workflow+Statistics+file#WorkflowStatisticsfile-Totalsucceededfailedjobs
         """
+        if not classify_error and self._use_summary():
+            # the sums are NULL when no job was started, as when counted
+            started = func.sum(WorkflowSummary.started_jobs) > 0
+            q = self._summary_query(
+                case(
+                    [(started, func.sum(WorkflowSummary.succeeded_jobs))], else_=None
+                ).label("succeeded"),
+                case(
+                    [(started, func.sum(WorkflowSummary.failed_jobs))], else_=None
+                ).label("failed"),
+            )
+            return q.one()
+
         JobInstanceSub = orm.aliased(JobInstance, name="JobInstanceSub")
         sq_1 = self.session.query(
             func.max(JobInstanceSub.job_submit_seq).label("jss"),
@@ -505,6 +550,9 @@ class StampedeStatistics:
         https://confluence.pegasus.isi.edu/display/pegasus/Workflow+Summary#WorkflowSummary-Totalsucceededjobs
         https://confluence.pegasus.isi.edu/display/pegasus/Workflow+Statistics+file#WorkflowStatisticsfile-Totalsucceededjobs
         """
+        if self._use_summary():
+            return self._summary_total(WorkflowSummary.succeeded_jobs)
+
         JobInstanceSub = orm.aliased(JobInstance, name="JobInstanceSub")
         sq_1 = self.session.query(
             func.max(JobInstanceSub.job_submit_seq).label("jss"),
@@ -562,6 +610,13 @@ class StampedeStatistics:
         return q
 
     def get_total_running_jobs_status(self):
+        if self._use_summary():
+            return self._summary_total(
+                WorkflowSummary.started_jobs
+                - WorkflowSummary.succeeded_jobs
+                - WorkflowSummary.failed_jobs
+            )
+
         JobInstanceSub = orm.aliased(JobInstance, name="JobInstanceSub")
         sq_1 = self.session.query(
             func.max(JobInstanceSub.job_submit_seq).label("jss"),
@@ -586,6 +641,8 @@ class StampedeStatistics:
         return q.count()
 
     def get_total_failed_jobs_status(self):
+        if self._use_summary():
+            return self._summary_total(WorkflowSummary.failed_jobs)
 
         q = self._get_total_failed_jobs_status()
         return q.count()
@@ -607,6 +664,11 @@ class StampedeStatistics:
         https://confluence.pegasus.isi.edu/display/pegasus/Workflow+Summary#WorkflowSummary-TotalJobRetries
         https://confluence.pegasus.isi.edu/display/pegasus/Workflow+Statistics+file#WorkflowStatisticsfile-TotalJobRetries
         """
+        if self._use_summary():
+            return self._summary_total(
+                WorkflowSummary.job_instances - WorkflowSummary.started_jobs
+            )
+
         self._dax_or_dag_cond()
 
         sq_1 = self.session.query(func.count(Job.job_id))
@@ -648,6 +710,9 @@ class StampedeStatistics:
         https://confluence.pegasus.isi.edu/display/pegasus/Workflow+Summary#WorkflowSummary-Totaltask
         https://confluence.pegasus.isi.edu/display/pegasus/Workflow+Statistics+file#WorkflowStatisticsfile-Totaltasks
         """
+        if self._use_summary():
+            return self._summary_total(WorkflowSummary.tasks)
+
         q = self.session.query(Task.task_id)
         if self._expand and self._is_root_wf:
             q = q.filter(Workflow.root_wf_id == self._root_wf_id)
@@ -846,6 +911,9 @@ class StampedeStatistics:
         https://confluence.pegasus.isi.edu/display/pegasus/Workflow+Summary#WorkflowSummary-Workflowcumulativejobwalltime
         https://confluence.pegasus.isi.edu/display/pegasus/Workflow+Statistics+file#WorkflowStatisticsfile-Workflowcumulativejobwalltime
         """
+        if self._use_summary():
+            return self._get_summary_cum_job_wall_time()
+
         q = self.session.query(
             cast(
                 func.sum(Invocation.remote_duration * JobInstance.multiplier_factor),
@@ -897,6 +965,25 @@ class StampedeStatistics:
 
         return q.first()
 
+    def _get_summary_cum_job_wall_time(self):
+        q = self.session.query(
+            func.sum(WorkflowSummary.invocations),
+            func.sum(WorkflowSummary.wall_time),
+            func.sum(WorkflowSummary.goodput),
+            func.sum(WorkflowSummary.badput),
+        )
+        # the wall time is not filtered on the job type
+        if self._expand:
+            q = q.filter(WorkflowSummary.wf_id == Workflow.wf_id)
+            q = q.filter(Workflow.root_wf_id == self._root_wf_id)
+        else:
+            q = q.filter(WorkflowSummary.wf_id.in_(self._wfs))
+
+        invocations, wall_time, goodput, badput = q.one()
+        if not invocations:
+            return None, None, None
+        return float(wall_time), float(goodput), float(badput)
+
     def get_summary_integrity_metrics(self):
         """
 
@@ -1086,109 +1173,70 @@ class StampedeStatistics:
     def get_job_statistics(self):
         """
         https://confluence.pegasus.isi.edu/display/pegasus/Job+Statistics+file#JobStatisticsfile-All
+
+        The job state timestamps and the invocation totals of all the job
+        instances are computed in one pass each, with conditional aggregates
+        grouped by job instance, rather than with a correlated subquery per
+        column and job instance.
         """
         if self._expand:
             return []
-        sq_1 = self.session.query(func.min(Jobstate.timestamp))
-        sq_1 = sq_1.filter(
-            Jobstate.job_instance_id == JobInstance.job_instance_id
-        ).correlate(JobInstance)
-        sq_1 = sq_1.filter(
-            or_(
-                Jobstate.state == "GRID_SUBMIT",
-                Jobstate.state == "GLOBUS_SUBMIT",
-                Jobstate.state == "EXECUTE",
-            )
-        )
-        sq_1 = sq_1.subquery()
 
-        sq_2 = self.session.query(Jobstate.timestamp)
-        sq_2 = sq_2.filter(
-            Jobstate.job_instance_id == JobInstance.job_instance_id
-        ).correlate(JobInstance)
-        sq_2 = sq_2.filter(Jobstate.state == "SUBMIT")
-        sq_2 = sq_2.subquery()
-
-        sq_3 = self.session.query(func.min(Jobstate.timestamp))
-        sq_3 = sq_3.filter(
-            Jobstate.job_instance_id == JobInstance.job_instance_id
-        ).correlate(JobInstance)
-        sq_3 = sq_3.filter(Jobstate.state == "EXECUTE")
-        sq_3 = sq_3.subquery()
+        def state_time(function, *states):
+            in_states = or_(*[Jobstate.state == state for state in states])
+            return function(case([(in_states, Jobstate.timestamp)]))
 
-        sq_4 = self.session.query(func.min(Jobstate.timestamp))
-        sq_4 = sq_4.filter(
-            Jobstate.job_instance_id == JobInstance.job_instance_id
-        ).correlate(JobInstance)
-        sq_4 = sq_4.filter(
-            or_(Jobstate.state == "GRID_SUBMIT", Jobstate.state == "GLOBUS_SUBMIT")
+        sq_states = self.session.query(
+            Jobstate.job_instance_id,
+            state_time(func.min, "GRID_SUBMIT", "GLOBUS_SUBMIT", "EXECUTE").label(
+                "grid_or_execute"
+            ),
+            state_time(func.min, "SUBMIT").label("submit"),
+            state_time(func.min, "EXECUTE").label("execute"),
+            state_time(func.min, "GRID_SUBMIT", "GLOBUS_SUBMIT").label("grid_submit"),
+            state_time(func.min, "POST_SCRIPT_TERMINATED").label("post_end"),
+            state_time(func.max, "POST_SCRIPT_STARTED", "JOB_TERMINATED").label(
+                "post_start"
+            ),
         )
-        sq_4 = sq_4.subquery()
-
-        sq_5 = self.session.query(func.sum(Invocation.remote_duration))
-        sq_5 = sq_5.filter(
-            Invocation.job_instance_id == JobInstance.job_instance_id
-        ).correlate(JobInstance)
-        sq_5 = sq_5.filter(Invocation.wf_id == Job.wf_id).correlate(Job)
-        sq_5 = sq_5.filter(Invocation.task_submit_seq >= 0)
-        sq_5 = sq_5.group_by().subquery()
-
-        sq_6 = self.session.query(Jobstate.timestamp)
-        sq_6 = sq_6.filter(
-            Jobstate.job_instance_id == JobInstance.job_instance_id
-        ).correlate(JobInstance)
-        sq_6 = sq_6.filter(Jobstate.state == "POST_SCRIPT_TERMINATED")
-        sq_6 = sq_6.subquery()
-
-        sq_7 = self.session.query(func.max(Jobstate.timestamp))
-        sq_7 = sq_7.filter(
-            Jobstate.job_instance_id == JobInstance.job_instance_id
-        ).correlate(JobInstance)
-        sq_7 = sq_7.filter(
-            or_(
-                Jobstate.state == "POST_SCRIPT_STARTED",
-                Jobstate.state == "JOB_TERMINATED",
-            )
+        # An IN rather than a join, so that jobstate is read in primary key
+        # order and the rows are grouped as they come
+        sq_jis = self.session.query(JobInstance.job_instance_id)
+        sq_jis = sq_jis.filter(JobInstance.job_id == Job.job_id)
+        sq_jis = sq_jis.filter(Job.wf_id.in_(self._wfs))
+        sq_states = sq_states.filter(Jobstate.job_instance_id.in_(sq_jis.subquery()))
+        sq_states = sq_states.group_by(Jobstate.job_instance_id).subquery()
+
+        # PM-704 the task submit sequence needs to be >= -1 to include prescript
+        # status, the other totals only include the tasks
+        is_task = Invocation.task_submit_seq >= 0
+        sq_invs = self.session.query(
+            Invocation.job_instance_id,
+            Invocation.wf_id,
+            func.sum(case([(is_task, Invocation.remote_duration)])).label("kickstart"),
+            func.max(Invocation.exitcode).label("exit_code"),
+            func.sum(
+                case(
+                    [
+                        (
+                            is_task,
+                            Invocation.remote_duration * JobInstance.multiplier_factor,
+                        )
+                    ]
+                )
+            ).label("kickstart_multi"),
+            func.sum(case([(is_task, Invocation.remote_cpu_time)])).label(
+                "remote_cpu_time"
+            ),
         )
-        sq_7 = sq_7.subquery()
-
-        sq_8 = self.session.query(func.max(Invocation.exitcode))
-        sq_8 = sq_8.filter(
+        sq_invs = sq_invs.filter(
             Invocation.job_instance_id == JobInstance.job_instance_id
-        ).correlate(JobInstance)
-        sq_8 = sq_8.filter(Invocation.wf_id == Job.wf_id).correlate(Job)
-        # PM-704 the task submit sequence needs to be >= -1 to include prescript status
-        sq_8 = sq_8.filter(Invocation.task_submit_seq >= -1)
-        sq_8 = sq_8.group_by().subquery()
-
-        JobInstanceSub = orm.aliased(JobInstance)
-
-        sq_9 = self.session.query(Host.hostname)
-        sq_9 = sq_9.filter(
-            JobInstanceSub.job_instance_id == JobInstance.job_instance_id
-        ).correlate(JobInstance)
-        sq_9 = sq_9.filter(Host.host_id == JobInstanceSub.host_id)
-        sq_9 = sq_9.subquery()
-
-        JI = orm.aliased(JobInstance)
-        sq_10 = self.session.query(
-            func.sum(Invocation.remote_duration * JI.multiplier_factor)
         )
-        sq_10 = sq_10.filter(
-            Invocation.job_instance_id == JobInstance.job_instance_id
-        ).correlate(JobInstance)
-        sq_10 = sq_10.filter(Invocation.job_instance_id == JI.job_instance_id)
-        sq_10 = sq_10.filter(Invocation.wf_id == Job.wf_id).correlate(Job)
-        sq_10 = sq_10.filter(Invocation.task_submit_seq >= 0)
-        sq_10 = sq_10.group_by().subquery()
-
-        sq_11 = self.session.query(func.sum(Invocation.remote_cpu_time))
-        sq_11 = sq_11.filter(
-            Invocation.job_instance_id == JobInstance.job_instance_id
-        ).correlate(JobInstance)
-        sq_11 = sq_11.filter(Invocation.wf_id == Job.wf_id).correlate(Job)
-        sq_11 = sq_11.filter(Invocation.task_submit_seq >= 0)
-        sq_11 = sq_11.group_by().subquery()
+        sq_invs = sq_invs.filter(Invocation.wf_id.in_(self._wfs))
+        sq_invs = sq_invs.filter(Invocation.task_submit_seq >= -1)
+        sq_invs = sq_invs.group_by(
+            Invocation.job_instance_id, Invocation.wf_id
+        ).subquery()
 
         q = self.session.query(
             Job.job_id,
@@ -1196,19 +1244,37 @@ class StampedeStatistics:
             JobInstance.job_submit_seq,
             Job.exec_job_id.label("job_name"),
             JobInstance.site,
-            cast(sq_1.as_scalar() - sq_2.as_scalar(), Float).label("condor_q_time"),
-            cast(sq_3.as_scalar() - sq_4.as_scalar(), Float).label("resource_delay"),
+            cast(sq_states.c.grid_or_execute - sq_states.c.submit, Float).label(
+                "condor_q_time"
+            ),
+            cast(sq_states.c.execute - sq_states.c.grid_submit, Float).label(
+                "resource_delay"
+            ),
             cast(JobInstance.local_duration, Float).label("runtime"),
-            cast(sq_5.as_scalar(), Float).label("kickstart"),
-            cast(sq_6.as_scalar() - sq_7.as_scalar(), Float).label("post_time"),
+            cast(sq_invs.c.kickstart, Float).label("kickstart"),
+            cast(sq_states.c.post_end - sq_states.c.post_start, Float).label(
+                "post_time"
+            ),
             cast(JobInstance.cluster_duration, Float).label("seqexec"),
-            sq_8.as_scalar().label("exit_code"),
-            sq_9.as_scalar().label("host_name"),
+            sq_invs.c.exit_code,
+            Host.hostname.label("host_name"),
             JobInstance.multiplier_factor,
-            cast(sq_10.as_scalar(), Float).label("kickstart_multi"),
-            sq_11.as_scalar().label("remote_cpu_time"),
+            cast(sq_invs.c.kickstart_multi, Float).label("kickstart_multi"),
+            sq_invs.c.remote_cpu_time,
         )
-        q = q.filter(JobInstance.job_id == Job.job_id)
+        q = q.select_from(Job)
+        q = q.join(JobInstance, JobInstance.job_id == Job.job_id)
+        q = q.outerjoin(
+            sq_states, sq_states.c.job_instance_id == JobInstance.job_instance_id
+        )
+        q = q.outerjoin(
+            sq_invs,
+            and_(
+                sq_invs.c.job_instance_id == JobInstance.job_instance_id,
+                sq_invs.c.wf_id == Job.wf_id,
+            ),
+        )
+        q = q.outerjoin(Host, Host.host_id == JobInstance.host_id)
         q = q.filter(Job.wf_id.in_(self._wfs))
         q = q.order_by(JobInstance.job_submit_seq)
 
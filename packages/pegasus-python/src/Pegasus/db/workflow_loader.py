@@ -1,12 +1,17 @@
 __author__ = "Monte Goode"
 __author__ = "Karan Vahi"
 
+import itertools
 import time
 
-from sqlalchemy import exc, orm
+from sqlalchemy import bindparam, exc, orm
+from sqlalchemy.dialects import mysql, postgresql
 
 from Pegasus.db.base_loader import BaseLoader
+from Pegasus.db.lookup_cache import DEFAULT_MAX_SIZE, LookupCache
 from Pegasus.db.schema import *
+from Pegasus.db.schema import metadata
+from Pegasus.db.workflow_summary import SummaryTracker
 from Pegasus.netlogger import util
 
 
@@ -35,11 +40,14 @@ class WorkflowLoader(BaseLoader):
         props=None,
         db_type=None,
         backup=False,
+        cache_size=DEFAULT_MAX_SIZE,
     ):
         """Init object
 
         @type   connString: string
         @param  connString: SQLAlchemy connection string - REQUIRED
+        @type   cache_size: int
+        @param  cache_size: Maximum number of entries in each lookup cache
         """
         super().__init__(
             connString,
@@ -101,27 +109,38 @@ class WorkflowLoader(BaseLoader):
         # Dicts for caching FK lookups
         self.wf_id_cache = {}
         self.root_wf_id_cache = {}
-        self.task_id_cache = {}  # for task metadata population
-        self.lfn_id_cache = {}  # for file metadata population
-        self.job_id_cache = {}
-        self.job_instance_id_cache = {}
-        self.host_cache = {}
-        self.hosts_written_cache = None
+        # Bounded caches, keyed by (wf_id, ...) so they can be purged
+        # when a workflow ends
+        self.task_id_cache = LookupCache("task_id", cache_size)  # task metadata
+        self.lfn_id_cache = LookupCache("lfn_id", cache_size)  # file metadata
+        self.job_id_cache = LookupCache("job_id", cache_size)
+        self.job_instance_id_cache = LookupCache("job_instance_id", cache_size)
+        self.host_cache = LookupCache("host", cache_size)
+        self.hosts_written_cache = None  # (wf_id, site, hostname, ip) --> host_id
+        # wf_id --> highest job_id, task_id and job_instance_id loaded
+        # into the caches by load_ids
+        self.id_marks = {}
+        # changes to the workflow_summary table
+        self.summary = SummaryTracker(cache_size)
 
         # undocumented performance option
         self._perf = perf
         if self._perf:
             self._insert_time, self._insert_num = 0, 0
             self._start_time = time.time()
+            # table (or table:upsert, table:update) --> [rows, statements, time]
+            self._flush_stats = {}
 
         # caches for batched events
         self._batch_cache = {
             "batch_events": [],
-            "update_events": [],
+            "update_events": {},  # job_instance_id --> JobInstance
             "host_map_events": [],
         }
         self._task_map_flush = {}
         self._task_edge_flush = {}
+        self._host_updates = []
+        self._flushing = False
 
     def process(self, linedata):
         """
@@ -184,6 +203,9 @@ class WorkflowLoader(BaseLoader):
                 % retry
             )
 
+        if not self._batch:
+            self.flush_summary()
+
         self.check_flush(increment=True)
 
     def linedataToObject(self, linedata, o):
@@ -278,6 +300,13 @@ class WorkflowLoader(BaseLoader):
         if not self._batch:
             return
 
+        flushing, self._flushing = self._flushing, True
+        try:
+            self._hard_flush(batch_flush, retry)
+        finally:
+            self._flushing = flushing
+
+    def _hard_flush(self, batch_flush, retry):
         self.log.debug("Hard flush: batch_flush=%s", batch_flush)
 
         if retry == self.MAX_RETRIES + 1:
@@ -297,6 +326,8 @@ class WorkflowLoader(BaseLoader):
         if self._perf:
             s = time.time()
 
+        self.drop_written_hosts()
+
         end_event = []
 
         self.log.debug(
@@ -305,22 +336,31 @@ class WorkflowLoader(BaseLoader):
             len(self._batch_cache["update_events"]),
         )
 
+        id_wf_ids = set()
         for event in self._batch_cache["batch_events"]:
             if event.event == "stampede.xwf.end":
                 end_event.append(event)
-            if batch_flush:
-                self.session.add(event)
-            else:
+            elif isinstance(event, (Job, Task)):
+                id_wf_ids.add(event.wf_id)
+            if not batch_flush:
                 self.individual_commit(event)
 
-        for event in self._batch_cache["update_events"]:
-            if batch_flush:
-                self.session.merge(event)
-            else:
+        if not batch_flush:
+            for event in self._batch_cache["update_events"].values():
                 self.individual_commit(event, merge=True)
 
         try:
+            if batch_flush:
+                self.summary.load(self.session)
+                self.bulk_insert(self._batch_cache["batch_events"])
+                self.bulk_merge(self._batch_cache["update_events"].values())
+                contributions = self.summary.flush(self.session)
+            else:
+                # some of the events may have failed
+                self.summary.rebuild(self.session)
             self.session.commit()
+            if batch_flush:
+                self.summary.committed(contributions)
         except exc.IntegrityError as e:
             self.log.exception(e)
             self.log.error(
@@ -337,6 +377,10 @@ class WorkflowLoader(BaseLoader):
             self.session.rollback()
             self.hard_flush(retry=retry)
 
+        # Cache the ids the database assigned to the new jobs and tasks
+        for wf_id in id_wf_ids:
+            self.load_ids(wf_id)
+
         for host in self._batch_cache["host_map_events"]:
             self.map_host_to_job_instance(host)
 
@@ -346,10 +390,11 @@ class WorkflowLoader(BaseLoader):
 
         # Clear all data structures here.
         for k in self._batch_cache.keys():
-            self._batch_cache[k] = []
+            self._batch_cache[k] = type(self._batch_cache[k])()
 
         try:
             # commit the map host to job events . no retries for this.
+            self.bulk_merge(self._host_updates)
             self.session.commit()
         except exc.IntegrityError as e:
             self.log.exception(e)
@@ -361,6 +406,7 @@ class WorkflowLoader(BaseLoader):
                 "Connection problem on host_map_events during commit in hard_flush()"
             )
             self.session.rollback()
+        self._host_updates = []
 
         self.reset_flush_state()
         self.log.debug("Hard flush end")
@@ -368,6 +414,174 @@ class WorkflowLoader(BaseLoader):
         if self._perf:
             self.log.debug("Hard flush duration: %s", (time.time() - s))
 
+    def queue_update(self, job_instance):
+        """
+        @type   job_instance: class instance of stampede_schema.JobInstance
+        @param  job_instance: Job instance with its job_instance_id and
+            the columns to update set.
+
+        Queues an update of a job instance row for the next flush. The
+        updates of a row are combined as they come in, so that the row
+        is written once per flush whatever the number of events.
+        """
+        key = job_instance.job_instance_id
+        if key is None:
+            # a new row, merged on its own
+            key = ("new", id(job_instance))
+
+        pending = self._batch_cache["update_events"].get(key)
+        if pending is None:
+            self._batch_cache["update_events"][key] = job_instance
+            return
+
+        for key, value in self.row_values(job_instance).items():
+            setattr(pending, key, value)
+
+    def bulk_insert(self, events):
+        """
+        @type   events: list
+        @param  events: Mapper class instances queued for insertion.
+
+        Inserts the queued objects with one executemany per table and
+        run of rows setting the same columns, bypassing the ORM unit of
+        work. Tables are written in foreign key dependency order, so that
+        rows referenced by other rows of the same batch are inserted
+        first, and the rows of a table in the order of the events.
+        """
+        tables = {}
+        for event in events:
+            tables.setdefault(event.__table__, []).append(self.row_values(event))
+
+        order = {table: i for i, table in enumerate(metadata.sorted_tables)}
+        for table in sorted(tables, key=order.get):
+            for _, rows in itertools.groupby(
+                tables[table], key=lambda row: tuple(sorted(row))
+            ):
+                self.execute_many(table.name, table.insert(), list(rows))
+
+    def bulk_merge(self, events):
+        """
+        @type   events: list
+        @param  events: Mapper class instances, with their primary key
+            set, queued to be merged with the existing rows.
+
+        Updates of the same row are combined first, the later ones
+        winning, so that each row is written once. Rows of the same table
+        setting the same columns are then sent with one executemany, as
+        an upsert on MySQL and PostgreSQL, and as an UPDATE by primary
+        key otherwise.
+        """
+        dialect = self.session.get_bind().dialect
+
+        updates = {}  # (table, primary key) --> column values
+        for event in events:
+            table = event.__table__
+            row = self.row_values(event)
+            if any(column.key not in row for column in table.primary_key):
+                # nothing to match the existing row on
+                self.session.merge(event)
+                continue
+
+            pkey = tuple(row[column.key] for column in table.primary_key)
+            updates.setdefault((table, pkey), {}).update(row)
+
+        groups = {}
+        for (table, _), row in updates.items():
+            groups.setdefault((table, tuple(sorted(row))), []).append(row)
+
+        for (table, columns), rows in groups.items():
+            pkeys = [column.key for column in table.primary_key]
+            values = [key for key in columns if key not in pkeys]
+            if not values:
+                continue
+
+            statement = self.upsert_statement(dialect.name, table, columns, values)
+            if statement is not None:
+                self.execute_many(table.name + ":upsert", statement, rows)
+                continue
+
+            statement = table.update()
+            for key in pkeys:
+                statement = statement.where(table.c[key] == bindparam("_pk_%s" % key))
+            rows = [
+                {("_pk_%s" % k if k in pkeys else k): v for k, v in row.items()}
+                for row in rows
+            ]
+            result = self.execute_many(table.name + ":update", statement, rows)
+            if dialect.supports_sane_multi_rowcount and result.rowcount != len(rows):
+                self.log.warning(
+                    "Batch update of %s matched %s rows out of %s",
+                    table.name,
+                    result.rowcount,
+                    len(rows),
+                )
+
+    @staticmethod
+    def upsert_statement(dialect, table, columns, values):
+        """
+        Returns an INSERT statement for the columns, that updates the
+        values of an existing row with the same key instead, or None if
+        the dialect cannot do that. The columns have to include all the
+        columns that are required to insert a new row.
+        """
+        required = [
+            column.key
+            for column in table.columns
+            if not column.nullable
+            and column.default is None
+            and column.server_default is None
+        ]
+        if any(key not in columns for key in required):
+            return None
+
+        if dialect == "postgresql":
+            statement = postgresql.insert(table)
+            return statement.on_conflict_do_update(
+                index_elements=list(table.primary_key),
+                set_={key: statement.excluded[key] for key in values},
+            )
+        elif dialect == "mysql":
+            statement = mysql.insert(table)
+            return statement.on_duplicate_key_update(
+                {key: statement.inserted[key] for key in values}
+            )
+
+        return None
+
+    @staticmethod
+    def row_values(event):
+        """
+        Returns the column values set on a mapper class instance. Events
+        also carry attributes that are not columns (event, ts, wf_uuid,
+        etc.), and primary keys that are not set are left for the
+        database to generate.
+        """
+        row = {}
+        for column in event.__table__.columns:
+            if column.key not in event.__dict__:
+                continue
+            value = event.__dict__[column.key]
+            if value is None and column.primary_key:
+                continue
+            row[column.key] = value
+        return row
+
+    def execute_many(self, name, statement, rows):
+        """
+        Executes statement once for each row, and records the time it
+        took under name when collecting performance statistics.
+        """
+        if not self._perf:
+            return self.session.execute(statement, rows)
+
+        t = time.time()
+        result = self.session.execute(statement, rows)
+        stats = self._flush_stats.setdefault(name, [0, 0, 0.0])
+        stats[0] += len(rows)
+        stats[1] += 1
+        stats[2] += time.time() - t
+        return result
+
     #############################################
     # Methods to handle the various insert events
     #############################################
@@ -461,6 +675,8 @@ class WorkflowLoader(BaseLoader):
             self._batch_cache["batch_events"].append(job)
         else:
             job.commit_to_db(self.session)
+            self.job_id_cache[(job.wf_id, job.exec_job_id)] = job.job_id
+        self.summary.count(job.wf_id, job.type_desc, "jobs")
 
     def job_edge(self, linedata):
         """
@@ -515,9 +731,18 @@ class WorkflowLoader(BaseLoader):
 
             if not iid:
                 # explicit insert
+                self.summary.touch(
+                    self.session, job_instance.wf_id, job_instance.job_id, load=True
+                )
                 job_instance.commit_to_db(self.session)
                 # seed the cache
-                self.get_job_instance_id(job_instance)
+                self.job_instance_id_cache[
+                    (
+                        job_instance.wf_id,
+                        job_instance.job_id,
+                        job_instance.job_submit_seq,
+                    )
+                ] = job_instance.job_instance_id
 
             if job_instance.event == "stampede.job_inst.pre.start":
                 self.jobstate(linedata)
@@ -530,8 +755,14 @@ class WorkflowLoader(BaseLoader):
 
             job_instance.job_instance_id = self.get_job_instance_id(job_instance)
 
+            self.summary.touch(
+                self.session,
+                job_instance.wf_id,
+                job_instance.job_id,
+                load=not self._batch,
+            )
             if self._batch:
-                self._batch_cache["update_events"].append(job_instance)
+                self.queue_update(job_instance)
             else:
                 job_instance.merge_to_db(self.session)
             self.jobstate(linedata)
@@ -621,6 +852,12 @@ class WorkflowLoader(BaseLoader):
             )
             return
 
+        self.summary.touch(
+            self.session,
+            invocation.wf_id,
+            self.get_job_id(invocation.wf_id, invocation.exec_job_id),
+            load=not self._batch,
+        )
         if self._batch:
             self._batch_cache["batch_events"].append(invocation)
         else:
@@ -641,6 +878,7 @@ class WorkflowLoader(BaseLoader):
             self._batch_cache["batch_events"].append(task)
         else:
             task.commit_to_db(self.session)
+            self.task_id_cache[(task.wf_id, task.abs_task_id)] = task.task_id
 
     def task_edge(self, linedata):
         """
@@ -692,6 +930,8 @@ class WorkflowLoader(BaseLoader):
                 .filter(Task.abs_task_id == linedata["task.id"])
                 .one()
             )
+            if task.job_id is None:
+                self.summary.count(wf_id, task.type_desc, "tasks")
             task.job_id = job_id
         except orm.exc.MultipleResultsFound as e:
             self.log.error("Multiple task results: cant map task: %s ", linedata)
@@ -852,32 +1092,20 @@ class WorkflowLoader(BaseLoader):
         """
         self.log.trace("subwf_map: %s", linedata)
 
-        wf_id = self.wf_uuid_to_id(linedata["xwf.id"])
-        subwf_id = self.wf_uuid_to_id(linedata["subwf.id"])
-        job_id = self.get_job_id(wf_id, linedata["job.id"])
+        # only used to look up the job instance
+        parent = self.linedataToObject(linedata, JobInstance())
 
-        try:
-            job_inst = (
-                self.session.query(JobInstance)
-                .filter(JobInstance.job_id == job_id)
-                .filter(JobInstance.job_submit_seq == linedata["job_inst.id"])
-                .one()
-            )
-            job_inst.subwf_id = subwf_id
-        except orm.exc.MultipleResultsFound as e:
-            self.log.error(
-                "Multiple job instance results: cant map subwf: %s ", linedata
-            )
-            return
-        except orm.exc.NoResultFound as e:
+        job_inst = JobInstance()
+        job_inst.job_instance_id = self.get_job_instance_id(parent)
+        if job_inst.job_instance_id is None:
             self.log.error("No job instance found: cant map subwf: %s ", linedata)
             return
+        job_inst.subwf_id = self.wf_uuid_to_id(linedata["subwf.id"])
 
         if self._batch:
-            # next flush will catch this - no cache
-            pass
+            self.queue_update(job_inst)
         else:
-            self.session.commit()
+            job_inst.merge_to_db(self.session)
 
     def host(self, linedata):
         """
@@ -896,7 +1124,7 @@ class WorkflowLoader(BaseLoader):
             for row in query.all():
                 self.hosts_written_cache[
                     (row.wf_id, row.site, row.hostname, row.ip)
-                ] = True
+                ] = row.host_id
 
         host.wf_id = self.wf_uuid_to_root_id(host.wf_uuid)
 
@@ -911,9 +1139,10 @@ class WorkflowLoader(BaseLoader):
                 self._batch_cache["batch_events"].append(host)
             else:
                 host.commit_to_db(self.session)
+            # the host_id is not known yet for batched inserts
             self.hosts_written_cache[
                 (host.wf_id, host.site, host.hostname, host.ip)
-            ] = True
+            ] = host.host_id
 
         # handle mappings
         if self._batch:
@@ -933,6 +1162,10 @@ class WorkflowLoader(BaseLoader):
         if self._batch:
             self.hard_flush()
 
+        wf_id = self.wf_uuid_to_id(linedata["xwf.id"])
+        if wf_id is not None:
+            self.load_ids(wf_id)
+
     def static_meta_start(self, linedata):
         """
         @type   linedata: dict
@@ -1011,7 +1244,8 @@ class WorkflowLoader(BaseLoader):
 
         Gets and caches task_id for task_meta inserts
         """
-        if (wf_id, task_dax_id) not in self.task_id_cache:
+        if self.cached_id(self.task_id_cache, (wf_id, task_dax_id), wf_id) is None:
+            self.flush_queued(Task, wf_id=wf_id, abs_task_id=task_dax_id)
             query = (
                 self.session.query(Task.task_id)
                 .filter(Task.wf_id == wf_id)
@@ -1045,7 +1279,7 @@ class WorkflowLoader(BaseLoader):
 
         Gets and caches lfn_id for rc_meta, rc_lfn, rc_pfn and wf_files inserts
         """
-        if (wf_id, lfn) not in self.lfn_id_cache:
+        if self.lfn_id_cache.get((wf_id, lfn)) is None:
             id = self.__get_lfn_id_from_database__(wf_id, lfn)
 
             if id is None:
@@ -1054,8 +1288,7 @@ class WorkflowLoader(BaseLoader):
                 file.lfn = lfn
                 # explicit insert
                 file.commit_to_db(self.session)
-                # retrieve from the database and set the cache
-                id = self.__get_lfn_id_from_database__(wf_id, lfn)
+                id = file.lfn_id
 
                 # if ID is still None then definitely an an error
                 if id is None:
@@ -1100,7 +1333,8 @@ class WorkflowLoader(BaseLoader):
         Gets and caches job_id for job_instance inserts and static
         table updating.
         """
-        if (wf_id, exec_id) not in self.job_id_cache:
+        if self.cached_id(self.job_id_cache, (wf_id, exec_id), wf_id) is None:
+            self.flush_queued(Job, wf_id=wf_id, exec_job_id=exec_id)
             query = (
                 self.session.query(Job.job_id)
                 .filter(Job.wf_id == wf_id)
@@ -1134,8 +1368,17 @@ class WorkflowLoader(BaseLoader):
         """
         wf_id = self.wf_uuid_to_id(o.wf_uuid)
         cached_job_id = self.get_job_id(wf_id, o.exec_job_id)
-        uniqueIdIdx = (cached_job_id, o.job_submit_seq)
-        if uniqueIdIdx not in self.job_instance_id_cache:
+        uniqueIdIdx = (wf_id, cached_job_id, o.job_submit_seq)
+        if self.cached_id(self.job_instance_id_cache, uniqueIdIdx, wf_id) is None:
+            if wf_id in self.id_marks and self.job_instance_id_cache.complete(wf_id):
+                # All the job instances of the workflow are cached, as
+                # they are only inserted by job_instance
+                if not quiet:
+                    self.log.error(
+                        "No job_instance_id results for tuple %s", uniqueIdIdx
+                    )
+                return None
+
             query = (
                 self.session.query(JobInstance)
                 .filter(JobInstance.job_id == cached_job_id)
@@ -1174,29 +1417,124 @@ class WorkflowLoader(BaseLoader):
         wf_id = self.wf_uuid_to_id(host.wf_uuid)
         cached_job_id = self.get_job_id(wf_id, host.exec_job_id)
 
-        if (cached_job_id, host.job_submit_seq) not in self.host_cache:
+        if self.host_cache.get((wf_id, cached_job_id, host.job_submit_seq)) is None:
             if not host.host_id:
-                try:
-                    host.host_id = (
-                        self.session.query(Host.host_id)
-                        .filter(Host.wf_id == host.wf_id)
-                        .filter(Host.site == host.site)
-                        .filter(Host.hostname == host.hostname)
-                        .filter(Host.ip == host.ip)
-                        .one()
-                        .host_id
-                    )
-                except orm.exc.MultipleResultsFound as e:
-                    self.log.error("Multiple host_id results for host: %s", host)
-            job_instance = (
-                self.session.query(JobInstance)
-                .filter(JobInstance.job_id == cached_job_id)
-                .filter(JobInstance.job_submit_seq == host.job_submit_seq)
-                .one()
-            )
+                host.host_id = self.get_host_id(host)
+
+            job_instance = JobInstance()
+            job_instance.job_instance_id = self.get_job_instance_id(host)
+            if job_instance.job_instance_id is None:
+                return
             job_instance.host_id = host.host_id
-            job_instance.merge_to_db(self.session, batch=self._batch)
-            self.host_cache[(cached_job_id, host.job_submit_seq)] = True
+            if self._batch:
+                self._host_updates.append(job_instance)
+            else:
+                job_instance.merge_to_db(self.session)
+            self.host_cache[(wf_id, cached_job_id, host.job_submit_seq)] = True
+
+    def get_host_id(self, host):
+        """
+        @type   host: class instance of stampede_schema.Host
+        @param  host: Host object with info from a host event in the log
+
+        Gets and caches the host_id of a host that was written to the
+        database.
+        """
+        key = (host.wf_id, host.site, host.hostname, host.ip)
+        if self.hosts_written_cache.get(key) is None:
+            try:
+                self.hosts_written_cache[key] = (
+                    self.session.query(Host.host_id)
+                    .filter(Host.wf_id == host.wf_id)
+                    .filter(Host.site == host.site)
+                    .filter(Host.hostname == host.hostname)
+                    .filter(Host.ip == host.ip)
+                    .one()
+                    .host_id
+                )
+            except orm.exc.MultipleResultsFound as e:
+                self.log.error("Multiple host_id results for host: %s", host)
+            except orm.exc.NoResultFound as e:
+                self.log.error("No host_id results for host: %s", host)
+
+        return self.hosts_written_cache.get(key)
+
+    def flush_queued(self, mapper, **values):
+        """
+        @type   mapper: class
+        @param  mapper: Mapper class of the row looked up.
+
+        Flushes the queued events if one of them is a mapper row with
+        the given column values, so that the row can be looked up in the
+        database. Lookups made while flushing do not flush again.
+        """
+        if not self._batch or self._flushing:
+            return
+
+        for event in self._batch_cache["batch_events"]:
+            if isinstance(event, mapper) and all(
+                getattr(event, key, None) == value for key, value in values.items()
+            ):
+                self.hard_flush()
+                return
+
+    def cached_id(self, cache, key, wf_id):
+        """
+        Returns the id cached under key, or None if it is not known.
+        The ids of workflow wf_id are loaded first, if that was not done
+        yet (e.g. when monitord restarts without the static events).
+        """
+        if key not in cache and wf_id is not None and wf_id not in self.id_marks:
+            self.load_ids(wf_id)
+        return cache.get(key)
+
+    def load_ids(self, wf_id):
+        """
+        @type   wf_id: int
+        @param  wf_id: A workflow id from the workflow table.
+
+        Loads the job, task and job instance ids of a workflow into the
+        caches, with one query per table, so that processing its events
+        does not need a query per lookup. Only the rows added since the
+        last call are loaded.
+        """
+        marks = self.id_marks.setdefault(
+            wf_id, {"job": 0, "task": 0, "job_instance": 0}
+        )
+
+        query = (
+            self.session.query(Job.job_id, Job.exec_job_id)
+            .filter(Job.wf_id == wf_id)
+            .filter(Job.job_id > marks["job"])
+        )
+        for job_id, exec_job_id in query:
+            self.job_id_cache[(wf_id, exec_job_id)] = job_id
+            marks["job"] = max(marks["job"], job_id)
+
+        query = (
+            self.session.query(Task.task_id, Task.abs_task_id)
+            .filter(Task.wf_id == wf_id)
+            .filter(Task.task_id > marks["task"])
+        )
+        for task_id, abs_task_id in query:
+            self.task_id_cache[(wf_id, abs_task_id)] = task_id
+            marks["task"] = max(marks["task"], task_id)
+
+        query = (
+            self.session.query(
+                JobInstance.job_instance_id,
+                JobInstance.job_id,
+                JobInstance.job_submit_seq,
+            )
+            .join(Job, Job.job_id == JobInstance.job_id)
+            .filter(Job.wf_id == wf_id)
+            .filter(JobInstance.job_instance_id > marks["job_instance"])
+        )
+        for job_instance_id, job_id, job_submit_seq in query:
+            self.job_instance_id_cache[
+                (wf_id, job_id, job_submit_seq)
+            ] = job_instance_id
+            marks["job_instance"] = max(marks["job_instance"], job_instance_id)
 
     def purgeCaches(self, wfs):
         """
@@ -1212,19 +1550,43 @@ class WorkflowLoader(BaseLoader):
 
         self.purgeCache(self.root_wf_id_cache, wfs.wf_uuid)
 
-        self.purgeCache(self.job_instance_id_cache, wfs.wf_id)
+        for cache in self.lookup_caches():
+            cache.purge(wfs.wf_id)
 
-        self.purgeCache(self.host_cache, wfs.wf_uuid)
+        self.purgeCache(self.id_marks, wfs.wf_id)
 
-        self.purgeCache(self.task_id_cache, wfs.wf_id)
-
-        self.purgeCache(self.lfn_id_cache, wfs.wf_id)
-
-        self.purgeCache(self.job_id_cache, wfs.wf_id)
+        self.summary.purge(wfs.wf_id)
 
         if wfs.wf_uuid in self._task_map_flush:
             del self._task_map_flush[wfs.wf_uuid]
 
+    def lookup_caches(self):
+        return [
+            self.job_id_cache,
+            self.job_instance_id_cache,
+            self.task_id_cache,
+            self.lfn_id_cache,
+            self.host_cache,
+            self.summary.contributions,
+        ]
+
+    def flush_summary(self):
+        """
+        Writes the changes to the workflow_summary table made by the
+        last event, when the events are not batched.
+        """
+        if not self.summary.pending():
+            return
+
+        try:
+            contributions = self.summary.flush(self.session)
+            self.session.commit()
+            self.summary.committed(contributions)
+        except (exc.IntegrityError, exc.OperationalError) as e:
+            self.log.exception(e)
+            self.log.error("Update of the workflow summary failed")
+            self.session.rollback()
+
     def purgeCache(self, cache, key):
         """
         Removes from a cache an entry matching a key id
@@ -1239,6 +1601,33 @@ class WorkflowLoader(BaseLoader):
     # Cleanup, etc
     ################
 
+    def drop_written_hosts(self):
+        """
+        Removes from the batch the hosts that are already in the
+        database. Hosts belong to the root workflow, so the loaders of
+        several of its sub-workflows can write the same host at the same
+        time (e.g. when pegasus-monitord replays sub-workflows in
+        parallel), which the hosts_written_cache cannot know about.
+        """
+        hosts = [e for e in self._batch_cache["batch_events"] if isinstance(e, Host)]
+        if not hosts:
+            return
+
+        written = set()
+        query = self.session.query(Host.wf_id, Host.site, Host.hostname, Host.ip)
+        for row in query.filter(Host.wf_id.in_({h.wf_id for h in hosts})):
+            written.add(tuple(row))
+
+        if not written:
+            return
+
+        self._batch_cache["batch_events"] = [
+            e
+            for e in self._batch_cache["batch_events"]
+            if not isinstance(e, Host)
+            or (e.wf_id, e.site, e.hostname, e.ip) not in written
+        ]
+
     def finish(self):
         if self._batch:
             self.log.info("Executing final flush")
@@ -1255,3 +1644,21 @@ class WorkflowLoader(BaseLoader):
                 run_time - self._insert_time,
                 self._insert_time / self._insert_num,
             )
+            for name, (rows, statements, flush_time) in sorted(
+                self._flush_stats.items(), key=lambda item: -item[1][2]
+            ):
+                self.log.info(
+                    "Flush performance: table=%s, rows=%s, statements=%s, "
+                    "flush_time=%s, mean_time=%s",
+                    name,
+                    rows,
+                    statements,
+                    flush_time,
+                    flush_time / rows,
+                )
+            for cache in self.lookup_caches():
+                self.log.info(
+                    "Cache performance: cache=%s, %s",
+                    cache.name,
+                    ", ".join("%s=%s" % item for item in cache.stats().items()),
+                )
@@ -0,0 +1,360 @@
+"""
+Maintenance of the workflow_summary table.
+
+The workflow loader tells the SummaryTracker which jobs the events of a
+batch touch. When the batch is written, the contribution of each of
+these jobs to the summary of its workflow (job instances, status of the
+last job instance, invocations and their wall times) is read back from
+the database, and the difference with its contribution before the batch
+is added to the summary rows, in the same transaction as the batch. The
+new jobs and the tasks mapped to jobs are counted from the events.
+"""
+
+##
+#  Copyright 2007-2020 University Of Southern California
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing,
+#  software distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##
+
+import logging
+
+from sqlalchemy import bindparam
+from sqlalchemy.sql.expression import and_, case, func
+
+from Pegasus.db.lookup_cache import DEFAULT_MAX_SIZE, LookupCache
+from Pegasus.db.schema import Invocation, Job, JobInstance, Task, WorkflowSummary
+
+log = logging.getLogger(__name__)
+
+# Columns a job contributes to, in the order of the contribution values
+JOB_COLUMNS = (
+    "started_jobs",
+    "job_instances",
+    "succeeded_jobs",
+    "failed_jobs",
+    "invocations",
+    "wall_time",
+    "goodput",
+    "badput",
+)
+DURATION_COLUMNS = ("wall_time", "goodput", "badput")
+COLUMNS = ("jobs", "tasks") + JOB_COLUMNS
+
+# Number of job ids per IN clause
+CHUNK_SIZE = 500
+
+
+def chunks(items, size=CHUNK_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def job_contributions(session, condition):
+    """
+    Returns a dict mapping the job_id of the jobs matching condition, a
+    clause on the job table, to (wf_id, type_desc, values), where values
+    is the list of what the job adds to each of the JOB_COLUMNS.
+    """
+    jobs = {}
+    query = session.query(Job.job_id, Job.wf_id, Job.type_desc).filter(condition)
+    for job_id, wf_id, type_desc in query:
+        jobs[job_id] = (wf_id, type_desc, [0] * len(JOB_COLUMNS))
+
+    last = {}  # job_id --> (job_submit_seq, exitcode) of the last instance
+    multipliers = {}  # job_instance_id --> (job_id, multiplier_factor)
+    query = (
+        session.query(
+            JobInstance.job_instance_id,
+            JobInstance.job_id,
+            JobInstance.job_submit_seq,
+            JobInstance.exitcode,
+            JobInstance.multiplier_factor,
+        )
+        .join(Job, Job.job_id == JobInstance.job_id)
+        .filter(condition)
+    )
+    for job_instance_id, job_id, job_submit_seq, exitcode, multiplier in query:
+        jobs[job_id][2][1] += 1
+        multipliers[job_instance_id] = (job_id, multiplier)
+        if job_id not in last or job_submit_seq > last[job_id][0]:
+            last[job_id] = (job_submit_seq, exitcode)
+
+    for job_id, (job_submit_seq, exitcode) in last.items():
+        values = jobs[job_id][2]
+        values[0] = 1
+        if exitcode == 0:
+            values[2] = 1
+        elif exitcode is not None:
+            values[3] = 1
+
+    # the same invocations as StampedeStatistics.get_workflow_cum_job_wall_time
+    query = (
+        session.query(
+            Invocation.job_instance_id,
+            func.count(Invocation.invocation_id),
+            func.sum(Invocation.remote_duration),
+            func.sum(
+                case([(Invocation.exitcode == 0, Invocation.remote_duration)], else_=0)
+            ),
+            func.sum(
+                case([(Invocation.exitcode > 0, Invocation.remote_duration)], else_=0)
+            ),
+        )
+        .join(JobInstance, JobInstance.job_instance_id == Invocation.job_instance_id)
+        .join(Job, Job.job_id == JobInstance.job_id)
+        .filter(condition)
+        .filter(Invocation.task_submit_seq >= 0)
+        .filter(Invocation.transformation != "condor::dagman")
+        .group_by(Invocation.job_instance_id)
+    )
+    for job_instance_id, count, wall_time, goodput, badput in query:
+        job_id, multiplier = multipliers[job_instance_id]
+        values = jobs[job_id][2]
+        values[4] += count
+        values[5] += float(wall_time or 0) * multiplier
+        values[6] += float(goodput or 0) * multiplier
+        values[7] += float(badput or 0) * multiplier
+
+    return jobs
+
+
+def write_deltas(session, deltas):
+    """
+    Adds deltas, a dict mapping (wf_id, type_desc) to {column: delta},
+    to the summary rows, creating the rows that do not exist yet.
+    """
+    for key, row in list(deltas.items()):
+        for column in DURATION_COLUMNS:
+            if column in row:
+                row[column] = round(row[column], 3)
+        row = {column: value for column, value in row.items() if value}
+        if row:
+            deltas[key] = row
+        else:
+            del deltas[key]
+    if not deltas:
+        return
+
+    existing = set()
+    for wf_ids in chunks({wf_id for wf_id, _ in deltas}):
+        query = session.query(WorkflowSummary.wf_id, WorkflowSummary.type_desc)
+        existing.update(
+            tuple(row) for row in query.filter(WorkflowSummary.wf_id.in_(wf_ids))
+        )
+
+    table = WorkflowSummary.__table__
+    inserts = []
+    updates = {}  # columns --> rows
+    for (wf_id, type_desc), row in deltas.items():
+        if (wf_id, type_desc) in existing:
+            values = {"b_" + column: value for column, value in row.items()}
+            values["b_wf_id"] = wf_id
+            values["b_type_desc"] = type_desc
+            updates.setdefault(tuple(sorted(row)), []).append(values)
+        else:
+            values = dict.fromkeys(COLUMNS, 0)
+            values.update(row)
+            values["wf_id"] = wf_id
+            values["type_desc"] = type_desc
+            inserts.append(values)
+
+    for columns, rows in updates.items():
+        statement = (
+            table.update()
+            .where(
+                and_(
+                    table.c.wf_id == bindparam("b_wf_id"),
+                    table.c.type_desc == bindparam("b_type_desc"),
+                )
+            )
+            .values(
+                {
+                    column: table.c[column] + bindparam("b_" + column)
+                    for column in columns
+                }
+            )
+        )
+        session.execute(statement, rows)
+
+    if inserts:
+        session.execute(table.insert(), inserts)
+
+
+def rebuild(session, wf_ids):
+    """
+    Recomputes the summary rows of the workflows wf_ids from the job,
+    job_instance, invocation and task tables.
+    """
+    wf_ids = list(wf_ids)
+    if not wf_ids:
+        return
+
+    deltas = {}
+    for wf_id_chunk in chunks(wf_ids):
+        session.query(WorkflowSummary).filter(
+            WorkflowSummary.wf_id.in_(wf_id_chunk)
+        ).delete(synchronize_session=False)
+
+        contributions = job_contributions(session, Job.wf_id.in_(wf_id_chunk))
+        for wf_id, type_desc, values in contributions.values():
+            row = deltas.setdefault((wf_id, type_desc), {})
+            row["jobs"] = row.get("jobs", 0) + 1
+            for column, value in zip(JOB_COLUMNS, values):
+                row[column] = row.get(column, 0) + value
+
+        query = (
+            session.query(Task.wf_id, Task.type_desc, func.count(Task.task_id))
+            .join(Job, Job.job_id == Task.job_id)
+            .filter(Task.wf_id.in_(wf_id_chunk))
+            .group_by(Task.wf_id, Task.type_desc)
+        )
+        for wf_id, type_desc, count in query:
+            deltas.setdefault((wf_id, type_desc), {})["tasks"] = count
+
+    write_deltas(session, deltas)
+
+
+class SummaryTracker:
+    """
+    Keeps track of the changes the events processed by the workflow
+    loader make to the summary of their workflows.
+
+    The contributions of the jobs, as last written to the summary, are
+    cached by (wf_id, job_id). The first time a job of a workflow is
+    needed, those of all the jobs of the workflow are loaded at once.
+    """
+
+    def __init__(self, cache_size=DEFAULT_MAX_SIZE):
+        # (wf_id, job_id) --> (type_desc, values)
+        self.contributions = LookupCache("job_summary", cache_size)
+        self._loaded = set()  # wf_ids whose contributions were loaded
+        # (wf_id, job_id) --> contribution before the batch, None if not
+        # read yet
+        self._touched = {}
+        # (wf_id, type_desc) --> {column: delta} of the jobs and tasks
+        self._counts = {}
+
+    def pending(self):
+        return bool(self._touched or self._counts)
+
+    def count(self, wf_id, type_desc, column):
+        """
+        Counts a new job or a task mapped to a job.
+        """
+        counts = self._counts.setdefault((wf_id, type_desc), {})
+        counts[column] = counts.get(column, 0) + 1
+
+    def touch(self, session, wf_id, job_id, load=False):
+        """
+        Records that the rows of a job are about to change. Unless load
+        is set, its current contribution is read later, by load, which
+        has to be called before the rows are written.
+        """
+        key = (wf_id, job_id)
+        if key not in self._touched:
+            self._touched[key] = self.contributions.get(key)
+        if load and self._touched[key] is None:
+            self.load(session, [key])
+
+    def load(self, session, keys=None):
+        """
+        Reads the current contribution of the touched jobs (or of the
+        jobs keys) that is not known yet.
+        """
+        if keys is None:
+            keys = [key for key, value in self._touched.items() if value is None]
+        if not keys:
+            return
+
+        found = {}
+        for wf_id in {wf_id for wf_id, _ in keys} - self._loaded:
+            self._loaded.add(wf_id)
+            for job_id, (_, type_desc, values) in job_contributions(
+                session, Job.wf_id == wf_id
+            ).items():
+                self.contributions[(wf_id, job_id)] = found[(wf_id, job_id)] = (
+                    type_desc,
+                    tuple(values),
+                )
+
+        # evicted entries, or jobs added after their workflow was loaded
+        missing = [
+            key for key in keys if key not in found and key not in self.contributions
+        ]
+        for chunk in chunks(job_id for _, job_id in missing):
+            for job_id, (wf_id, type_desc, values) in job_contributions(
+                session, Job.job_id.in_(chunk)
+            ).items():
+                self.contributions[(wf_id, job_id)] = found[(wf_id, job_id)] = (
+                    type_desc,
+                    tuple(values),
+                )
+
+        for key in keys:
+            contribution = found.get(key) or self.contributions.get(key)
+            if contribution is None:
+                log.error("No job found for summary of job %s", key)
+            self._touched[key] = contribution
+
+    def flush(self, session):
+        """
+        Adds the changes to the summary rows, once the rows of the
+        touched jobs are written. Returns the new contributions, to pass
+        to committed once the transaction is committed.
+        """
+        contributions = {}
+        for chunk in chunks(sorted(job_id for _, job_id in self._touched)):
+            for job_id, (wf_id, type_desc, values) in job_contributions(
+                session, Job.job_id.in_(chunk)
+            ).items():
+                contributions[(wf_id, job_id)] = (type_desc, tuple(values))
+
+        deltas = {key: dict(counts) for key, counts in self._counts.items()}
+        for key, before in self._touched.items():
+            for contribution, sign in ((before, -1), (contributions.get(key), 1)):
+                if contribution is None:
+                    continue
+                type_desc, values = contribution
+                row = deltas.setdefault((key[0], type_desc), {})
+                for column, value in zip(JOB_COLUMNS, values):
+                    row[column] = row.get(column, 0) + sign * value
+
+        write_deltas(session, deltas)
+        return contributions
+
+    def committed(self, contributions):
+        """
+        Forgets the changes written by flush.
+        """
+        for key, contribution in contributions.items():
+            self.contributions[key] = contribution
+        self._touched.clear()
+        self._counts.clear()
+
+    def rebuild(self, session):
+        """
+        Recomputes the summary of the workflows with changes, when it is
+        not known which of the changes made it to the database.
+        """
+        wf_ids = {wf_id for wf_id, _ in self._touched}
+        wf_ids.update(wf_id for wf_id, _ in self._counts)
+        rebuild(session, wf_ids)
+        for wf_id in wf_ids:
+            self.purge(wf_id)
+        self._touched.clear()
+        self._counts.clear()
+
+    def purge(self, wf_id):
+        self.contributions.purge(wf_id)
+        self._loaded.discard(wf_id)
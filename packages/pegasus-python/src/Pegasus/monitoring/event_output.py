@@ -26,7 +26,7 @@ import ssl
 import time
 import traceback
 import urllib.parse
-from threading import Thread
+from threading import Event, Thread
 
 from Pegasus import json
 from Pegasus.db import connection, expunge
@@ -54,6 +54,13 @@ except Exception:
 STAMPEDE_NS = "stampede."
 DASHBOARD_NS = "dashboard."
 
+# Maximum number of events waiting for the DB writer thread
+DEFAULT_DB_QUEUE_SIZE = 10000
+
+# Sent to the DB writer thread along with the events
+_DB_FLUSH = object()
+_DB_CLOSE = object()
+
 
 def purge_wf_uuid_from_database(rundir, output_db):
     """
@@ -197,6 +204,11 @@ class EventSink:
 class DBEventSink(EventSink):
     """
     Write wflow event logs to database via loader
+
+    With async_writer, events are put in a queue of at most queue_size
+    events, and a writer thread loads them into the database, so that
+    slow commits and reconnects do not hold up the caller. send blocks
+    when the queue is full, until the writer catches up.
     """
 
     def __init__(
@@ -207,21 +219,23 @@ class DBEventSink(EventSink):
         props=None,
         db_type=None,
         backup=False,
+        async_writer=False,
+        queue_size=DEFAULT_DB_QUEUE_SIZE,
         **kw
     ):
         self._namespace = namespace
         # pick the right database loader based on prefix
         if namespace == STAMPEDE_NS:
-            self._db = WorkflowLoader(
-                dest,
-                perf=db_stats,
-                batch=True,
-                props=props,
-                db_type=db_type,
-                backup=backup,
-            )
+            loader = WorkflowLoader
         elif namespace == DASHBOARD_NS:
-            self._db = DashboardLoader(
+            loader = DashboardLoader
+        else:
+            raise ValueError("Unknown namespace specified '%s'" % (namespace))
+
+        super().__init__()
+
+        def create_loader():
+            return loader(
                 dest,
                 perf=db_stats,
                 batch=True,
@@ -229,26 +243,108 @@ class DBEventSink(EventSink):
                 db_type=db_type,
                 backup=backup,
             )
-        else:
-            raise ValueError("Unknown namespace specified '%s'" % (namespace))
 
-        super().__init__()
+        self._db = None
+        self._queue = None
+        self._writer = None
+
+        if not async_writer:
+            self._db = create_loader()
+            return
+
+        # Database sessions are thread-local, so the loader is created by
+        # the writer thread, which does all the database work
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._flush_pending = False
+        self._writer_error = None
+        started = Event()
+        self._writer = Thread(
+            target=self.event_writer,
+            args=(create_loader, started),
+            name="db-writer",
+            daemon=True,
+        )
+        self._writer.start()
+        started.wait()
+        if self._writer_error is not None:
+            raise self._writer_error
+
+    def event_writer(self, create_loader, started):
+        try:
+            self._db = create_loader()
+        except Exception as e:
+            self._writer_error = e
+            return
+        finally:
+            started.set()
+
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _DB_CLOSE:
+                    self._db.finish()
+                    return
+                elif item is _DB_FLUSH:
+                    self._flush_pending = False
+                    self._db.flush()
+                else:
+                    self._db.process(item)
+            except Exception as e:
+                self._log.exception(e)
+                self._log.error("DB writer thread failed, no more events are written")
+                self._writer_error = e
+                return
+            finally:
+                self._queue.task_done()
+
+    def enqueue(self, item):
+        """
+        Queues an item for the writer thread, waiting for room in the
+        queue if it is full.
+        """
+        while True:
+            if not self._writer.is_alive():
+                raise Exception(
+                    "DB writer thread is dead. Cannot send events: %s"
+                    % (self._writer_error)
+                )
+            try:
+                self._queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                self._log.debug("DB writer queue is full, waiting for the writer")
 
     def send(self, event, kw):
         self._log.trace("send.start event=%s", event)
         d = {"event": self._namespace + event}
         for k, v in kw.items():
             d[k.replace("__", ".")] = v
-        self._db.process(d)
+        if self._writer is None:
+            self._db.process(d)
+        else:
+            self.enqueue(d)
         self._log.trace("send.end event=%s", event)
 
     def close(self):
         self._log.trace("close.start")
-        self._db.finish()
+        if self._writer is None:
+            self._db.finish()
+        elif self._writer.is_alive():
+            self._log.debug(
+                "Waiting for the DB writer to load %d queued events",
+                self._queue.qsize(),
+            )
+            self.enqueue(_DB_CLOSE)
+            self._writer.join()
         self._log.trace("close.end")
 
     def flush(self):
-        self._db.flush()
+        if self._writer is None:
+            self._db.flush()
+        elif not self._flush_pending and self._writer.is_alive():
+            # A flush already in the queue will do
+            self._flush_pending = True
+            self.enqueue(_DB_FLUSH)
 
 
 class FileEventSink(EventSink):
@@ -0,0 +1,93 @@
+"""
+Streaming line reader used by pegasus-monitord to follow dagman.out files.
+"""
+
+##
+#  Copyright 2007-2020 University Of Southern California
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing,
+#  software distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_READ_SIZE = (
+    32768  # at most the maximum bytes to read while parsing dagman.out file
+)
+
+
+class LineReader:
+    """
+    Reads a file that is still being written in chunks of read_size
+    characters, and splits each chunk into complete lines. Each chunk is
+    split once, so the cost is linear in the size of the chunk. A line
+    that is not yet terminated by a newline is kept aside (as a list of
+    pieces, so very long lines are not copied over and over) until the
+    rest of it shows up in a later chunk.
+    """
+
+    def __init__(self, fp, read_size=DEFAULT_READ_SIZE):
+        if read_size <= 0:
+            raise ValueError("read_size must be a positive integer")
+
+        self._fp = fp
+        self.read_size = read_size
+        self._partial = []  # pieces of the last, incomplete, line
+        self._pending = 0  # number of characters in self._partial
+
+    @property
+    def pending(self):
+        """
+        Number of characters read, but not yet returned as part of a line.
+        """
+        return self._pending
+
+    def read(self):
+        """
+        Reads the next chunk of the file. Returns a tuple with the number
+        of characters read (0 at end of file) and the list of complete
+        lines found, without their trailing newline.
+        """
+        chunk = self._fp.read(self.read_size)
+        if not chunk:
+            return 0, []
+
+        lines = chunk.split("\n")
+
+        # The last element is either empty (chunk ends with a newline)
+        # or the beginning of a line we have not fully read yet
+        tail = lines.pop()
+
+        if lines and self._partial:
+            self._partial.append(lines[0])
+            lines[0] = "".join(self._partial)
+            self._partial = []
+            self._pending = 0
+
+        if tail:
+            self._partial.append(tail)
+            self._pending += len(tail)
+
+        return len(chunk), lines
+
+    def __iter__(self):
+        """
+        Iterates over all the complete lines until the end of the file
+        is reached.
+        """
+        while True:
+            nread, lines = self.read()
+            if nread == 0:
+                return
+            yield from lines
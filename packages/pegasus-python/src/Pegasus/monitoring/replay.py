@@ -0,0 +1,284 @@
+"""
+Parallel replay of hierarchical workflows for pegasus-monitord.
+
+In replay mode the workflow being replayed is already finished, so its
+sub-workflows can be replayed independently of each other. The parent
+process replays the root workflow and hands every sub-workflow it finds
+to a pool of worker processes. Workers report the sub-workflows they
+find in turn, and the parent process dispatches them as well. Each
+worker loads its own events (with its own event sink), so the links
+between sub-workflows and the jobs that started them, which need rows
+written by other processes, are collected and sent at the end.
+"""
+
+##
+#  Copyright 2007-2020 University Of Southern California
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing,
+#  software distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##
+
+import logging
+import multiprocessing
+import os
+import queue
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# A workflow to be replayed by a worker process
+ReplayTask = namedtuple(
+    "ReplayTask",
+    ["dagman_out", "parent_wf_uuid", "parent_jobid", "parent_jobseq", "root_wf_uuid"],
+)
+
+# Link between a sub-workflow and the job instance that started it
+SubworkflowLink = namedtuple(
+    "SubworkflowLink", ["wf_uuid", "parent_wf_uuid", "parent_jobid", "parent_jobseq"]
+)
+
+# Messages sent by the workers to the parent process
+_FOUND = "found"
+_STARTED = "started"
+_DONE = "done"
+
+
+class ReplayWorker:
+    """
+    Handle given to the function replaying a workflow in a worker
+    process. Sub-workflows found while replaying are sent back to the
+    parent process, which decides who replays them.
+    """
+
+    def __init__(self, results):
+        self._results = results
+
+    def subworkflow_found(
+        self, dagman_out, parent_wf_uuid, parent_jobid, parent_jobseq, root_wf_uuid
+    ):
+        self._results.put(
+            (
+                _FOUND,
+                os.getpid(),
+                ReplayTask(
+                    dagman_out,
+                    parent_wf_uuid,
+                    parent_jobid,
+                    parent_jobseq,
+                    root_wf_uuid,
+                ),
+            )
+        )
+
+    def poll(self, timeout=0):
+        pass
+
+
+def _worker_main(replay_func, tasks, results):
+    """
+    Main loop of a worker process. replay_func(task, worker) replays a
+    workflow, and returns its wf_uuid and the sub-workflow retry
+    information it collected.
+    """
+    worker = ReplayWorker(results)
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        results.put((_STARTED, os.getpid(), task))
+
+        wf_uuid = None
+        retries = {}
+        try:
+            wf_uuid, retries = replay_func(task, worker)
+        except (Exception, SystemExit):
+            logger.exception("error replaying workflow %s" % (task.dagman_out))
+
+        results.put((_DONE, os.getpid(), task, wf_uuid, retries))
+
+
+class ParallelReplay:
+    """
+    Dispatches the sub-workflows of a workflow to a pool of worker
+    processes. Workers are forked, so replay_func (and everything it
+    uses) does not need to be importable or picklable.
+    """
+
+    def __init__(self, replay_func, workers):
+        if workers < 1:
+            raise ValueError("number of workers must be a positive integer")
+
+        self._replay_func = replay_func
+        self._n_workers = workers
+        self._context = multiprocessing.get_context("fork")
+        self._tasks = self._context.Queue()
+        self._results = self._context.Queue()
+        self._workers = {}  # pid --> process
+        self._running = {}  # pid --> task
+        self._tracked = set()  # dagman.out files already dispatched
+        self._found = []  # (dagman.out, parent wf_uuid, parent jobid, parent jobseq)
+        self._wf_uuids = {}  # dagman.out --> wf_uuid
+        self._pending = 0  # tasks dispatched, but not yet done
+        self.retries = {}  # sub-workflow directory --> retry
+        self.failed = []  # dagman.out files we could not replay
+
+    def start(self, root_dagman_out=None):
+        """
+        Starts the worker processes. root_dagman_out is the workflow
+        replayed by the parent process, which is never dispatched.
+        """
+        if root_dagman_out is not None:
+            self._tracked.add(root_dagman_out)
+
+        for _ in range(self._n_workers):
+            self._start_worker()
+
+        logger.info("started %d replay workers" % (self._n_workers))
+
+    def _start_worker(self):
+        process = self._context.Process(
+            target=_worker_main,
+            args=(self._replay_func, self._tasks, self._results),
+            name="pegasus-monitord-replay",
+        )
+        # Do not let workers outlive us if we exit early
+        process.daemon = True
+        process.start()
+        self._workers[process.pid] = process
+
+    def subworkflow_found(
+        self, dagman_out, parent_wf_uuid, parent_jobid, parent_jobseq, root_wf_uuid
+    ):
+        """
+        Records that job parent_jobid, parent_jobseq of workflow
+        parent_wf_uuid started the sub-workflow of dagman_out, and
+        dispatches the sub-workflow to a worker, unless that was
+        already done (e.g. for a job retry).
+        """
+        self._found.append((dagman_out, parent_wf_uuid, parent_jobid, parent_jobseq))
+
+        if dagman_out in self._tracked:
+            logger.info("already tracking workflow: %s, not adding" % (dagman_out))
+            return
+
+        logger.info("found new workflow to replay: %s" % (dagman_out))
+        self._tracked.add(dagman_out)
+        self._pending += 1
+        self._tasks.put(
+            ReplayTask(
+                dagman_out, parent_wf_uuid, parent_jobid, parent_jobseq, root_wf_uuid
+            )
+        )
+
+    def poll(self, timeout=0):
+        """
+        Processes the messages sent by the workers, waiting at most
+        timeout seconds for the first one.
+        """
+        try:
+            if timeout > 0:
+                message = self._results.get(timeout=timeout)
+            else:
+                message = self._results.get_nowait()
+        except queue.Empty:
+            self._check_workers()
+            return
+
+        while True:
+            self._handle(message)
+            try:
+                message = self._results.get_nowait()
+            except queue.Empty:
+                break
+
+    def _handle(self, message):
+        kind, pid, task = message[:3]
+
+        if kind == _FOUND:
+            self.subworkflow_found(*task)
+        elif kind == _STARTED:
+            self._running[pid] = task
+        elif kind == _DONE:
+            wf_uuid, retries = message[3:]
+            self._running.pop(pid, None)
+            self._pending -= 1
+            self.retries.update(retries)
+            if wf_uuid is None:
+                self.failed.append(task.dagman_out)
+            else:
+                self._wf_uuids[task.dagman_out] = wf_uuid
+            logger.info(
+                "finished replaying workflow %s, %d left"
+                % (task.dagman_out, self._pending)
+            )
+
+    def _check_workers(self):
+        """
+        Replaces workers that died without telling us, the workflow they
+        were replaying is lost.
+        """
+        for pid, process in list(self._workers.items()):
+            if process.is_alive():
+                continue
+
+            del self._workers[pid]
+            task = self._running.pop(pid, None)
+            logger.critical(
+                "replay worker %d died with exit code %s" % (pid, process.exitcode)
+            )
+            if task is not None:
+                self._pending -= 1
+                self.failed.append(task.dagman_out)
+
+            if self._pending > 0:
+                self._start_worker()
+
+    def finish(self):
+        """
+        Waits for all dispatched workflows to be replayed, and stops the
+        workers. Returns the list of links between sub-workflows and
+        their parent jobs.
+        """
+        while self._pending > 0:
+            self.poll(timeout=1)
+
+        for _ in self._workers:
+            self._tasks.put(None)
+        for process in self._workers.values():
+            process.join()
+        self._workers = {}
+
+        for dagman_out in self.failed:
+            logger.error("could not replay workflow %s" % (dagman_out))
+
+        return self.links()
+
+    def links(self):
+        """
+        Returns the links between the sub-workflows replayed so far and
+        the jobs that started them, including job retries.
+        """
+        links = []
+        for dagman_out, parent_wf_uuid, parent_jobid, parent_jobseq in self._found:
+            wf_uuid = self._wf_uuids.get(dagman_out)
+            if wf_uuid is None:
+                logger.warning(
+                    "cannot link job %s:%s to its subwf because %s was not replayed"
+                    % (parent_jobid, parent_jobseq, dagman_out)
+                )
+                continue
+            links.append(
+                SubworkflowLink(wf_uuid, parent_wf_uuid, parent_jobid, parent_jobseq)
+            )
+        return links
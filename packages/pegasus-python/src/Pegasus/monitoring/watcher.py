@@ -0,0 +1,336 @@
+"""
+File watchers used by pegasus-monitord to find out when the files it
+tracks (dagman.out, jobstate.log and the jobs' .out/.err files) change.
+"""
+
+##
+#  Copyright 2007-2020 University Of Southern California
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing,
+#  software distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+# Values accepted by the pegasus.monitord.watcher property
+WATCHER_AUTO = "auto"
+WATCHER_INOTIFY = "inotify"
+WATCHER_POLL = "poll"
+WATCHERS = (WATCHER_AUTO, WATCHER_INOTIFY, WATCHER_POLL)
+
+# inotify constants, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_CLOSE_WRITE
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 65536
+
+# Files that should wake up monitord when they change
+TRACKED_FILES = ("jobstate.log",)
+TRACKED_SUFFIXES = (".out", ".err")
+
+
+def is_tracked_file(name):
+    """
+    Returns True if a change to the file name (no directory component)
+    is interesting to monitord.
+    """
+    return name in TRACKED_FILES or name.endswith(TRACKED_SUFFIXES)
+
+
+class PollingWatcher:
+    """
+    Fallback watcher. It cannot tell which files changed, so it just
+    sleeps for the requested time and asks the caller to check all the
+    workflows it is tracking, which is what monitord has always done.
+    """
+
+    name = WATCHER_POLL
+
+    def watch(self, key, directory):
+        pass
+
+    def unwatch(self, key):
+        pass
+
+    def wait(self, timeout):
+        """
+        Sleeps for timeout seconds. Returns None, meaning every key
+        must be checked.
+        """
+        if timeout > 0:
+            time.sleep(timeout)
+        return None
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    Watcher based on the Linux inotify API. Watches are placed on
+    directories rather than on files, so files that have not yet been
+    created (e.g. a sub-workflow's dagman.out) are picked up as soon as
+    they appear, and the number of kernel watches grows with the number
+    of submit directories, not with the number of files.
+
+    Each directory is associated with one or more keys (monitord uses
+    the path to the dagman.out file). wait() returns the keys whose
+    directories had a change to a tracked file.
+
+    Directories that do not exist yet (e.g. the run directory of a
+    sub-workflow that is still being planned), or that were removed, are
+    watched as soon as they are created.
+    """
+
+    name = WATCHER_INOTIFY
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        for func in ("inotify_init1", "inotify_add_watch", "inotify_rm_watch"):
+            if not hasattr(self._libc, func):
+                raise OSError(errno.ENOSYS, "%s is not available" % func)
+
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, "inotify_init1: %s" % os.strerror(err))
+
+        self._wd_dirs = {}  # wd --> directory
+        self._dir_wds = {}  # directory --> wd
+        self._dir_keys = {}  # directory --> set of keys
+        self._key_dirs = {}  # key --> set of directories
+        self._pending = set()  # directories waiting to be created
+        self._unwatched = set()  # keys we could not place a watch for
+
+    def watch(self, key, directory):
+        """
+        Starts watching directory on behalf of key. If the kernel refuses
+        the watch (e.g. fs.inotify.max_user_watches has been reached), the
+        key is reported as changed on every wait(), which degrades to the
+        polling behavior for that key only.
+        """
+        directory = os.path.abspath(directory)
+
+        self._dir_keys.setdefault(directory, set()).add(key)
+        self._key_dirs.setdefault(key, set()).add(directory)
+
+        if directory in self._dir_wds or directory in self._pending:
+            return
+
+        err = self._add_watch(directory)
+        if err == errno.ENOENT:
+            # Watched by wait() once it is created
+            self._pending.add(directory)
+        elif err:
+            self._watch_failed(directory, err)
+
+    def _add_watch(self, directory):
+        """
+        Places the kernel watch on directory. Returns 0, or the errno of
+        the failure.
+        """
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            return ctypes.get_errno()
+        self._wd_dirs[wd] = directory
+        self._dir_wds[directory] = wd
+        return 0
+
+    def _watch_failed(self, directory, err):
+        keys = self._dir_keys.get(directory, ())
+        logger.warning(
+            "cannot watch directory %s (%s), falling back to polling for %s"
+            % (directory, os.strerror(err), ", ".join(sorted(keys)))
+        )
+        self._unwatched.update(keys)
+
+    def _watch_pending(self):
+        """
+        Places the watches on the pending directories which have been
+        created since. Returns their keys, as files may have been written
+        to the directories before they were watched.
+        """
+        changed = set()
+
+        for directory in list(self._pending):
+            err = self._add_watch(directory)
+            if err == errno.ENOENT:
+                continue
+            self._pending.discard(directory)
+            if err:
+                self._watch_failed(directory, err)
+            else:
+                logger.debug("watching new directory %s" % (directory))
+                changed.update(self._dir_keys.get(directory, ()))
+
+        return changed
+
+    def unwatch(self, key):
+        """
+        Stops watching on behalf of key. Directory watches are removed
+        once no key refers to them.
+        """
+        self._unwatched.discard(key)
+
+        for directory in self._key_dirs.pop(key, ()):
+            keys = self._dir_keys.get(directory)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if keys:
+                continue
+            self._remove_directory(directory)
+
+    def _remove_directory(self, directory):
+        wd = self._dir_wds.pop(directory, None)
+        self._dir_keys.pop(directory, None)
+        self._pending.discard(directory)
+        if wd is None:
+            return
+        self._wd_dirs.pop(wd, None)
+        # Fails harmlessly if the kernel already dropped the watch
+        self._libc.inotify_rm_watch(self._fd, wd)
+
+    def _read_events(self):
+        """
+        Drains the inotify file descriptor, returns the set of changed keys.
+        """
+        changed = set(self._unwatched)
+
+        while True:
+            try:
+                buf = os.read(self._fd, _READ_SIZE)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            if not buf:
+                break
+
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(buf):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(buf, offset)
+                offset += _EVENT_HEADER.size
+                name = buf[offset : offset + length].rstrip(b"\0")
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    # Lost events, everybody has to check
+                    logger.debug("inotify queue overflow")
+                    changed.update(self._key_dirs.keys())
+                    continue
+
+                directory = self._wd_dirs.get(wd)
+                if directory is None:
+                    continue
+
+                if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                    # Directory went away, let the keys find out on their own
+                    changed.update(self._dir_keys.get(directory, ()))
+                    if mask & IN_IGNORED:
+                        self._wd_dirs.pop(wd, None)
+                        self._dir_wds.pop(directory, None)
+                        # Watched again if it is created again
+                        if directory in self._dir_keys:
+                            self._pending.add(directory)
+                    continue
+
+                if mask & IN_ISDIR:
+                    # Pending directories are checked by wait()
+                    continue
+
+                if name and is_tracked_file(os.fsdecode(name)):
+                    changed.update(self._dir_keys.get(directory, ()))
+
+        return changed
+
+    def wait(self, timeout):
+        """
+        Waits at most timeout seconds for a tracked file to change.
+        Returns the set of keys that need to be checked (possibly empty).
+        """
+        if timeout < 0:
+            timeout = 0
+
+        try:
+            readable, _, _ = select.select([self._fd], [], [], timeout)
+        except InterruptedError:
+            readable = []
+
+        if readable or self._unwatched:
+            changed = self._read_events()
+        else:
+            changed = set()
+
+        if self._pending:
+            changed.update(self._watch_pending())
+
+        return changed
+
+    def close(self):
+        if self._fd is not None and self._fd >= 0:
+            os.close(self._fd)
+        self._fd = None
+
+
+def create_watcher(kind=WATCHER_AUTO):
+    """
+    Returns a watcher of the requested kind. In auto mode, inotify is
+    used when the platform supports it, polling otherwise.
+    """
+    kind = (kind or WATCHER_AUTO).lower()
+
+    if kind not in WATCHERS:
+        logger.warning("unknown watcher %s, using %s" % (kind, WATCHER_AUTO))
+        kind = WATCHER_AUTO
+
+    if kind == WATCHER_POLL:
+        return PollingWatcher()
+
+    try:
+        return InotifyWatcher()
+    except (OSError, AttributeError) as e:
+        logger.info("inotify is not available (%s), polling for changes" % e)
+        return PollingWatcher()
@@ -3121,6 +3121,24 @@ class Workflow:
 
         return my_dagman_out
 
+    def get_watch_directories(self):
+        """
+        Returns the set of directories containing the files monitord
+        follows for this workflow: the run directory (dagman.out and
+        jobstate.log) and the submit directories where the jobs' .out
+        and .err files are written.
+        """
+        directories = {self._run_dir}
+
+        if self._jsd_file is not None:
+            directories.add(os.path.dirname(os.path.abspath(self._jsd_file)))
+
+        for job_info in self._job_info.values():
+            if job_info[0] is not None:
+                directories.add(os.path.dirname(job_info[0]))
+
+        return directories
+
     def set_dagman_version(self, major, minor, patch):
         """
         Sets the dagman version
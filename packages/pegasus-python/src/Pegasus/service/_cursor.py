@@ -0,0 +1,105 @@
+import base64
+import binascii
+import hashlib
+import json
+from decimal import Decimal
+
+
+class InvalidCursorError(Exception):
+    pass
+
+
+def cursor_encode(values, query=None, order=None, total=None, filtered=None):
+    """
+    Encodes the position after a record into an opaque continuation token.
+
+    The token carries the values of the sort columns of the last record
+    returned, a fingerprint of the query and order clauses it is valid for,
+    and the record counts of the first page, so that the following pages do
+    not count the records again.
+
+    :param values: Sort column values of the last record, primary key last
+    :type values: list
+    :param query: Query clause of the request
+    :type query: str
+    :param order: Order clause of the request
+    :type order: str
+    :param total: Total number of records, if known
+    :type total: int
+    :param filtered: Number of records matching `query`, if known
+    :type filtered: int
+
+    :returns: URL safe token
+    :rtype: str
+
+    .. example::
+
+        >>> cursor_encode([1421432530.0, 7], order="-w.timestamp")
+        'eyJrIjpbMTQyMTQzMjUzMC4wLDddLCJjIjoiMTQ4ODA3ODgifQ'
+    """
+    token = {"k": [_encode_value(v) for v in values], "c": _fingerprint(query, order)}
+
+    if total is not None:
+        token["t"] = total
+
+    if filtered is not None:
+        token["f"] = filtered
+
+    token = json.dumps(token, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(token).decode("ascii").rstrip("=")
+
+
+def cursor_decode(cursor, query=None, order=None):
+    """
+    Decodes a continuation token created by `cursor_encode`.
+
+    :param cursor: The token to be decoded
+    :type cursor: str
+    :param query: Query clause of the request
+    :type query: str
+    :param order: Order clause of the request
+    :type order: str
+
+    :raises InvalidCursorError: Raised if the `cursor` is malformed, or was
+        created for a different query or order clause.
+
+    :returns: tuple of sort column values, total records and filtered records
+    :rtype: tuple
+    """
+    try:
+        token = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        token = json.loads(token.decode("utf-8"))
+        values = [_decode_value(v) for v in token["k"]]
+        fingerprint = token["c"]
+    except (binascii.Error, ValueError, TypeError, KeyError, AttributeError):
+        raise InvalidCursorError("Invalid cursor %r" % cursor)
+
+    if fingerprint != _fingerprint(query, order):
+        raise InvalidCursorError(
+            "Invalid cursor: cursor does not match the query and order arguments"
+        )
+
+    return values, token.get("t"), token.get("f")
+
+
+def _fingerprint(query, order):
+    clauses = "%s\0%s" % (query or "", order or "")
+    return hashlib.md5(clauses.encode("utf-8")).hexdigest()[:8]
+
+
+def _encode_value(value):
+    # JSON has no decimal type, and floats would lose precision
+    if isinstance(value, Decimal):
+        return {"d": str(value)}
+
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        return Decimal(value["d"])
+
+    if isinstance(value, list):
+        raise ValueError("Invalid cursor value")
+
+    return value
@@ -13,6 +13,25 @@ from Pegasus.service.base import ErrorResponse, OrderedDict, PagedResponse
 log = logging.getLogger(__name__)
 
 
+def paged_response_meta(o):
+    """Returns the _meta section of a PagedResponse, or None."""
+    if not (o.total_records or o.total_filtered or o.next_cursor):
+        return None
+
+    meta = OrderedDict()
+
+    if o.total_records is not None:
+        meta["records_total"] = o.total_records
+
+    if o.total_filtered is not None:
+        meta["records_filtered"] = o.total_filtered
+
+    if o.next_cursor:
+        meta["next_cursor"] = o.next_cursor
+
+    return meta
+
+
 class PegasusJsonEncoder(JSONEncoder):
     """JSON Encoder for Pegasus Service API Resources."""
 
@@ -31,15 +50,8 @@ class PegasusJsonEncoder(JSONEncoder):
         elif isinstance(o, PagedResponse):
             json_record = OrderedDict([("records", o.records)])
 
-            if o.total_records or o.total_filtered:
-                meta = OrderedDict()
-
-                if o.total_records is not None:
-                    meta["records_total"] = o.total_records
-
-                if o.total_filtered is not None:
-                    meta["records_filtered"] = o.total_filtered
-
+            meta = paged_response_meta(o)
+            if meta:
                 json_record["_meta"] = meta
 
             return json_record
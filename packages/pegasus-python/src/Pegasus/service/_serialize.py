@@ -1,15 +1,24 @@
 import logging
 from json import JSONEncoder, dumps
 
-from flask import current_app, make_response, request
+from flask import current_app, make_response, request, stream_with_context
+
+from Pegasus.service._encoder import paged_response_meta
+from Pegasus.service.base import PagedResponse
 
 __all__ = (
     "serialize",
     "jsonify",
+    "ndjson_requested",
 )
 
 log = logging.getLogger(__name__)
 
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+# Streamed responses are sent in chunks of at least this many characters
+STREAM_CHUNK_SIZE = 64 * 1024
+
 
 def serialize(rv):
     log.debug("Serializing output")
@@ -61,7 +70,71 @@ def jsonify(*args, **kwargs):
     else:
         mime_type = "application/json; charset=utf-8"
 
+    if isinstance(data, PagedResponse) and stream_requested():
+        encoder = cls(indent=indent, separators=separators)
+        ndjson = ndjson_requested()
+        if ndjson:
+            mime_type = NDJSON_MIMETYPE
+
+        return current_app.response_class(
+            stream_with_context(_stream_paged_response(data, encoder, ndjson)),
+            mimetype=mime_type,
+        )
+
     json_str = dumps(data, indent=indent, separators=separators, cls=cls) + "\n"
     json_str.encode("utf-8")
 
     return current_app.response_class(json_str, mimetype=mime_type)
+
+
+def ndjson_requested():
+    """
+    Returns True if the client prefers newline delimited JSON to JSON.
+    """
+    best = request.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+
+def stream_requested():
+    stream = request.args.get("stream", "").strip().lower()
+    return stream in {"1", "true"} or ndjson_requested()
+
+
+def _stream_paged_response(o, encoder, ndjson=False):
+    """
+    Yields a paged response in chunks, encoding the records as they are read,
+    so that large collections are not held in memory.
+
+    As JSON, the document is the same as the one jsonify returns. As newline
+    delimited JSON, each record is on a line of its own, followed by a line
+    with the _meta section, if any.
+    """
+    chunk = [] if ndjson else ['{"records":[']
+    size = 0
+
+    for i, record in enumerate(o.records):
+        record = encoder.encode(record)
+        if ndjson:
+            chunk.append(record + "\n")
+        else:
+            chunk.append("," + record if i else record)
+        size += len(record) + 1
+
+        if size >= STREAM_CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk = []
+            size = 0
+
+    meta = paged_response_meta(o)
+
+    if ndjson:
+        if meta:
+            chunk.append(encoder.encode({"_meta": meta}) + "\n")
+    else:
+        chunk.append("]")
+        if meta:
+            chunk.append(',"_meta":' + encoder.encode(meta))
+        chunk.append("}\n")
+
+    if chunk:
+        yield "".join(chunk)
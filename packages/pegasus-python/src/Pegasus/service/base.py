@@ -18,10 +18,11 @@ from werkzeug.routing import BaseConverter
 
 
 class PagedResponse:
-    def __init__(self, records, total, filtered):
+    def __init__(self, records, total, filtered, next_cursor=None):
         self._records = records
         self._total = total
         self._filtered = filtered
+        self._next_cursor = next_cursor
 
     @property
     def records(self):
@@ -35,6 +36,10 @@ class PagedResponse:
     def total_filtered(self):
         return self._filtered
 
+    @property
+    def next_cursor(self):
+        return self._next_cursor
+
 
 class ErrorResponse:
     def __init__(self, code, message, errors=None):
@@ -24,6 +24,10 @@ AUTHENTICATION = "PAMAuthentication"
 PROCESS_SWITCHING = True
 
 # Flask cache configuration
+# filesystem -> Shared by all the processes of the service, in CACHE_DIR.
+# SimpleCache -> In the memory of each process, see CACHE_THRESHOLD.
+# UWSGICache -> In the shared memory of uWSGI, see CACHE_UWSGI_NAME.
+# RedisCache, MemcachedCache -> In a Redis or memcached server.
 CACHE_TYPE = "filesystem"
 CACHE_DIR = os.path.join(tempfile.gettempdir(), "pegasus-service")
 
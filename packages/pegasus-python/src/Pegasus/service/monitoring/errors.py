@@ -3,6 +3,7 @@ import logging
 from flask import make_response
 from sqlalchemy.orm.exc import NoResultFound
 
+from Pegasus.service._cursor import InvalidCursorError
 from Pegasus.service._query import InvalidQueryError
 from Pegasus.service._serialize import jsonify
 from Pegasus.service._sort import InvalidSortError
@@ -56,6 +57,14 @@ def invalid_order_error(error):
     return make_response(response_json, 400, JSON_HEADER)
 
 
+@monitoring.errorhandler(InvalidCursorError)
+def invalid_cursor_error(error):
+    e = ErrorResponse("INVALID_CURSOR", str(error))
+    response_json = jsonify(e)
+
+    return make_response(response_json, 400, JSON_HEADER)
+
+
 @monitoring.errorhandler(InvalidJSONError)
 def invalid_json_error(error):
     e = ErrorResponse("INVALID_JSON", str(error))
@@ -14,12 +14,16 @@
 
 __author__ = "Rajiv Mayani"
 
+import functools
 import hashlib
 import logging
+from inspect import Parameter, signature
 
-from sqlalchemy.orm import aliased, defer, joinedload
+from sqlalchemy import inspect
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import aliased, contains_eager, defer
 from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy.sql.expression import and_, desc, distinct, func
+from sqlalchemy.sql.expression import and_, desc, distinct, false, func, or_
 
 from Pegasus.db import connection
 from Pegasus.db.admin.admin_loader import DBAdminError
@@ -41,14 +45,118 @@ from Pegasus.db.schema import (
     WorkflowFiles,
     WorkflowMeta,
     Workflowstate,
+    WorkflowSummary,
+    check_table_exists,
 )
 from Pegasus.service import cache
+from Pegasus.service._cursor import InvalidCursorError, cursor_decode, cursor_encode
 from Pegasus.service._query import InvalidQueryError, query_parse
 from Pegasus.service._sort import InvalidSortError, sort_parse
 from Pegasus.service.base import PagedResponse
 
 log = logging.getLogger(__name__)
 
+# Number of rows fetched at a time when streaming results
+STREAM_BATCH_SIZE = 1000
+
+# Duration for which the change marker of a workflow is cached
+MARKER_TIMEOUT = 5
+
+# Arguments which select a page of a collection, and not the records counted
+PAGING_ARGS = {"start_index", "max_results", "order", "cursor", "count", "stream"}
+
+
+def cached_query(timeout=60, workflow="wf_id"):
+    """
+    Caches the result of a query method, keyed by the name of the method,
+    its arguments and the change marker of the workflow named by the
+    `workflow` argument, if any.
+
+    Results of running workflows expire after `timeout` seconds, which may
+    be a callable taking the result, and the `timeout` argument of the
+    method if it has one, or as soon as the workflow changes.
+    Results of finished workflows do not expire.
+    """
+
+    def decorator(fn):
+        sig = signature(fn)
+        var_kw = [
+            k for k, v in sig.parameters.items() if v.kind == Parameter.VAR_KEYWORD
+        ]
+
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            bound = sig.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = bound.arguments
+            del arguments["self"]
+
+            if not arguments.get("use_cache", True) or arguments.get("stream"):
+                return fn(self, *args, **kwargs)
+
+            for k in var_kw:
+                arguments.update(arguments.pop(k))
+
+            if workflow:
+                marker, finished = self._get_workflow_marker(arguments[workflow])
+            else:
+                marker, finished = None, False
+
+            scope = _CacheScope(
+                "%s.%s.%s" % (self._conn_string_csum, fn.__name__, marker),
+                sorted(arguments.items()),
+                finished,
+            )
+            cache_key = scope.key()
+            rv = cache.get(cache_key)
+            if rv is not None:
+                log.debug("Cache Hit: %s" % cache_key)
+                return rv
+
+            log.debug("Cache Miss: %s" % cache_key)
+            outer_scope, self._cache_scope = self._cache_scope, scope
+            try:
+                rv = fn(self, *args, **kwargs)
+            finally:
+                self._cache_scope = outer_scope
+
+            if finished:
+                t = 0
+            elif not callable(timeout):
+                t = timeout
+            elif "timeout" in arguments:
+                t = timeout(rv, arguments["timeout"])
+            else:
+                t = timeout(rv)
+            cache.set(cache_key, rv, timeout=t)
+
+            return rv
+
+        return wrapper
+
+    return decorator
+
+
+class _CacheScope:
+    """
+    Cache key prefix, arguments and state of the workflow of a query method
+    being evaluated.
+    """
+
+    def __init__(self, prefix, arguments, finished=False):
+        self.prefix = prefix
+        self.arguments = arguments
+        self.finished = finished
+
+    def key(self, suffix="", exclude=()):
+        arguments = [(k, v) for k, v in self.arguments if k not in exclude]
+        arguments = hashlib.md5(repr(arguments).encode("utf-8")).hexdigest()
+        return "%s.%s%s" % (self.prefix, arguments, suffix)
+
+
+def _job_instance_timeout(ji, timeout=5):
+    return 300 if ji and ji.exitcode is not None else timeout
+
 
 class WorkflowQueries:
     def __init__(self, connection_string, use_cache=True):
@@ -67,6 +175,8 @@ class WorkflowQueries:
 
         self._use_cache = True
         self.use_cache = use_cache
+        self._summary = None
+        self._cache_scope = None
 
     def close(self):
         self.session.close()
@@ -93,25 +203,81 @@ class WorkflowQueries:
         )
         return hashlib.md5(cache_key.encode("utf-8")).hexdigest()
 
-    def _get_count(self, q, use_cache=True, timeout=60):
-        cache_key = "%s.count" % self._cache_key_from_query(q)
-        if use_cache and cache.get(cache_key):
+    def _get_workflow_marker(self, wf_id):
+        """
+        Returns a value which changes whenever the records of the workflow
+        `wf_id` change, and True if the workflow has finished.
+        """
+        return None, False
+
+    def _get_count(self, q, use_cache=True, timeout=60, cache_key=None):
+        if not use_cache:
+            return q.count()
+
+        finished = False
+        if cache_key:
+            finished = self._cache_scope.finished
+        else:
+            cache_key = "%s.count" % self._cache_key_from_query(q)
+
+        count = cache.get(cache_key)
+        if count is not None:
             log.debug("Cache Hit: %s" % cache_key)
-            count = cache.get(cache_key)
 
         else:
             log.debug("Cache Miss: %s" % cache_key)
             count = q.count()
-            t = timeout(count) if callable(timeout) else timeout
-            cache.set(cache_key, count, t)
+            if finished:
+                t = 0
+            else:
+                t = timeout(count) if callable(timeout) else timeout
+            cache.set(cache_key, count, timeout=t)
 
         return count
 
+    def _get_total(
+        self, q, count=True, position=None, filtered=False, use_cache=True, timeout=60
+    ):
+        """
+        Returns the number of records of `q`. The count is carried over from
+        the first page when paging with a cursor, and is None when `count`
+        is False.
+
+        Within a cached query method the count is cached under the arguments
+        of the method which select the records counted, so that it is shared
+        by all the pages of a collection.
+        """
+        if position:
+            return position[2] if filtered else position[1]
+
+        if not count:
+            return None
+
+        cache_key = None
+        if self._cache_scope:
+            exclude = PAGING_ARGS if filtered else PAGING_ARGS | {"query"}
+            cache_key = self._cache_scope.key(".count", exclude)
+
+        return self._get_count(q, use_cache, timeout=timeout, cache_key=cache_key)
+
+    def _use_summary(self):
+        """
+        Returns True if the database has the workflow_summary table that
+        the workflow loader keeps up to date.
+        """
+        if self._summary is None:
+            self._summary = check_table_exists(self.session.get_bind(), WorkflowSummary)
+        return self._summary
+
     def _get_all(self, q, use_cache=True, timeout=60):
+        # the result of a cached query method is cached as a whole
+        if not use_cache or self._cache_scope:
+            return q.all()
+
         cache_key = "%s.all" % self._cache_key_from_query(q)
-        if use_cache and cache.get(cache_key):
+        record = cache.get(cache_key)
+        if record is not None:
             log.debug("Cache Hit: %s" % cache_key)
-            record = cache.get(cache_key)
 
         else:
             log.debug("Cache Miss: %s" % cache_key)
@@ -121,11 +287,39 @@ class WorkflowQueries:
 
         return record
 
+    @staticmethod
+    def _stream_all(q):
+        """
+        Yields the records of `q` as they are read from a server-side cursor,
+        bypassing the cache.
+        """
+        try:
+            records = iter(q.yield_per(STREAM_BATCH_SIZE))
+        except InvalidRequestError:
+            # joined eager loading of collections needs all the rows at once
+            records = iter(q)
+
+        yield from records
+
+    @staticmethod
+    def _map_records(records, fn):
+        """
+        Applies `fn` to the records, as they are read if they are streamed.
+        """
+        if isinstance(records, list):
+            return [fn(r) for r in records]
+
+        return (fn(r) for r in records)
+
     def _get_one(self, q, use_cache=True, timeout=60):
+        # the result of a cached query method is cached as a whole
+        if not use_cache or self._cache_scope:
+            return q.one()
+
         cache_key = "%s.one" % self._cache_key_from_query(q)
-        if use_cache and cache.get(cache_key):
+        record = cache.get(cache_key)
+        if record is not None:
             log.debug("Cache Hit: %s" % cache_key)
-            record = cache.get(cache_key)
 
         else:
             log.debug("Cache Miss: %s" % cache_key)
@@ -160,6 +354,20 @@ class WorkflowQueries:
         if not q or not order or not resource:
             return q
 
+        for field, sort_dir in WorkflowQueries._get_ordering(order, **resource):
+            if sort_dir == "ASC":
+                q = q.order_by(field)
+            else:
+                q = q.order_by(desc(field))
+
+        return q
+
+    @staticmethod
+    def _get_ordering(order, **resource):
+        if not order or not resource:
+            return []
+
+        ordering = []
         sort_order = sort_parse(order)
 
         for prefix, identifier, sort_dir in sort_order:
@@ -169,12 +377,147 @@ class WorkflowQueries:
                 log.exception("Invalid field {}.{}".format(prefix, identifier))
                 raise InvalidSortError("Invalid field %r" % identifier)
 
+            ordering.append((field, sort_dir))
+
+        return ordering
+
+    def _get_page(
+        self,
+        q,
+        start_index=None,
+        max_results=None,
+        query=None,
+        order=None,
+        position=None,
+        total_records=None,
+        total_filtered=None,
+        use_cache=True,
+        timeout=60,
+        stream=False,
+        **resource
+    ):
+        """
+        Returns the records of a page of `q`, and the cursor to the next page.
+
+        Pages requested with a cursor, and the first page of a request with
+        `max_results`, are read by seeking past the last record returned,
+        ordered by the `order` fields and the primary key, instead of
+        skipping `start_index` records with OFFSET, so that the cost of a
+        page does not grow with its position.
+
+        If `stream` is True, pages which are not limited to `max_results`
+        records are returned as an iterator over the records.
+
+        Fields of entities joined to the records, but not returned by `q`,
+        are read along with the records to build the cursor.
+        """
+        if not position and (start_index or not max_results):
+            q = self._add_ordering(q, order, **resource)
+            q = WorkflowQueries._add_pagination(
+                q, start_index, max_results, total_filtered
+            )
+            if stream:
+                return self._stream_all(q), None
+
+            return self._get_all(q, use_cache, timeout=timeout), None
+
+        ordering = self._get_ordering(order, **resource)
+        entity = q.column_descriptions[0]["entity"]
+        mapper = inspect(entity)
+        fields = {field.property for field, _ in ordering}
+        for column in mapper.primary_key:
+            prop = mapper.get_property_by_column(column)
+            if prop not in fields:
+                ordering.append((getattr(entity, prop.key), "ASC"))
+
+        columns = len(q.column_descriptions)
+        entities = [
+            d["type"] for d in q.column_descriptions if isinstance(d["type"], type)
+        ]
+        extra = [
+            field
+            for field, _ in ordering
+            if not any(issubclass(e, field.class_) for e in entities)
+        ]
+        if extra:
+            q = q.add_columns(*extra)
+
+        # NULLs sort lowest, as they do on SQLite and MySQL
+        nulls = self.session.get_bind().dialect.name == "postgresql"
+        for field, sort_dir in ordering:
             if sort_dir == "ASC":
-                q = q.order_by(field)
+                q = q.order_by(field.nullsfirst() if nulls else field)
             else:
-                q = q.order_by(desc(field))
+                q = q.order_by(desc(field).nullslast() if nulls else desc(field))
+
+        if position:
+            if len(position[0]) != len(ordering):
+                raise InvalidCursorError("Invalid cursor: does not match the order")
+            q = q.filter(self._after(ordering, position[0]))
+
+        def strip(records):
+            if not extra:
+                return records
+            return self._map_records(
+                records, lambda r: r[0] if columns == 1 else r[:columns]
+            )
 
-        return q
+        if max_results:
+            q = q.limit(max_results + 1)
+        elif stream:
+            return strip(self._stream_all(q)), None
+
+        records = self._get_all(q, use_cache, timeout=timeout)
+
+        if not max_results or len(records) <= max_results:
+            return strip(records), None
+
+        records = records[:max_results]
+        values = self._get_sort_values(records[-1], ordering, columns)
+        next_cursor = cursor_encode(values, query, order, total_records, total_filtered)
+        return strip(records), next_cursor
+
+    @staticmethod
+    def _after(ordering, values):
+        """
+        Returns a condition selecting the records sorted after the one with
+        the sort field `values`.
+        """
+        clauses = []
+        for i, ((field, sort_dir), value) in enumerate(zip(ordering, values)):
+            if value is None:
+                after = field.isnot(None) if sort_dir == "ASC" else false()
+            elif sort_dir == "ASC":
+                after = field > value
+            else:
+                after = or_(field < value, field.is_(None))
+
+            equal = [
+                f.is_(None) if v is None else f == v
+                for (f, _), v in zip(ordering[:i], values)
+            ]
+            clauses.append(and_(*(equal + [after])))
+
+        return or_(*clauses)
+
+    @staticmethod
+    def _get_sort_values(record, ordering, columns=1):
+        """
+        Returns the values of the sort fields of a record, read from the
+        first `columns` entities of the record, or from the columns that
+        follow them for the fields of other entities.
+        """
+        if isinstance(record, tuple):
+            entities, extra = record[:columns], iter(record[columns:])
+        else:
+            entities, extra = (record,), iter(())
+        values = []
+
+        for field, _ in ordering:
+            entity = [e for e in entities if isinstance(e, field.class_)]
+            values.append(getattr(entity[0], field.key) if entity else next(extra))
+
+        return values
 
     @staticmethod
     def _add_pagination(q, start_index=None, max_results=None, total_records=None):
@@ -205,12 +548,16 @@ class WorkflowQueries:
 
 
 class MasterWorkflowQueries(WorkflowQueries):
+    @cached_query(workflow=None)
     def get_root_workflows(
         self,
         start_index=None,
         max_results=None,
         query=None,
         order=None,
+        cursor=None,
+        count=True,
+        stream=False,
         use_cache=True,
         **kwargs
     ):
@@ -221,6 +568,9 @@ class MasterWorkflowQueries(WorkflowQueries):
         :param max_results: Return a maximum of `max_results` records
         :param query: Filtering criteria
         :param order: Sorting criteria
+        :param cursor: Return results following the record `cursor` points to
+        :param count: Count the total, and filtered records
+        :param stream: Return an iterator over the records, read as they are needed
         :param use_cache: If available, use cached results
 
         :return: Collection of tuples (MasterWorkflow, MasterWorkflowstate)
@@ -231,7 +581,10 @@ class MasterWorkflowQueries(WorkflowQueries):
         #
         q = self.session.query(MasterWorkflow)
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        position = cursor_decode(cursor, query, order) if cursor else None
+        total_records = total_filtered = self._get_total(
+            q, count, position, use_cache=use_cache
+        )
 
         if total_records == 0:
             log.debug("total_records 0")
@@ -253,33 +606,44 @@ class MasterWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, r=MasterWorkflow, ws=alias)
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_total(
+                q, count, position, filtered=True, use_cache=use_cache
+            )
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (
+                start_index and total_filtered and start_index >= total_filtered
+            ):
                 log.debug("total_filtered is 0 or start_index >= total_filtered")
                 return PagedResponse([], total_records, total_filtered)
 
         #
-        # Construct SQLAlchemy Query `q` to sort
-        #
-        if order:
-            q = self._add_ordering(q, order, r=MasterWorkflow)
-
-        #
-        # Construct SQLAlchemy Query `q` to paginate.
-        #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
-
-        records = self._get_all(q, use_cache)
+        # Construct SQLAlchemy Query `q` to sort, and paginate.
+        #
+        records, next_cursor = self._get_page(
+            q,
+            start_index,
+            max_results,
+            query,
+            order,
+            position,
+            total_records,
+            total_filtered,
+            use_cache=use_cache,
+            stream=stream,
+            r=MasterWorkflow,
+        )
 
-        for i in range(len(records)):
-            new_record = records[i][0]
-            new_record.workflow_state = records[i][1]
+        def merge(record):
+            new_record = record[0]
+            new_record.workflow_state = record[1]
             new_record.__includes__ = ("workflow_state",)
-            records[i] = new_record
+            return new_record
+
+        records = self._map_records(records, merge)
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor)
 
+    @cached_query(workflow=None)
     def get_root_workflow(self, m_wf_id, use_cache=True):
         """
         Returns a Root Workflow object identified by m_wf_id.
@@ -362,8 +726,61 @@ class StampedeWorkflowQueries(WorkflowQueries):
 
         return wf_id
 
+    def _get_workflow_marker(self, wf_id):
+        """
+        Returns the latest state of the workflow, and the counts the workflow
+        loader keeps in the workflow_summary table, or the count of the job
+        states of the workflow, as the change marker of the workflow.
+        """
+        try:
+            wf_id = self.wf_uuid_to_wf_id(wf_id)
+        except NoResultFound:
+            return None, False
+
+        cache_key = "%s.%s.marker" % (self._conn_string_csum, wf_id)
+        marker = cache.get(cache_key)
+        if marker is not None:
+            return marker
+
+        q = self.session.query(
+            Workflowstate.state, Workflowstate.timestamp, Workflowstate.restart_count
+        )
+        q = q.filter(Workflowstate.wf_id == wf_id)
+        q = q.order_by(desc(Workflowstate.timestamp), desc(Workflowstate.restart_count))
+        ws = q.first()
+
+        counts = None
+        if self._use_summary():
+            q = self.session.query(
+                func.sum(WorkflowSummary.job_instances),
+                func.sum(WorkflowSummary.succeeded_jobs),
+                func.sum(WorkflowSummary.failed_jobs),
+                func.sum(WorkflowSummary.invocations),
+            )
+            q = q.filter(WorkflowSummary.wf_id == wf_id)
+            counts = q.one()
+
+        # workflows loaded before the workflow_summary table was added
+        if not counts or counts[0] is None:
+            q = self.session.query(func.count(), func.max(Jobstate.timestamp))
+            q = q.join(
+                JobInstance, JobInstance.job_instance_id == Jobstate.job_instance_id
+            )
+            q = q.join(Job, Job.job_id == JobInstance.job_id)
+            q = q.filter(Job.wf_id == wf_id)
+            counts = q.one()
+
+        state = tuple(ws) if ws else None
+        digest = hashlib.md5(repr((state, tuple(counts))).encode("utf-8")).hexdigest()
+        finished = ws is not None and ws.state == "WORKFLOW_TERMINATED"
+        marker = (digest[:16], finished)
+
+        cache.set(cache_key, marker, timeout=MARKER_TIMEOUT)
+        return marker
+
     # Workflow
 
+    @cached_query(workflow="m_wf_id")
     def get_workflows(
         self,
         m_wf_id,
@@ -371,6 +788,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         max_results=None,
         query=None,
         order=None,
+        cursor=None,
+        count=True,
+        stream=False,
         use_cache=False,
         **kwargs
     ):
@@ -381,6 +801,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         :param max_results: Return a maximum of `max_results` records
         :param query: Filtering criteria
         :param order: Sorting criteria
+        :param cursor: Return results following the record `cursor` points to
+        :param count: Count the total, and filtered records
+        :param stream: Return an iterator over the records, read as they are needed
         :param use_cache: If available, use cached results
 
         :return: Collection of Workflow objects
@@ -392,7 +815,10 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         q = self.session.query(Workflow)
         q = q.filter(Workflow.root_wf_id == m_wf_id)
-        total_records = total_filtered = self._get_count(q, use_cache)
+        position = cursor_decode(cursor, query, order) if cursor else None
+        total_records = total_filtered = self._get_total(
+            q, count, position, use_cache=use_cache
+        )
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -402,27 +828,36 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, w=Workflow)
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_total(
+                q, count, position, filtered=True, use_cache=use_cache
+            )
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (
+                start_index and total_filtered and start_index >= total_filtered
+            ):
                 log.debug("total_filtered is 0 or start_index >= total_filtered")
                 return PagedResponse([], total_records, total_filtered)
 
         #
-        # Construct SQLAlchemy Query `q` to sort
-        #
-        if order:
-            q = self._add_ordering(q, order, w=Workflow)
-
-        #
-        # Construct SQLAlchemy Query `q` to paginate.
-        #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
-
-        records = self._get_all(q, use_cache)
+        # Construct SQLAlchemy Query `q` to sort, and paginate.
+        #
+        records, next_cursor = self._get_page(
+            q,
+            start_index,
+            max_results,
+            query,
+            order,
+            position,
+            total_records,
+            total_filtered,
+            use_cache=use_cache,
+            stream=stream,
+            w=Workflow,
+        )
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor)
 
+    @cached_query()
     def get_workflow(self, wf_id, use_cache=True):
         """
         Returns a Workflow object identified by wf_id.
@@ -443,6 +878,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
 
     # Workflow Meta
 
+    @cached_query()
     def get_workflow_meta(
         self,
         wf_id,
@@ -450,6 +886,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         max_results=None,
         query=None,
         order=None,
+        cursor=None,
+        count=True,
+        stream=False,
         use_cache=False,
         **kwargs
     ):
@@ -461,6 +900,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         :param max_results: Return a maximum of `max_results` records
         :param query: Filtering criteria
         :param order: Sorting criteria
+        :param cursor: Return results following the record `cursor` points to
+        :param count: Count the total, and filtered records
+        :param stream: Return an iterator over the records, read as they are needed
         :param use_cache: If available, use cached results
 
         :return: Workflow Meta collection, total records count, total filtered records count
@@ -472,7 +914,10 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         q = self.session.query(WorkflowMeta)
         q = q.filter(WorkflowMeta.wf_id == wf_id)
-        total_records = total_filtered = self._get_count(q, use_cache)
+        position = cursor_decode(cursor, query, order) if cursor else None
+        total_records = total_filtered = self._get_total(
+            q, count, position, use_cache=use_cache
+        )
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -482,29 +927,38 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, wm=WorkflowMeta)
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_total(
+                q, count, position, filtered=True, use_cache=use_cache
+            )
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (
+                start_index and total_filtered and start_index >= total_filtered
+            ):
                 log.debug("total_filtered is 0 or start_index >= total_filtered")
                 return PagedResponse([], total_records, total_filtered)
 
         #
-        # Construct SQLAlchemy Query `q` to sort
-        #
-        if order:
-            q = self._add_ordering(q, order, wm=WorkflowMeta)
-
-        #
-        # Construct SQLAlchemy Query `q` to paginate.
-        #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
-
-        records = self._get_all(q, use_cache)
+        # Construct SQLAlchemy Query `q` to sort, and paginate.
+        #
+        records, next_cursor = self._get_page(
+            q,
+            start_index,
+            max_results,
+            query,
+            order,
+            position,
+            total_records,
+            total_filtered,
+            use_cache=use_cache,
+            stream=stream,
+            wm=WorkflowMeta,
+        )
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor)
 
     # Workflow Files
 
+    @cached_query()
     def get_workflow_files(
         self,
         wf_id,
@@ -512,6 +966,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         max_results=None,
         query=None,
         order=None,
+        cursor=None,
+        count=True,
+        stream=False,
         use_cache=False,
         **kwargs
     ):
@@ -522,6 +979,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         :param max_results: Return a maximum of `max_results` records
         :param query: Filtering criteria
         :param order: Sorting criteria
+        :param cursor: Return results following the record `cursor` points to
+        :param count: Count the total, and filtered records
+        :param stream: Return an iterator over the records, read as they are needed
         :param use_cache: If available, use cached results
 
         :return: Collection of Workflow Files
@@ -534,16 +994,21 @@ class StampedeWorkflowQueries(WorkflowQueries):
         q = self.session.query(WorkflowFiles)
         q = q.filter(WorkflowFiles.wf_id == wf_id)
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        position = cursor_decode(cursor, query, order) if cursor else None
+        total_records = total_filtered = self._get_total(
+            q, count, position, use_cache=use_cache
+        )
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
 
+        # RCLFN is joined, so that the files can be sorted by its fields
         q = (
             self.session.query(WorkflowFiles)
+            .join(WorkflowFiles.lfn)
             .options(
-                joinedload(WorkflowFiles.lfn).joinedload(RCLFN.pfns),
-                joinedload(WorkflowFiles.lfn).joinedload(RCLFN.meta),
+                contains_eager(WorkflowFiles.lfn).joinedload(RCLFN.pfns),
+                contains_eager(WorkflowFiles.lfn).joinedload(RCLFN.meta),
             )
             .filter(WorkflowFiles.wf_id == wf_id)
         )
@@ -553,37 +1018,48 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, l=RCLFN, p=RCPFN, rm=RCMeta)
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_total(
+                q, count, position, filtered=True, use_cache=use_cache
+            )
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (
+                start_index and total_filtered and start_index >= total_filtered
+            ):
                 log.debug("total_filtered is 0 or start_index >= total_filtered")
                 return PagedResponse([], total_records, total_filtered)
 
         #
-        # Construct SQLAlchemy Query `q` to paginate.
-        #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
-
-        #
-        # Construct SQLAlchemy Query `q` to sort
-        #
-        if order:
-            q = self._add_ordering(q, order, l=RCLFN, p=RCPFN, rm=RCMeta)
-
-        records = self._get_all(q, use_cache)
+        # Construct SQLAlchemy Query `q` to sort, and paginate.
+        #
+        records, next_cursor = self._get_page(
+            q,
+            start_index,
+            max_results,
+            query,
+            order,
+            position,
+            total_records,
+            total_filtered,
+            use_cache=use_cache,
+            stream=stream,
+            # PFNs and metadata are collections, which cannot sort the files
+            l=RCLFN,
+        )
 
-        _records = []
-        for r in records:
+        def to_dict(r):
             o = {k: getattr(r, k) for k in r.__table__.columns.keys()}
             o["lfn"] = r.lfn.lfn
             o["pfns"] = r.lfn.pfns
             o["meta"] = r.lfn.meta
-            _records.append(o)
+            return o
+
+        _records = self._map_records(records, to_dict)
 
-        return PagedResponse(_records, total_records, total_filtered)
+        return PagedResponse(_records, total_records, total_filtered, next_cursor)
 
     # Workflow State
 
+    @cached_query(timeout=5)
     def get_workflow_state(
         self,
         wf_id,
@@ -591,6 +1067,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         max_results=None,
         query=None,
         order=None,
+        cursor=None,
+        count=True,
+        stream=False,
         use_cache=True,
         **kwargs
     ):
@@ -602,6 +1081,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         :param max_results: Return a maximum of `max_results` records
         :param query: Filtering criteria
         :param order: Sorting criteria
+        :param cursor: Return results following the record `cursor` points to
+        :param count: Count the total, and filtered records
+        :param stream: Return an iterator over the records, read as they are needed
         :param use_cache: If available, use cached results
 
         :return: Workflow States collection, total records count, total filtered records count
@@ -617,7 +1099,10 @@ class StampedeWorkflowQueries(WorkflowQueries):
         q = self.session.query(Workflowstate)
         q = q.filter(Workflowstate.wf_id == wf_id)
 
-        total_records = total_filtered = self._get_count(q, use_cache, timeout=timeout)
+        position = cursor_decode(cursor, query, order) if cursor else None
+        total_records = total_filtered = self._get_total(
+            q, count, position, use_cache=use_cache, timeout=timeout
+        )
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -627,26 +1112,35 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, ws=Workflowstate)
-            total_filtered = self._get_count(q, use_cache, timeout=timeout)
+            total_filtered = self._get_total(
+                q, count, position, filtered=True, use_cache=use_cache, timeout=timeout
+            )
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (
+                start_index and total_filtered and start_index >= total_filtered
+            ):
                 log.debug("total_filtered is 0 or start_index >= total_filtered")
                 return PagedResponse([], total_records, total_filtered)
 
         #
-        # Construct SQLAlchemy Query `q` to sort
-        #
-        if order:
-            q = self._add_ordering(q, order, ws=Workflowstate)
-
-        #
-        # Construct SQLAlchemy Query `q` to paginate.
-        #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
-
-        records = self._get_all(q, use_cache, timeout=timeout)
+        # Construct SQLAlchemy Query `q` to sort, and paginate.
+        #
+        records, next_cursor = self._get_page(
+            q,
+            start_index,
+            max_results,
+            query,
+            order,
+            position,
+            total_records,
+            total_filtered,
+            use_cache=use_cache,
+            stream=stream,
+            timeout=timeout,
+            ws=Workflowstate,
+        )
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor)
 
     def _get_max_workflow_state(self, wf_id=None, ws=Workflowstate):
         qmax = self._get_recent_workflow_state(wf_id, ws)
@@ -673,6 +1167,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
 
     # Job
 
+    @cached_query()
     def get_workflow_jobs(
         self,
         wf_id,
@@ -680,6 +1175,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         max_results=None,
         query=None,
         order=None,
+        cursor=None,
+        count=True,
+        stream=False,
         use_cache=True,
         **kwargs
     ):
@@ -691,6 +1189,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         :param max_results: Return a maximum of `max_results` records
         :param query: Filtering criteria
         :param order: Sorting criteria
+        :param cursor: Return results following the record `cursor` points to
+        :param count: Count the total, and filtered records
+        :param stream: Return an iterator over the records, read as they are needed
         :param use_cache: If available, use cached results
 
         :return: Jobs collection, total jobs count, filtered jobs count
@@ -703,7 +1204,16 @@ class StampedeWorkflowQueries(WorkflowQueries):
         q = self.session.query(Job)
         q = q.filter(Job.wf_id == wf_id)
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        position = cursor_decode(cursor, query, order) if cursor else None
+
+        if count and not position and self._use_summary():
+            qs = self.session.query(func.sum(WorkflowSummary.jobs))
+            qs = qs.filter(WorkflowSummary.wf_id == wf_id)
+            total_records = total_filtered = int(qs.scalar() or 0)
+        else:
+            total_records = total_filtered = self._get_total(
+                q, count, position, use_cache=use_cache
+            )
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -713,27 +1223,36 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, j=Job)
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_total(
+                q, count, position, filtered=True, use_cache=use_cache
+            )
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (
+                start_index and total_filtered and start_index >= total_filtered
+            ):
                 log.debug("total_filtered is 0 or start_index >= total_filtered")
                 return PagedResponse([], total_records, total_filtered)
 
         #
-        # Construct SQLAlchemy Query `q` to sort
-        #
-        if order:
-            q = self._add_ordering(q, order, j=Job)
-
-        #
-        # Construct SQLAlchemy Query `q` to paginate.
-        #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
-
-        records = self._get_all(q, use_cache)
+        # Construct SQLAlchemy Query `q` to sort, and paginate.
+        #
+        records, next_cursor = self._get_page(
+            q,
+            start_index,
+            max_results,
+            query,
+            order,
+            position,
+            total_records,
+            total_filtered,
+            use_cache=use_cache,
+            stream=stream,
+            j=Job,
+        )
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor)
 
+    @cached_query(timeout=600, workflow=None)
     def get_job(self, job_id, use_cache=True):
         """
         Returns a Job object identified by job_id.
@@ -756,6 +1275,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
 
     # Host
 
+    @cached_query()
     def get_workflow_hosts(
         self,
         wf_id,
@@ -763,6 +1283,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         max_results=None,
         query=None,
         order=None,
+        cursor=None,
+        count=True,
+        stream=False,
         use_cache=True,
         **kwargs
     ):
@@ -774,6 +1297,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         :param max_results: Return a maximum of `max_results` records
         :param query: Filtering criteria
         :param order: Sorting criteria
+        :param cursor: Return results following the record `cursor` points to
+        :param count: Count the total, and filtered records
+        :param stream: Return an iterator over the records, read as they are needed
         :param use_cache: If available, use cached results
 
         :return: hosts collection, total jobs count, filtered jobs count
@@ -786,7 +1312,10 @@ class StampedeWorkflowQueries(WorkflowQueries):
         q = self.session.query(Host)
         q = q.filter(Host.wf_id == wf_id)
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        position = cursor_decode(cursor, query, order) if cursor else None
+        total_records = total_filtered = self._get_total(
+            q, count, position, use_cache=use_cache
+        )
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -796,27 +1325,36 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, h=Host)
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_total(
+                q, count, position, filtered=True, use_cache=use_cache
+            )
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (
+                start_index and total_filtered and start_index >= total_filtered
+            ):
                 log.debug("total_filtered is 0 or start_index >= total_filtered")
                 return PagedResponse([], total_records, total_filtered)
 
         #
-        # Construct SQLAlchemy Query `q` to sort
-        #
-        if order:
-            q = self._add_ordering(q, order, h=Host)
-
-        #
-        # Construct SQLAlchemy Query `q` to paginate.
-        #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
-
-        records = self._get_all(q, use_cache)
+        # Construct SQLAlchemy Query `q` to sort, and paginate.
+        #
+        records, next_cursor = self._get_page(
+            q,
+            start_index,
+            max_results,
+            query,
+            order,
+            position,
+            total_records,
+            total_filtered,
+            use_cache=use_cache,
+            stream=stream,
+            h=Host,
+        )
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor)
 
+    @cached_query(workflow=None)
     def get_host(self, host_id, use_cache=True):
         """
         Returns a Host object identified by host_id.
@@ -839,6 +1377,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
 
     # Job State
 
+    @cached_query()
     def get_job_instance_states(
         self,
         wf_id,
@@ -848,6 +1387,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         max_results=None,
         query=None,
         order=None,
+        cursor=None,
+        count=True,
+        stream=False,
         use_cache=True,
         **kwargs
     ):
@@ -861,6 +1403,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         :param max_results: Return a maximum of `max_results` records
         :param query: Filtering criteria
         :param order: Sorting criteria
+        :param cursor: Return results following the record `cursor` points to
+        :param count: Count the total, and filtered records
+        :param stream: Return an iterator over the records, read as they are needed
         :param use_cache: If available, use cached results
 
         :return: state record
@@ -877,7 +1422,10 @@ class StampedeWorkflowQueries(WorkflowQueries):
         q = q.filter(JobInstance.job_instance_id == job_instance_id)
         q = q.filter(Jobstate.job_instance_id == job_instance_id)
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        position = cursor_decode(cursor, query, order) if cursor else None
+        total_records = total_filtered = self._get_total(
+            q, count, position, use_cache=use_cache
+        )
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -887,26 +1435,34 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, js=Jobstate)
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_total(
+                q, count, position, filtered=True, use_cache=use_cache
+            )
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (
+                start_index and total_filtered and start_index >= total_filtered
+            ):
                 log.debug("total_filtered is 0 or start_index >= total_filtered")
                 return PagedResponse([], total_records, total_filtered)
 
         #
-        # Construct SQLAlchemy Query `q` to sort
-        #
-        if order:
-            q = self._add_ordering(q, order, js=Jobstate)
-
-        #
-        # Construct SQLAlchemy Query `q` to paginate.
-        #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
-
-        records = self._get_all(q, use_cache)
+        # Construct SQLAlchemy Query `q` to sort, and paginate.
+        #
+        records, next_cursor = self._get_page(
+            q,
+            start_index,
+            max_results,
+            query,
+            order,
+            position,
+            total_records,
+            total_filtered,
+            use_cache=use_cache,
+            stream=stream,
+            js=Jobstate,
+        )
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor)
 
     def _get_recent_job_state(self, job_instance_id=None, js=Jobstate):
         q = self.session.query(js.job_instance_id)
@@ -922,6 +1478,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
 
     # Task
 
+    @cached_query()
     def get_workflow_tasks(
         self,
         wf_id,
@@ -929,6 +1486,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         max_results=None,
         query=None,
         order=None,
+        cursor=None,
+        count=True,
+        stream=False,
         use_cache=True,
         **kwargs
     ):
@@ -940,6 +1500,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         :param max_results: Return a maximum of `max_results` records
         :param query: Filtering criteria
         :param order: Sorting criteria
+        :param cursor: Return results following the record `cursor` points to
+        :param count: Count the total, and filtered records
+        :param stream: Return an iterator over the records, read as they are needed
         :param use_cache: If available, use cached results
 
         :return: Collection of Task objects
@@ -952,7 +1515,10 @@ class StampedeWorkflowQueries(WorkflowQueries):
         q = self.session.query(Task)
         q = q.filter(Task.wf_id == wf_id)
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        position = cursor_decode(cursor, query, order) if cursor else None
+        total_records = total_filtered = self._get_total(
+            q, count, position, use_cache=use_cache
+        )
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -962,27 +1528,36 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, t=Task)
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_total(
+                q, count, position, filtered=True, use_cache=use_cache
+            )
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (
+                start_index and total_filtered and start_index >= total_filtered
+            ):
                 log.debug("total_filtered is 0 or start_index >= total_filtered")
                 return PagedResponse([], total_records, total_filtered)
 
         #
-        # Construct SQLAlchemy Query `q` to sort
-        #
-        if order:
-            q = self._add_ordering(q, order, t=Task)
-
-        #
-        # Construct SQLAlchemy Query `q` to paginate.
-        #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
-
-        records = self._get_all(q, use_cache)
+        # Construct SQLAlchemy Query `q` to sort, and paginate.
+        #
+        records, next_cursor = self._get_page(
+            q,
+            start_index,
+            max_results,
+            query,
+            order,
+            position,
+            total_records,
+            total_filtered,
+            use_cache=use_cache,
+            stream=stream,
+            t=Task,
+        )
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor)
 
+    @cached_query()
     def get_job_tasks(
         self,
         wf_id,
@@ -991,6 +1566,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         max_results=None,
         query=None,
         order=None,
+        cursor=None,
+        count=True,
+        stream=False,
         use_cache=True,
         **kwargs
     ):
@@ -1002,6 +1580,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         :param max_results: Return a maximum of `max_results` records
         :param query: Filtering criteria
         :param order: Sorting criteria
+        :param cursor: Return results following the record `cursor` points to
+        :param count: Count the total, and filtered records
+        :param stream: Return an iterator over the records, read as they are needed
         :param use_cache: If available, use cached results
 
         :return: Collection of Task objects
@@ -1013,7 +1594,10 @@ class StampedeWorkflowQueries(WorkflowQueries):
         q = q.filter(Task.wf_id == wf_id)
         q = q.filter(Task.job_id == job_id)
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        position = cursor_decode(cursor, query, order) if cursor else None
+        total_records = total_filtered = self._get_total(
+            q, count, position, use_cache=use_cache
+        )
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -1023,27 +1607,36 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, t=Task)
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_total(
+                q, count, position, filtered=True, use_cache=use_cache
+            )
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (
+                start_index and total_filtered and start_index >= total_filtered
+            ):
                 log.debug("total_filtered is 0 or start_index >= total_filtered")
                 return PagedResponse([], total_records, total_filtered)
 
         #
-        # Construct SQLAlchemy Query `q` to sort
-        #
-        if order:
-            q = self._add_ordering(q, order, t=Task)
-
-        #
-        # Construct SQLAlchemy Query `q` to paginate.
-        #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
-
-        records = self._get_all(q, use_cache)
+        # Construct SQLAlchemy Query `q` to sort, and paginate.
+        #
+        records, next_cursor = self._get_page(
+            q,
+            start_index,
+            max_results,
+            query,
+            order,
+            position,
+            total_records,
+            total_filtered,
+            use_cache=use_cache,
+            stream=stream,
+            t=Task,
+        )
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor)
 
+    @cached_query(workflow=None)
     def get_task(self, task_id, use_cache=True):
         """
         Returns a Task object identified by task_id.
@@ -1067,6 +1660,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
 
     # Task Meta
 
+    @cached_query(workflow=None)
     def get_task_meta(
         self,
         task_id,
@@ -1074,6 +1668,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         max_results=None,
         query=None,
         order=None,
+        cursor=None,
+        count=True,
+        stream=False,
         use_cache=False,
         **kwargs
     ):
@@ -1085,6 +1682,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         :param max_results: Return a maximum of `max_results` records
         :param query: Filtering criteria
         :param order: Sorting criteria
+        :param cursor: Return results following the record `cursor` points to
+        :param count: Count the total, and filtered records
+        :param stream: Return an iterator over the records, read as they are needed
         :param use_cache: If available, use cached results
 
         :return: Workflow Meta collection, total records count, total filtered records count
@@ -1094,7 +1694,10 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         q = self.session.query(TaskMeta)
         q = q.filter(TaskMeta.task_id == task_id)
-        total_records = total_filtered = self._get_count(q, use_cache)
+        position = cursor_decode(cursor, query, order) if cursor else None
+        total_records = total_filtered = self._get_total(
+            q, count, position, use_cache=use_cache
+        )
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -1104,29 +1707,38 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, tm=TaskMeta)
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_total(
+                q, count, position, filtered=True, use_cache=use_cache
+            )
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (
+                start_index and total_filtered and start_index >= total_filtered
+            ):
                 log.debug("total_filtered is 0 or start_index >= total_filtered")
                 return PagedResponse([], total_records, total_filtered)
 
         #
-        # Construct SQLAlchemy Query `q` to sort
-        #
-        if order:
-            q = self._add_ordering(q, order, tm=TaskMeta)
-
-        #
-        # Construct SQLAlchemy Query `q` to paginate.
-        #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
-
-        records = self._get_all(q, use_cache)
+        # Construct SQLAlchemy Query `q` to sort, and paginate.
+        #
+        records, next_cursor = self._get_page(
+            q,
+            start_index,
+            max_results,
+            query,
+            order,
+            position,
+            total_records,
+            total_filtered,
+            use_cache=use_cache,
+            stream=stream,
+            tm=TaskMeta,
+        )
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor)
 
     # Job Instance
 
+    @cached_query()
     def get_job_instances(
         self,
         wf_id,
@@ -1136,6 +1748,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         max_results=None,
         query=None,
         order=None,
+        cursor=None,
+        count=True,
+        stream=False,
         use_cache=True,
         **kwargs
     ):
@@ -1149,6 +1764,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         :param max_results: Return a maximum of `max_results` records
         :param query: Filtering criteria
         :param order: Sorting criteria
+        :param cursor: Return results following the record `cursor` points to
+        :param count: Count the total, and filtered records
+        :param stream: Return an iterator over the records, read as they are needed
         :param use_cache: If available, use cached results
 
         :return: job-instance collection, total jobs count, filtered jobs count
@@ -1162,7 +1780,10 @@ class StampedeWorkflowQueries(WorkflowQueries):
         q = q.filter(Job.wf_id == wf_id)
         q = q.filter(Job.job_id == job_id)
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        position = cursor_decode(cursor, query, order) if cursor else None
+        total_records = total_filtered = self._get_total(
+            q, count, position, use_cache=use_cache
+        )
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -1183,27 +1804,36 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query or recent:
             q = self._evaluate_query(q, query, ji=JobInstance)
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_total(
+                q, count, position, filtered=True, use_cache=use_cache
+            )
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (
+                start_index and total_filtered and start_index >= total_filtered
+            ):
                 log.debug("total_filtered is 0 or start_index >= total_filtered")
                 return PagedResponse([], total_records, total_filtered)
 
         #
-        # Construct SQLAlchemy Query `q` to sort
-        #
-        if order:
-            q = self._add_ordering(q, order, ji=JobInstance)
-
-        #
-        # Construct SQLAlchemy Query `q` to paginate.
-        #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
-
-        records = self._get_all(q, use_cache)
+        # Construct SQLAlchemy Query `q` to sort, and paginate.
+        #
+        records, next_cursor = self._get_page(
+            q,
+            start_index,
+            max_results,
+            query,
+            order,
+            position,
+            total_records,
+            total_filtered,
+            use_cache=use_cache,
+            stream=stream,
+            ji=JobInstance,
+        )
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor)
 
+    @cached_query(timeout=_job_instance_timeout, workflow=None)
     def get_job_instance(self, job_instance_id, use_cache=True, timeout=5):
         """
         Returns a JobInstance object identified by job_instance_id.
@@ -1215,9 +1845,6 @@ class StampedeWorkflowQueries(WorkflowQueries):
         :return: job-instance record
         """
 
-        def timeout_duration(ji):
-            return 300 if ji and ji.exitcode is not None else timeout
-
         if job_instance_id is None:
             raise ValueError("job_instance_id cannot be None")
 
@@ -1225,7 +1852,11 @@ class StampedeWorkflowQueries(WorkflowQueries):
         q = q.filter(JobInstance.job_instance_id == job_instance_id)
 
         try:
-            return self._get_one(q, use_cache, timeout=timeout_duration)
+            return self._get_one(
+                q,
+                use_cache,
+                timeout=functools.partial(_job_instance_timeout, timeout=timeout),
+            )
         except NoResultFound as e:
             raise e
 
@@ -1243,6 +1874,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
 
     # Invocation
 
+    @cached_query()
     def get_workflow_invocations(
         self,
         wf_id,
@@ -1250,6 +1882,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         max_results=None,
         query=None,
         order=None,
+        cursor=None,
+        count=True,
+        stream=False,
         use_cache=True,
         **kwargs
     ):
@@ -1261,6 +1896,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         :param max_results: Return a maximum of `max_results` records
         :param query: Filtering criteria
         :param order: Sorting criteria
+        :param cursor: Return results following the record `cursor` points to
+        :param count: Count the total, and filtered records
+        :param stream: Return an iterator over the records, read as they are needed
         :param use_cache: If available, use cached results
 
         :return: invocations record
@@ -1273,7 +1911,10 @@ class StampedeWorkflowQueries(WorkflowQueries):
         q = self.session.query(Invocation)
         q = q.filter(Invocation.wf_id == wf_id)
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        position = cursor_decode(cursor, query, order) if cursor else None
+        total_records = total_filtered = self._get_total(
+            q, count, position, use_cache=use_cache
+        )
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -1283,27 +1924,36 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, i=Invocation)
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_total(
+                q, count, position, filtered=True, use_cache=use_cache
+            )
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (
+                start_index and total_filtered and start_index >= total_filtered
+            ):
                 log.debug("total_filtered is 0 or start_index >= total_filtered")
                 return PagedResponse([], total_records, total_filtered)
 
         #
-        # Construct SQLAlchemy Query `q` to sort
-        #
-        if order:
-            q = self._add_ordering(q, order, i=Invocation)
-
-        #
-        # Construct SQLAlchemy Query `q` to paginate.
-        #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
-
-        records = self._get_all(q, use_cache)
+        # Construct SQLAlchemy Query `q` to sort, and paginate.
+        #
+        records, next_cursor = self._get_page(
+            q,
+            start_index,
+            max_results,
+            query,
+            order,
+            position,
+            total_records,
+            total_filtered,
+            use_cache=use_cache,
+            stream=stream,
+            i=Invocation,
+        )
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor)
 
+    @cached_query()
     def get_job_instance_invocations(
         self,
         wf_id,
@@ -1313,6 +1963,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         max_results=None,
         query=None,
         order=None,
+        cursor=None,
+        count=True,
+        stream=False,
         use_cache=True,
         **kwargs
     ):
@@ -1326,6 +1979,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         :param max_results: Return a maximum of `max_results` records
         :param query: Filtering criteria
         :param order: Sorting criteria
+        :param cursor: Return results following the record `cursor` points to
+        :param count: Count the total, and filtered records
+        :param stream: Return an iterator over the records, read as they are needed
         :param use_cache: If available, use cached results
 
         :return: invocations record
@@ -1339,7 +1995,10 @@ class StampedeWorkflowQueries(WorkflowQueries):
         q = q.filter(Invocation.wf_id == wf_id)
         q = q.filter(Invocation.job_instance_id == job_instance_id)
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        position = cursor_decode(cursor, query, order) if cursor else None
+        total_records = total_filtered = self._get_total(
+            q, count, position, use_cache=use_cache
+        )
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -1349,27 +2008,36 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, i=Invocation)
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_total(
+                q, count, position, filtered=True, use_cache=use_cache
+            )
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (
+                start_index and total_filtered and start_index >= total_filtered
+            ):
                 log.debug("total_filtered is 0 or start_index >= total_filtered")
                 return PagedResponse([], total_records, total_filtered)
 
         #
-        # Construct SQLAlchemy Query `q` to sort
-        #
-        if order:
-            q = self._add_ordering(q, order, i=Invocation)
-
-        #
-        # Construct SQLAlchemy Query `q` to paginate.
-        #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
-
-        records = self._get_all(q, use_cache)
+        # Construct SQLAlchemy Query `q` to sort, and paginate.
+        #
+        records, next_cursor = self._get_page(
+            q,
+            start_index,
+            max_results,
+            query,
+            order,
+            position,
+            total_records,
+            total_filtered,
+            use_cache=use_cache,
+            stream=stream,
+            i=Invocation,
+        )
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor)
 
+    @cached_query(workflow=None)
     def get_invocation(self, invocation_id, use_cache=True):
         """
         Returns a Invocation object identified by invocation_id.
@@ -1392,6 +2060,7 @@ class StampedeWorkflowQueries(WorkflowQueries):
 
     # Views
 
+    @cached_query()
     def get_running_jobs(
         self,
         wf_id,
@@ -1399,6 +2068,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         max_results=None,
         query=None,
         order=None,
+        cursor=None,
+        count=True,
+        stream=False,
         use_cache=True,
         **kwargs
     ):
@@ -1410,6 +2082,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         :param max_results: Return a maximum of `max_results` records
         :param query: Filtering criteria
         :param order: Sorting criteria
+        :param cursor: Return results following the record `cursor` points to
+        :param count: Count the total, and filtered records
+        :param stream: Return an iterator over the records, read as they are needed
         :param use_cache: If available, use cached results
 
         :return: Jobs collection, total jobs count, filtered jobs count
@@ -1440,7 +2115,10 @@ class StampedeWorkflowQueries(WorkflowQueries):
             ),
         )
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        position = cursor_decode(cursor, query, order) if cursor else None
+        total_records = total_filtered = self._get_total(
+            q, count, position, use_cache=use_cache
+        )
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -1450,28 +2128,38 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, j=Job, ji=JobInstance)
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_total(
+                q, count, position, filtered=True, use_cache=use_cache
+            )
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (
+                start_index and total_filtered and start_index >= total_filtered
+            ):
                 log.debug("total_filtered is 0 or start_index >= total_filtered")
                 return PagedResponse([], total_records, total_filtered)
 
         #
-        # Construct SQLAlchemy Query `q` to sort
-        #
-        if order:
-            q = self._add_ordering(q, order, j=Job, ji=JobInstance)
-
-        #
-        # Construct SQLAlchemy Query `q` to paginate.
-        #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
-
-        records = self._get_all(q, use_cache)
+        # Construct SQLAlchemy Query `q` to sort, and paginate.
+        #
+        records, next_cursor = self._get_page(
+            q,
+            start_index,
+            max_results,
+            query,
+            order,
+            position,
+            total_records,
+            total_filtered,
+            use_cache=use_cache,
+            stream=stream,
+            j=Job,
+            ji=JobInstance,
+        )
         records = self._merge_job_instance(records)
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor)
 
+    @cached_query()
     def get_successful_jobs(
         self,
         wf_id,
@@ -1479,6 +2167,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         max_results=None,
         query=None,
         order=None,
+        cursor=None,
+        count=True,
+        stream=False,
         use_cache=True,
         **kwargs
     ):
@@ -1490,6 +2181,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         :param max_results: Return a maximum of `max_results` records
         :param query: Filtering criteria
         :param order: Sorting criteria
+        :param cursor: Return results following the record `cursor` points to
+        :param count: Count the total, and filtered records
+        :param stream: Return an iterator over the records, read as they are needed
         :param use_cache: If available, use cached results
 
         :return: Jobs collection, total jobs count, filtered jobs count
@@ -1524,7 +2218,10 @@ class StampedeWorkflowQueries(WorkflowQueries):
             ),
         )
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        position = cursor_decode(cursor, query, order) if cursor else None
+        total_records = total_filtered = self._get_total(
+            q, count, position, use_cache=use_cache
+        )
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -1534,28 +2231,38 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, j=Job, ji=JobInstance)
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_total(
+                q, count, position, filtered=True, use_cache=use_cache
+            )
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (
+                start_index and total_filtered and start_index >= total_filtered
+            ):
                 log.debug("total_filtered is 0 or start_index >= total_filtered")
                 return PagedResponse([], total_records, total_filtered)
 
         #
-        # Construct SQLAlchemy Query `q` to sort
-        #
-        if order:
-            q = self._add_ordering(q, order, j=Job, ji=JobInstance)
-
-        #
-        # Construct SQLAlchemy Query `q` to paginate.
-        #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
-
-        records = self._get_all(q, use_cache)
+        # Construct SQLAlchemy Query `q` to sort, and paginate.
+        #
+        records, next_cursor = self._get_page(
+            q,
+            start_index,
+            max_results,
+            query,
+            order,
+            position,
+            total_records,
+            total_filtered,
+            use_cache=use_cache,
+            stream=stream,
+            j=Job,
+            ji=JobInstance,
+        )
         records = self._merge_job_instance(records)
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor)
 
+    @cached_query()
     def get_failed_jobs(
         self,
         wf_id,
@@ -1563,6 +2270,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         max_results=None,
         query=None,
         order=None,
+        cursor=None,
+        count=True,
+        stream=False,
         use_cache=True,
         **kwargs
     ):
@@ -1574,6 +2284,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         :param max_results: Return a maximum of `max_results` records
         :param query: Filtering criteria
         :param order: Sorting criteria
+        :param cursor: Return results following the record `cursor` points to
+        :param count: Count the total, and filtered records
+        :param stream: Return an iterator over the records, read as they are needed
         :param use_cache: If available, use cached results
 
         :return: Jobs collection, total jobs count, filtered jobs count
@@ -1608,7 +2321,10 @@ class StampedeWorkflowQueries(WorkflowQueries):
             ),
         )
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        position = cursor_decode(cursor, query, order) if cursor else None
+        total_records = total_filtered = self._get_total(
+            q, count, position, use_cache=use_cache
+        )
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -1618,28 +2334,38 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, j=Job, ji=JobInstance)
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_total(
+                q, count, position, filtered=True, use_cache=use_cache
+            )
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (
+                start_index and total_filtered and start_index >= total_filtered
+            ):
                 log.debug("total_filtered is 0 or start_index >= total_filtered")
                 return PagedResponse([], total_records, total_filtered)
 
         #
-        # Construct SQLAlchemy Query `q` to sort
-        #
-        if order:
-            q = self._add_ordering(q, order, j=Job, ji=JobInstance)
-
-        #
-        # Construct SQLAlchemy Query `q` to paginate.
-        #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
-
-        records = self._get_all(q, use_cache)
+        # Construct SQLAlchemy Query `q` to sort, and paginate.
+        #
+        records, next_cursor = self._get_page(
+            q,
+            start_index,
+            max_results,
+            query,
+            order,
+            position,
+            total_records,
+            total_filtered,
+            use_cache=use_cache,
+            stream=stream,
+            j=Job,
+            ji=JobInstance,
+        )
         records = self._merge_job_instance(records)
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor)
 
+    @cached_query()
     def get_failing_jobs(
         self,
         wf_id,
@@ -1647,6 +2373,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         max_results=None,
         query=None,
         order=None,
+        cursor=None,
+        count=True,
+        stream=False,
         use_cache=True,
         **kwargs
     ):
@@ -1658,6 +2387,9 @@ class StampedeWorkflowQueries(WorkflowQueries):
         :param max_results: Return a maximum of `max_results` records
         :param query: Filtering criteria
         :param order: Sorting criteria
+        :param cursor: Return results following the record `cursor` points to
+        :param count: Count the total, and filtered records
+        :param stream: Return an iterator over the records, read as they are needed
         :param use_cache: If available, use cached results
 
         :return: Jobs collection, total jobs count, filtered jobs count
@@ -1709,7 +2441,10 @@ class StampedeWorkflowQueries(WorkflowQueries):
             )
         )
 
-        total_records = total_filtered = self._get_count(q, use_cache)
+        position = cursor_decode(cursor, query, order) if cursor else None
+        total_records = total_filtered = self._get_total(
+            q, count, position, use_cache=use_cache
+        )
 
         if total_records == 0:
             return PagedResponse([], 0, 0)
@@ -1719,35 +2454,43 @@ class StampedeWorkflowQueries(WorkflowQueries):
         #
         if query:
             q = self._evaluate_query(q, query, j=Job, ji=JobInstance)
-            total_filtered = self._get_count(q, use_cache)
+            total_filtered = self._get_total(
+                q, count, position, filtered=True, use_cache=use_cache
+            )
 
-            if total_filtered == 0 or (start_index and start_index >= total_filtered):
+            if total_filtered == 0 or (
+                start_index and total_filtered and start_index >= total_filtered
+            ):
                 log.debug("total_filtered is 0 or start_index >= total_filtered")
                 return PagedResponse([], total_records, total_filtered)
 
         #
-        # Construct SQLAlchemy Query `q` to sort
-        #
-        if order:
-            q = self._add_ordering(q, order, j=Job, ji=JobInstance)
-
-        #
-        # Construct SQLAlchemy Query `q` to paginate.
-        #
-        q = WorkflowQueries._add_pagination(q, start_index, max_results, total_filtered)
-
-        records = self._get_all(q, use_cache)
+        # Construct SQLAlchemy Query `q` to sort, and paginate.
+        #
+        records, next_cursor = self._get_page(
+            q,
+            start_index,
+            max_results,
+            query,
+            order,
+            position,
+            total_records,
+            total_filtered,
+            use_cache=use_cache,
+            stream=stream,
+            j=Job,
+            ji=JobInstance,
+        )
         records = self._merge_job_instance(records)
 
-        return PagedResponse(records, total_records, total_filtered)
+        return PagedResponse(records, total_records, total_filtered, next_cursor)
 
     @staticmethod
     def _merge_job_instance(records):
-        if records:
-            for i in range(len(records)):
-                new_record = records[i][0]
-                new_record.job_instance = records[i][1]
-                new_record.__includes__ = ("job_instance",)
-                records[i] = new_record
-
-        return records
+        def merge(record):
+            new_record = record[0]
+            new_record.job_instance = record[1]
+            new_record.__includes__ = ("job_instance",)
+            return new_record
+
+        return WorkflowQueries._map_records(records, merge)
@@ -4,7 +4,7 @@ import logging
 from flask import g, make_response, request
 
 from Pegasus.service import cache
-from Pegasus.service._serialize import jsonify
+from Pegasus.service._serialize import jsonify, ndjson_requested
 from Pegasus.service.base import OrderedDict
 from Pegasus.service.monitoring import monitoring as blueprint
 from Pegasus.service.monitoring.queries import (
@@ -130,6 +130,9 @@ def get_query_args():
             ("max-results", to_int),
             ("query", to_str),
             ("order", to_str),
+            ("cursor", to_str),
+            ("count", to_bool),
+            ("stream", to_bool),
         ]
     )
 
@@ -137,6 +140,9 @@ def get_query_args():
         if arg in request.args:
             g.query_args[arg.replace("-", "_")] = cast(arg, request.args.get(arg))
 
+    if "stream" not in g.query_args and ndjson_requested():
+        g.query_args["stream"] = True
+
 
 """
 Root Workflow
@@ -172,6 +178,9 @@ def get_root_workflows(username):
     :query int max-results: Return a maximum of <max-results> records
     :query string query: Search criteria
     :query string order: Sorting criteria
+    :query string cursor: Return results following the record <cursor> points to
+    :query boolean count: Count the total, and filtered records (default true)
+    :query boolean stream: Stream the records as they are read from the database
     :query boolean pretty-print: Return formatted JSON response.
 
     :statuscode 200: OK
@@ -195,7 +204,7 @@ def get_root_workflows(username):
     #
     response_json = jsonify(paged_response)
 
-    return make_response(response_json, 200, JSON_HEADER)
+    return make_response(response_json, 200)
 
 
 @blueprint.route("/root/<string:m_wf_id>")
@@ -264,6 +273,9 @@ def get_workflows(username, m_wf_id):
     :query int max-results: Return a maximum of <max-results> records
     :query string query: Search criteria
     :query string order: Sorting criteria
+    :query string cursor: Return results following the record <cursor> points to
+    :query boolean count: Count the total, and filtered records (default true)
+    :query boolean stream: Stream the records as they are read from the database
     :query boolean pretty-print: Return formatted JSON response
 
     :statuscode 200: OK
@@ -288,7 +300,7 @@ def get_workflows(username, m_wf_id):
     #
     response_json = jsonify(paged_response)
 
-    return make_response(response_json, 200, JSON_HEADER)
+    return make_response(response_json, 200)
 
 
 @blueprint.route("/root/<string:m_wf_id>/workflow/<string:wf_id>")
@@ -340,6 +352,9 @@ def get_workflow_meta(username, m_wf_id, wf_id):
     :query int max-results: Return a maximum of <max-results> records
     :query string query: Search criteria
     :query string order: Sorting criteria
+    :query string cursor: Return results following the record <cursor> points to
+    :query boolean count: Count the total, and filtered records (default true)
+    :query boolean stream: Stream the records as they are read from the database
     :query boolean pretty-print: Return formatted JSON response
 
     :statuscode 200: OK
@@ -364,7 +379,7 @@ def get_workflow_meta(username, m_wf_id, wf_id):
     #
     response_json = jsonify(paged_response)
 
-    return make_response(response_json, 200, JSON_HEADER)
+    return make_response(response_json, 200)
 
 
 """
@@ -404,6 +419,9 @@ def get_workflow_files(username, m_wf_id, wf_id):
     :query int max-results: Return a maximum of <max-results> records
     :query string query: Search criteria
     :query string order: Sorting criteria
+    :query string cursor: Return results following the record <cursor> points to
+    :query boolean count: Count the total, and filtered records (default true)
+    :query boolean stream: Stream the records as they are read from the database
     :query boolean pretty-print: Return formatted JSON response
 
     :statuscode 200: OK
@@ -428,7 +446,7 @@ def get_workflow_files(username, m_wf_id, wf_id):
     #
     response_json = jsonify(paged_response)
 
-    return make_response(response_json, 200, JSON_HEADER)
+    return make_response(response_json, 200)
 
 
 """
@@ -456,6 +474,9 @@ def get_workflow_state(username, m_wf_id, wf_id):
     :query int max-results: Return a maximum of <max-results> records
     :query string query: Search criteria
     :query string order: Sorting criteria
+    :query string cursor: Return results following the record <cursor> points to
+    :query boolean count: Count the total, and filtered records (default true)
+    :query boolean stream: Stream the records as they are read from the database
     :query boolean pretty-print: Return formatted JSON response
 
     :statuscode 200: OK
@@ -480,7 +501,7 @@ def get_workflow_state(username, m_wf_id, wf_id):
     #
     response_json = jsonify(paged_response)
 
-    return make_response(response_json, 200, JSON_HEADER)
+    return make_response(response_json, 200)
 
 
 """
@@ -515,6 +536,9 @@ def get_workflow_jobs(username, m_wf_id, wf_id):
     :query int max-results: Return a maximum of <max-results> records
     :query string query: Search criteria
     :query string order: Sorting criteria
+    :query string cursor: Return results following the record <cursor> points to
+    :query boolean count: Count the total, and filtered records (default true)
+    :query boolean stream: Stream the records as they are read from the database
     :query boolean pretty-print: Return formatted JSON response
 
     :statuscode 200: OK
@@ -539,7 +563,7 @@ def get_workflow_jobs(username, m_wf_id, wf_id):
     #
     response_json = jsonify(paged_response)
 
-    return make_response(response_json, 200, JSON_HEADER)
+    return make_response(response_json, 200)
 
 
 @blueprint.route("/root/<string:m_wf_id>/workflow/<string:wf_id>/job/<int:job_id>")
@@ -595,6 +619,9 @@ def get_workflow_hosts(username, m_wf_id, wf_id):
     :query int max-results: Return a maximum of <max-results> records
     :query string query: Search criteria
     :query string order: Sorting criteria
+    :query string cursor: Return results following the record <cursor> points to
+    :query boolean count: Count the total, and filtered records (default true)
+    :query boolean stream: Stream the records as they are read from the database
     :query boolean pretty-print: Return formatted JSON response
 
     :statuscode 200: OK
@@ -619,7 +646,7 @@ def get_workflow_hosts(username, m_wf_id, wf_id):
     #
     response_json = jsonify(paged_response)
 
-    return make_response(response_json, 200, JSON_HEADER)
+    return make_response(response_json, 200)
 
 
 @blueprint.route("/root/<string:m_wf_id>/workflow/<string:wf_id>/host/<int:host_id>")
@@ -675,6 +702,9 @@ def get_job_instance_states(username, m_wf_id, wf_id, job_id, job_instance_id):
     :query int max-results: Return a maximum of <max-results> records
     :query string query: Search criteria
     :query string order: Sorting criteria
+    :query string cursor: Return results following the record <cursor> points to
+    :query boolean count: Count the total, and filtered records (default true)
+    :query boolean stream: Stream the records as they are read from the database
     :query boolean pretty-print: Return formatted JSON response
 
     :statuscode 200: OK
@@ -701,7 +731,7 @@ def get_job_instance_states(username, m_wf_id, wf_id, job_id, job_instance_id):
     #
     response_json = jsonify(paged_response)
 
-    return make_response(response_json, 200, JSON_HEADER)
+    return make_response(response_json, 200)
 
 
 """
@@ -732,6 +762,9 @@ def get_workflow_tasks(username, m_wf_id, wf_id):
     :query int max-results: Return a maximum of <max-results> records
     :query string query: Search criteria
     :query string order: Sorting criteria
+    :query string cursor: Return results following the record <cursor> points to
+    :query boolean count: Count the total, and filtered records (default true)
+    :query boolean stream: Stream the records as they are read from the database
     :query boolean pretty-print: Return formatted JSON response
 
     :statuscode 200: OK
@@ -756,7 +789,7 @@ def get_workflow_tasks(username, m_wf_id, wf_id):
     #
     response_json = jsonify(paged_response)
 
-    return make_response(response_json, 200, JSON_HEADER)
+    return make_response(response_json, 200)
 
 
 @blueprint.route("/root/<string:m_wf_id>/workflow/<string:wf_id>/job/<int:job_id>/task")
@@ -768,6 +801,9 @@ def get_job_tasks(username, m_wf_id, wf_id, job_id):
     :query int max-results: Return a maximum of <max-results> records
     :query string query: Search criteria
     :query string order: Sorting criteria
+    :query string cursor: Return results following the record <cursor> points to
+    :query boolean count: Count the total, and filtered records (default true)
+    :query boolean stream: Stream the records as they are read from the database
     :query boolean pretty-print: Return formatted JSON response
 
     :statuscode 200: OK
@@ -792,7 +828,7 @@ def get_job_tasks(username, m_wf_id, wf_id, job_id):
     #
     response_json = jsonify(paged_response)
 
-    return make_response(response_json, 200, JSON_HEADER)
+    return make_response(response_json, 200)
 
 
 @blueprint.route("/root/<string:m_wf_id>/workflow/<string:wf_id>/task/<int:task_id>")
@@ -846,6 +882,9 @@ def get_task_meta(username, m_wf_id, wf_id, task_id):
     :query int max-results: Return a maximum of <max-results> records
     :query string query: Search criteria
     :query string order: Sorting criteria
+    :query string cursor: Return results following the record <cursor> points to
+    :query boolean count: Count the total, and filtered records (default true)
+    :query boolean stream: Stream the records as they are read from the database
     :query boolean pretty-print: Return formatted JSON response
 
     :statuscode 200: OK
@@ -870,7 +909,7 @@ def get_task_meta(username, m_wf_id, wf_id, task_id):
     #
     response_json = jsonify(paged_response)
 
-    return make_response(response_json, 200, JSON_HEADER)
+    return make_response(response_json, 200)
 
 
 """
@@ -916,6 +955,9 @@ def get_job_instances(username, m_wf_id, wf_id, job_id):
     :query int max-results: Return a maximum of <max-results> records
     :query string query: Search criteria
     :query string order: Sorting criteria
+    :query string cursor: Return results following the record <cursor> points to
+    :query boolean count: Count the total, and filtered records (default true)
+    :query boolean stream: Stream the records as they are read from the database
     :query boolean pretty-print: Return formatted JSON response
 
     :statuscode 200: OK
@@ -945,7 +987,7 @@ def get_job_instances(username, m_wf_id, wf_id, job_id):
     #
     response_json = jsonify(paged_response)
 
-    return make_response(response_json, 200, JSON_HEADER)
+    return make_response(response_json, 200)
 
 
 @blueprint.route(
@@ -1009,6 +1051,9 @@ def get_workflow_invocations(username, m_wf_id, wf_id):
     :query int max-results: Return a maximum of <max-results> records
     :query string query: Search criteria
     :query string order: Sorting criteria
+    :query string cursor: Return results following the record <cursor> points to
+    :query boolean count: Count the total, and filtered records (default true)
+    :query boolean stream: Stream the records as they are read from the database
     :query boolean pretty-print: Return formatted JSON response
 
     :statuscode 200: OK
@@ -1033,7 +1078,7 @@ def get_workflow_invocations(username, m_wf_id, wf_id):
     #
     response_json = jsonify(paged_response)
 
-    return make_response(response_json, 200, JSON_HEADER)
+    return make_response(response_json, 200)
 
 
 @blueprint.route(
@@ -1055,7 +1100,7 @@ def get_job_instance_invocations(username, m_wf_id, wf_id, job_id, job_instance_
     #
     response_json = jsonify(paged_response)
 
-    return make_response(response_json, 200, JSON_HEADER)
+    return make_response(response_json, 200)
 
 
 @blueprint.route(
@@ -1101,6 +1146,9 @@ def get_running_jobs(username, m_wf_id, wf_id):
     :query int max-results: Return a maximum of <max-results> records
     :query string query: Search criteria
     :query string order: Sorting criteria
+    :query string cursor: Return results following the record <cursor> points to
+    :query boolean count: Count the total, and filtered records (default true)
+    :query boolean stream: Stream the records as they are read from the database
     :query boolean pretty-print: Return formatted JSON response
 
     :statuscode 200: OK
@@ -1125,7 +1173,7 @@ def get_running_jobs(username, m_wf_id, wf_id):
     #
     response_json = jsonify(paged_response)
 
-    return make_response(response_json, 200, JSON_HEADER)
+    return make_response(response_json, 200)
 
 
 @blueprint.route("/root/<string:m_wf_id>/workflow/<string:wf_id>/job/successful")
@@ -1137,6 +1185,9 @@ def get_successful_jobs(username, m_wf_id, wf_id):
     :query int max-results: Return a maximum of <max-results> records
     :query string query: Search criteria
     :query string order: Sorting criteria
+    :query string cursor: Return results following the record <cursor> points to
+    :query boolean count: Count the total, and filtered records (default true)
+    :query boolean stream: Stream the records as they are read from the database
     :query boolean pretty-print: Return formatted JSON response
 
     :statuscode 200: OK
@@ -1161,7 +1212,7 @@ def get_successful_jobs(username, m_wf_id, wf_id):
     #
     response_json = jsonify(paged_response)
 
-    return make_response(response_json, 200, JSON_HEADER)
+    return make_response(response_json, 200)
 
 
 @blueprint.route("/root/<string:m_wf_id>/workflow/<string:wf_id>/job/failed")
@@ -1173,6 +1224,9 @@ def get_failed_jobs(username, m_wf_id, wf_id):
     :query int max-results: Return a maximum of <max-results> records
     :query string query: Search criteria
     :query string order: Sorting criteria
+    :query string cursor: Return results following the record <cursor> points to
+    :query boolean count: Count the total, and filtered records (default true)
+    :query boolean stream: Stream the records as they are read from the database
     :query boolean pretty-print: Return formatted JSON response
 
     :statuscode 200: OK
@@ -1197,7 +1251,7 @@ def get_failed_jobs(username, m_wf_id, wf_id):
     #
     response_json = jsonify(paged_response)
 
-    return make_response(response_json, 200, JSON_HEADER)
+    return make_response(response_json, 200)
 
 
 @blueprint.route("/root/<string:m_wf_id>/workflow/<string:wf_id>/job/failing")
@@ -1209,6 +1263,9 @@ def get_failing_jobs(username, m_wf_id, wf_id):
     :query int max-results: Return a maximum of <max-results> records
     :query string query: Search criteria
     :query string order: Sorting criteria
+    :query string cursor: Return results following the record <cursor> points to
+    :query boolean count: Count the total, and filtered records (default true)
+    :query boolean stream: Stream the records as they are read from the database
     :query boolean pretty-print: Return formatted JSON response
 
     :statuscode 200: OK
@@ -1233,4 +1290,4 @@ def get_failing_jobs(username, m_wf_id, wf_id):
     #
     response_json = jsonify(paged_response)
 
-    return make_response(response_json, 200, JSON_HEADER)
+    return make_response(response_json, 200)
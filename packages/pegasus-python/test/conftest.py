@@ -120,7 +120,8 @@ class FlaskTestClient:
 def app():
     from Pegasus.service.server import create_app
 
-    app = create_app(env="testing")
+    # results of finished workflows do not expire, keep them out of CACHE_DIR
+    app = create_app(config={"CACHE_TYPE": "SimpleCache"}, env="testing")
 
     with app.app_context():
         yield app
@@ -4,9 +4,13 @@ import re
 import unittest
 import uuid
 
+import pytest
+
 from Pegasus.db import connection
 from Pegasus.db.admin.admin_loader import *
+from Pegasus.db.connection import DBType
 from Pegasus.db.schema import *
+from Pegasus.tools import properties
 
 
 class TestConnection(unittest.TestCase):
@@ -63,6 +67,128 @@ class TestConnection(unittest.TestCase):
         _remove(filename)
 
 
+def test_engines_shared(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    connection.connect("sqlite:///shared.db", create=True, verbose=False).close()
+
+    db1 = connection.connect("sqlite:///shared.db", print_version=False)
+    db2 = connection.connect(
+        "jdbc:sqlite:%s" % (tmp_path / "shared.db"), print_version=False
+    )
+    assert db1.get_bind() is db2.get_bind()
+    assert db1 is not db2
+    db1.close()
+    db2.close()
+
+    # in-memory databases are never shared
+    db1 = connection.connect("sqlite://", create=True, verbose=False)
+    db2 = connection.connect("sqlite://", create=True, verbose=False)
+    assert db1.get_bind() is not db2.get_bind()
+
+    connection.dispose_engines()
+    db3 = connection.connect("sqlite:///shared.db", print_version=False)
+    assert db3.get_bind() is not db1.get_bind()
+    db3.close()
+
+
+def test_normalize_url(tmp_path, monkeypatch):
+    from sqlalchemy.engine.url import make_url
+
+    monkeypatch.chdir(tmp_path)
+    url = make_url("sqlite:///relative.db")
+    normalized = connection._normalize_url(url)
+    assert normalized.database == os.path.realpath(str(tmp_path / "relative.db"))
+    # the URL given is left unchanged
+    assert url.database == "relative.db"
+
+    url = make_url("mysql://user@localhost/db")
+    assert connection._normalize_url(url) == url
+
+
+def test_schema_check_memoized(tmp_path, monkeypatch):
+    import Pegasus.db.admin.admin_loader as admin_loader
+
+    verified = []
+    db_verify = admin_loader.db_verify
+    monkeypatch.setattr(
+        admin_loader,
+        "db_verify",
+        lambda db, **kwargs: verified.append(1) or db_verify(db, **kwargs),
+    )
+
+    dburi = "sqlite:///%s" % (tmp_path / "memo.db")
+    connection.connect(dburi, create=True, verbose=False).close()
+    for _ in range(3):
+        connection.connect(dburi, print_version=False).close()
+    assert len(verified) == 1
+
+    # verified again for another version, or after a change of the schema
+    connection.connect(dburi, pegasus_version="5.0.0", print_version=False).close()
+    assert len(verified) == 2
+    connection.invalidate_schema_check(dburi)
+    connection.connect(dburi, print_version=False).close()
+    assert len(verified) == 3
+
+    # and when the database file is replaced
+    (tmp_path / "memo.db").rename(tmp_path / "memo.db.0")
+    with pytest.raises(DBAdminError):
+        connection.connect(dburi, print_version=False)
+    assert len(verified) == 4
+
+
+def test_sqlite_wal_profile(tmp_path):
+    dburi = "sqlite:///%s" % (tmp_path / "wal.db")
+    # pegasus-monitord passes the properties as connect_args
+    db = connection.connect(
+        dburi,
+        create=True,
+        verbose=False,
+        connect_args={"sqlite.wal": "true", "sqlite.cache_size": "-2000"},
+    )
+    assert db.execute("PRAGMA journal_mode").scalar() == "wal"
+    assert db.execute("PRAGMA synchronous").scalar() == 1
+    assert db.execute("PRAGMA cache_size").scalar() == -2000
+    assert db.execute("PRAGMA busy_timeout").scalar() == 30000
+
+    # the write-ahead log is emptied by the checkpoint, it is only kept as
+    # long as a connection is open
+    reader = db.get_bind().connect()
+    db.execute("UPDATE dbversion SET version_timestamp = 1")
+    db.commit()
+    assert os.path.getsize(str(tmp_path / "wal.db-wal")) > 0
+    connection.checkpoint(db)
+    assert os.path.getsize(str(tmp_path / "wal.db-wal")) == 0
+    reader.close()
+    db.close()
+
+    # journal mode is kept in the database, other connections use it too
+    db = connection.connect(dburi, print_version=False)
+    assert db.execute("PRAGMA journal_mode").scalar() == "wal"
+    assert db.execute("PRAGMA synchronous").scalar() == 2
+    connection.checkpoint(db)
+    db.close()
+
+
+def test_sqlite_properties(tmp_path):
+    props = properties.Properties()
+    props.property("pegasus.catalog.*.sqlite.mmap_size", "0")
+    props.property("pegasus.catalog.workflow.sqlite.synchronous", "off")
+    props.property("pegasus.catalog.master.sqlite.synchronous", "full")
+
+    dburi = "sqlite:///%s" % (tmp_path / "props.db")
+    db = connection.connect(
+        dburi, create=True, verbose=False, props=props, db_type=DBType.WORKFLOW
+    )
+    assert db.execute("PRAGMA journal_mode").scalar() == "delete"
+    assert db.execute("PRAGMA synchronous").scalar() == 0
+    assert db.execute("PRAGMA mmap_size").scalar() == 0
+    db.close()
+
+    props.property("pegasus.catalog.workflow.sqlite.checkpoint", "later")
+    with pytest.raises(connection.ConnectionError):
+        connection.connect(dburi, props=props, db_type=DBType.WORKFLOW)
+
+
 def _silentremove(filename):
     try:
         os.remove(filename)
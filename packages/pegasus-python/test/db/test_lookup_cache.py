@@ -0,0 +1,55 @@
+import pytest
+
+from Pegasus.db.lookup_cache import LookupCache
+
+
+def test_invalid_size():
+    with pytest.raises(ValueError):
+        LookupCache("test", 0)
+
+
+def test_lru_eviction():
+    cache = LookupCache("test", 3)
+    cache[(1, "a")] = 10
+    cache[(1, "b")] = 11
+    cache[(2, "a")] = 20
+
+    # (1, "a") is now the most recently used entry
+    assert cache.get((1, "a")) == 10
+    cache[(2, "b")] = 21
+
+    assert len(cache) == 3
+    assert (1, "b") not in cache
+    assert cache.get((1, "b")) is None
+    assert cache.evictions == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert not cache.complete(1)
+    assert cache.complete(2)
+
+
+def test_purge():
+    cache = LookupCache("test", 2)
+    cache[(1, "a")] = 10
+    cache[(2, "a")] = 20
+    # evicts (1, "a")
+    cache[(1, "b")] = 11
+
+    cache.purge(1)
+
+    assert len(cache) == 1
+    assert (2, "a") in cache
+    assert cache.complete(1)
+    assert cache.stats()["workflows"] == 1
+    # purging an unknown workflow is fine
+    cache.purge(3)
+
+
+def test_stats():
+    cache = LookupCache("test")
+    cache[(1, "job_a")] = 10
+
+    stats = cache.stats()
+
+    assert stats["entries"] == 1
+    assert stats["workflows"] == 1
+    assert stats["memory"] > 0
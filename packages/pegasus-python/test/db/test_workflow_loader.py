@@ -0,0 +1,318 @@
+import pytest
+
+from Pegasus.db import workflow_summary
+from Pegasus.db.schema import Job, JobInstance, Jobstate, Workflow, WorkflowSummary
+from Pegasus.db.workflow.stampede_statistics import StampedeStatistics
+from Pegasus.db.workflow_loader import WorkflowLoader
+from Pegasus.tools import properties, utils
+
+# Adds the TRACE level the loader logs at, as pegasus-monitord does
+utils.configureLogging()
+
+
+@pytest.fixture
+def loader(tmp_path):
+    loader = WorkflowLoader(
+        "sqlite:///%s" % (tmp_path / "workflow.db"),
+        batch=True,
+        props=properties.Properties(),
+    )
+    yield loader
+    loader.disconnect()
+
+
+def new_job(wf_id, exec_job_id):
+    job = Job()
+    job.wf_id = wf_id
+    job.exec_job_id = exec_job_id
+    job.submit_file = "%s.sub" % exec_job_id
+    job.type_desc = "compute"
+    job.clustered = 0
+    job.max_retries = 3
+    job.executable = "/bin/true"
+    job.task_count = 1
+    # not a column, like the attributes set from the event line
+    job.event = "stampede.job.info"
+    return job
+
+
+def test_row_values():
+    job = new_job(1, "job_a")
+    job.job_id = None
+
+    row = WorkflowLoader.row_values(job)
+
+    assert "job_id" not in row
+    assert "event" not in row
+    assert row["exec_job_id"] == "job_a"
+
+
+def test_bulk_insert_and_merge(loader):
+    session = loader.session
+    wf = Workflow()
+    wf.wf_uuid = "a8b6e6b4-1c2b-4d5e-8f90-123456789abc"
+    wf.commit_to_db(session)
+
+    jobs = [new_job(wf.wf_id, "job_%d" % i) for i in range(3)]
+    loader.bulk_insert(jobs)
+    session.commit()
+
+    job_ids = {
+        job.exec_job_id: job.job_id
+        for job in session.query(Job).filter(Job.wf_id == wf.wf_id)
+    }
+    assert sorted(job_ids) == ["job_0", "job_1", "job_2"]
+
+    instances = []
+    for exec_job_id, job_id in sorted(job_ids.items()):
+        ji = JobInstance()
+        ji.job_id = job_id
+        ji.job_submit_seq = 1
+        ji.commit_to_db(session)
+        instances.append(ji.job_instance_id)
+
+    events = []
+    for job_instance_id in instances:
+        js = Jobstate()
+        js.job_instance_id = job_instance_id
+        js.state = "SUBMIT"
+        js.timestamp = 1.0
+        js.jobstate_submit_seq = 0
+        js.event = "stampede.job_inst.submit.end"
+        events.append(js)
+    loader.bulk_insert(events)
+
+    updates = []
+    for exitcode, job_instance_id in enumerate(instances):
+        ji = JobInstance()
+        ji.job_instance_id = job_instance_id
+        ji.exitcode = exitcode
+        updates.append(ji)
+    # a later update of the same row wins
+    ji = JobInstance()
+    ji.job_instance_id = instances[0]
+    ji.exitcode = 42
+    updates.append(ji)
+    loader.bulk_merge(updates)
+    session.commit()
+    session.expire_all()
+
+    assert session.query(Jobstate).count() == 3
+    exitcodes = [
+        session.query(JobInstance).get(job_instance_id).exitcode
+        for job_instance_id in instances
+    ]
+    assert exitcodes == [42, 1, 2]
+    # columns that were not set are left alone
+    assert session.query(JobInstance).get(instances[1]).job_submit_seq == 1
+
+
+def test_load_ids(loader):
+    session = loader.session
+    wf = Workflow()
+    wf.wf_uuid = "0c5b8a3e-9d1f-4b6a-a2c7-123456789abc"
+    wf.commit_to_db(session)
+
+    loader.bulk_insert([new_job(wf.wf_id, "job_%d" % i) for i in range(2)])
+    session.commit()
+
+    ji = JobInstance()
+    ji.job_id = session.query(Job).filter(Job.exec_job_id == "job_1").one().job_id
+    ji.job_submit_seq = 1
+    ji.commit_to_db(session)
+
+    # the first lookup loads all the ids of the workflow
+    assert loader.get_job_id(wf.wf_id, "job_1") == ji.job_id
+    assert loader.id_marks[wf.wf_id]["job"] == ji.job_id
+    assert loader.job_instance_id_cache[(wf.wf_id, ji.job_id, 1)] == ji.job_instance_id
+    assert len(loader.job_instance_id_cache) == 1
+
+    # only the new rows are loaded afterwards
+    loader.bulk_insert([new_job(wf.wf_id, "job_2")])
+    session.commit()
+    loader.load_ids(wf.wf_id)
+    assert len(loader.job_id_cache) == 3
+    assert [(wf.wf_id, "job_%d" % i) in loader.job_id_cache for i in range(3)] == [
+        True,
+        True,
+        True,
+    ]
+
+
+def test_bulk_insert_keeps_event_order(loader):
+    session = loader.session
+    wf = Workflow()
+    wf.wf_uuid = "5d2e7f10-3a4b-4c5d-9e8f-123456789abc"
+    wf.commit_to_db(session)
+
+    # rows setting different columns are interleaved
+    jobs = [new_job(wf.wf_id, "job_%d" % i) for i in range(6)]
+    for job in jobs[::2]:
+        job.argv = "-a"
+    loader.bulk_insert(jobs)
+    session.commit()
+
+    query = session.query(Job.exec_job_id).filter(Job.wf_id == wf.wf_id)
+    assert [row.exec_job_id for row in query.order_by(Job.job_id)] == [
+        "job_%d" % i for i in range(6)
+    ]
+
+
+def test_lookup_flushes_queued_rows(loader):
+    session = loader.session
+    wf = Workflow()
+    wf.wf_uuid = "7e4f8a21-5b6c-4d7e-8f90-123456789abc"
+    wf.commit_to_db(session)
+    loader.load_ids(wf.wf_id)
+
+    loader._batch_cache["batch_events"].append(new_job(wf.wf_id, "job_0"))
+
+    job_id = loader.get_job_id(wf.wf_id, "job_0")
+    assert job_id is not None
+    assert loader._batch_cache["batch_events"] == []
+    assert session.query(Job).get(job_id).exec_job_id == "job_0"
+
+    # rows which are not queued do not flush
+    loader._batch_cache["batch_events"].append(new_job(wf.wf_id, "job_1"))
+    assert loader.get_job_id(wf.wf_id, "job_2") is None
+    assert len(loader._batch_cache["batch_events"]) == 1
+
+
+def test_queue_update(loader):
+    for column, value in (("exitcode", 1), ("site", "local"), ("exitcode", 0)):
+        ji = JobInstance()
+        ji.job_instance_id = 7
+        setattr(ji, column, value)
+        loader.queue_update(ji)
+
+    # the updates of a row are combined
+    updates = loader._batch_cache["update_events"]
+    assert list(updates) == [7]
+    assert WorkflowLoader.row_values(updates[7]) == {
+        "job_instance_id": 7,
+        "exitcode": 0,
+        "site": "local",
+    }
+
+    # new rows are kept apart
+    for _ in range(2):
+        ji = JobInstance()
+        ji.job_id = 1
+        loader.queue_update(ji)
+    assert len(updates) == 3
+
+
+def summary_rows(session):
+    rows = {}
+    for row in session.query(WorkflowSummary):
+        values = tuple(float(getattr(row, c)) for c in workflow_summary.COLUMNS)
+        if any(values):
+            rows[(row.wf_id, row.type_desc)] = values
+    return rows
+
+
+@pytest.mark.parametrize("batch", [True, False])
+def test_workflow_summary(tmp_path, batch):
+    dburi = "sqlite:///%s" % (tmp_path / "workflow.db")
+    loader = WorkflowLoader(dburi, batch=batch, props=properties.Properties())
+    wf_uuid = "7e0c2f4a-3b1d-4c5e-9f60-123456789abc"
+
+    def send(event, **kwargs):
+        linedata = {"event": "stampede." + event, "xwf.id": wf_uuid, "ts": 1.0}
+        linedata.update((k.replace("__", "."), v) for k, v in kwargs.items())
+        loader.process(linedata)
+
+    def job_instance(job_id, seq, exitcode, multiplier="1", invocations=()):
+        send("job_inst.submit.start", job__id=job_id, job_inst__id=seq)
+        if exitcode is None:
+            return
+        for inv_id, (duration, inv_exitcode) in enumerate(invocations, 1):
+            send(
+                "inv.end",
+                job__id=job_id,
+                job_inst__id=seq,
+                inv__id=inv_id,
+                dur=duration,
+                exitcode=inv_exitcode,
+                start_time="1.0",
+                transformation="example::keg",
+                executable="/bin/keg",
+            )
+        send(
+            "job_inst.main.end",
+            job__id=job_id,
+            job_inst__id=seq,
+            js__id=1,
+            status=0 if exitcode == "0" else -1,
+            exitcode=exitcode,
+            multiplier_factor=multiplier,
+        )
+
+    send("wf.plan", root__xwf__id=wf_uuid, argv="", dax__label="summary")
+    for job_id, type_desc in (("a", "compute"), ("b", "compute"), ("c", "compute")):
+        send(
+            "job.info",
+            job__id=job_id,
+            submit_file="%s.sub" % job_id,
+            type_desc=type_desc,
+            clustered="0",
+            max_retries="3",
+            executable="/bin/keg",
+            task_count="1",
+        )
+        send(
+            "task.info",
+            task__id="ID_%s" % job_id,
+            transformation="example::keg",
+            type_desc=type_desc,
+        )
+    send(
+        "job.info",
+        job__id="d",
+        submit_file="d.sub",
+        type_desc="cleanup",
+        clustered="0",
+        max_retries="3",
+        executable="/bin/rm",
+        task_count="0",
+    )
+    send("static.end")
+    for job_id in ("a", "b"):
+        send("wf.map.task_job", job__id=job_id, task__id="ID_%s" % job_id)
+
+    # a fails, and succeeds on the retry after a flush
+    job_instance("a", 1, "1", invocations=[("5.0", "1")])
+    loader.hard_flush()
+    job_instance("a", 2, "0", multiplier="2", invocations=[("10.0", "0")])
+    job_instance("b", 1, "0", invocations=[("3.0", "0")])
+    # c is running, d was not submitted
+    job_instance("c", 1, None)
+    loader.finish()
+
+    stats = StampedeStatistics(dburi, expand_workflow=False)
+    stats.initialize(wf_uuid)
+    try:
+        session = stats.session
+        rows = summary_rows(session)
+        # the summary is the same as the one computed from the rows
+        workflow_summary.rebuild(session, [stats._root_wf_id])
+        assert summary_rows(session) == rows
+        session.rollback()
+
+        totals = {}
+        for use_summary in (True, False):
+            stats._summary = use_summary
+            totals[use_summary] = (
+                stats.get_total_jobs_status(),
+                tuple(stats.get_total_succeeded_failed_jobs_status()),
+                stats.get_total_succeeded_jobs_status(),
+                stats.get_total_failed_jobs_status(),
+                stats.get_total_running_jobs_status(),
+                stats.get_total_jobs_retries(),
+                stats.get_total_tasks_status(),
+                tuple(stats.get_workflow_cum_job_wall_time()),
+            )
+        assert totals[True] == (4, (2, 0), 2, 0, 1, 1, 2, (28.0, 23.0, 5.0))
+        assert totals[True] == totals[False]
+    finally:
+        stats.close()
@@ -0,0 +1,122 @@
+import pytest
+
+from Pegasus.db import connection
+from Pegasus.db.schema import Host, Invocation, Job, JobInstance, Jobstate, Workflow
+from Pegasus.db.workflow.stampede_statistics import StampedeStatistics
+
+WF_UUID = "d3f1a2b4-5c6d-4e7f-8a9b-123456789abc"
+
+# state, timestamp
+STATES = [
+    ("PRE_SCRIPT_STARTED", 100),
+    ("PRE_SCRIPT_TERMINATED", 101),
+    ("SUBMIT", 102),
+    ("GRID_SUBMIT", 104),
+    ("EXECUTE", 107),
+    ("JOB_TERMINATED", 127),
+    ("POST_SCRIPT_STARTED", 128),
+    ("POST_SCRIPT_TERMINATED", 130),
+]
+
+# task_submit_seq, remote_duration, exitcode
+INVOCATIONS = [(-1, 1.0, 0), (1, 15.0, 0), (2, 5.0, 256), (-2, 2.0, 0)]
+
+
+@pytest.fixture
+def dburi(tmp_path):
+    dburi = "sqlite:///%s" % (tmp_path / "workflow.db")
+    session = connection.connect(dburi, create=True)
+
+    wf = Workflow()
+    wf.wf_uuid = WF_UUID
+    session.add(wf)
+    session.flush()
+    wf.root_wf_id = wf.wf_id
+
+    host = Host(wf_id=wf.wf_id, site="local", hostname="worker", ip="127.0.0.1")
+    session.add(host)
+    session.flush()
+
+    for i in range(3):
+        job = Job(
+            wf_id=wf.wf_id,
+            exec_job_id="job_%d" % i,
+            submit_file="job_%d.sub" % i,
+            type_desc="compute",
+            clustered=0,
+            max_retries=3,
+            executable="/bin/true",
+            task_count=2,
+        )
+        session.add(job)
+        session.flush()
+
+        ji = JobInstance(
+            job_id=job.job_id,
+            job_submit_seq=i + 1,
+            site="local",
+            local_duration=20.0,
+            multiplier_factor=2,
+        )
+        # the last job never ran
+        if i < 2:
+            ji.host_id = host.host_id
+        session.add(ji)
+        session.flush()
+
+        states = STATES if i < 2 else STATES[:3]
+        for seq, (state, ts) in enumerate(states):
+            session.add(
+                Jobstate(
+                    job_instance_id=ji.job_instance_id,
+                    state=state,
+                    timestamp=ts,
+                    jobstate_submit_seq=seq,
+                )
+            )
+        if i < 2:
+            for task_submit_seq, duration, exitcode in INVOCATIONS:
+                session.add(
+                    Invocation(
+                        wf_id=wf.wf_id,
+                        job_instance_id=ji.job_instance_id,
+                        task_submit_seq=task_submit_seq,
+                        start_time=107,
+                        remote_duration=duration,
+                        remote_cpu_time=duration / 2,
+                        exitcode=exitcode,
+                        transformation="test::task",
+                        executable="/bin/true",
+                    )
+                )
+
+    session.commit()
+    session.close()
+    return dburi
+
+
+def test_get_job_statistics(dburi):
+    stats = StampedeStatistics(dburi, expand_workflow=False)
+    stats.initialize(WF_UUID)
+    try:
+        rows = stats.get_job_statistics()
+
+        assert [row.job_name for row in rows] == ["job_0", "job_1", "job_2"]
+
+        job = rows[0]
+        assert job.condor_q_time == 2.0
+        assert job.resource_delay == 3.0
+        assert job.post_time == 2.0
+        assert job.kickstart == 20.0
+        assert job.kickstart_multi == 40.0
+        assert job.remote_cpu_time == 10.0
+        assert job.exit_code == 256
+        assert job.host_name == "worker"
+
+        job = rows[2]
+        assert job.condor_q_time is None
+        assert job.kickstart is None
+        assert job.exit_code is None
+        assert job.host_name is None
+    finally:
+        stats.close()
@@ -0,0 +1,61 @@
+import pytest
+
+from Pegasus.db import connection
+from Pegasus.db.schema import Workflow, Workflowstate
+from Pegasus.monitoring.event_output import DBEventSink
+from Pegasus.tools import properties, utils
+
+# Adds the TRACE level the sinks log at, as pegasus-monitord does
+utils.configureLogging()
+
+WF_UUID = "5b3cbb60-79d2-4d09-9d2c-3f6d1f7c1a52"
+
+
+def send_workflow(sink, wf_uuid):
+    sink.send(
+        "wf.plan",
+        {
+            "xwf__id": wf_uuid,
+            "root__xwf__id": wf_uuid,
+            "ts": 1600000000,
+            "argv": "pegasus-plan",
+            "dax__label": "test",
+        },
+    )
+    for state, ts in (("start", 1600000001), ("end", 1600000002)):
+        sink.send(
+            "xwf.%s" % state,
+            {"xwf__id": wf_uuid, "ts": ts, "restart_count": 0, "status": 0},
+        )
+
+
+@pytest.mark.parametrize("async_writer", [False, True])
+def test_db_event_sink(tmp_path, async_writer):
+    dburi = "sqlite:///%s" % (tmp_path / "workflow.db")
+    sink = DBEventSink(
+        dburi, props=properties.Properties(), async_writer=async_writer, queue_size=2
+    )
+
+    send_workflow(sink, WF_UUID)
+    sink.flush()
+    sink.close()
+
+    session = connection.connect(dburi, create=False)
+    try:
+        wf = session.query(Workflow).filter(Workflow.wf_uuid == WF_UUID).one()
+        states = session.query(Workflowstate).filter(Workflowstate.wf_id == wf.wf_id)
+        assert sorted(ws.state for ws in states) == [
+            "WORKFLOW_STARTED",
+            "WORKFLOW_TERMINATED",
+        ]
+    finally:
+        session.close()
+
+
+def test_async_writer_failure(tmp_path):
+    with pytest.raises(connection.ConnectionError):
+        DBEventSink(
+            "sqlite:///%s" % (tmp_path / "missing" / "workflow.db"),
+            props=properties.Properties(),
+            async_writer=True,
+        )
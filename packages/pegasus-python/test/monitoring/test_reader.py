@@ -0,0 +1,41 @@
+import io
+
+import pytest
+
+from Pegasus.monitoring.reader import LineReader
+
+
+def test_invalid_read_size():
+    with pytest.raises(ValueError):
+        LineReader(io.StringIO(""), read_size=0)
+
+
+@pytest.mark.parametrize("read_size", [1, 2, 3, 7, 64, 32768])
+def test_lines_split_across_chunks(read_size):
+    text = "first line\n\nsecond line\na much longer third line\nlast"
+    reader = LineReader(io.StringIO(text), read_size=read_size)
+
+    assert list(reader) == ["first line", "", "second line", "a much longer third line"]
+    # The unterminated line is kept until its newline shows up
+    assert reader.pending == len("last")
+
+
+def test_partial_line_completed_by_later_write():
+    fp = io.StringIO()
+    reader = LineReader(fp, read_size=1024)
+
+    fp.write("10/18/20 10:00:00 Submitting HTCondor ")
+    fp.seek(0)
+    nread, lines = reader.read()
+    assert nread == 38
+    assert lines == []
+    assert reader.pending == 38
+
+    pos = fp.tell()
+    fp.write("Node job_1 job(s)...\n10/18/20 10:00:01 Event")
+    fp.seek(pos)
+    nread, lines = reader.read()
+    assert lines == ["10/18/20 10:00:00 Submitting HTCondor Node job_1 job(s)..."]
+    assert reader.pending == len("10/18/20 10:00:01 Event")
+
+    assert reader.read() == (0, [])
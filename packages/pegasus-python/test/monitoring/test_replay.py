@@ -0,0 +1,62 @@
+import os
+import sys
+
+import pytest
+
+from Pegasus.monitoring.replay import ParallelReplay, SubworkflowLink
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32", reason="parallel replay forks its workers"
+)
+
+# dagman.out --> sub-workflows started by its jobs (jobid, jobseq, dagman.out)
+HIERARCHY = {
+    "/root.dagman.out": [
+        ("subdax_a", 1, "/a.dagman.out"),
+        ("subdax_b", 2, "/b.dagman.out"),
+        # Retry of the job running sub-workflow a
+        ("subdax_a", 3, "/a.dagman.out"),
+    ],
+    "/a.dagman.out": [("subdax_c", 4, "/c.dagman.out")],
+    "/b.dagman.out": [],
+    "/c.dagman.out": [],
+}
+
+
+def wf_uuid(dagman_out):
+    return "uuid-%s" % os.path.basename(dagman_out).split(".")[0]
+
+
+def replay_func(task, worker):
+    if task.dagman_out == "/c.dagman.out":
+        raise RuntimeError("cannot replay %s" % task.dagman_out)
+
+    for jobid, jobseq, dagman_out in HIERARCHY[task.dagman_out]:
+        worker.subworkflow_found(
+            dagman_out, wf_uuid(task.dagman_out), jobid, jobseq, task.root_wf_uuid
+        )
+    return wf_uuid(task.dagman_out), {os.path.dirname(task.dagman_out): 0}
+
+
+def test_invalid_workers():
+    with pytest.raises(ValueError):
+        ParallelReplay(replay_func, 0)
+
+
+def test_parallel_replay():
+    pool = ParallelReplay(replay_func, 2)
+    pool.start("/root.dagman.out")
+
+    # The root workflow is replayed by the parent process
+    for jobid, jobseq, dagman_out in HIERARCHY["/root.dagman.out"]:
+        pool.subworkflow_found(dagman_out, "uuid-root", jobid, jobseq, "uuid-root")
+
+    links = pool.finish()
+
+    assert sorted(links) == [
+        SubworkflowLink("uuid-a", "uuid-root", "subdax_a", 1),
+        SubworkflowLink("uuid-a", "uuid-root", "subdax_a", 3),
+        SubworkflowLink("uuid-b", "uuid-root", "subdax_b", 2),
+    ]
+    assert pool.failed == ["/c.dagman.out"]
+    assert pool.retries == {"/": 0}
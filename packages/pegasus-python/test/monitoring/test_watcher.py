@@ -0,0 +1,125 @@
+import sys
+
+import pytest
+
+from Pegasus.monitoring import watcher
+
+linux_only = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="inotify is only available on Linux"
+)
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        ("jobstate.log", True),
+        ("blackdiamond-0.dag.dagman.out", True),
+        ("findrange_ID0000002.out.000", False),
+        ("findrange_ID0000002.out", True),
+        ("findrange_ID0000002.err", True),
+        ("monitord.log", False),
+        ("braindump.yml", False),
+    ],
+)
+def test_is_tracked_file(name, expected):
+    assert watcher.is_tracked_file(name) is expected
+
+
+def test_create_poll_watcher():
+    w = watcher.create_watcher(watcher.WATCHER_POLL)
+    assert isinstance(w, watcher.PollingWatcher)
+    assert w.wait(0) is None
+
+
+@linux_only
+def test_inotify_reports_changed_keys(tmp_path):
+    a = tmp_path / "a"
+    b = tmp_path / "b"
+    a.mkdir()
+    b.mkdir()
+
+    w = watcher.create_watcher(watcher.WATCHER_INOTIFY)
+    assert isinstance(w, watcher.InotifyWatcher)
+
+    try:
+        w.watch("wf-a", str(a))
+        w.watch("wf-b", str(b))
+        assert w.wait(0) == set()
+
+        # dagman.out appearing and growing wakes up the owner only
+        (a / "wf.dag.dagman.out").write_text("line\n")
+        assert w.wait(1) == {"wf-a"}
+
+        # Untracked files do not wake anybody up
+        (b / "monitord.log").write_text("line\n")
+        assert w.wait(0.1) == set()
+
+        (b / "job.err").write_text("line\n")
+        assert w.wait(1) == {"wf-b"}
+
+        # Once unwatched, changes are ignored
+        w.unwatch("wf-a")
+        (a / "jobstate.log").write_text("line\n")
+        assert w.wait(0.1) == set()
+    finally:
+        w.close()
+
+
+@linux_only
+def test_inotify_shared_directory(tmp_path):
+    w = watcher.create_watcher(watcher.WATCHER_INOTIFY)
+
+    try:
+        w.watch("wf-a", str(tmp_path))
+        w.watch("wf-b", str(tmp_path))
+
+        (tmp_path / "jobstate.log").write_text("line\n")
+        assert w.wait(1) == {"wf-a", "wf-b"}
+
+        w.unwatch("wf-a")
+        (tmp_path / "jobstate.log").write_text("line\n")
+        assert w.wait(1) == {"wf-b"}
+    finally:
+        w.close()
+
+
+@linux_only
+def test_inotify_directory_created_later(tmp_path):
+    run_dir = tmp_path / "subwf"
+    w = watcher.create_watcher(watcher.WATCHER_INOTIFY)
+
+    try:
+        w.watch("wf-a", str(run_dir))
+        assert w.wait(0) == set()
+
+        # Watched once it is created, and checked as files may already be there
+        run_dir.mkdir()
+        assert w.wait(0) == {"wf-a"}
+
+        (run_dir / "jobstate.log").write_text("line\n")
+        assert w.wait(1) == {"wf-a"}
+
+        # Removed and created again
+        (run_dir / "jobstate.log").unlink()
+        run_dir.rmdir()
+        assert w.wait(1) == {"wf-a"}
+        run_dir.mkdir()
+        assert w.wait(0) == {"wf-a"}
+
+        (run_dir / "job.out").write_text("line\n")
+        assert w.wait(1) == {"wf-a"}
+    finally:
+        w.close()
+
+
+@linux_only
+def test_inotify_unwatchable_directory_falls_back_to_polling(tmp_path):
+    not_a_dir = tmp_path / "file"
+    not_a_dir.write_text("")
+    w = watcher.create_watcher(watcher.WATCHER_INOTIFY)
+
+    try:
+        w.watch("wf-a", str(not_a_dir))
+        assert w.wait(0) == {"wf-a"}
+    finally:
+        w.close()
@@ -0,0 +1,389 @@
+import os
+import shutil
+
+import pytest
+from sqlalchemy import inspect
+from sqlalchemy.orm import Query
+
+from Pegasus.db.schema import (
+    RCLFN,
+    JobInstance,
+    Task,
+    WorkflowFiles,
+    Workflowstate,
+    WorkflowSummary,
+)
+from Pegasus.service import cache
+from Pegasus.service._cursor import InvalidCursorError
+from Pegasus.service._sort import InvalidSortError
+from Pegasus.service.monitoring.queries import StampedeWorkflowQueries
+
+
+@pytest.fixture
+def queries(app):
+    directory = os.path.dirname(__file__)
+    db = os.path.join(directory, "monitoring-rest-api-master.db")
+
+    queries = StampedeWorkflowQueries("sqlite:///%s" % db)
+    yield queries
+    queries.close()
+
+
+def get_pages(method, *args, **kwargs):
+    records = []
+    cursor = None
+    pages = []
+
+    while True:
+        page = method(*args, cursor=cursor, use_cache=False, **kwargs)
+        records.extend(page.records)
+        pages.append(page)
+        cursor = page.next_cursor
+        if not cursor:
+            return records, pages
+
+
+def sort_key(*fields):
+    # NULLs sort lowest, and DESC is handled by the caller
+    return lambda r: tuple(
+        (getattr(r, f) is not None, getattr(r, f) or 0) for f in fields
+    )
+
+
+@pytest.mark.parametrize(
+    "method, args, order, key, reverse",
+    [
+        ("get_workflow_jobs", (1,), None, ("job_id",), False),
+        ("get_workflow_jobs", (1,), "-j.type_desc", ("type_desc",), True),
+        (
+            "get_workflow_invocations",
+            (1,),
+            "i.remote_duration",
+            ("remote_duration",),
+            False,
+        ),
+        ("get_workflow_invocations", (1,), "-i.exitcode", ("exitcode",), True),
+        ("get_workflow_state", (1,), "-ws.timestamp", ("timestamp",), True),
+    ],
+)
+def test_cursor_paging(queries, method, args, order, key, reverse):
+    method = getattr(queries, method)
+    expected = method(*args, use_cache=False).records
+
+    records, pages = get_pages(method, *args, order=order, max_results=4)
+
+    assert len(pages) == (len(expected) + 3) // 4
+    assert sorted(map(id_of, records)) == sorted(map(id_of, expected))
+    assert [sort_key(*key)(r) for r in records] == sorted(
+        (sort_key(*key)(r) for r in records), reverse=reverse
+    )
+
+    # counts are carried over to the following pages
+    for page in pages:
+        assert page.total_records == len(expected)
+        assert page.total_filtered == len(expected)
+
+
+def test_cursor_paging_query(queries):
+    query = "i.exitcode == 0"
+    expected = queries.get_workflow_invocations(1, query=query, use_cache=False)
+
+    records, pages = get_pages(
+        queries.get_workflow_invocations, 1, query=query, max_results=5
+    )
+
+    assert list(map(id_of, records)) == sorted(map(id_of, expected.records))
+    assert pages[-1].total_records == expected.total_records
+    assert pages[-1].total_filtered == expected.total_filtered
+
+
+def test_cursor_paging_merged(queries):
+    records, pages = get_pages(
+        queries.get_successful_jobs, 1, order="-ji.local_duration", max_results=2
+    )
+
+    assert len(pages) == 3
+    assert len({r.job_id for r in records}) == 5
+    durations = [r.job_instance.local_duration for r in records]
+    assert durations == sorted(durations, reverse=True)
+
+
+def test_no_count(queries):
+    page = queries.get_workflow_jobs(1, max_results=5, count=False, use_cache=False)
+
+    assert len(page.records) == 5
+    assert page.total_records is None
+    assert page.total_filtered is None
+
+    page = queries.get_workflow_jobs(
+        1, max_results=5, cursor=page.next_cursor, count=False, use_cache=False
+    )
+    assert len(page.records) == 5
+    assert page.total_records is None
+
+
+@pytest.mark.parametrize(
+    "method, kwargs",
+    [
+        ("get_workflow_invocations", {}),
+        ("get_workflow_invocations", {"query": "i.exitcode == 0", "start_index": 2}),
+        ("get_successful_jobs", {"order": "-ji.local_duration"}),
+        ("get_workflow_files", {}),
+    ],
+)
+def test_stream(queries, method, kwargs):
+    method = getattr(queries, method)
+    expected = method(1, use_cache=False, **kwargs)
+
+    page = method(1, stream=True, use_cache=False, **kwargs)
+
+    assert not isinstance(page.records, list)
+    assert page.total_records == expected.total_records
+    assert page.total_filtered == expected.total_filtered
+    assert list(page.records) == expected.records
+
+
+def test_start_index(queries):
+    page = queries.get_workflow_jobs(1, start_index=2, max_results=5, use_cache=False)
+
+    assert len(page.records) == 5
+    assert page.next_cursor is None
+
+
+@pytest.mark.parametrize("order", [None, "j.job_id", "-j.exec_job_id"])
+def test_invalid_cursor(queries, order):
+    page = queries.get_workflow_jobs(1, max_results=5, use_cache=False)
+
+    with pytest.raises(InvalidCursorError):
+        queries.get_workflow_jobs(
+            1, order=order or "-j.job_id", cursor=page.next_cursor, use_cache=False
+        )
+
+    with pytest.raises(InvalidCursorError):
+        queries.get_workflow_jobs(1, order=order, cursor="bad", use_cache=False)
+
+
+def test_cursor_paging_joined_field(app, tmp_path):
+    directory = os.path.dirname(__file__)
+    db = str(tmp_path / "workflow.db")
+    shutil.copy(os.path.join(directory, "monitoring-rest-api-master.db"), db)
+
+    queries = StampedeWorkflowQueries("sqlite:///%s" % db)
+    session = queries.session
+    try:
+        task_id = session.query(Task.task_id).filter(Task.wf_id == 1).first().task_id
+        for lfn in ("f.e", "f.a", "f.d", "f.c"):
+            rc_lfn = RCLFN()
+            rc_lfn.lfn = lfn
+            session.add(rc_lfn)
+            session.flush()
+            wf_file = WorkflowFiles()
+            wf_file.wf_id = 1
+            wf_file.task_id = task_id
+            wf_file.lfn_id = rc_lfn.lfn_id
+            session.add(wf_file)
+        session.commit()
+
+        # files are sorted by the LFN they are joined to
+        records, pages = get_pages(
+            queries.get_workflow_files, 1, order="-l.lfn", max_results=2
+        )
+        assert len(pages) == 3
+        assert [r["lfn"] for r in records] == ["f.e", "f.d", "f.c", "f.b", "f.a"]
+        assert [len(r["pfns"]) for r in records] == [0, 0, 0, 4, 0]
+
+        expected = queries.get_workflow_files(1, order="-l.lfn", use_cache=False)
+        assert [r["lfn"] for r in expected.records] == [r["lfn"] for r in records]
+    finally:
+        queries.close()
+
+
+def test_sort_by_collection(queries):
+    with pytest.raises(InvalidSortError):
+        queries.get_workflow_files(1, order="p.pfn", max_results=2, use_cache=False)
+
+
+@pytest.fixture
+def cached_queries(queries, monkeypatch):
+    cache.clear()
+    queries.timeouts = record_timeouts(monkeypatch)
+    yield queries
+    cache.clear()
+
+
+def record_timeouts(monkeypatch):
+    timeouts = {}
+    set_ = cache.set
+
+    def set_timeout(key, value, timeout=None):
+        timeouts[key] = timeout
+        return set_(key, value, timeout=timeout)
+
+    monkeypatch.setattr(cache, "set", set_timeout)
+    return timeouts
+
+
+def count_queries(monkeypatch):
+    executed = []
+    depth = []
+    for name in ("all", "count", "one"):
+        fn = getattr(Query, name)
+
+        def wrapper(self, fn=fn, name=name):
+            # Query.count runs Query.one
+            if not depth:
+                executed.append(name)
+            depth.append(name)
+            try:
+                return fn(self)
+            finally:
+                depth.pop()
+
+        monkeypatch.setattr(Query, name, wrapper)
+    return executed
+
+
+def test_cache_hit(cached_queries, monkeypatch):
+    expected = cached_queries.get_workflow_jobs(1, max_results=5)
+
+    executed = count_queries(monkeypatch)
+    monkeypatch.setattr(
+        StampedeWorkflowQueries, "_cache_key_from_query", pytest.fail, raising=True
+    )
+    page = cached_queries.get_workflow_jobs(1, max_results=5)
+
+    assert executed == []
+    assert list(map(id_of, page.records)) == list(map(id_of, expected.records))
+    assert page.total_records == expected.total_records == 14
+    assert page.next_cursor == expected.next_cursor
+
+
+def test_cache_count_shared_by_pages(cached_queries, monkeypatch):
+    page = cached_queries.get_workflow_invocations(1, max_results=5)
+
+    executed = count_queries(monkeypatch)
+    page = cached_queries.get_workflow_invocations(
+        1, max_results=5, cursor=page.next_cursor
+    )
+    cached_queries.get_workflow_invocations(1, start_index=10, max_results=5)
+    cached_queries.get_workflow_invocations(1, query="i.exitcode == 0")
+
+    assert executed == ["all", "all", "count", "all"]
+    assert page.total_records == 41
+
+
+def test_cache_finished_workflow(cached_queries):
+    cached_queries.get_workflow_invocations(1, max_results=5)
+    cached_queries.get_job_instance(1)
+
+    # workflow 1 has terminated, its records do not change anymore
+    timeouts = sorted(
+        (k.split(".")[1], k.endswith(".count"), t)
+        for k, t in cached_queries.timeouts.items()
+        if not k.endswith(".marker")
+    )
+    assert timeouts == [
+        ("get_job_instance", False, 300),
+        ("get_workflow_invocations", False, 0),
+        ("get_workflow_invocations", True, 0),
+    ]
+
+    # the change marker of the workflow is checked again shortly
+    markers = [t for k, t in cached_queries.timeouts.items() if k.endswith(".marker")]
+    assert markers == [5]
+
+
+def test_cache_running_workflow(cached_queries, monkeypatch):
+    markers = iter([("a", False), ("a", False), ("b", False)])
+    monkeypatch.setattr(
+        StampedeWorkflowQueries,
+        "_get_workflow_marker",
+        lambda self, wf_id: next(markers),
+    )
+
+    executed = count_queries(monkeypatch)
+    cached_queries.get_workflow_state(1)
+    cached_queries.get_workflow_state(1)
+    assert executed == ["count", "all"]
+    assert list(cached_queries.timeouts.values()) == [5, 5]
+
+    # the workflow has changed
+    cached_queries.get_workflow_state(1)
+    assert executed == ["count", "all", "count", "all"]
+
+
+def test_cache_running_job_instance(app, tmp_path, monkeypatch):
+    directory = os.path.dirname(__file__)
+    db = str(tmp_path / "workflow.db")
+    shutil.copy(os.path.join(directory, "monitoring-rest-api-master.db"), db)
+
+    queries = StampedeWorkflowQueries("sqlite:///%s" % db)
+    try:
+        ji = queries.session.query(JobInstance).get(1)
+        ji.exitcode = None
+        queries.session.commit()
+
+        cache.clear()
+        timeouts = record_timeouts(monkeypatch)
+
+        # running job instances expire after the timeout of the caller
+        queries.get_job_instance(1, timeout=42)
+        assert set(timeouts.values()) == {42}
+    finally:
+        queries.close()
+        cache.clear()
+
+
+def test_workflow_marker(app, tmp_path):
+    directory = os.path.dirname(__file__)
+    db = str(tmp_path / "workflow.db")
+    shutil.copy(os.path.join(directory, "monitoring-rest-api-master.db"), db)
+
+    queries = StampedeWorkflowQueries("sqlite:///%s" % db)
+    session = queries.session
+    try:
+        cache.clear()
+        marker, finished = queries._get_workflow_marker(1)
+        assert finished
+
+        # the workflow is restarted
+        ws = Workflowstate()
+        ws.wf_id = 1
+        ws.state = "WORKFLOW_STARTED"
+        ws.timestamp = 1421885100
+        ws.restart_count = 4
+        session.add(ws)
+        session.commit()
+
+        assert queries._get_workflow_marker(1) == (marker, True)
+        cache.clear()
+        restarted, finished = queries._get_workflow_marker(1)
+        assert restarted != marker
+        assert not finished
+
+        # a job of the workflow finishes
+        summary = session.query(WorkflowSummary).filter_by(wf_id=1).first()
+        summary.succeeded_jobs += 1
+        session.commit()
+
+        cache.clear()
+        assert queries._get_workflow_marker(1) not in {
+            (marker, True),
+            (restarted, False),
+        }
+    finally:
+        queries.close()
+        cache.clear()
+
+
+def test_no_cache(cached_queries, monkeypatch):
+    executed = count_queries(monkeypatch)
+    cached_queries.get_workflow_invocations(1, use_cache=False)
+    cached_queries.get_workflow_invocations(1, use_cache=False)
+
+    assert executed == ["count", "all", "count", "all"]
+    assert cached_queries.timeouts == {}
+
+
+def id_of(record):
+    return inspect(record).identity
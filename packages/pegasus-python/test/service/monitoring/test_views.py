@@ -1,4 +1,5 @@
 import getpass
+import json
 import os
 
 import pytest
@@ -649,6 +650,45 @@ class TestStampedeInvocationQueries(NoAuthFlaskTestCase):
             == invocations["_meta"]["records_filtered"]
         )
 
+    def test_stream_workflow_invocations(self, cli):
+        rv = cli.get_context(
+            "/api/v1/user/%s/root/1/workflow/1/invocation?stream=true" % self.user,
+            pre_callable=self.pre_callable,
+        )
+
+        assert rv.status_code == 200
+        assert rv.content_type.lower() == "application/json"
+        assert rv.is_streamed
+
+        invocations = rv.json
+
+        assert len(invocations["records"]) == 41
+        assert invocations["_meta"]["records_total"] == 41
+
+    def test_stream_workflow_invocations_ndjson(self, cli):
+        rv = cli.get_context(
+            "/api/v1/user/%s/root/1/workflow/1/invocation" % self.user,
+            headers={"Accept": "application/x-ndjson"},
+            pre_callable=self.pre_callable,
+        )
+
+        assert rv.status_code == 200
+        assert rv.content_type.lower() == "application/x-ndjson"
+
+        lines = [json.loads(line) for line in rv.get_data(as_text=True).splitlines()]
+
+        assert len(lines) == 42
+        assert all("invocation_id" in line for line in lines[:-1])
+        assert lines[-1]["_meta"]["records_total"] == 41
+
+    def test_bad_stream(self, cli):
+        rv = cli.get_context(
+            "/api/v1/user/%s/root/1/workflow/1/invocation?stream=AAA" % self.user,
+            pre_callable=self.pre_callable,
+        )
+
+        assert rv.status_code == 400
+
     def test_get_job_instance_invocations(self, cli):
         rv = cli.get_context(
             "/api/v1/user/%s/root/1/workflow/1/job/6/job-instance/21/invocation"
@@ -0,0 +1,41 @@
+from decimal import Decimal
+
+import pytest
+
+from Pegasus.service._cursor import InvalidCursorError, cursor_decode, cursor_encode
+
+
+@pytest.mark.parametrize(
+    "values",
+    [[1], [1421432530.0, 7], [Decimal("1421432530.123456"), 7], [None, "a", 1]],
+)
+def test_round_trip(values):
+    cursor = cursor_encode(values, "j.type_desc == 'compute'", "-j.exec_job_id")
+    assert cursor_decode(cursor, "j.type_desc == 'compute'", "-j.exec_job_id") == (
+        values,
+        None,
+        None,
+    )
+
+
+def test_counts():
+    cursor = cursor_encode([1], total=10, filtered=5)
+    assert cursor_decode(cursor) == ([1], 10, 5)
+
+
+def test_url_safe():
+    cursor = cursor_encode(["?&/+=" * 10])
+    assert cursor.replace("-", "").replace("_", "").isalnum()
+
+
+@pytest.mark.parametrize("query, order", [("j.job_id > 1", None), (None, "j.job_id")])
+def test_different_request(query, order):
+    cursor = cursor_encode([1])
+    with pytest.raises(InvalidCursorError):
+        cursor_decode(cursor, query, order)
+
+
+@pytest.mark.parametrize("cursor", ["", "x", "!!!", "eyJ9", "WzFd", "eyJrIjoxfQ"])
+def test_invalid_cursor(cursor):
+    with pytest.raises(InvalidCursorError):
+        cursor_decode(cursor)
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from Pegasus.service._serialize import jsonify
+from Pegasus.service.base import PagedResponse
+
+
+def records():
+    # a generator, as streamed query results are
+    return ({"id": i, "name": "record %d" % i} for i in range(1000))
+
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        PagedResponse([], 0, 0),
+        PagedResponse([{"id": 1}], None, None),
+        PagedResponse([{"id": 1}, {"id": 2}], 10, 2, "cursor"),
+    ],
+)
+def test_stream_json(app, response):
+    with app.test_request_context("/"):
+        expected = jsonify(response).get_json()
+
+    with app.test_request_context("/?stream=true"):
+        rv = jsonify(response)
+        assert rv.is_streamed
+        assert rv.mimetype == "application/json"
+        assert rv.get_json() == expected
+
+
+def test_stream_json_chunks(app, monkeypatch):
+    monkeypatch.setattr("Pegasus.service._serialize.STREAM_CHUNK_SIZE", 1024)
+
+    with app.test_request_context("/?stream=true"):
+        rv = jsonify(PagedResponse(records(), 1000, 1000))
+        chunks = list(rv.response)
+
+    assert len(chunks) > 10
+    data = json.loads("".join(chunks))
+    assert data["records"] == list(records())
+    assert data["_meta"] == {"records_total": 1000, "records_filtered": 1000}
+
+
+def test_stream_ndjson(app):
+    headers = {"Accept": "application/x-ndjson"}
+
+    with app.test_request_context("/", headers=headers):
+        rv = jsonify(PagedResponse(records(), 1000, 10, "cursor"))
+        assert rv.is_streamed
+        assert rv.mimetype == "application/x-ndjson"
+        lines = rv.get_data(as_text=True).splitlines()
+
+    assert [json.loads(line) for line in lines[:-1]] == list(records())
+    assert json.loads(lines[-1]) == {
+        "_meta": {
+            "records_total": 1000,
+            "records_filtered": 10,
+            "next_cursor": "cursor",
+        }
+    }
+
+    with app.test_request_context("/", headers=headers):
+        assert jsonify(PagedResponse([], None, None)).get_data() == b""
@@ -15,9 +15,8 @@ import os
 import pprint
 import sys
 import time
-from datetime import datetime
 
-from Pegasus.tools import worker_utils as utils
+from Pegasus.tools import integrity
 
 ##
 #  Copyright 2007-2017 University Of Southern California
@@ -36,14 +35,6 @@ from Pegasus.tools import worker_utils as utils
 ##
 
 
-# for some reason, sometimes grp is missing, but we can do without it
-try:
-    import grp
-    import pwd
-except Exception:
-    pass
-
-
 # see https://www.python.org/dev/peps/pep-0469/
 try:
     dict.iteritems
@@ -92,6 +83,9 @@ logger = logging.getLogger("PegasusIntegrity")
 
 multipart_fh = None
 
+checksums = {}  # pfn --> (sha256, timing)
+checksum_cache = None
+
 count_succeeded = 0
 count_failed = 0
 total_timing = 0.0
@@ -117,6 +111,11 @@ def setup_logger(debug_flag):
     formatter = logging.Formatter("Integrity check: %(message)s")
     console.setFormatter(formatter)
     logger.addHandler(console)
+
+    # messages from the shared Pegasus.tools modules
+    tools_logger = logging.getLogger("Pegasus")
+    tools_logger.setLevel(logger.level)
+    tools_logger.addHandler(console)
     logger.debug("Logger has been configured")
 
 
@@ -186,55 +185,34 @@ def myexit(rc):
         sys.exit(rc)
 
 
-def generate_sha256(fname):
+def generate_checksums(pfns):
     """
-    Generates a sha256 hash for the given file
+    Computes the checksums of a set of files in parallel, for
+    generate_sha256() to return
     """
+    checksums.update(integrity.sha256_files(pfns, cache=checksum_cache))
+    if checksum_cache is not None:
+        try:
+            checksum_cache.save()
+        except EnvironmentError as err:
+            logger.warning("Unable to update the checksum cache: %s" % err)
 
-    tools = utils.Tools()
-    tools.find("openssl", "version", "([0-9]+\.[0-9]+\.[0-9]+)")
-    tools.find("sha256sum", "--version", "([0-9]+\.[0-9]+)")
-
-    if tools.full_path("openssl"):
-        cmd = tools.full_path("openssl")
-        if tools.version_comparable("openssl") < "001001000":
-            cmd += " sha -sha256"
-        else:
-            cmd += " sha256"
-        cmd += " " + fname
-    elif tools.full_path("sha256sum"):
-        cmd = tools.full_path("sha256sum")
-        cmd += " " + fname + " | sed 's/ .*//'"
-    else:
-        logger.error("openssl or sha256sum not found!")
-        return None
-
-    if not os.path.exists(fname):
-        logger.error("File " + fname + " does not exist")
-        return None
-
-    # generate the checksum
-    tc = utils.TimedCommand(cmd, log_cmd=False, log_outerr=False)
-    tc.run()
-    if tc.get_exit_code() != 0:
-        logger.error("Unable to determine sha256: " + tc.get_outerr())
-        return None
-
-    sha256 = tc.get_outerr()
-    sha256 = sha256.strip()
-    sha256 = sha256[-64:]
-    if len(sha256) != 64:
-        logger.warn("Unable to determine sha256 of " + fname)
 
-    return sha256
+def generate_sha256(fname):
+    """
+    Generates a sha256 hash for the given file
+    """
+    return file_checksum(fname)[0]
 
 
-def iso8601(ts):
+def file_checksum(fname):
     """
-    Formats a UNIX timestamp in ISO 8601 format
+    Returns the sha256 hash for the given file, and the time it took to
+    compute it
     """
-    dt = datetime.utcfromtimestamp(ts)
-    return dt.isoformat()
+    if fname not in checksums:
+        generate_checksums([fname])
+    return checksums[fname]
 
 
 def generate_yaml(lfn, pfn):
@@ -242,16 +220,11 @@ def generate_yaml(lfn, pfn):
     Generates kickstart yaml for the given file
     """
 
-    ts_start = time.time()
-    sha256 = generate_sha256(pfn)
+    (sha256, timing) = file_checksum(pfn)
     if sha256 is None:
         return None
-    ts_end = time.time()
 
-    return "      sha256: %s\n      checksum_timing: %.3f\n" % (
-        sha256,
-        ts_end - ts_start,
-    )
+    return "      sha256: %s\n      checksum_timing: %.3f\n" % (sha256, timing)
 
 
 def generate_fullstat_yaml(lfn, pfn):
@@ -259,16 +232,9 @@ def generate_fullstat_yaml(lfn, pfn):
     Generates kickstart yaml for the given file
     """
 
-    ts_start = time.time()
-    sha256 = generate_sha256(pfn)
+    (sha256, timing) = file_checksum(pfn)
     if sha256 is None:
         return None
-    ts_end = time.time()
-
-    yaml = ""
-    yaml += '    "%s":\n' % (lfn)
-    yaml += "      comment: entry generated by pegasus-integrity\n"
-    yaml += '      file_name: "%s"\n' % (pfn)
 
     try:
         s = os.stat(pfn)
@@ -276,79 +242,41 @@ def generate_fullstat_yaml(lfn, pfn):
         # if we can't stat, just return
         return ""
 
-    uname = ""
-    try:
-        uname = pwd.getpwuid(s.st_uid).pw_name
-    except Exception:
-        pass
-    gname = ""
-    try:
-        gname = grp.getgrgid(s.st_gid).gr_name
-    except Exception:
-        pass
-    yaml += (
-        "      mode: 0o%o\n"
-        "      size: %d\n"
-        "      inode: %d\n"
-        "      nlink: %d\n"
-        "      mtime: %s\n"
-        "      atime: %s\n"
-        "      ctime: %s\n"
-        "      uid: %d\n"
-        "      user: %s\n"
-        "      gid: %d\n"
-        "      group: %s\n"
-        "      output: True\n"
-        % (
-            s.st_mode,
-            s.st_size,
-            s.st_ino,
-            s.st_nlink,
-            iso8601(s.st_mtime),
-            iso8601(s.st_atime),
-            iso8601(s.st_ctime),
-            s.st_uid,
-            uname,
-            s.st_gid,
-            gname,
-        )
-    )
-    yaml += "      sha256: %s\n" "      checksum_timing: %.3f\n" % (
-        sha256,
-        ts_end - ts_start,
-    )
-    return yaml
+    return integrity.fullstat_yaml(lfn, pfn, sha256, timing, s)
 
 
-def check_integrity(fname, lfn, meta_data, print_timings):
+def meta_checksums(meta_data):
     """
-    Checks the integrity of a file given a set of metadata
+    Returns the expected checksums in the metadata, by lfn
+    """
+    expected = {}
+    for entry in meta_data:
+        if "_attributes" in entry and "checksum.value" in entry["_attributes"]:
+            expected[entry["_id"]] = entry["_attributes"]["checksum.value"]
+    return expected
+
+
+def check_integrity(fname, lfn, expected, print_timings):
+    """
+    Checks the integrity of a file given the checksums from the metadata
     """
 
     global count_succeeded
     global count_failed
     global total_timing
 
-    ts_start = time.time()
-
     if lfn is None or lfn == "":
         lfn = fname
 
     # find the expected checksum in the metadata
-    expected_sha256 = None
-    for entry in meta_data:
-        if entry["_id"] == lfn:
-            if "_attributes" in entry and "checksum.value" in entry["_attributes"]:
-                expected_sha256 = entry["_attributes"]["checksum.value"]
+    expected_sha256 = expected.get(lfn)
     if expected_sha256 is None:
         logger.error("No checksum in the meta data for " + lfn)
         return False
 
-    current_sha256 = generate_sha256(fname)
+    (current_sha256, timing) = file_checksum(fname)
 
-    ts_end = time.time()
-
-    total_timing += ts_end - ts_start
+    total_timing += timing
 
     if print_timings:
         check_info_yaml(
@@ -363,7 +291,7 @@ def check_integrity(fname, lfn, meta_data, print_timings):
     if current_sha256 != expected_sha256:
         logger.error(
             "%s: Expected checksum (%s) does not match the calculated checksum (%s) (timing: %.3f)"
-            % (fname, expected_sha256, current_sha256, ts_end - ts_start)
+            % (fname, expected_sha256, current_sha256, timing)
         )
         count_failed += 1
         return False
@@ -414,6 +342,21 @@ def check_info_yaml(lfn, pfn, sha256, expected_sha256, success):
         multipart_out("    sha256_expected: %s\n" % expected_sha256)
 
 
+def split_files(files):
+    """
+    Splits a : separated list of files into (lfn, pfn) tuples. The lfn can
+    be encoded in the file name in the format lfn=pfn
+    """
+    pairs = []
+    for f in str.split(files, ":"):
+        lfn = None
+        pfn = f
+        if "=" in f:
+            (lfn, pfn) = str.split(f, "=", 1)
+        pairs.append((lfn, pfn))
+    return pairs
+
+
 def dump_summary_yaml():
     """
     outputs a timing block for Pegasus monitoring
@@ -494,6 +437,15 @@ def main():
         dest="print_timings",
         help="Display timing data after verifying files",
     )
+    parser.add_option(
+        "",
+        "--cache",
+        action="store",
+        dest="cache",
+        help="File to keep the checksums of already hashed files in."
+        + " Defaults to $PEGASUS_INTEGRITY_CACHE, or a file in the"
+        + " PegasusLite work directory. An empty value turns the cache off.",
+    )
     parser.add_option(
         "",
         "--debug",
@@ -506,6 +458,23 @@ def main():
     (options, args) = parser.parse_args()
     setup_logger(options.debug)
 
+    # files hashed by a previous invocation in the same job are not hashed
+    # again, except when verifying them: a file modified in place could have
+    # kept its cache key
+    global checksum_cache
+    cache_file = options.cache
+    if cache_file is None:
+        cache_file = os.environ.get("PEGASUS_INTEGRITY_CACHE")
+    if cache_file is None and "pegasus_lite_work_dir" in os.environ:
+        cache_file = os.path.join(
+            os.environ["pegasus_lite_work_dir"], ".pegasus-integrity-cache"
+        )
+    if cache_file:
+        logger.debug("Using the checksum cache in %s" % (cache_file))
+        checksum_cache = integrity.ChecksumCache(
+            cache_file, lookup=options.verify_files is None
+        )
+
     # sanity checks
     if (
         sum(
@@ -527,40 +496,31 @@ def main():
         sys.exit(1)
 
     if options.generate_files:
-        for f in str.split(options.generate_files, ":"):
+        files = str.split(options.generate_files, ":")
+        generate_checksums(files)
+        for f in files:
             results = generate_sha256(f)
             if not results:
                 myexit(1)
             print(results + "  " + f)
 
     elif options.generate_yaml:
-        for f in str.split(options.generate_yaml, ":"):
-            # lfn can be encoded in the file name in the format lfn=pfn
-            lfn = None
-            pfn = f
-            if "=" in f:
-                (lfn, pfn) = str.split(f, "=", 1)
+        files = split_files(options.generate_yaml)
+        generate_checksums([pfn for (lfn, pfn) in files])
+        for (lfn, pfn) in files:
             results = generate_yaml(lfn, pfn)
             if not results:
                 myexit(1)
             print(results)
 
     elif options.generate_fullstat_yaml:
-        for f in str.split(options.generate_fullstat_yaml, ":"):
-            # lfn can be encoded in the file name in the format lfn=pfn
-            lfn = None
-            pfn = f
-            if "=" in f:
-                (lfn, pfn) = str.split(f, "=", 1)
+        files = split_files(options.generate_fullstat_yaml)
+        generate_checksums([pfn for (lfn, pfn) in files])
+        for (lfn, pfn) in files:
             results = generate_fullstat_yaml(lfn, pfn)
             if not results:
                 myexit(1)
-            # if lfn is not None and 'KICKSTART_INTEGRITY_DATA' in os.environ:
-            if "KICKSTART_INTEGRITY_DATA" in os.environ:
-                f = open(os.environ["KICKSTART_INTEGRITY_DATA"], "a")
-                f.write(results)
-                f.close()
-            else:
+            if not integrity.write_kickstart_data(results):
                 print(results)
 
     elif options.verify_files:
@@ -588,13 +548,11 @@ def main():
 
         # now check the files
         exit_code = 0
-        for f in str.split(files, ":"):
-            # lfn can be encoded in the file name in the format lfn=pfn
-            lfn = None
-            pfn = f
-            if "=" in f:
-                (lfn, pfn) = str.split(f, "=", 1)
-            results = check_integrity(pfn, lfn, meta_data, options.print_timings)
+        expected = meta_checksums(meta_data)
+        files = split_files(files)
+        generate_checksums([pfn for (lfn, pfn) in files if (lfn or pfn) in expected])
+        for (lfn, pfn) in files:
+            results = check_integrity(pfn, lfn, expected, options.print_timings)
             if not results:
                 exit_code = 1
 
@@ -22,7 +22,9 @@ Usage: pegasus-transfer [options]
 #  limitations under the License.
 ##
 
+import collections
 import hashlib
+import heapq
 import io
 import json
 import logging
@@ -41,6 +43,9 @@ import threading
 import time
 import traceback
 
+from Pegasus.tools import file_copy
+from Pegasus.tools import http_downloader as http_dl
+from Pegasus.tools import integrity
 from Pegasus.tools import worker_utils as utils
 
 try:
@@ -48,11 +53,6 @@ try:
 except Exception:
     import ConfigParser as configparser
 
-try:
-    import queue
-except Exception:
-    import Queue as queue
-
 try:
     # Python 3.0 and later
     from urllib import parse as urllib
@@ -205,6 +205,9 @@ class TransferBase(object):
     def __init__(self):
         self._sub_transfer_index = 0
         self._sub_transfer_count = 0
+        # the attempt the scheduler is on, counting all the src/dst pairs
+        # tried as one attempt
+        self.attempt_current = 1
 
     def get_sub_transfer_index(self):
         return self._sub_transfer_index
@@ -218,7 +221,7 @@ class Mkdir(TransferBase):
     Represents a single mkdir request
     """
 
-    def __init(self):
+    def __init__(self):
         super(Mkdir, self).__init__()
         self._target_url = None
 
@@ -246,7 +249,7 @@ class Remove(TransferBase):
     Represents a single remove request
     """
 
-    def __init(self):
+    def __init__(self):
         super(Remove, self).__init__()
         self._target_url = None
         self._recursive = False
@@ -504,6 +507,11 @@ class TransferHandlerBase(object):
     _mkdir_cleanup_protocols = []
     _protocol_map = []
 
+    # protocols the handler can read from / write to as a stream, for
+    # two stage transfers without a temporary file
+    _stream_read_protocols = []
+    _stream_write_protocols = []
+
     lock = threading.Lock()
 
     def do_mkdirs(self, mkdir_list):
@@ -544,27 +552,80 @@ class TransferHandlerBase(object):
         item = str(src_proto) + "->" + str(dst_proto)
         return item in self._protocol_map
 
-    def _pre_transfer_attempt(self, transfer):
+    def stream_read_check(self, proto):
+        """
+        Checks to see if the handler can open_stream() the given source
+        protocol
+        """
+        return proto in self._stream_read_protocols
+
+    def stream_write_check(self, proto):
+        """
+        Checks to see if the handler can write_stream() to the given
+        destination protocol
+        """
+        return proto in self._stream_write_protocols
+
+    def open_stream(self, transfer):
         """
-        A common callback from do_transfers for things like integrity checking
+        Opens the source of the transfer, returning a file-like object to
+        read the data from - derived classes listing protocols in
+        _stream_read_protocols should override this method
+        """
+        raise RuntimeError("open_stream() is not implemented in " + self._name)
+
+    def write_stream(self, transfer, stream):
+        """
+        Writes the data read from stream to the destination of the transfer
+        - derived classes listing protocols in _stream_write_protocols
+        should override this method
+        """
+        raise RuntimeError("write_stream() is not implemented in " + self._name)
+
+    def _pre_transfer_attempt(self, transfer, inline_checksum=False):
+        """
+        A common callback from do_transfers for things like integrity checking.
+        Handlers computing the checksum during the transfer set inline_checksum
+        and pass the result to _post_transfer_attempt()
         """
 
         # do we need to calculate integrity checksums?
-        if transfer.generate_checksum and transfer.get_src_proto() == "file":
+        if (
+            transfer.generate_checksum
+            and not inline_checksum
+            and transfer.get_src_proto() == "file"
+        ):
             self._generate_integrity_checksum(
                 transfer.lfn, transfer.get_src_path(), transfer.linkage
             )
 
-    def _post_transfer_attempt(self, transfer, was_successful, t_start, t_end=None):
+    def _post_transfer_attempt(
+        self, transfer, was_successful, t_start, t_end=None, checksum=None
+    ):
         """
-        A common callback from do_transfers to collect statistics for transfers
+        A common callback from do_transfers to collect statistics for transfers.
+        checksum is the integrity.ChecksumReader the data went through, for
+        checksums computed during the transfer
         """
 
         if t_end is None:
             t_end = time.time()
 
         # do we need to calculate integrity checksums?
-        if (
+        if was_successful and transfer.generate_checksum and checksum is not None:
+            fname = transfer.dst_url()
+            if transfer.get_dst_proto() == "file":
+                fname = transfer.get_dst_path()
+            elif transfer.get_src_proto() == "file":
+                fname = transfer.get_src_path()
+            self._record_integrity_checksum(
+                transfer.lfn,
+                fname,
+                checksum.hexdigest(),
+                checksum.timing,
+                checksum.size,
+            )
+        elif (
             was_successful
             and transfer.generate_checksum
             and transfer.get_dst_proto() == "file"
@@ -646,6 +707,31 @@ class TransferHandlerBase(object):
             # stats.add_integrity_generate(linkage, tc.get_duration())
             self.lock.release()
 
+    def _record_integrity_checksum(self, lfn, fname, sha256, timing, size):
+        """
+        Records a checksum computed during the transfer, the same way
+        _generate_integrity_checksum() does. fname is the local file, or
+        the URL of the data.
+        """
+        if lfn is None or lfn == "":
+            logger.error("lfn is required when enabling checksumming")
+            return
+
+        st = None
+        if os.path.exists(fname):
+            st = os.stat(fname)
+        yaml = integrity.fullstat_yaml(lfn, fname, sha256, timing, st, size)
+
+        self.lock.acquire()
+        try:
+            if lfn in integrity_checksummed:
+                return
+            if not integrity.write_kickstart_data(yaml):
+                logger.info(yaml)
+            integrity_checksummed.append(lfn)
+        finally:
+            self.lock.release()
+
     def _check_similar(self, a, b):
         """
         compares two transfers, and determines if they are similar enough to be
@@ -720,6 +806,10 @@ class TransferHandlerBase(object):
         if not os.path.exists(path):
             return False
 
+        # directories are copied recursively, they have to be listable
+        if os.path.isdir(path):
+            return os.access(path, os.R_OK | os.X_OK)
+
         # for non-zero sized files, try to read a little bit at the beginning
         check_bytes = 0
         try:
@@ -745,23 +835,23 @@ class TransferHandlerBase(object):
 
 class FileHandler(TransferHandlerBase):
     """
-    Uses system commands to act on file:// URLs
+    Acts on file:// URLs in process, with the semantics of cp, ln, mkdir
+    and rm
     """
 
     _name = "FileHandler"
     _mkdir_cleanup_protocols = ["file"]
     _protocol_map = ["file->file"]
+    _stream_write_protocols = ["file"]
 
     def do_mkdirs(self, transfers):
         successful_l = []
         failed_l = []
         for t in transfers:
-            cmd = "/bin/mkdir -p '%s' " % (t.get_path())
             try:
-                tc = utils.TimedCommand(cmd)
-                tc.run()
-            except RuntimeError as err:
-                logger.error(err)
+                file_copy.makedirs(t.get_path())
+            except OSError as err:
+                logger.error("mkdir: %s" % err)
                 failed_l.append(t)
                 continue
             successful_l.append(t)
@@ -775,12 +865,20 @@ class FileHandler(TransferHandlerBase):
             prepare_local_dir(os.path.dirname(t.get_dst_path()))
 
             # src has to exist and be readable
-            if not verify_local_file(t.get_src_path()):
+            if not os.path.isdir(t.get_src_path()) and not verify_local_file(
+                t.get_src_path()
+            ):
                 failed_l.append(t)
                 self._post_transfer_attempt(t, False, t_start)
                 continue
 
-            self._pre_transfer_attempt(t)
+            # files being copied are checksummed as they are read
+            inline_checksum = (
+                t.generate_checksum
+                and not symlink_file_transfer
+                and not os.path.isdir(t.get_src_path())
+            )
+            self._pre_transfer_attempt(t, inline_checksum)
 
             if os.path.exists(t.get_src_path()) and os.path.exists(t.get_dst_path()):
                 # make sure src and target are not the same file - have to
@@ -809,39 +907,58 @@ class FileHandler(TransferHandlerBase):
                 continue
 
             # some of the time, PegasusLite can tell us to take shortcut and symlink the files
-            if symlink_file_transfer:
-                cmd = "ln -f -s '%s' '%s'" % (t.get_src_path(), t.get_dst_path())
-            else:
-                cmd = "/bin/cp -f -R -L '%s' '%s'" % (
-                    t.get_src_path(),
-                    t.get_dst_path(),
-                )
+            checksum = None
             try:
-                tc = utils.TimedCommand(cmd)
-                tc.run()
-            except RuntimeError as err:
+                if symlink_file_transfer:
+                    logger.info("ln -f -s %s %s" % (t.get_src_path(), t.get_dst_path()))
+                    file_copy.symlink(t.get_src_path(), t.get_dst_path())
+                else:
+                    logger.info(
+                        "cp -f -R -L %s %s" % (t.get_src_path(), t.get_dst_path())
+                    )
+                    if inline_checksum:
+                        checksum = self._copy_checksummed(
+                            t.get_src_path(), t.get_dst_path()
+                        )
+                    else:
+                        file_copy.copy(t.get_src_path(), t.get_dst_path())
+            except (IOError, OSError) as err:
                 logger.error(err)
                 failed_l.append(t)
                 self._post_transfer_attempt(t, False, t_start)
                 continue
             successful_l.append(t)
-            self._post_transfer_attempt(t, True, t_start)
+            self._post_transfer_attempt(t, True, t_start, checksum=checksum)
 
         return [successful_l, failed_l]
 
+    def write_stream(self, transfer, stream):
+        prepare_local_dir(os.path.dirname(transfer.get_dst_path()))
+        logger.info("Writing %s to %s" % (transfer.src_url(), transfer.get_dst_path()))
+        file_copy.write_stream(stream, transfer.get_dst_path())
+
+    def _copy_checksummed(self, src, dst):
+        """
+        Copies the file src to dst through user space, computing its
+        checksum on the way. Returns the integrity.ChecksumReader used.
+        """
+        if os.path.isdir(dst):
+            dst = os.path.join(dst, os.path.basename(src))
+        with open(src, "rb") as f:
+            checksum = integrity.ChecksumReader(f)
+            file_copy.write_stream(
+                checksum, dst, stat.S_IMODE(os.fstat(f.fileno()).st_mode)
+            )
+        return checksum
+
     def do_removes(self, transfers):
         successful_l = []
         failed_l = []
         for t in transfers:
-            cmd = "/bin/rm -f"
-            if t.get_recursive():
-                cmd += " -r "
-            cmd += " '%s' " % (t.get_path())
             try:
-                tc = utils.TimedCommand(cmd)
-                tc.run()
-            except RuntimeError as err:
-                logger.error(err)
+                file_copy.remove(t.get_path(), t.get_recursive())
+            except OSError as err:
+                logger.error("rm: %s" % err)
                 failed_l.append(t)
                 continue
             successful_l.append(t)
@@ -1292,16 +1409,66 @@ class GridFtpHandler(TransferHandlerBase):
 
 class HttpHandler(TransferHandlerBase):
     """
-    pulls from http/https/ftp using wget or curl
+    pulls from http/https with the built-in downloader, and from ftp using
+    wget or curl
     """
 
     _name = "HttpHandler"
     _mkdir_cleanup_protocols = []
     _protocol_map = ["http->file", "https->file", "ftp->file"]
+    _stream_read_protocols = ["http", "https"]
 
     def do_transfers(self, transfers):
 
-        tools = utils.Tools()
+        env = self._proxy_env(transfers)
+
+        if transfers[0].get_src_proto() == "ftp":
+            return self._exec_transfers(transfers, env)
+
+        proxy = env.get("http_proxy", os.environ.get("http_proxy"))
+
+        successful_l = []
+        failed_l = []
+        for t in transfers:
+
+            self._pre_transfer_attempt(t)
+
+            prepare_local_dir(os.path.dirname(t.get_dst_path()))
+
+            t_start = time.time()
+            checksum = None
+            try:
+                logger.info("Downloading %s to %s" % (t.src_url(), t.get_dst_path()))
+                if t.generate_checksum:
+                    # a single request, so that the data can be checksummed
+                    # in order as it arrives
+                    checksum = integrity.ChecksumReader(
+                        get_http_downloader().open(t.src_url(), proxy)
+                    )
+                    try:
+                        file_copy.write_stream(checksum, t.get_dst_path())
+                    finally:
+                        checksum.close()
+                else:
+                    get_http_downloader().download(t.src_url(), t.get_dst_path(), proxy)
+                stats_add(t.get_dst_path())
+            except Exception as err:
+                logger.error(err)
+                self._post_transfer_attempt(t, False, t_start)
+                failed_l.append(t)
+                continue
+            self._post_transfer_attempt(t, True, t_start, checksum=checksum)
+            successful_l.append(t)
+
+        return [successful_l, failed_l]
+
+    def open_stream(self, transfer):
+        env = self._proxy_env([transfer])
+        proxy = env.get("http_proxy", os.environ.get("http_proxy"))
+        logger.info("Streaming %s" % (transfer.src_url()))
+        return get_http_downloader().open(transfer.src_url(), proxy)
+
+    def _proxy_env(self, transfers):
         env = {}
 
         # Open Science Grid sites can inform us about local Squid proxies
@@ -1319,6 +1486,13 @@ class HttpHandler(TransferHandlerBase):
             if "http_proxy" in os.environ:
                 del os.environ["http_proxy"]
 
+        return env
+
+    def _exec_transfers(self, transfers, env):
+        """
+        Transfers the files with wget or curl
+        """
+        tools = utils.Tools()
         if (
             tools.find("wget", "--version", "([0-9]+\.[0-9]+)") is None
             and tools.find("curl", "--version", " ([0-9]+\.[0-9]+)") is None
@@ -2007,6 +2181,8 @@ class S3Handler(TransferHandlerBase):
         "s3s->s3",
         "s3s->s3s",
     ]
+    _stream_read_protocols = ["s3", "s3s"]
+    _stream_write_protocols = ["s3", "s3s"]
 
     def do_mkdirs(self, mkdir_l):
         tools = utils.Tools()
@@ -2047,8 +2223,11 @@ class S3Handler(TransferHandlerBase):
 
     def do_transfers(self, transfers):
 
+        # transfer in this process when boto3 is available, instead of
+        # starting pegasus-s3 for every file
+        s3 = import_pegasus_s3()
         tools = utils.Tools()
-        if tools.find("pegasus-s3", "help", None, [prog_dir]) is None:
+        if s3 is None and tools.find("pegasus-s3", "help", None, [prog_dir]) is None:
             logger.error(
                 "Unable to do S3 transfers because pegasus-s3 could not be found"
             )
@@ -2058,58 +2237,40 @@ class S3Handler(TransferHandlerBase):
         failed_l = []
         for t in transfers:
 
-            self._pre_transfer_attempt(t)
+            self._pre_transfer_attempt(t, inline_checksum=s3 is not None)
 
             t_start = time.time()
-            env = {}
 
-            # use cp for s3->s3 transfers, and get/put when one end is a file://
-            if (t.get_src_proto() == "s3" or t.get_src_proto() == "s3s") and (
-                t.get_dst_proto() == "s3" or t.get_dst_proto() == "s3s"
-            ):
-                # s3 -> s3
-                env = self._s3_cred_env(t.get_src_site_label())
-                cmd = tools.full_path("pegasus-s3") + " cp -f -c '%s' '%s'" % (
-                    t.src_url(),
-                    t.dst_url(),
-                )
-            elif t.get_dst_proto() == "file":
-                # this is a 'get'
-                env = self._s3_cred_env(t.get_src_site_label())
-                prepare_local_dir(os.path.dirname(t.get_dst_path()))
-                cmd = tools.full_path("pegasus-s3") + " get '%s' '%s'" % (
-                    t.src_url(),
-                    t.get_dst_path(),
-                )
-            else:
-                # this is a 'put'
-                if t.get_src_proto() == "file":
-                    # src has to exist and be readable
-                    if not verify_local_file(t.get_src_path()):
-                        failed_l.append(t)
-                        self._post_transfer_attempt(t, False, t_start)
-                        continue
-                env = self._s3_cred_env(t.get_dst_site_label())
-                cmd = tools.full_path("pegasus-s3") + " put -f -b '%s' '%s'" % (
-                    t.get_src_path(),
-                    t.dst_url(),
-                )
+            # src has to exist and be readable for a 'put'
+            if t.get_src_proto() == "file" and not verify_local_file(t.get_src_path()):
+                failed_l.append(t)
+                self._post_transfer_attempt(t, False, t_start)
+                continue
 
+            checksum = None
             try:
-                tc = utils.TimedCommand(cmd, env_overrides=env)
-                tc.run()
+                if s3 is None:
+                    self._exec_transfer(tools, t)
+                else:
+                    checksum = self._transfer_in_process(s3, t)
             except Exception as err:
                 logger.error(err)
                 self._post_transfer_attempt(t, False, t_start)
                 failed_l.append(t)
                 continue
 
-            self._post_transfer_attempt(t, True, t_start)
+            self._post_transfer_attempt(t, True, t_start, checksum=checksum)
             successful_l.append(t)
 
         return [successful_l, failed_l]
 
     def do_removes(self, removes_list):
+
+        # remove in this process when boto3 is available
+        s3 = import_pegasus_s3()
+        if s3 is not None:
+            return self._remove_in_process(s3, removes_list)
+
         tools = utils.Tools()
         if tools.find("pegasus-s3", "help", None, [prog_dir]) is None:
             logger.error(
@@ -2117,69 +2278,279 @@ class S3Handler(TransferHandlerBase):
             )
             return [[], removes_list]
 
-        try:
-            tmp_fd, tmp_name = tempfile.mkstemp(
-                prefix="pegasus-transfer-", suffix=".lst"
-            )
-            tmp_file = io.open(tmp_fd, "w+")
-        except Exception:
-            raise RuntimeError("Unable to create tmp file for pegasus-s3 cleanup")
-
         successful_l = []
         failed_l = []
-        for t in removes_list:
 
-            fixed_url = t.get_url()
+        # recursive removes need their own pegasus-s3 rm -r
+        for recursive in (False, True):
+            removes = [t for t in removes_list if bool(t.get_recursive()) == recursive]
+            if len(removes) == 0:
+                continue
 
-            # PM-790: recursive deletes are really a pattern matching. For example,
-            # if told to remove the foo/bar directory, we need to translate it into
-            # foo/bar/*
-            if t.get_recursive():
-                # first make sure there are no trailing slashes
-                last_char = len(fixed_url) - 1
-                while (
-                    len(fixed_url) > 0 and last_char > 0 and fixed_url[last_char] == "/"
-                ):
-                    fixed_url = fixed_url[0:last_char]
-                    last_char -= 1
-                fixed_url += "/*"
-                logger.info("Transformed remote URL to " + fixed_url)
-
-            tmp_file.write("%s\n" % (fixed_url))
+            try:
+                tmp_fd, tmp_name = tempfile.mkstemp(
+                    prefix="pegasus-transfer-", suffix=".lst"
+                )
+                tmp_file = io.open(tmp_fd, "w+")
+            except Exception:
+                raise RuntimeError("Unable to create tmp file for pegasus-s3 cleanup")
 
-        tmp_file.close()
+            for t in removes:
+                tmp_file.write("%s\n" % (t.get_url()))
 
-        env = self._s3_cred_env(removes_list[0].get_site_label())
+            tmp_file.close()
 
-        cmd = tools.full_path("pegasus-s3")
-        if logger.isEnabledFor(logging.DEBUG):
-            cmd += " -v"
-        cmd += " rm -f -F " + tmp_name
+            env = self._s3_cred_env(removes[0].get_site_label())
 
-        success = False
-        try:
-            tc = utils.TimedCommand(cmd, env_overrides=env)
-            tc.run()
-            success = True
-        except RuntimeError as err:
-            logger.error(err)
+            cmd = tools.full_path("pegasus-s3")
+            if logger.isEnabledFor(logging.DEBUG):
+                cmd += " -v"
+            cmd += " rm -f"
+            if recursive:
+                cmd += " -r"
+            cmd += " -F " + tmp_name
 
-        # as we don't know which removes in the set succeeded/failed, we have
-        # to mark them all the same (for example, one failure means all removes
-        # gets marked as failed)
-        for t in removes_list:
+            success = False
+            try:
+                tc = utils.TimedCommand(cmd, env_overrides=env)
+                tc.run()
+                success = True
+            except RuntimeError as err:
+                logger.error(err)
+
+            # as we don't know which removes in the set succeeded/failed, we have
+            # to mark them all the same (for example, one failure means all removes
+            # gets marked as failed)
             if success:
-                successful_l.append(t)
+                successful_l.extend(removes)
             else:
+                failed_l.extend(removes)
+
+            try:
+                os.unlink(tmp_name)
+            except Exception:
+                pass
+
+        return [successful_l, failed_l]
+
+    def _remove_in_process(self, s3, removes_list):
+        """
+        Removes the keys with the Pegasus.s3 module, with one bulk delete
+        per bucket for the plain removes, and one per recursive remove, so
+        that they do not stop at the first failure.
+        """
+        successful_l = []
+        failed_l = []
+
+        groups = {}
+        for t in removes_list:
+            try:
+                uri = s3.parse_uri(t.get_url())
+                if uri.bucket is None or uri.key is None:
+                    raise RuntimeError("URL for rm must contain a key: %s" % uri)
+            except Exception as err:
+                logger.error(err)
                 failed_l.append(t)
+                continue
+            if t.get_recursive():
+                group = (t.get_site_label(), uri.ident, uri.bucket, id(t))
+            else:
+                group = (t.get_site_label(), uri.ident, uri.bucket, None)
+            groups.setdefault(group, []).append((t, uri))
 
-        try:
-            os.unlink(tmp_name)
-        except Exception:
-            pass
+        for group, removes in groups.items():
+            site_label = group[0]
+            uri = removes[0][1]
+            recursive = group[3] is not None
+            logger.info(
+                "S3 %sremove of %d keys in %s"
+                % ("recursive " if recursive else "", len(removes), uri.bucket)
+            )
+            try:
+                config = self._s3_config(site_label)
+                errors = s3.remove(
+                    s3.get_shared_s3_client(config, uri, max_threads),
+                    uri.bucket,
+                    [u.key for (t, u) in removes],
+                    recursive=recursive,
+                    force=True,
+                    batch_size=config.getint(uri.site, "batch_delete_size"),
+                    transfer_config=s3.get_transfer_config(config, uri),
+                )
+            except Exception as err:
+                logger.error(err)
+                failed_l.extend(t for (t, u) in removes)
+                continue
+
+            for key, reason in errors.items():
+                logger.error("Unable to remove %s: %s" % (key, reason))
+            for (t, u) in removes:
+                if (recursive and errors) or u.key in errors:
+                    failed_l.append(t)
+                else:
+                    successful_l.append(t)
 
         return [successful_l, failed_l]
 
+    def stream_read_check(self, proto):
+        # streams are only available in process
+        return (
+            TransferHandlerBase.stream_read_check(self, proto)
+            and import_pegasus_s3() is not None
+        )
+
+    def stream_write_check(self, proto):
+        return (
+            TransferHandlerBase.stream_write_check(self, proto)
+            and import_pegasus_s3() is not None
+        )
+
+    def open_stream(self, transfer):
+        s3 = import_pegasus_s3()
+        logger.info("Streaming %s" % (transfer.src_url()))
+        config = self._s3_config(transfer.get_src_site_label())
+        uri = s3.parse_uri(transfer.src_url())
+        if uri.bucket is None or uri.key is None:
+            raise RuntimeError("URL must contain a bucket and a key: %s" % uri)
+        return s3.open_object(s3.get_shared_s3_client(config, uri, max_threads), uri)
+
+    def write_stream(self, transfer, stream):
+        s3 = import_pegasus_s3()
+        logger.info("Writing %s to %s" % (transfer.src_url(), transfer.dst_url()))
+        config = self._s3_config(transfer.get_dst_site_label())
+        uri = s3.parse_uri(transfer.dst_url())
+        if uri.bucket is None:
+            raise RuntimeError("URL for put must have a bucket: %s" % uri)
+        if uri.key is None:
+            uri.key = os.path.basename(transfer.get_src_path())
+        s3.upload_stream(
+            s3.get_shared_s3_client(config, uri, max_threads),
+            stream,
+            uri,
+            create_bucket=True,
+            force=True,
+            transfer_config=s3.get_transfer_config(config, uri),
+        )
+
+    def _exec_transfer(self, tools, t):
+        """
+        Transfers one file with pegasus-s3
+        """
+        # use cp for s3->s3 transfers, and get/put when one end is a file://
+        if (t.get_src_proto() == "s3" or t.get_src_proto() == "s3s") and (
+            t.get_dst_proto() == "s3" or t.get_dst_proto() == "s3s"
+        ):
+            # s3 -> s3
+            env = self._s3_cred_env(t.get_src_site_label())
+            cmd = tools.full_path("pegasus-s3") + " cp -f -c '%s' '%s'" % (
+                t.src_url(),
+                t.dst_url(),
+            )
+        elif t.get_dst_proto() == "file":
+            # this is a 'get'
+            env = self._s3_cred_env(t.get_src_site_label())
+            prepare_local_dir(os.path.dirname(t.get_dst_path()))
+            cmd = tools.full_path("pegasus-s3") + " get '%s' '%s'" % (
+                t.src_url(),
+                t.get_dst_path(),
+            )
+        else:
+            # this is a 'put'
+            env = self._s3_cred_env(t.get_dst_site_label())
+            cmd = tools.full_path("pegasus-s3") + " put -f -b '%s' '%s'" % (
+                t.get_src_path(),
+                t.dst_url(),
+            )
+
+        tc = utils.TimedCommand(cmd, env_overrides=env)
+        tc.run()
+
+    def _transfer_in_process(self, s3, t):
+        """
+        Transfers one file with the Pegasus.s3 module, doing the same as
+        the pegasus-s3 commands of _exec_transfer. The clients are shared
+        by all the transfers to the same endpoint and identity. Gets and
+        puts requesting a checksum stream the data through an
+        integrity.ChecksumReader, which is returned.
+        """
+        if (t.get_src_proto() == "s3" or t.get_src_proto() == "s3s") and (
+            t.get_dst_proto() == "s3" or t.get_dst_proto() == "s3s"
+        ):
+            # s3 -> s3
+            logger.info("S3 copy of %s to %s" % (t.src_url(), t.dst_url()))
+            config = self._s3_config(t.get_src_site_label())
+            src = s3.parse_uri(t.src_url())
+            dest = s3.parse_uri(t.dst_url())
+            s3.copy(
+                s3.get_shared_s3_client(config, src, max_threads),
+                [src],
+                dest,
+                create=True,
+                force=True,
+                transfer_config=s3.get_transfer_config(config, src),
+            )
+        elif t.get_dst_proto() == "file":
+            # this is a 'get'
+            logger.info("S3 get of %s to %s" % (t.src_url(), t.get_dst_path()))
+            config = self._s3_config(t.get_src_site_label())
+            prepare_local_dir(os.path.dirname(t.get_dst_path()))
+            uri = s3.parse_uri(t.src_url())
+            if uri.bucket is None or uri.key is None:
+                raise RuntimeError("URL must contain a bucket and a key: %s" % uri)
+            client = s3.get_shared_s3_client(config, uri, max_threads)
+            if t.generate_checksum:
+                checksum = integrity.ChecksumReader(s3.open_object(client, uri))
+                try:
+                    file_copy.write_stream(checksum, t.get_dst_path())
+                finally:
+                    checksum.close()
+                return checksum
+            s3.download(
+                client,
+                uri,
+                t.get_dst_path(),
+                transfer_config=s3.get_transfer_config(config, uri),
+            )
+        else:
+            # this is a 'put'
+            logger.info("S3 put of %s to %s" % (t.get_src_path(), t.dst_url()))
+            config = self._s3_config(t.get_dst_site_label())
+            uri = s3.parse_uri(t.dst_url())
+            if uri.bucket is None:
+                raise RuntimeError("URL for put must have a bucket: %s" % uri)
+            if uri.key is None:
+                uri.key = os.path.basename(t.get_src_path())
+            client = s3.get_shared_s3_client(config, uri, max_threads)
+            if t.generate_checksum:
+                with open(t.get_src_path(), "rb") as f:
+                    checksum = integrity.ChecksumReader(f)
+                    s3.upload_stream(
+                        client,
+                        checksum,
+                        uri,
+                        create_bucket=True,
+                        force=True,
+                        transfer_config=s3.get_transfer_config(config, uri),
+                    )
+                return checksum
+            s3.upload(
+                client,
+                t.get_src_path(),
+                uri,
+                create_bucket=True,
+                force=True,
+                transfer_config=s3.get_transfer_config(config, uri),
+            )
+
+    def _s3_config(self, site_label):
+        """
+        Returns the parsed S3CFG file for the site, read once per file
+        """
+        path = self._s3_cred_env(site_label)["S3CFG"]
+        if path not in s3_configs:
+            s3_configs[path] = import_pegasus_s3().read_config(path)
+        return s3_configs[path]
+
     def _s3_cred_env(self, site_label):
         env = {}
         if "S3CFG" in os.environ:
@@ -3524,11 +3895,10 @@ class SymlinkHandler(TransferHandlerBase):
                     successful_l.append(t)
                     continue
 
-            cmd = "ln -f -s '%s' '%s'" % (t.get_src_path(), t.get_dst_path())
+            logger.info("ln -f -s %s %s" % (t.get_src_path(), t.get_dst_path()))
             try:
-                tc = utils.TimedCommand(cmd, timeout_secs=60)
-                tc.run()
-            except RuntimeError as err:
+                file_copy.symlink(t.get_src_path(), t.get_dst_path())
+            except OSError as err:
                 logger.error(err)
                 self._post_transfer_attempt(t, False, t_start)
                 failed_l.append(t)
@@ -3543,13 +3913,10 @@ class SymlinkHandler(TransferHandlerBase):
         successful_l = []
         failed_l = []
         for t in transfers:
-            cmd = "/bin/rm -f"
-            cmd += " '%s' " % (t.get_path())
             try:
-                tc = utils.TimedCommand(cmd)
-                tc.run()
-            except RuntimeError as err:
-                logger.error(err)
+                file_copy.remove(t.get_path())
+            except OSError as err:
+                logger.error("rm: %s" % err)
                 failed_l.append(t)
                 continue
             successful_l.append(t)
@@ -3990,7 +4357,7 @@ class Stats:
         self._integrity_generate_count = {}
         self._integrity_generate_duration = {}
 
-    def add_stats(self, transfer, was_successful, t_start, t_end):
+    def add_stats(self, transfer, was_successful, t_start, t_end, size=None):
 
         key = transfer.get_src_site_label() + "->" + transfer.get_dst_site_label()
         if key not in self._site_pair_count:
@@ -4007,7 +4374,12 @@ class Stats:
         elif transfer.get_dst_proto() == "file":
             local_filename = transfer.get_dst_path()
 
-        if local_filename is None:
+        if size is not None:
+            # streamed transfers count the bytes as they go
+            bytes = size
+            self._total_bytes += bytes
+            self._site_pair_bytes[key] += bytes
+        elif local_filename is None:
             self._detected_3rd_party = True
         else:
             try:
@@ -4241,6 +4613,31 @@ class Panorama:
             data = u.read()
 
 
+class HandlerRegistry(object):
+    """
+    The transfer handlers, one instance of each shared by all the threads,
+    indexed by the src/dst protocol pairs they can handle. When more than
+    one handler can handle a pair, the first one registered is used.
+    """
+
+    def __init__(self, handler_classes):
+        self._handlers = {}
+        for handler_class in handler_classes:
+            h = handler_class()
+            for item in h._protocol_map:
+                src_proto, dst_proto = item.split("->", 1)
+                self._handlers.setdefault((src_proto, dst_proto), h)
+            for proto in h._mkdir_cleanup_protocols:
+                self._handlers.setdefault((None, proto), h)
+
+    def find(self, src_proto, dst_proto):
+        """
+        Returns the handler for the src/dst protocol pair, or None. A None
+        src_proto finds the handler for mkdirs and removes on dst_proto.
+        """
+        return self._handlers.get((src_proto, dst_proto))
+
+
 class SimilarWorkSet:
     """
     A transfer set is a set of similar transfers, similar in the sense
@@ -4248,44 +4645,23 @@ class SimilarWorkSet:
     """
 
     _transfers = None
-    _available_handlers = []
     _primary_handler = None
     _secondary_handler = None
+    _streaming = False
     _tmp_file = None
-    _excessive_failures = False
 
-    def __init__(self, transfers_l, completed_q, failed_q):
+    def __init__(self, transfers_l):
 
         self._transfers = transfers_l
-        self._completed_q = completed_q
-        self._failed_q = failed_q
-
-        # load all the handlers - does the order matter?
-        self._available_handlers.append(FileHandler())
-        self._available_handlers.append(GridFtpHandler())
-        self._available_handlers.append(HttpHandler())
-        self._available_handlers.append(IRodsHandler())
-        self._available_handlers.append(S3Handler())
-        self._available_handlers.append(GlobusOnlineHandler())
-        self._available_handlers.append(GSHandler())
-        self._available_handlers.append(GFALHandler())
-        self._available_handlers.append(ScpHandler())
-        self._available_handlers.append(GSIScpHandler())
-        self._available_handlers.append(StashHandler())
-        self._available_handlers.append(SymlinkHandler())
-        self._available_handlers.append(DockerHandler())
-        self._available_handlers.append(SingularityHandler())
-        self._available_handlers.append(HPSSHandler())
-        self._available_handlers.append(WebdavHandler())
 
         # mkdirs and removes
         if isinstance(transfers_l[0], Mkdir) or isinstance(transfers_l[0], Remove):
             proto = transfers_l[0].get_proto()
-            for h in self._available_handlers:
-                if h.protocol_check(None, proto):
-                    self._primary_handler = h
-                    logger.debug("Selected %s for handling these transfers" % (h._name))
-                    return
+            h = handlers.find(None, proto)
+            if h is not None:
+                self._primary_handler = h
+                logger.debug("Selected %s for handling these transfers" % (h._name))
+                return
             raise RuntimeError("Unable to find handlers for target '%s'" % (proto))
 
         ## normal transfer below this
@@ -4312,11 +4688,11 @@ class SimilarWorkSet:
         # (sometimes we want to force split transfer to do things like
         #  local checksumming)
         if not self.force_split_transfers(transfers_l[0]):
-            for h in self._available_handlers:
-                if h.protocol_check(src_proto, dst_proto):
-                    self._primary_handler = h
-                    logger.debug("Selected %s for handling these transfers" % (h._name))
-                    return
+            h = handlers.find(src_proto, dst_proto)
+            if h is not None:
+                self._primary_handler = h
+                logger.debug("Selected %s for handling these transfers" % (h._name))
+                return
 
         # we need to split the transfer from src to local file,
         # and then transfer the local file to the dst
@@ -4332,34 +4708,40 @@ class SimilarWorkSet:
         # if transfers_l[0].get_src_type() is not None:
         #    middle_out_proto = 'file::' + transfers_l[0].get_src_type()
 
-        for h in self._available_handlers:
-            if h.protocol_check(src_proto, middle_in_proto):
-                self._primary_handler = h
-                break
-        for h in self._available_handlers:
-            # symlink destinations are a special case as a symlink to a temporary
-            # files does not make sense - override as a file->file transfer to force
-            # the file to be copied
-            if dst_proto == "symlink":
-                dst_proto = "file"
-            if h.protocol_check(middle_out_proto, dst_proto):
-                self._secondary_handler = h
-                break
+        self._primary_handler = handlers.find(src_proto, middle_in_proto)
+        # symlink destinations are a special case as a symlink to a temporary
+        # files does not make sense - override as a file->file transfer to force
+        # the file to be copied
+        if dst_proto == "symlink":
+            dst_proto = "file"
+        self._secondary_handler = handlers.find(middle_out_proto, dst_proto)
         if self._primary_handler is None or self._secondary_handler is None:
             raise RuntimeError(
                 "Unable to find handlers for '%s' to '%s' transfers"
                 % (src_proto, dst_proto)
             )
 
+        # when the first handler can read the source as a stream, and the
+        # second one can write it, the data does not have to go through a
+        # local file
+        self._streaming = self._primary_handler.stream_read_check(
+            src_proto
+        ) and self._secondary_handler.stream_write_check(dst_proto)
+
         logger.debug(
-            "Selected %s and %s for handling these transfers"
-            % (self._primary_handler._name, self._secondary_handler._name)
+            "Selected %s and %s for %s these transfers"
+            % (
+                self._primary_handler._name,
+                self._secondary_handler._name,
+                "streaming" if self._streaming else "handling",
+            )
         )
 
     def do_transfers(self):
         """
         given a list of transfers, figure out what handlers are needed
-        and then execute the transfers
+        and then execute the transfers - returns the lists of successful
+        and failed transfers
         """
 
         assert self._transfers is not None
@@ -4377,12 +4759,7 @@ class SimilarWorkSet:
             except Exception:
                 logger.error("Exception while doing mkdirs")
                 raise
-            # accounting
-            for t in success_list:
-                self._completed_q.put(t)
-            for t in failed_list:
-                self._failed_q.put(t)
-            return
+            return (success_list, failed_list)
 
         # removes
         if isinstance(self._transfers[0], Remove):
@@ -4393,16 +4770,11 @@ class SimilarWorkSet:
             except Exception:
                 logger.error("Exception while doing removes")
                 raise
-            # accounting
-            for t in success_list:
-                self._completed_q.put(t)
-            for t in failed_list:
-                self._failed_q.put(t)
-            return
+            return (success_list, failed_list)
 
         # actual transfers
         self._tmp_name = None
-        if self._secondary_handler is not None:
+        if self._secondary_handler is not None and not self._streaming:
             # we have a two stage transfer to deal with and we need a temp file
             self._tmp_name = self.get_temp_file()
             # open the permission up to make sure files downstream
@@ -4424,6 +4796,13 @@ class SimilarWorkSet:
                 logger.exception("Exception while doing transfer:")
                 raise
 
+        elif self._streaming:
+            for transfer in self._transfers:
+                if self._stream_transfer(transfer):
+                    success_list.append(transfer)
+                else:
+                    failed_list.append(transfer)
+
         else:
             for transfer in self._transfers:
 
@@ -4455,7 +4834,8 @@ class SimilarWorkSet:
                     failed_list.append(transfer)
 
         # remove temp file
-        self.clean_up_temp_file(self._tmp_name)
+        if self._tmp_name is not None:
+            self.clean_up_temp_file(self._tmp_name)
 
         # verify that the remotely stored file's checksum matches - this means
         # pulling the file back to the local filesystem and verifying the checksum
@@ -4510,24 +4890,47 @@ class SimilarWorkSet:
                 # no verification needed
                 success_list.append(t)
 
-        # accounting
-        for t in success_list:
-            self._completed_q.put(t)
-        for t in failed_list:
-            self._failed_q.put(t)
-        count_success = self._completed_q.qsize()
-        count_failed = self._failed_q.qsize()
-        count_total = count_success + count_failed
+        return (success_list, failed_list)
 
-        # determine if we saw excessive failures
-        if count_total > 10 and (count_failed / float(count_total)) > 0.8:
-            self._excessive_failures = True
-
-    def excessive_failures(self):
+    def _stream_transfer(self, transfer):
         """
-        Did the last transfer set see excessive failures?
+        Does a two stage transfer without a temp file: the data read by the
+        primary handler is written by the secondary handler as it arrives,
+        and checksummed on the way if requested. Returns True on success.
         """
-        return self._excessive_failures
+        t_start = time.time()
+        reader = None
+        success = False
+        try:
+            reader = integrity.ChecksumReader(
+                self._primary_handler.open_stream(transfer)
+            )
+            try:
+                self._secondary_handler.write_stream(transfer, reader)
+            finally:
+                reader.close()
+            success = True
+        except Exception as err:
+            logger.error(err)
+        t_end = time.time()
+
+        if success and transfer.generate_checksum:
+            fname = transfer.dst_url()
+            if transfer.get_dst_proto() in ("file", "symlink"):
+                fname = transfer.get_dst_path()
+            self._secondary_handler._record_integrity_checksum(
+                transfer.lfn, fname, reader.hexdigest(), reader.timing, reader.size
+            )
+
+        transfer.attempts += 1
+        stats.add_stats(
+            transfer,
+            success,
+            t_start,
+            t_end,
+            reader.size if reader is not None else None,
+        )
+        return success
 
     def has_gridftp_transfers(self):
         """
@@ -4610,46 +5013,253 @@ class SimilarWorkSet:
             pass
 
 
+class TransferScheduler(object):
+    """
+    Hands out the transfers to the WorkThreads as SimilarWorkSets, as soon
+    as a thread is free. The number of sets using the same protocol, or the
+    same host, at the same time can be limited so that one slow service
+    does not hold all the threads. Failed transfers are retried after a
+    backoff delay while the other transfers keep going.
+    """
+
+    def __init__(
+        self, transfers, attempts_max, set_size, protocol_limits=None, host_limit=0,
+    ):
+        # transfers which can be started now, in order
+        self._ready = collections.deque(transfers)
+        # transfers waiting for their next attempt: (start time, seq, transfer)
+        self._delayed = []
+        self._seq = 0
+        self._attempts_max = attempts_max
+        self._set_size = set_size
+        self._protocol_limits = protocol_limits or {}
+        self._host_limit = host_limit
+        # number of running sets using each protocol/host/retry slot
+        self._running = {}
+        self._running_sets = 0
+        # transfers which succeeded, or failed all their attempts
+        self._count_success = 0
+        self._count_failed = 0
+        self._cond = threading.Condition()
+        self.completed = []
+        self.failed = []
+        self.too_many_failures = False
+        self.tb = None
+
+    def next_set(self):
+        """
+        Waits for transfers which can be started, and returns them as a list
+        of similar transfers, along with the resources they hold. Returns
+        (None, None) once all the transfers are done, or once the scheduler
+        gave up after abort() or too many failures.
+        """
+        with self._cond:
+            while True:
+                if self._gave_up():
+                    return (None, None)
+
+                now = time.time()
+                while self._delayed and self._delayed[0][0] <= now:
+                    # retries go first
+                    self._ready.appendleft(heapq.heappop(self._delayed)[2])
+
+                t_list, keys = self._take_set()
+                if t_list is not None:
+                    self._acquire(keys)
+                    self._running_sets += 1
+                    return (t_list, keys)
+
+                if self._running_sets == 0 and not self._ready and not self._delayed:
+                    return (None, None)
+
+                timeout = None
+                if self._delayed:
+                    timeout = max(self._delayed[0][0] - now, 0.1)
+                self._cond.wait(timeout)
+
+    def set_done(self, t_list, keys, success_list, failed_list):
+        """
+        Accounts for the outcome of a set returned by next_set(), and
+        schedules the retries of the failed transfers
+        """
+        with self._cond:
+            self._release(keys)
+            self._running_sets -= 1
+            self.completed.extend(success_list)
+            self._count_success += len(success_list)
+
+            for t in failed_list:
+                if self._gave_up():
+                    # no more attempts once the scheduler gave up
+                    self._count_failed += 1
+                    self.failed.append(t)
+                    continue
+                # transfers might have multiple sources/destinations and
+                # we should try them all in each attempt
+                t.move_to_next_sub_transfer()
+                if t.get_sub_transfer_index() > 0:
+                    self._ready.appendleft(t)
+                    continue
+                if t.attempt_current >= self._attempts_max:
+                    self._count_failed += 1
+                    self.failed.append(t)
+                    continue
+                # retry with a random delay - useful when large workflows
+                # overwhelm data services
+                d = min(5 ** (t.attempt_current + 2) + random.randint(1, 20), 300)
+                t.attempt_current += 1
+                if t.attempt_current > 2:
+                    # only allow grouping the first 2 attempts, then fall
+                    # back to single file transfers
+                    t.allow_grouping = False
+                logger.debug(
+                    "Attempt %d of %s in %d seconds" % (t.attempt_current, t, d)
+                )
+                self._seq += 1
+                heapq.heappush(self._delayed, (time.time() + d, self._seq, t))
+
+            count_total = self._count_success + self._count_failed
+            if (
+                count_total > 10
+                and (self._count_failed / float(count_total)) > 0.8
+                and (self._ready or self._delayed)
+                and not self._gave_up()
+            ):
+                logger.error("Too many failures to continue trying - exiting early")
+                self.too_many_failures = True
+                self._give_up()
+
+            self._cond.notify_all()
+
+    def abort(self, tb, t_list):
+        """
+        Stops handing out transfers after an unexpected exception in the
+        set t_list. The set still has to be handed to set_done().
+        """
+        with self._cond:
+            if self.tb is None:
+                self.tb = tb
+            self.failed.extend(t_list)
+            self._give_up()
+            self._cond.notify_all()
+
+    def _gave_up(self):
+        return self.tb is not None or self.too_many_failures
+
+    def _give_up(self):
+        self.failed.extend(self._ready)
+        self.failed.extend(item[2] for item in self._delayed)
+        self._ready.clear()
+        self._delayed = []
+
+    def _take_set(self):
+        """
+        Removes the first transfer which can be started from the ready
+        queue, together with the similar transfers following it
+        """
+        skipped = []
+        t_list = None
+        keys = None
+        while self._ready:
+            t = self._ready.popleft()
+            keys = self._keys(t)
+            if self._available(keys):
+                t_list = [t]
+                break
+            skipped.append(t)
+
+        while t_list is not None and self._ready and len(t_list) < self._set_size:
+            t = self._ready[0]
+            if not transfers_groupable(t_list[0], t):
+                break
+            new_keys = self._keys(t) - keys
+            if not self._available(new_keys):
+                break
+            keys |= new_keys
+            t_list.append(self._ready.popleft())
+
+        self._ready.extendleft(reversed(skipped))
+        return (t_list, keys)
+
+    def _keys(self, t):
+        """
+        The resources used by a transfer, which can be limited
+        """
+        if isinstance(t, Mkdir) or isinstance(t, Remove):
+            protos = [t.get_proto()]
+            hosts = [t.get_host()]
+        else:
+            protos = [t.get_src_proto(), t.get_dst_proto()]
+            hosts = [t.get_src_host(), t.get_dst_host()]
+        keys = set(("proto", p) for p in protos)
+        keys.update(("host", h) for h in hosts if h)
+        if t.attempt_current > 2:
+            # late retries are done one at a time
+            keys.add(("retry", None))
+        return keys
+
+    def _limit(self, key):
+        if key[0] == "proto":
+            return self._protocol_limits.get(key[1], 0)
+        if key[0] == "host":
+            return self._host_limit
+        return 1
+
+    def _available(self, keys):
+        for key in keys:
+            limit = self._limit(key)
+            if limit > 0 and self._running.get(key, 0) >= limit:
+                return False
+        return True
+
+    def _acquire(self, keys):
+        for key in keys:
+            self._running[key] = self._running.get(key, 0) + 1
+
+    def _release(self, keys):
+        for key in keys:
+            self._running[key] -= 1
+
+
 class WorkThread(threading.Thread):
     """
-    A thread which processes SimilarWorkSets
+    A thread which processes the SimilarWorkSets handed out by the
+    TransferScheduler
     """
 
-    def __init__(self, thread_id, queue, current_attempt, failed_queue):
+    def __init__(self, thread_id, scheduler):
         threading.Thread.__init__(self)
         self.thread_id = thread_id
-        self.queue = queue
-        self.current_attempt = current_attempt
-        self.failed_queue = failed_queue
-        self.exception = None
-        self.tb = None
+        self.scheduler = scheduler
         self.daemon = True
 
     def run(self):
         # give the threads a slow start
         time.sleep(self.thread_id * 2)
         logger.debug("Started new WorkThread with id " + str(self.thread_id))
-        try:
-            # Just keep grabbing SimilarWorkSets and executing them until
-            # there are no more to process, then exit
-            while True:
-                ts = self.queue.get(False)
+        # Just keep grabbing SimilarWorkSets and executing them until
+        # there are no more to process, then exit
+        while True:
+            (t_list, keys) = self.scheduler.next_set()
+            if t_list is None:
+                return
+            success_list = []
+            failed_list = []
+            try:
+                # magic!
+                ts = SimilarWorkSet(t_list)
                 logger.debug(
                     "Thread "
                     + str(self.thread_id)
                     + " is executing transfer "
                     + str(ts)
                 )
-                ts.do_transfers()
-                # if we see excessive failures, stop the thread early
-                if ts.excessive_failures():
-                    break
-
-        except queue.Empty:
-            return
-        except Exception as e:
-            self.exception = e
-            self.tb = traceback.format_exc()
+                (success_list, failed_list) = ts.do_transfers()
+            except Exception:
+                self.scheduler.abort(traceback.format_exc(), t_list)
+            finally:
+                # always release the resources held by the set
+                self.scheduler.set_done(t_list, keys, success_list, failed_list)
 
 
 class Alarm(Exception):
@@ -4663,8 +5273,8 @@ prog_base = os.path.split(sys.argv[0])[1]  # Name of this program
 
 logger = logging.getLogger("Pegasus")
 
-# threads we have currently running
-threads = []
+# maximum number of threads running at the same time
+max_threads = 1
 
 # common credentials
 credentials = configparser.ConfigParser()
@@ -4676,6 +5286,44 @@ symlink_file_transfer = False
 # try to create them over and over again
 remote_dirs_created = {}
 
+# the Pegasus.s3 module, see import_pegasus_s3
+pegasus_s3 = False
+
+# downloader of the HttpHandler, shared by all the threads, see
+# get_http_downloader
+http_downloader = None
+http_downloader_lock = threading.Lock()
+
+# number of parts of a file downloaded at the same time, set from the
+# PEGASUS_TRANSFER_HTTP_PARTS environment variable
+http_parts = 4
+
+# all the transfer handlers, shared by all the threads - the order matters
+# when more than one handler can handle the same protocols
+handlers = HandlerRegistry(
+    [
+        FileHandler,
+        GridFtpHandler,
+        HttpHandler,
+        IRodsHandler,
+        S3Handler,
+        GlobusOnlineHandler,
+        GSHandler,
+        GFALHandler,
+        ScpHandler,
+        GSIScpHandler,
+        StashHandler,
+        SymlinkHandler,
+        DockerHandler,
+        SingularityHandler,
+        HPSSHandler,
+        WebdavHandler,
+    ]
+)
+
+# S3CFG files read by the S3Handler, by path
+s3_configs = {}
+
 # track which lfns we have already checksummed
 integrity_checksummed = []
 
@@ -4874,6 +5522,61 @@ def prepare_local_dir(path):
                 raise RuntimeError(err)
 
 
+def get_http_downloader():
+    """
+    Returns the downloader of the HttpHandler, created on first use
+    """
+    global http_downloader
+    with http_downloader_lock:
+        if http_downloader is None:
+            http_downloader = http_dl.Downloader(parts=http_parts)
+    return http_downloader
+
+
+def parse_http_parts(value):
+    """
+    Returns the number of parts of the PEGASUS_TRANSFER_HTTP_PARTS value,
+    or the default of 4 if the value is not valid
+    """
+    try:
+        parts = int(value)
+    except ValueError:
+        parts = 0
+    if parts < 1:
+        logger.warning(
+            "Invalid value for PEGASUS_TRANSFER_HTTP_PARTS: %s - using 4" % (value)
+        )
+        return 4
+    return parts
+
+
+def import_pegasus_s3():
+    """
+    Returns the Pegasus.s3 module, or None when boto3 is not available
+    """
+    global pegasus_s3
+    if pegasus_s3 is False:
+        try:
+            import boto3  # noqa: F401
+        except ImportError:
+            pegasus_s3 = None
+            return pegasus_s3
+        # Pegasus.s3 removes http_proxy from the environment, which other
+        # transfers may need
+        http_proxy = os.environ.get("http_proxy")
+        from Pegasus import s3
+
+        if http_proxy is not None:
+            os.environ["http_proxy"] = http_proxy
+        # Pegasus.s3 logs to the root logger, which would otherwise set
+        # itself up and print our own messages a second time
+        root_logger = logging.getLogger()
+        if not root_logger.handlers:
+            root_logger.addHandler(logging.NullHandler())
+        pegasus_s3 = s3
+    return pegasus_s3
+
+
 def transfers_groupable(a, b):
     """
     compares two url_pairs, and determines if they are similar enough to be
@@ -4900,6 +5603,22 @@ def transfers_groupable(a, b):
     return True
 
 
+def parse_protocol_limits(s):
+    """
+    Parses a list of protocol=threads pairs, for example "gsiftp=2,http=4"
+    """
+    limits = {}
+    for item in s.split(","):
+        item = item.strip()
+        if item == "":
+            continue
+        proto, sep, limit = item.partition("=")
+        if sep == "":
+            raise ValueError("expected protocol=threads, got '%s'" % (item))
+        limits[proto.strip()] = int(limit)
+    return limits
+
+
 def stats_add(filename):
     global stats_total_bytes
     try:
@@ -5090,11 +5809,12 @@ def myexit(rc):
 
 
 def main():
-    global threads
     global credentials
     global stats_start
     global stats_end
     global symlink_file_transfer
+    global max_threads
+    global http_parts
 
     # dup stderr onto stdout
     sys.stderr = sys.stdout
@@ -5166,6 +5886,10 @@ def main():
             options.threads = int(os.environ["PEGASUS_TRANSFER_THREADS"])
         else:
             options.threads = 8
+    max_threads = options.threads
+
+    if "PEGASUS_TRANSFER_HTTP_PARTS" in os.environ:
+        http_parts = parse_http_parts(os.environ["PEGASUS_TRANSFER_HTTP_PARTS"])
 
     # stdin or file input?
     input_data = None
@@ -5189,11 +5913,7 @@ def main():
     # store options in global variables
     symlink_file_transfer = options.symlink
 
-    # queues to track the work
     inputs_l = []
-    ready_q = queue.Queue()
-    failed_q = queue.Queue()
-    completed_q = queue.Queue()
 
     # determine format, and read the transfer specification
     if input_data[0:5] == "# src":
@@ -5207,8 +5927,6 @@ def main():
     # we will now sort the list as some tools (gridftp) can optimize when
     # given a group of similar transfers
     inputs_l.sort()
-    for t in inputs_l:
-        ready_q.put(t)
 
     # check environment
     try:
@@ -5239,132 +5957,54 @@ def main():
     # start the stats time
     stats_start = time.time()
 
-    # Attempt transfers until the queue is empty. We create SimilarWorkSets
-    # of the transfers, and then hand then of to our worker threads. But
-    # note that we are only doing the threads for one attempt at a time.
-    # After failures, transfers might be regrouped, and then handed of to the
-    # thread pool again.
-    done = False
-    too_many_failures = False
-    attempt_current = 0
+    # Hand the transfers to the worker threads until they are all done.
+    # The threads pick up SimilarWorkSets as soon as they are free, and
+    # failed transfers are retried after a delay, while the others keep
+    # going. Later attempts are not grouped, and are done one at a time.
     approx_transfer_per_thread = total_transfers / (float)(options.threads)
 
     # also cap the approx_transfer_per_thread so that we can fail early
     # if we have to
     approx_transfer_per_thread = min(approx_transfer_per_thread, 100)
 
-    while not done:
-
-        tset_q = queue.Queue()
-
-        attempt_current = attempt_current + 1
-        logger.info("-" * 80)
-        logger.info("Starting transfers - attempt %d" % (attempt_current))
-
-        # this outer loop is for trying all url pair combinations of a transfer
-        # before moving on and marking it as failed
-        while not ready_q.empty():
-
-            # organize the transfers
-            while not ready_q.empty():
-                t_main = ready_q.get()
-
-                # create a list of transfers to pass to underlying tool
-                t_list = []
-                t_list.append(t_main)
-
-                try:
-                    t_next = ready_q.get(False)
-                    while t_next is not None:
-                        if len(
-                            t_list
-                        ) < approx_transfer_per_thread and transfers_groupable(
-                            t_main, t_next
-                        ):
-                            t_list.append(t_next)
-                            t_next = ready_q.get(False)
-                        else:
-                            # done, put the last transfer back
-                            ready_q.put(t_next)
-                            t_next = None
-                except queue.Empty:
-                    pass
-
-                # magic!
-                ts = SimilarWorkSet(t_list, completed_q, failed_q)
-                tset_q.put(ts)
-
-            # pool of worker threads
-            t_id = 0
-            num_threads = min(options.threads, tset_q.qsize())
-            if attempt_current > 2:
-                num_threads = 1
-            logger.debug("Using %d threads for this set of transfers" % (num_threads))
-            for i in range(num_threads):
-                t_id += 1
-                t = WorkThread(t_id, tset_q, attempt_current, failed_q)
-                threads.append(t)
-                t.start()
-
-            # wait for the threads to finish all the transfers
-            for t in threads:
-                t.join()
-                # do we need to do any better error handling here?
-                if t.exception is not None:
-                    logger.critical(t.tb)
-                    myexit(2)
-            threads = []
-
-            # transfers might have multiple sources/destinations and
-            # we should try them all in each round
-            failed_q_updated = queue.Queue()
-            while not failed_q.empty():
-                t = failed_q.get()
-                t.move_to_next_sub_transfer()
-                # see if there are more pairs to try
-                if t.get_sub_transfer_index() > 0:
-                    ready_q.put(t)
-                else:
-                    failed_q_updated.put(t)
-            failed_q = failed_q_updated
+    try:
+        protocol_limits = parse_protocol_limits(
+            os.environ.get("PEGASUS_TRANSFER_PROTOCOL_THREADS", "")
+        )
+        host_limit = int(os.environ.get("PEGASUS_TRANSFER_HOST_THREADS", 0))
+    except ValueError as err:
+        logger.critical("Invalid transfer thread limits: %s" % (err))
+        myexit(1)
 
-            # if we get here and the transfer sets queue (tset_q) is not
-            # empty, that means the work threads saw too many failures
-            # and short-circuited the rest of the transfers
-            if not tset_q.empty() and not failed_q.empty():
-                logger.error("Too many failures to continue trying - exiting early")
-                too_many_failures = True
-                break
+    scheduler = TransferScheduler(
+        inputs_l, attempts_max, approx_transfer_per_thread, protocol_limits, host_limit,
+    )
 
-        # when we get here, all the tries for one round has been attempted
-
-        logger.debug("%d items in failed_q" % (failed_q.qsize()))
-
-        # are we done?
-        if attempt_current == attempts_max or failed_q.empty() or too_many_failures:
-            done = True
-            break
-
-        # retry failed transfers with a random delay - useful when
-        # large workflows overwhelm data services
-        if not failed_q.empty() and attempt_current < attempts_max:
-            d = min(5 ** (attempt_current + 2) + random.randint(1, 20), 300)
-            logger.debug("Sleeping for %d seconds before the next attempt" % (d))
-            time.sleep(d)
-        while not failed_q.empty():
-            t = failed_q.get()
-            if attempt_current >= 2:
-                # only allow grouping the first 2 attempts, then fall back
-                # to single file transfers
-                t.allow_grouping = False
-            ready_q.put(t)
+    logger.info("-" * 80)
+    logger.info("Starting transfers")
+
+    # pool of worker threads
+    num_threads = min(options.threads, total_transfers)
+    logger.debug("Using %d threads for the transfers" % (num_threads))
+    threads = []
+    for i in range(num_threads):
+        t = WorkThread(i + 1, scheduler)
+        threads.append(t)
+        t.start()
+
+    # wait for the threads to finish all the transfers
+    for t in threads:
+        t.join()
+    if scheduler.tb is not None:
+        logger.critical(scheduler.tb)
+        myexit(2)
 
     logger.info("-" * 80)
 
     # end the stats timer and show summary
     stats.stats_summary()
 
-    if not failed_q.empty():
+    if scheduler.failed:
         logger.critical("Some transfers failed! See above," + " and possibly stderr.")
 
         myexit(1)
@@ -14,19 +14,31 @@
 #  limitations under the License.
 #
 
+import collections
+import hashlib
+import itertools
+import json
 import logging as log
+import math
 import os
 import re
 import stat
 import sys
+import threading
 from argparse import ArgumentParser
+from multiprocessing.pool import ThreadPool
 
+from six.moves import queue
 from six.moves.configparser import ConfigParser
 from six.moves.urllib.parse import urlsplit
 
 try:
     import boto3
     import botocore
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config
+    from botocore.utils import get_environ_proxies
+    from s3transfer.utils import ChunksizeAdjuster
 except ImportError as e:
     sys.stderr.write("ERROR: Unable to load boto3 library: %s\n" % e)
     exit(1)
@@ -104,8 +116,31 @@ LOCATIONS = {
 DEFAULT_CONFIG = {
     "batch_delete": str(True),
     "batch_delete_size": str(1000),
+    "max_concurrency": str(10),
+    "multipart_threshold": "8M",
+    "multipart_chunksize": "8M",
+    "resume": str(True),
+    "bulk_concurrency": str(10),
 }
 
+# size of the reads of the parts of resumable downloads
+BLOCK_SIZE = 1024 * 1024
+
+# objects listed in parallel but not yet consumed, see list_objects
+LIST_QUEUE_SIZE = 10000
+
+# keys in the same "directory" from which existing_keys lists it instead of
+# sending a HEAD request per key
+LIST_KEYS_THRESHOLD = 10
+
+# most keys a delete_objects request can take
+MAX_DELETE_BATCH = 1000
+
+# clients shared by the threads of programs doing many transfers in the
+# same process, see get_shared_s3_client
+_shared_clients = {}
+_shared_clients_lock = threading.Lock()
+
 
 def fix_file(url):
     if url.startswith("file://"):
@@ -160,6 +195,10 @@ def get_config(options):
             # If the new default doesn't exist, try the old default
             cfg = os.path.expanduser("~/.s3cfg")
 
+    return read_config(cfg)
+
+
+def read_config(cfg):
     if not os.path.isfile(cfg):
         raise Exception("Config file not found")
 
@@ -191,27 +230,350 @@ def parse_endpoint(uri):
     return kwargs, location
 
 
-def get_s3_client(config, uri):
+def get_client_args(config, uri):
     if not config.has_section(uri.site):
         raise Exception("Config file has no section for site '%s'" % uri.site)
 
     if not config.has_section(uri.ident):
         raise Exception("Config file has no section for identity '%s'" % uri.ident)
 
-    endpoint = config.get(uri.site, "endpoint")
-    aws_access_key_id = config.get(uri.ident, "access_key")
-    aws_secret_access_key = config.get(uri.ident, "secret_key")
-
     # what about s3s????
 
-    return boto3.client(
-        "s3",
-        endpoint_url=endpoint,
-        aws_access_key_id=aws_access_key_id,
-        aws_secret_access_key=aws_secret_access_key,
+    return {
+        "endpoint_url": config.get(uri.site, "endpoint"),
+        "aws_access_key_id": config.get(uri.ident, "access_key"),
+        "aws_secret_access_key": config.get(uri.ident, "secret_key"),
+    }
+
+
+def get_s3_client(config, uri):
+    kwargs = get_client_args(config, uri)
+    # room for the parts of the files of a bulk transfer
+    kwargs["config"] = Config(
+        max_pool_connections=get_bulk_concurrency(config, uri)
+        * get_max_concurrency(config, uri)
+    )
+    return boto3.client("s3", **kwargs)
+
+
+def get_shared_s3_client(config, uri, threads=1):
+    """
+    Returns the client for the endpoint and identity of uri, created the
+    first time it is needed and then shared by all the callers in the
+    process, so that they reuse its connections. Its connection pool has
+    room for the parts of one file per thread.
+    """
+    kwargs = get_client_args(config, uri)
+    key = tuple(sorted(kwargs.items()))
+    with _shared_clients_lock:
+        s3 = _shared_clients.get(key)
+        if s3 is None:
+            # do not use http proxies for S3 either, but leave http_proxy
+            # to the other transfers of the program
+            proxies = get_environ_proxies(kwargs["endpoint_url"])
+            proxies.pop("http", None)
+            kwargs["config"] = Config(
+                max_pool_connections=threads * get_max_concurrency(config, uri),
+                proxies=proxies,
+            )
+            # boto3.client uses a default session, which is not thread safe
+            s3 = _shared_clients[key] = boto3.session.Session().client("s3", **kwargs)
+    return s3
+
+
+def get_site_option(config, uri, name):
+    """
+    Returns the value of the variable name of the site of uri. The
+    PEGASUS_S3_<NAME> environment variable overrides the configuration
+    file, so that site catalogs can set it with an env profile.
+    """
+    value = os.environ.get("PEGASUS_S3_" + name.upper())
+    if value is None:
+        value = config.get(uri.site, name)
+    return value
+
+
+def parse_size(size):
+    "Parse a size in bytes, with an optional K, M or G suffix"
+    m = re.match(r"^\s*([0-9]+)\s*([kmg]?)b?\s*$", size, re.IGNORECASE)
+    if m is None:
+        raise Exception("Invalid size: %s" % size)
+    return int(m.group(1)) * {"": 1, "k": KB, "m": MB, "g": GB}[m.group(2).lower()]
+
+
+def get_max_concurrency(config, uri):
+    return max(1, int(get_site_option(config, uri, "max_concurrency")))
+
+
+def get_bulk_concurrency(config, uri):
+    return max(1, int(get_site_option(config, uri, "bulk_concurrency")))
+
+
+class S3TransferConfig(TransferConfig):
+    """
+    boto3's TransferConfig, with the settings of pegasus-s3 on top: whether
+    interrupted multipart transfers are resumed, and the number of files
+    transferred at the same time by commands given many of them.
+    """
+
+    def __init__(self, resume=False, bulk_concurrency=1, **kwargs):
+        super(S3TransferConfig, self).__init__(**kwargs)
+        self.resume = resume
+        self.bulk_concurrency = bulk_concurrency
+
+
+def get_transfer_config(config, uri):
+    """
+    Returns the settings of the multipart uploads and ranged downloads
+    at the site of uri.
+    """
+    return S3TransferConfig(
+        max_concurrency=get_max_concurrency(config, uri),
+        multipart_threshold=parse_size(
+            get_site_option(config, uri, "multipart_threshold")
+        ),
+        multipart_chunksize=parse_size(
+            get_site_option(config, uri, "multipart_chunksize")
+        ),
+        resume=get_site_option(config, uri, "resume").lower()
+        in ("true", "yes", "on", "1"),
+        bulk_concurrency=get_bulk_concurrency(config, uri),
     )
 
 
+def run_bulk(function, items, transfer_config=None):
+    """
+    Calls function for each of items, bulk_concurrency of them at a time.
+    The first exception raised is raised again once they are all done.
+    """
+    workers = getattr(transfer_config, "bulk_concurrency", 1)
+    if workers <= 1 or len(items) <= 1:
+        for item in items:
+            function(item)
+        return
+    thread_map(function, items, workers)
+
+
+def thread_map(function, items, workers):
+    """
+    Returns the results of function for each of items, called in up to
+    workers threads.
+    """
+    pool = ThreadPool(max(1, min(workers, len(items))))
+    try:
+        return pool.map(function, items, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def existing_keys(s3, bucket, keys, concurrency=1):
+    """
+    Returns the subset of keys which exist in bucket. The "directories"
+    holding at least LIST_KEYS_THRESHOLD of the keys are listed, the
+    other keys are checked with a HEAD request each, concurrency of them
+    at a time.
+    """
+    keys = set(keys)
+    by_prefix = collections.defaultdict(list)
+    for key in keys:
+        by_prefix[key.rpartition("/")[0]].append(key)
+
+    found = set()
+    to_head = []
+    for prefix, prefix_keys in by_prefix.items():
+        if prefix and len(prefix_keys) >= LIST_KEYS_THRESHOLD:
+            found.update(_list_keys(s3, bucket, prefix + "/"))
+        else:
+            to_head.extend(prefix_keys)
+
+    def exists(key):
+        try:
+            s3.head_object(Bucket=bucket, Key=key)
+            return True
+        except botocore.exceptions.ClientError as e:
+            if e.response["ResponseMetadata"]["HTTPStatusCode"] != 404:
+                raise e
+            return False
+
+    if concurrency > 1 and len(to_head) > 1:
+        results = thread_map(exists, to_head, concurrency)
+    else:
+        results = [exists(key) for key in to_head]
+    found.update(key for key, result in zip(to_head, results) if result)
+    return keys & found
+
+
+def _list_keys(s3, bucket, prefix):
+    """
+    Yields the keys directly under prefix in bucket, none if the bucket
+    does not exist.
+    """
+    paginator = s3.get_paginator("list_objects_v2")
+    try:
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix, Delimiter="/"):
+            for obj in page.get("Contents", []):
+                yield obj["Key"]
+    except s3.exceptions.NoSuchBucket:
+        pass
+
+
+def list_objects(s3, bucket, prefix="", concurrency=1, **kwargs):
+    """
+    Yields the objects of bucket under prefix, as returned by
+    list_objects_v2, while they are being listed. With a concurrency above
+    1, the "directories" under prefix are listed in parallel, and the
+    objects come in no particular order.
+    """
+    if concurrency <= 1:
+        paginator = s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix, **kwargs):
+            for obj in page.get("Contents", []):
+                yield obj
+        return
+
+    results = queue.Queue(LIST_QUEUE_SIZE)
+    done = object()
+    stop = threading.Event()
+    lock = threading.Lock()
+    pending = [0]
+    pool = ThreadPool(concurrency)
+
+    def put(item):
+        # gives up when the consumer went away
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def list_prefix(prefix):
+        try:
+            paginator = s3.get_paginator("list_objects_v2")
+            for page in paginator.paginate(
+                Bucket=bucket, Prefix=prefix, Delimiter="/", **kwargs
+            ):
+                for common_prefix in page.get("CommonPrefixes", []):
+                    submit(common_prefix["Prefix"])
+                for obj in page.get("Contents", []):
+                    put(obj)
+                if stop.is_set():
+                    break
+        except Exception as e:
+            put(e)
+        finally:
+            with lock:
+                pending[0] -= 1
+                last = pending[0] == 0
+            if last:
+                put(done)
+
+    def submit(prefix):
+        with lock:
+            pending[0] += 1
+        pool.apply_async(list_prefix, (prefix,))
+
+    submit(prefix)
+    try:
+        while True:
+            item = results.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        # the listings still running stop at their next page
+        pool.close()
+
+
+def delete_keys(s3, bucket, keys, batch_size=MAX_DELETE_BATCH, concurrency=1):
+    """
+    Deletes keys, an iterable consumed as the deletes go, with
+    delete_objects requests of up to batch_size keys, concurrency of them
+    at a time. Returns the number of keys deleted, and a dict of the keys
+    which could not be deleted to the reasons why.
+    """
+    batch_size = max(1, min(batch_size, MAX_DELETE_BATCH))
+    errors = {}
+
+    def delete_batch(batch):
+        log.info("Deleting batch of %d keys" % len(batch))
+        resp = s3.delete_objects(
+            Bucket=bucket,
+            Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+        )
+        failed = resp.get("Errors", [])
+        for error in failed:
+            errors[error["Key"]] = error.get("Message", error.get("Code"))
+        return len(batch) - len(failed)
+
+    deleted = 0
+    keys = iter(keys)
+    pool = ThreadPool(max(1, concurrency))
+    try:
+        # a few batches ahead of the requests, not the whole listing
+        running = collections.deque()
+        while True:
+            batch = list(itertools.islice(keys, batch_size))
+            if not batch:
+                break
+            if len(running) >= 2 * concurrency:
+                deleted += running.popleft().get()
+            running.append(pool.apply_async(delete_batch, (batch,)))
+        for result in running:
+            deleted += result.get()
+    finally:
+        pool.close()
+        pool.join()
+    return deleted, errors
+
+
+def remove(
+    s3,
+    bucket,
+    keys,
+    recursive=False,
+    force=False,
+    batch_size=MAX_DELETE_BATCH,
+    transfer_config=None,
+):
+    """
+    Deletes keys from bucket, and all the keys under them when recursive
+    is set. Unless force is set, the keys have to exist, which is checked
+    with existing_keys. Returns a dict of the keys which could not be
+    deleted to the reasons why.
+    """
+    keys = sorted(set(keys))
+    concurrency = getattr(transfer_config, "bulk_concurrency", 1)
+
+    if not force and not recursive:
+        missing = set(keys) - existing_keys(s3, bucket, keys, concurrency)
+        if missing:
+            raise Exception(
+                "Some keys to delete do not exist in bucket: {}; use --force to ignore non existing keys".format(
+                    bucket
+                )
+            )
+
+    to_delete = iter(keys)
+    if recursive:
+        to_delete = itertools.chain(
+            keys,
+            (
+                obj["Key"]
+                for key in keys
+                for obj in list_objects(s3, bucket, key.rstrip("/") + "/", concurrency)
+            ),
+        )
+
+    deleted, errors = delete_keys(s3, bucket, to_delete, batch_size, concurrency)
+    log.info("Deleted %d keys from bucket %s" % (deleted, bucket))
+    return errors
+
+
 def is_bucket_available(s3_client, bucket):
     is_available = False
     try:
@@ -334,22 +696,15 @@ def ls(args):
     s3 = get_s3_client(config, uri)
 
     if uri.bucket:
-        # list keys in bucket
+        # list keys in bucket, printing them as they are found
         try:
-            keys = s3.list_objects_v2(
-                Bucket=uri.bucket, Prefix=uri.key if uri.key else "", FetchOwner=True
-            )
-        except s3.exceptions.NoSuchBucket:
-            raise Exception("Invalid bucket: {}".format(uri.bucket))
-        except botocore.exceptions.ClientError as e:
-            # endpoint may also raise this for invalid bucket name
-            if e.response["Error"]["Code"] == "InvalidBucketName":
-                raise Exception("Invalid bucket: {}".format(uri.bucket))
-            else:
-                raise e
-
-        if keys.get("Contents"):
-            for content in keys["Contents"]:
+            for content in list_objects(
+                s3,
+                uri.bucket,
+                uri.key if uri.key else "",
+                get_bulk_concurrency(config, uri),
+                FetchOwner=True,
+            ):
                 key = content["Key"]
 
                 if args.long_format:
@@ -372,6 +727,14 @@ def ls(args):
                     )
                 else:
                     print("\t{}".format(key))
+        except s3.exceptions.NoSuchBucket:
+            raise Exception("Invalid bucket: {}".format(uri.bucket))
+        except botocore.exceptions.ClientError as e:
+            # endpoint may also raise this for invalid bucket name
+            if e.response["Error"]["Code"] == "InvalidBucketName":
+                raise Exception("Invalid bucket: {}".format(uri.bucket))
+            else:
+                raise e
     else:
         # list buckets
         buckets = s3.list_buckets()
@@ -385,6 +748,20 @@ def cp(args):
     srcs = [parse_uri(uri) for uri in args.srcs]
     dest = parse_uri(args.dest)
 
+    # using the first source (copy checks that the identities all match)
+    s3 = get_s3_client(config, srcs[0])
+
+    copy(
+        s3,
+        srcs,
+        dest,
+        create=args.create,
+        force=args.force,
+        transfer_config=get_transfer_config(config, srcs[0]),
+    )
+
+
+def copy(s3, srcs, dest, create=False, force=False, transfer_config=None):
     # If there is more than one source, then the destination must be
     # a bucket and not a bucket+key.
     if len(srcs) > 1 and dest.key is not None:
@@ -405,12 +782,8 @@ def cp(args):
                 "do not match: %s -> %s" % (src, dest)
             )
 
-    # using the first source (from the checks above, it is garuanteed that
-    # identities all match)
-    s3 = get_s3_client(config, srcs[0])
-
     # Create the bucket if the user requested it and it does not exist
-    if args.create:
+    if create:
         can_create = True
         try:
             s3.head_bucket(Bucket=dest.bucket)
@@ -436,21 +809,20 @@ def cp(args):
             s3.create_bucket(Bucket=dest.bucket)
 
     # ensure that none of the keys in srcs exist in dest
-    if not args.force:
+    if not force:
         if dest.key == None:
-            for src in srcs:
-                try:
-                    s3.head_object(Bucket=dest.bucket, Key=src.key)
-                    raise Exception(
-                        "Key: {key} already exists in destination bucket: {bucket}, (see --force)".format(
-                            key=src.key, bucket=dest.bucket
-                        )
+            existing = existing_keys(
+                s3,
+                dest.bucket,
+                [src.key for src in srcs],
+                getattr(transfer_config, "bulk_concurrency", 1),
+            )
+            if existing:
+                raise Exception(
+                    "Key: {key} already exists in destination bucket: {bucket}, (see --force)".format(
+                        key=sorted(existing)[0], bucket=dest.bucket
                     )
-                except botocore.exceptions.ClientError as e:
-                    error_code = e.response["ResponseMetadata"]["HTTPStatusCode"]
-
-                    if error_code != 404:
-                        raise e
+                )
 
         else:
             assert len(srcs) == 1
@@ -468,12 +840,17 @@ def cp(args):
                     raise e
 
     if dest.key == None:
-        for src in srcs:
+
+        def copy_key(src):
             s3.copy(
                 CopySource={"Bucket": src.bucket, "Key": src.key},
                 Bucket=dest.bucket,
                 Key=src.key,
+                Config=transfer_config,
             )
+
+        # many keys are copied at the same time
+        run_bulk(copy_key, srcs, transfer_config)
     else:
         assert len(srcs) == 1
         src = srcs[0]
@@ -481,6 +858,7 @@ def cp(args):
             CopySource={"Bucket": src.bucket, "Key": src.key},
             Bucket=dest.bucket,
             Key=dest.key,
+            Config=transfer_config,
         )
 
 
@@ -549,7 +927,7 @@ def rm(args):
             raise Exception("URL for rm must contain a key: %s" % uri)
 
         bid = "%s/%s" % (uri.ident, uri.bucket)
-        buri = S3URI(uri.user, uri.site, uri.bucket, uri.secure)
+        buri = S3URI(uri.user, uri.site, uri.bucket, secure=uri.secure)
 
         if bid not in buckets:
             buckets[bid] = (buri, set())
@@ -567,61 +945,45 @@ def rm(args):
 
             keys_to_delete = {k.key for k in keys}
 
-            # check that all keys to be deleted exist if force is not set
-            if not args.force:
-                bucket_contents = {
-                    obj["Key"]
-                    for obj in s3.list_objects_v2(Bucket=uri.bucket)["Contents"]
-                }
-                if not keys_to_delete.issubset(bucket_contents):
-                    raise Exception(
-                        "Some keys to delete do not exist in bucket: {}; use --force to ignore non existing keys".format(
-                            uri.bucket
-                        )
-                    )
-
-            log.info("Deleting %d keys" % len(keys_to_delete))
-
             batch_delete = config.getboolean(uri.site, "batch_delete")
 
-            if batch_delete:
+            if batch_delete or args.recursive:
                 log.info("Using batch deletes")
 
-                # Delete the keys in batches
-                batch_delete_size = config.getint(uri.site, "batch_delete_size")
-                log.info("batch_delete_size: %d" % batch_delete_size)
-                batch = []
-                for k in keys_to_delete:
-                    batch.append(k)
-                    if len(batch) == batch_delete_size:
-                        log.info("Deleting batch of %d keys" % len(batch))
-
-                        resp = s3.delete_objects(
-                            Bucket=uri.bucket,
-                            Delete={"Objects": [{"Key": item} for item in batch]},
-                        )
-
-                        if not len(resp["Deleted"]) == len(batch):
-                            raise Exception(
-                                "Incomplete batch delete, some keys were not successfully deleted."
-                            )
-
-                        batch = []
-
-                # Delete the final batch
-                if len(batch) > 0:
-                    log.info("Deleting batch of %d keys" % len(batch))
-                    resp = s3.delete_objects(
-                        Bucket=uri.bucket,
-                        Delete={"Objects": [{"Key": item} for item in batch]},
+                # the keys are deleted as they are listed
+                errors = remove(
+                    s3,
+                    uri.bucket,
+                    keys_to_delete,
+                    recursive=args.recursive,
+                    force=args.force,
+                    batch_size=config.getint(uri.site, "batch_delete_size"),
+                    transfer_config=get_transfer_config(config, uri),
+                )
+                if errors:
+                    key = sorted(errors)[0]
+                    raise Exception(
+                        "Unable to delete %d keys, for example %s: %s"
+                        % (len(errors), key, errors[key])
                     )
 
-                    if not len(resp["Deleted"]) == len(batch):
+            else:
+                # check that all keys to be deleted exist if force is not set
+                if not args.force:
+                    missing = keys_to_delete - existing_keys(
+                        s3,
+                        uri.bucket,
+                        keys_to_delete,
+                        get_bulk_concurrency(config, uri),
+                    )
+                    if missing:
                         raise Exception(
-                            "Incomplete batch delete, some keys were not successfully deleted."
+                            "Some keys to delete do not exist in bucket: {}; use --force to ignore non existing keys".format(
+                                uri.bucket
+                            )
                         )
 
-            else:
+                log.info("Deleting %d keys" % len(keys_to_delete))
                 for key_name in keys_to_delete:
                     log.info("Deleting %s" % key_name)
                     s3.delete_object(Bucket=uri.bucket, Key=key_name)
@@ -661,34 +1023,290 @@ def get_key_for_path(path, infile, outkey):
 
 
 def put(args):
-    path = fix_file(args.file)
+    paths = [fix_file(path) for path in args.files]
     url = args.url
 
-    if not os.path.exists(path):
-        raise Exception("No such file or directory: {}".format(path))
+    for path in paths:
+        if not os.path.exists(path):
+            raise Exception("No such file or directory: {}".format(path))
 
-    if os.path.isdir(path):
-        raise Exception("FILE: %s is a directory. FILE must be a file." % path)
+        if os.path.isdir(path):
+            raise Exception("FILE: %s is a directory. FILE must be a file." % path)
 
-    log.info("Attempting to upload {}".format(path))
+    log.info("Attempting to upload {}".format(" ".join(paths)))
 
     # Validate URL
     uri = parse_uri(url)
     if uri.bucket is None:
         raise Exception("URL for put must have a bucket: %s" % url)
-    if uri.key is None:
-        uri.key = os.path.basename(path)
+    if len(paths) > 1 and uri.key is not None and not uri.key.endswith("/"):
+        raise Exception("URL for put of many files must end with a '/': %s" % url)
 
     config = get_config(args)
 
     # get s3 client with associated endpoint
     s3 = get_s3_client(config, uri)
 
+    if len(paths) > 1:
+        upload_many(
+            s3,
+            paths,
+            uri,
+            create_bucket=args.create_bucket,
+            force=args.force,
+            transfer_config=get_transfer_config(config, uri),
+        )
+        return
+
+    if uri.key is None:
+        uri.key = os.path.basename(paths[0])
+    elif uri.key.endswith("/"):
+        uri.key += os.path.basename(paths[0])
+
+    upload(
+        s3,
+        paths[0],
+        uri,
+        create_bucket=args.create_bucket,
+        force=args.force,
+        transfer_config=get_transfer_config(config, uri),
+    )
+
+
+def upload(s3, path, uri, create_bucket=False, force=False, transfer_config=None):
+    key = path if uri.key is None else uri.key
+    _prepare_upload(s3, uri.bucket, key, create_bucket, force)
+
+    try:
+        if (
+            getattr(transfer_config, "resume", False)
+            and os.path.getsize(path) >= transfer_config.multipart_threshold
+        ):
+            upload_parts(s3, path, uri.bucket, key, transfer_config)
+        else:
+            s3.upload_file(path, uri.bucket, key, Config=transfer_config)
+        log.info(
+            "Uploaded file: {file} to bucket: {bucket} as key: {key}".format(
+                file=path, bucket=uri.bucket, key=key
+            )
+        )
+    except boto3.exceptions.S3UploadFailedError:
+        raise Exception(
+            "Failed to upload file: {file} to bucket: {bucket} as key: {key}".format(
+                file=path, bucket=uri.bucket, key=key
+            )
+        )
+
+
+def upload_many(s3, paths, uri, create_bucket=False, force=False, transfer_config=None):
+    """
+    Uploads the files as keys named after them, in the bucket of uri and
+    under its key, if any. The existence of the keys is checked with
+    existing_keys, and the files are uploaded bulk_concurrency at a time.
+    """
+    prefix = uri.key or ""
+    keys = [prefix + os.path.basename(path) for path in paths]
+    _prepare_upload(s3, uri.bucket, None, create_bucket, True)
+
+    if not force:
+        existing = existing_keys(
+            s3, uri.bucket, keys, getattr(transfer_config, "bulk_concurrency", 1)
+        )
+        if existing:
+            raise Exception(
+                "Key: {} already exists. Try --force to overwrite".format(
+                    sorted(existing)[0]
+                )
+            )
+
+    def upload_file(item):
+        path, key = item
+        upload(
+            s3,
+            path,
+            S3URI(uri.user, uri.site, uri.bucket, key, uri.secure),
+            force=True,
+            transfer_config=transfer_config,
+        )
+
+    run_bulk(upload_file, list(zip(paths, keys)), transfer_config)
+
+
+def upload_parts(s3, path, bucket, key, transfer_config):
+    """
+    Uploads the file at path as a multipart upload which can be resumed.
+    The upload is recorded in a path.*.upload.json checkpoint, and when
+    the upload of an earlier try is found there, the parts it left on the
+    server are kept, as long as their MD5 matches the data of the file.
+    Uploads started by other clients are never resumed. A failed upload
+    is aborted, unless the next try can resume it.
+    """
+    size = os.path.getsize(path)
+    # the same as boto3 would use, never changing for a given file size
+    part_size = ChunksizeAdjuster().adjust_chunksize(
+        transfer_config.multipart_chunksize, size
+    )
+    # one checkpoint per destination, as a file can be uploaded to several
+    # keys at the same time
+    checkpoint = "{}.{}.upload.json".format(
+        path, hashlib.md5(("%s/%s" % (bucket, key)).encode("utf-8")).hexdigest()[:8]
+    )
+    state = {
+        "bucket": bucket,
+        "key": key,
+        "size": size,
+        "mtime": os.path.getmtime(path),
+        "part_size": part_size,
+        "upload_id": None,
+    }
+    upload_id, uploaded = _find_multipart_upload(s3, checkpoint, state)
+    resumable = True
+    if upload_id is None:
+        upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key)["UploadId"]
+        state["upload_id"] = upload_id
+        try:
+            with open(checkpoint + ".tmp", "w") as f:
+                json.dump(state, f)
+            os.rename(checkpoint + ".tmp", checkpoint)
+        except EnvironmentError as e:
+            log.warning(
+                "Unable to write {}, the upload cannot be resumed: {}".format(
+                    checkpoint, e
+                )
+            )
+            resumable = False
+    else:
+        log.info("Resuming upload of {} to {}/{}".format(path, bucket, key))
+
+    def upload_part(number):
+        with open(path, "rb") as f:
+            f.seek((number - 1) * part_size)
+            data = f.read(part_size)
+        etag = '"%s"' % hashlib.md5(data).hexdigest()
+        if uploaded.get(number) != (etag, len(data)):
+            etag = s3.upload_part(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=number,
+                Body=data,
+            )["ETag"]
+        return {"ETag": etag, "PartNumber": number}
+
+    count = max(1, int(math.ceil(size / float(part_size))))
+    try:
+        parts = thread_map(
+            upload_part, list(range(1, count + 1)), transfer_config.max_concurrency
+        )
+        s3.complete_multipart_upload(
+            Bucket=bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+    except Exception as e:
+        if resumable and _is_resumable(e):
+            raise
+        log.info("Aborting upload of {} to {}/{}".format(path, bucket, key))
+        _abort_multipart_upload(s3, checkpoint, state)
+        raise
+
+    _remove_checkpoint(checkpoint)
+
+
+def _find_multipart_upload(s3, checkpoint, state):
+    """
+    Returns the id of the multipart upload recorded in checkpoint, when it
+    is the upload of the same file described by state, and its parts as
+    {number: (etag, size)}, or None and {}. The upload of a checkpoint
+    which does not match is aborted.
+    """
+    try:
+        with open(checkpoint) as f:
+            saved = json.load(f)
+    except (EnvironmentError, ValueError):
+        return None, {}
+    if any(saved.get(k) != v for k, v in state.items() if k != "upload_id"):
+        _abort_multipart_upload(s3, checkpoint, saved)
+        return None, {}
+
+    upload_id = saved["upload_id"]
+    parts = {}
+    kwargs = {"Bucket": state["bucket"], "Key": state["key"], "UploadId": upload_id}
+    try:
+        while True:
+            resp = s3.list_parts(**kwargs)
+            for part in resp.get("Parts", []):
+                parts[part["PartNumber"]] = (part["ETag"], part["Size"])
+            if not resp.get("IsTruncated"):
+                break
+            kwargs["PartNumberMarker"] = resp["NextPartNumberMarker"]
+    except s3.exceptions.NoSuchUpload:
+        # completed or aborted in the meantime
+        _remove_checkpoint(checkpoint)
+        return None, {}
+    return upload_id, parts
+
+
+def _abort_multipart_upload(s3, checkpoint, state):
+    """
+    Aborts the multipart upload of state, so that its parts do not stay
+    on the server, and removes its checkpoint.
+    """
+    try:
+        s3.abort_multipart_upload(
+            Bucket=state.get("bucket"),
+            Key=state.get("key"),
+            UploadId=state.get("upload_id"),
+        )
+    except Exception as e:
+        log.warning("Unable to abort upload {}: {}".format(state.get("upload_id"), e))
+    _remove_checkpoint(checkpoint)
+
+
+def _remove_checkpoint(checkpoint):
+    try:
+        os.unlink(checkpoint)
+    except EnvironmentError:
+        pass
+
+
+def _is_resumable(e):
+    """
+    Whether a transfer which failed with e can be resumed by the next
+    try: errors of the connection or of the server, but not requests
+    refused by the server.
+    """
+    if isinstance(e, botocore.exceptions.ClientError):
+        status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        code = e.response.get("Error", {}).get("Code")
+        return status >= 500 or code in ("RequestTimeout", "SlowDown")
+    return True
+
+
+def upload_stream(
+    s3, stream, uri, create_bucket=False, force=False, transfer_config=None
+):
+    """
+    Uploads the data read from stream, a file-like object which does not
+    have to be seekable, as uri. Large streams are sent as multipart
+    uploads, holding a few parts in memory at a time.
+    """
+    _prepare_upload(s3, uri.bucket, uri.key, create_bucket, force)
+
+    try:
+        s3.upload_fileobj(stream, uri.bucket, uri.key, Config=transfer_config)
+        log.info("Uploaded stream to {}".format(uri))
+    except boto3.exceptions.S3UploadFailedError:
+        raise Exception("Failed to upload stream to {}".format(uri))
+
+
+def _prepare_upload(s3, bucket, key, create_bucket, force):
     # Create the bucket if the user requested it and it does not exist
-    if args.create_bucket:
+    if create_bucket:
         can_create = True
         try:
-            s3.head_bucket(Bucket=uri.bucket)
+            s3.head_bucket(Bucket=bucket)
 
             # no exception, we already own this bucket
             can_create = False
@@ -700,15 +1318,15 @@ def put(args):
                 raise e
 
         if can_create:
-            s3.create_bucket(Bucket=uri.bucket)
+            s3.create_bucket(Bucket=bucket)
 
-    if not args.force:
+    if not force:
         # check if all keys do not yet exist
         # accepted method of checking for existence of a key
         key_already_exists = False
 
         try:
-            s3.head_object(Bucket=uri.bucket, Key=uri.key)
+            s3.head_object(Bucket=bucket, Key=key)
             key_already_exists = True
         except s3.exceptions.ClientError as e:
             code = e.response["ResponseMetadata"]["HTTPStatusCode"]
@@ -719,23 +1337,8 @@ def put(args):
 
         if key_already_exists:
             raise Exception(
-                "Key: {} already exists. Try --force to overwrite".format(path)
-            )
-
-    try:
-        key = path if uri.key is None else uri.key
-        s3.upload_file(path, uri.bucket, key)
-        log.info(
-            "Uploaded file: {file} to bucket: {bucket} as key: {key}".format(
-                file=path, bucket=uri.bucket, key=key
-            )
-        )
-    except boto3.exceptions.S3UploadFailedError:
-        raise Exception(
-            "Failed to upload file: {file} to bucket: {bucket} as key: {key}".format(
-                file=path, bucket=uri.bucket, key=key
+                "Key: {} already exists. Try --force to overwrite".format(key)
             )
-        )
 
 
 def get(args):
@@ -756,8 +1359,19 @@ def get(args):
     config = get_config(args)
     s3 = get_s3_client(config, uri)
 
+    download(s3, uri, output, transfer_config=get_transfer_config(config, uri))
+
+    log.info("Download: {} complete".format(uri))
+
+
+def download(s3, uri, output, transfer_config=None):
     try:
-        s3.download_file(Bucket=uri.bucket, Key=uri.key, Filename=output)
+        if getattr(transfer_config, "resume", False):
+            download_parts(s3, uri, output, transfer_config)
+            return
+        s3.download_file(
+            Bucket=uri.bucket, Key=uri.key, Filename=output, Config=transfer_config
+        )
     except s3.exceptions.NoSuchBucket:
         raise Exception("Invalid bucket: {}".format(uri.bucket))
     except botocore.exceptions.ClientError as e:
@@ -765,7 +1379,103 @@ def get(args):
         log.error("Response error code: {}".format(e.response["Error"]["Code"]))
         raise e
 
-    log.info("Download: {} complete".format(uri))
+
+def download_parts(s3, uri, output, transfer_config):
+    """
+    Downloads the object at uri in ranges of multipart_chunksize, written
+    to output.part. When there is more than one, the ranges done are
+    recorded in the output.part.json checkpoint, so that an interrupted
+    download resumes where it stopped, unless the object changed in the
+    meantime.
+    """
+    tmp_output = output + ".part"
+    checkpoint = tmp_output + ".json"
+    part_size = transfer_config.multipart_chunksize
+
+    # the first range tells the size of the object, small objects are
+    # done with this one request
+    try:
+        resp = s3.get_object(
+            Bucket=uri.bucket, Key=uri.key, Range="bytes=0-%d" % (part_size - 1)
+        )
+    except botocore.exceptions.ClientError as e:
+        # empty objects have no ranges
+        if e.response["Error"]["Code"] != "InvalidRange":
+            raise
+        resp = s3.get_object(Bucket=uri.bucket, Key=uri.key)
+    size = resp["ContentLength"]
+    count = 1
+    if "ContentRange" in resp:
+        size = int(resp["ContentRange"].rsplit("/", 1)[1])
+        count = int(math.ceil(size / float(part_size)))
+
+    state = {"etag": resp["ETag"], "size": size, "part_size": part_size, "done": []}
+    try:
+        with open(checkpoint) as f:
+            saved = json.load(f)
+        if os.path.exists(tmp_output) and all(
+            saved.get(k) == state[k] for k in ("etag", "size", "part_size")
+        ):
+            state["done"] = saved["done"]
+            log.info("Resuming download of {} to {}".format(uri, output))
+    except (EnvironmentError, ValueError):
+        pass
+    if not state["done"]:
+        with open(tmp_output, "wb") as f:
+            f.truncate(size)
+    lock = threading.Lock()
+
+    def write_part(number, body):
+        with open(tmp_output, "r+b") as f:
+            f.seek(number * part_size)
+            while True:
+                data = body.read(BLOCK_SIZE)
+                if not data:
+                    break
+                f.write(data)
+        if count > 1:
+            with lock:
+                state["done"].append(number)
+                with open(checkpoint + ".tmp", "w") as f:
+                    json.dump(state, f)
+                os.rename(checkpoint + ".tmp", checkpoint)
+
+    def download_part(number):
+        offset = number * part_size
+        resp = s3.get_object(
+            Bucket=uri.bucket,
+            Key=uri.key,
+            Range="bytes=%d-%d" % (offset, min(offset + part_size, size) - 1),
+            IfMatch=state["etag"],
+        )
+        write_part(number, resp["Body"])
+
+    if 0 not in state["done"]:
+        write_part(0, resp["Body"])
+    resp["Body"].close()
+
+    done = set(state["done"])
+    todo = [n for n in range(1, count) if n not in done]
+    if todo:
+        thread_map(download_part, todo, transfer_config.max_concurrency)
+
+    os.rename(tmp_output, output)
+    if count > 1:
+        os.unlink(checkpoint)
+
+
+def open_object(s3, uri):
+    """
+    Returns the body of the object at uri, a file-like object to read its
+    data from as it arrives.
+    """
+    try:
+        return s3.get_object(Bucket=uri.bucket, Key=uri.key)["Body"]
+    except s3.exceptions.NoSuchBucket:
+        raise Exception("Invalid bucket: {}".format(uri.bucket))
+    except botocore.exceptions.ClientError as e:
+        log.error("Response error code: {}".format(e.response["Error"]["Code"]))
+        raise e
 
 
 # --- Handle Command Line Arguments --------------------------------------------
@@ -833,6 +1543,14 @@ def parse_args(args):
         default=False,
         help="Ignore nonexistent keys",
     )
+    parser_rm.add_argument(
+        "-r",
+        "--recursive",
+        dest="recursive",
+        action="store_true",
+        default=False,
+        help="Also delete all the keys under URL/",
+    )
     parser_rm.add_argument(
         "-F",
         "--file",
@@ -845,7 +1563,9 @@ def parse_args(args):
 
     # PUT command ---------------------------
     parser_put = subparser.add_parser("put")
-    parser_put.add_argument("file", metavar="FILE", help="The file to be uploaded")
+    parser_put.add_argument(
+        "files", nargs="+", metavar="FILE", help="The files to be uploaded"
+    )
 
     parser_put.add_argument(
         "url", metavar="URL", help="URL to which the file will be uploaded"
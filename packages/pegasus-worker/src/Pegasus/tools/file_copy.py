@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+
+##
+#  Copyright 2007-2020 University Of Southern California
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing,
+#  software distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##
+
+"""
+Local file operations done in process, with the semantics of the cp -f -R -L,
+ln -f -s, mkdir -p and rm -f [-r] commands they replace.
+
+File data is copied by the kernel with copy_file_range() or sendfile() where
+available, falling back to reads and writes.
+"""
+
+import errno
+import os
+import shutil
+import stat
+
+# size of the copies done by one system call
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# errors telling that a system call cannot copy between the two files
+_UNSUPPORTED = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF)
+
+
+def copy(src, dst):
+    """
+    Copies src, a file or a directory tree, to dst, like cp -f -R -L. If dst
+    is an existing directory, src is copied into it.
+    """
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src.rstrip("/")))
+
+    if os.path.isdir(src):
+        _copy_tree(src, dst)
+    else:
+        copy_file(src, dst)
+
+
+def _copy_tree(src, dst):
+    if not os.path.isdir(dst):
+        os.mkdir(dst, stat.S_IMODE(os.stat(src).st_mode))
+    for name in os.listdir(src):
+        s = os.path.join(src, name)
+        d = os.path.join(dst, name)
+        # symlinks are followed, like cp -L
+        if os.path.isdir(s):
+            _copy_tree(s, d)
+        else:
+            copy_file(s, d)
+
+
+def copy_file(src, dst):
+    """
+    Copies the data of the file src to dst. A new dst gets the permissions of
+    src, an existing one keeps its own, unless it cannot be written to, in
+    which case it is replaced, as with cp -f.
+    """
+    with open(src, "rb") as fsrc:
+        fd = _open_dst(dst, stat.S_IMODE(os.fstat(fsrc.fileno()).st_mode))
+        try:
+            _copy_data(fsrc.fileno(), fd)
+        finally:
+            os.close(fd)
+
+
+def write_stream(stream, dst, mode=0o644):
+    """
+    Writes the data read from stream, a file-like object, to the file dst,
+    replacing it like copy_file() does. dst is removed if the data cannot
+    all be written.
+    """
+    try:
+        with os.fdopen(_open_dst(dst, mode), "wb") as fdst:
+            shutil.copyfileobj(stream, fdst, CHUNK_SIZE)
+    except Exception:
+        remove(dst)
+        raise
+
+
+def _open_dst(dst, mode):
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+    try:
+        return os.open(dst, flags, mode)
+    except OSError as err:
+        if err.errno not in (errno.EACCES, errno.EPERM, errno.ETXTBSY):
+            raise
+        os.unlink(dst)
+        return os.open(dst, flags, mode)
+
+
+def _copy_data(infd, outfd):
+    for copier in (_copy_file_range, _sendfile):
+        try:
+            copier(infd, outfd)
+            return
+        except OSError as err:
+            # only fall back before the first byte was written
+            if err.errno not in _UNSUPPORTED or os.lseek(outfd, 0, os.SEEK_CUR):
+                raise
+        except AttributeError:
+            # not available in this Python
+            pass
+
+    with os.fdopen(os.dup(infd), "rb") as fsrc:
+        with os.fdopen(os.dup(outfd), "wb") as fdst:
+            shutil.copyfileobj(fsrc, fdst, CHUNK_SIZE)
+
+
+def _copy_file_range(infd, outfd):
+    copy_file_range = os.copy_file_range
+    copied = copy_file_range(infd, outfd, CHUNK_SIZE)
+    if copied == 0:
+        # some file systems return 0 instead of an error, let the other
+        # copiers handle the file, even if it is really empty
+        raise OSError(errno.EINVAL, "copy_file_range copied nothing")
+    while copied:
+        copied = copy_file_range(infd, outfd, CHUNK_SIZE)
+
+
+def _sendfile(infd, outfd):
+    sendfile = os.sendfile
+    offset = 0
+    while True:
+        sent = sendfile(outfd, infd, offset, CHUNK_SIZE)
+        if sent == 0:
+            break
+        offset += sent
+
+
+def symlink(src, dst):
+    """
+    Creates a symlink dst pointing to src, like ln -f -s. If dst is an
+    existing directory, the symlink is created in it.
+    """
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src.rstrip("/")))
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    os.symlink(src, dst)
+
+
+def makedirs(path):
+    """
+    Creates the directory path and its parents, like mkdir -p.
+    """
+    try:
+        os.makedirs(path)
+    except OSError:
+        if not os.path.isdir(path):
+            raise
+
+
+def remove(path, recursive=False):
+    """
+    Removes path, like rm -f, or rm -f -r when recursive is set.
+    """
+    if not os.path.lexists(path):
+        return
+    if recursive and os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.unlink(path)
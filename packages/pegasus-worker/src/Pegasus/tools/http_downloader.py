@@ -0,0 +1,460 @@
+# -*- coding: utf-8 -*-
+
+##
+#  Copyright 2007-2020 University Of Southern California
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing,
+#  software distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##
+
+"""
+Downloads files over HTTP and HTTPS without starting wget or curl.
+
+Connections are kept alive and reused, large files are fetched with
+parallel byte-range requests, and the parts of a failed download are
+kept, so that the next attempt only fetches the missing ones.
+"""
+
+import logging
+import os
+import re
+import socket
+import ssl
+import threading
+
+from six.moves import http_client
+from six.moves.urllib.parse import urljoin, urlsplit
+from six.moves.urllib.request import getproxies, proxy_bypass
+
+# Module variables
+logger = logging.getLogger("Pegasus")
+
+# files larger than this are fetched in parts of this size
+PART_SIZE = 8 * 1024 * 1024
+
+# size of the reads from the responses
+BLOCK_SIZE = 64 * 1024
+
+# same as wget --timeout=300
+TIMEOUT = 300
+
+MAX_REDIRECTS = 10
+
+# suffix of the file a download is written to, before it is complete
+PARTIAL_SUFFIX = ".part"
+
+re_content_range = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+class ConnectionPool(object):
+    """
+    Keeps the idle keep-alive connections, by scheme, host and proxy.
+    """
+
+    def __init__(self, max_idle=16, timeout=TIMEOUT):
+        self._max_idle = max_idle
+        self._timeout = timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def get(self, scheme, netloc, proxy=None):
+        """
+        Returns (key, connection, reused), where key is to be passed to put
+        once the response has been read.
+        """
+        key = (scheme, netloc, proxy)
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return key, idle.pop(), True
+        return key, self._connect(scheme, netloc, proxy), False
+
+    def put(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self._max_idle:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            for idle in self._idle.values():
+                for conn in idle:
+                    conn.close()
+            self._idle = {}
+
+    def _connect(self, scheme, netloc, proxy):
+        host = netloc
+        if proxy is not None:
+            host = urlsplit(proxy).netloc
+
+        if scheme == "https":
+            # like wget --no-check-certificate
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            conn = http_client.HTTPSConnection(
+                host, timeout=self._timeout, context=context
+            )
+            if proxy is not None:
+                conn.set_tunnel(netloc)
+        else:
+            conn = http_client.HTTPConnection(host, timeout=self._timeout)
+        return conn
+
+
+class PartialDownload(object):
+    """
+    The parts of a file already written to its partial file.
+    """
+
+    def __init__(self, size, validator):
+        self.size = size
+        self.validator = validator
+        self.done = set()  # offsets of the parts written
+
+    def missing(self, part_size):
+        return [
+            (start, min(start + part_size, self.size) - 1)
+            for start in range(0, self.size, part_size)
+            if start not in self.done
+        ]
+
+
+class ResponseStream(object):
+    """
+    The body of a response, as a read-only file-like object. The connection
+    goes back to the pool when the body has been read completely.
+    """
+
+    def __init__(self, response, release):
+        self._response = response
+        self._release = release
+        self._eof = False
+
+    def read(self, size=-1):
+        if self._eof:
+            return b""
+        data = self._response.read(None if size < 0 else size)
+        if not data or size < 0:
+            self._eof = True
+        return data
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def close(self):
+        if self._release is not None:
+            self._release(self._eof)
+            self._release = None
+
+
+class Downloader(object):
+    """
+    Downloads URLs to local files. One instance can be shared by the threads
+    of a program, and across the attempts of the same transfers.
+    """
+
+    def __init__(self, parts=4, part_size=PART_SIZE, timeout=TIMEOUT):
+        self.parts = max(1, parts)
+        self.part_size = part_size
+        self.pool = ConnectionPool(max_idle=4 * self.parts, timeout=timeout)
+        self._partial = {}  # (url, path) --> PartialDownload
+        self._lock = threading.Lock()
+
+    def download(self, url, path, proxy=None):
+        """
+        Downloads url to path. proxy is the URL of the proxy to use for
+        http:// URLs, the https_proxy environment variable is used for
+        https:// ones. Raises RuntimeError when the download fails.
+        """
+        key = (url, path)
+        tmp_path = path + PARTIAL_SUFFIX
+        with self._lock:
+            partial = self._partial.get(key)
+        if partial is not None and not os.path.exists(tmp_path):
+            partial = None
+
+        try:
+            self._download(key, tmp_path, proxy, partial)
+        except Exception as err:
+            # keep the partial file only if it can be resumed
+            with self._lock:
+                resumable = key in self._partial
+            if not resumable and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            if isinstance(err, (socket.error, http_client.HTTPException)):
+                raise RuntimeError("Unable to download %s: %s" % (url, err))
+            raise
+
+        os.rename(tmp_path, path)
+        with self._lock:
+            self._partial.pop(key, None)
+
+    def open(self, url, proxy=None):
+        """
+        Opens url for reading with a single request, returning a file-like
+        ResponseStream to read the data from as it arrives. Raises
+        RuntimeError when the server does not send the file.
+        """
+        try:
+            response, release, url = self._get(url, proxy)
+        except (socket.error, http_client.HTTPException) as err:
+            raise RuntimeError("Unable to download %s: %s" % (url, err))
+        if response.status != 200:
+            release(False)
+            raise self._error(response, url)
+        return ResponseStream(response, release)
+
+    def _download(self, key, tmp_path, proxy, partial):
+        """
+        Fetches the url of key to tmp_path. The parts written are recorded
+        in self._partial, unless the server does not support ranges.
+        """
+        url = key[0]
+        if partial is not None:
+            ranges = partial.missing(self.part_size)
+            if not ranges:
+                return
+            logger.info(
+                "Resuming the download of %s, %d parts left" % (url, len(ranges))
+            )
+            validator = partial.validator
+        else:
+            ranges = [(0, self.part_size - 1)]
+            validator = None
+
+        # the first part tells the size of the file
+        response, release, url = self._get(url, proxy, ranges[0], validator)
+        try:
+            if response.status == 206:
+                start, end, size = self._content_range(response, url)
+                if start != ranges[0][0]:
+                    raise RuntimeError("Unexpected Content-Range for %s" % url)
+                if partial is None:
+                    partial = PartialDownload(
+                        size,
+                        response.getheader("ETag")
+                        or response.getheader("Last-Modified"),
+                    )
+                    with open(tmp_path, "wb") as f:
+                        f.truncate(size)
+                    # without a validator, a resumed download could mix
+                    # two versions of the file
+                    if partial.validator is not None:
+                        with self._lock:
+                            self._partial[key] = partial
+                elif size != partial.size:
+                    raise RuntimeError("The size of %s changed" % url)
+                self._write(response, tmp_path, start, end - start + 1)
+                partial.done.add(start)
+            elif response.status == 200:
+                # no range support, or the file changed since the previous
+                # attempt
+                with self._lock:
+                    self._partial.pop(key, None)
+                self._write(response, tmp_path, None, None)
+                release()
+                return
+            elif response.status == 416 and partial is None:
+                # an empty file
+                response.read()
+                open(tmp_path, "wb").close()
+                release()
+                return
+            else:
+                with self._lock:
+                    self._partial.pop(key, None)
+                raise self._error(response, url)
+        except Exception:
+            release(False)
+            raise
+        release()
+
+        missing = partial.missing(self.part_size)
+        if missing:
+            self._get_parts(url, tmp_path, proxy, partial, missing)
+
+    def _get_parts(self, url, tmp_path, proxy, partial, missing):
+        """
+        Fetches the missing parts with up to self.parts requests at the
+        same time.
+        """
+        errors = []
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    if errors or not missing:
+                        return
+                    start, end = missing.pop(0)
+                try:
+                    response, release, _ = self._get(
+                        url, proxy, (start, end), partial.validator
+                    )
+                    try:
+                        if response.status != 206:
+                            raise self._error(response, url, "changed during download")
+                        self._content_range(response, url, (start, end))
+                        self._write(response, tmp_path, start, end - start + 1)
+                    except Exception:
+                        release(False)
+                        raise
+                    release()
+                except Exception as err:
+                    with lock:
+                        errors.append(err)
+                    return
+                with lock:
+                    partial.done.add(start)
+
+        threads = [
+            threading.Thread(target=worker)
+            for _ in range(min(self.parts, len(missing)) - 1)
+        ]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        worker()
+        for t in threads:
+            t.join()
+
+        if errors:
+            raise errors[0]
+
+    def _get(self, url, proxy, byte_range=None, validator=None):
+        """
+        Sends a GET request for url, following the redirects. Returns the
+        response, a function giving its connection back to the pool, to
+        call once the body has been read, and the URL redirected to.
+        """
+        headers = {"Connection": "keep-alive"}
+        if byte_range is not None:
+            headers["Range"] = "bytes=%d-%d" % byte_range
+            if validator:
+                headers["If-Range"] = validator
+
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(url)
+            if parts.scheme not in ("http", "https"):
+                raise RuntimeError("Unsupported URL: %s" % url)
+
+            url_proxy = self._proxy(parts, proxy)
+            if url_proxy is not None and parts.scheme == "http":
+                target = url
+            else:
+                target = parts.path or "/"
+                if parts.query:
+                    target += "?" + parts.query
+
+            response, release = self._send(parts, url_proxy, target, headers)
+            if response.status in (301, 302, 303, 307, 308):
+                location = response.getheader("Location")
+                response.read()
+                release()
+                if location is None:
+                    raise RuntimeError("Redirect without a location for %s" % url)
+                url = urljoin(url, location)
+                logger.debug("Redirected to %s" % url)
+                continue
+            return response, release, url
+
+        raise RuntimeError("Too many redirects for %s" % url)
+
+    def _send(self, parts, proxy, target, headers):
+        key, conn, reused = self.pool.get(parts.scheme, parts.netloc, proxy)
+        try:
+            conn.request("GET", target, headers=headers)
+            response = conn.getresponse()
+        except (socket.error, http_client.HTTPException):
+            conn.close()
+            if not reused:
+                raise
+            # the server closed the idle connection, try a new one
+            key, conn, reused = self.pool.get(parts.scheme, parts.netloc, proxy)
+            try:
+                conn.request("GET", target, headers=headers)
+                response = conn.getresponse()
+            except Exception:
+                conn.close()
+                raise
+
+        def release(reuse=True):
+            if reuse and not response.will_close:
+                self.pool.put(key, conn)
+            else:
+                conn.close()
+
+        return response, release
+
+    def _proxy(self, parts, proxy):
+        if parts.scheme == "http":
+            url_proxy = proxy
+        else:
+            url_proxy = getproxies().get("https")
+        if url_proxy is None or proxy_bypass(parts.hostname):
+            return None
+        # OSG_SQUID_LOCATION is usually given as host:port
+        if "://" not in url_proxy:
+            url_proxy = "http://" + url_proxy
+        return url_proxy
+
+    def _write(self, response, path, offset, length):
+        """
+        Writes the body of response to path at offset, or to a new file
+        when offset is None.
+        """
+        written = 0
+        with open(path, "wb" if offset is None else "r+b") as f:
+            if offset is not None:
+                f.seek(offset)
+            while True:
+                block = response.read(BLOCK_SIZE)
+                if not block:
+                    break
+                f.write(block)
+                written += len(block)
+
+        if length is not None and written != length:
+            raise RuntimeError(
+                "Short read for %s: %d of %d bytes" % (path, written, length)
+            )
+        expected = response.getheader("Content-Length")
+        if length is None and expected is not None and written != int(expected):
+            raise RuntimeError(
+                "Short read for %s: %d of %s bytes" % (path, written, expected)
+            )
+
+    def _content_range(self, response, url, expected=None):
+        r = re_content_range.match(response.getheader("Content-Range") or "")
+        if r is None or r.group(3) == "*":
+            raise RuntimeError("Invalid Content-Range in the response for %s" % url)
+        start, end, size = int(r.group(1)), int(r.group(2)), int(r.group(3))
+        if expected is not None and (start, end) != expected:
+            raise RuntimeError("Unexpected Content-Range in the response for %s" % url)
+        return start, end, size
+
+    def _error(self, response, url, reason=None):
+        return RuntimeError(
+            "Unable to download %s: %s %s%s"
+            % (
+                url,
+                response.status,
+                response.reason,
+                "" if reason is None else " (%s)" % reason,
+            )
+        )
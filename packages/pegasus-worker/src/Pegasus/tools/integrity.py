@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+
+##
+#  Copyright 2007-2020 University Of Southern California
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing,
+#  software distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##
+
+"""
+Integrity data shared by pegasus-integrity and pegasus-transfer: sha256
+checksums of files and of data streaming by, and the kickstart records
+describing them.
+"""
+
+import errno
+import hashlib
+import json
+import logging
+import mmap
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+from multiprocessing.pool import ThreadPool
+
+# for some reason, sometimes grp is missing, but we can do without it
+try:
+    import grp
+    import pwd
+except Exception:
+    pass
+
+# Module variables
+logger = logging.getLogger("Pegasus")
+
+# size of the reads of files
+BLOCK_SIZE = 1024 * 1024
+
+# files at least this large are hashed through a memory map
+MMAP_MIN_SIZE = 16 * 1024 * 1024
+
+
+def sha256_file(path):
+    """
+    Returns the sha256 checksum of the file at path
+    """
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        data = None
+        if os.fstat(f.fileno()).st_size >= MMAP_MIN_SIZE:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (EnvironmentError, ValueError):
+                # not all file systems support memory maps
+                pass
+        if data is not None:
+            with closing(data):
+                sha256.update(data)
+        else:
+            while True:
+                block = f.read(BLOCK_SIZE)
+                if not block:
+                    break
+                sha256.update(block)
+    return sha256.hexdigest()
+
+
+def sha256_files(paths, threads=None, cache=None):
+    """
+    Computes the sha256 checksums of a set of files in parallel. Returns a
+    dict from each path to a (sha256, timing) tuple, where sha256 is None
+    for files which could not be read. Files found in cache, a
+    ChecksumCache, are not read again.
+    """
+    if threads is None:
+        threads = multiprocessing.cpu_count()
+    paths = list(set(paths))
+
+    def checksum(path):
+        ts_start = time.time()
+        try:
+            st = os.stat(path)
+            sha256 = None
+            if cache is not None:
+                sha256 = cache.get(st)
+            if sha256 is None:
+                sha256 = sha256_file(path)
+                if cache is not None:
+                    cache.put(st, sha256)
+        except EnvironmentError as err:
+            logger.error("Unable to determine the sha256 of %s: %s" % (path, err))
+            sha256 = None
+        return path, (sha256, time.time() - ts_start)
+
+    # hashlib releases the GIL while hashing, so threads use all the cores
+    if threads <= 1 or len(paths) <= 1:
+        return dict(checksum(path) for path in paths)
+    pool = ThreadPool(min(threads, len(paths)))
+    try:
+        return dict(pool.map(checksum, paths))
+    finally:
+        pool.close()
+        pool.join()
+
+
+class ChecksumCache(object):
+    """
+    Checksums of files, keyed by their device, inode, size and modification
+    time, and kept in a JSON file so that the processes of the same job do
+    not hash the same files again. Without lookup, the checksums already
+    in the cache are not used, and new ones are only added to it.
+    """
+
+    def __init__(self, path, lookup=True):
+        self.path = path
+        self.lookup = lookup
+        self._checksums = self._load()
+        self._added = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(st):
+        mtime = getattr(st, "st_mtime_ns", None)
+        if mtime is None:
+            mtime = int(st.st_mtime * 1000000000)
+        return "%d:%d:%d:%d" % (st.st_dev, st.st_ino, st.st_size, mtime)
+
+    def get(self, st):
+        if not self.lookup:
+            return None
+        with self._lock:
+            return self._checksums.get(self.key(st))
+
+    def put(self, st, sha256):
+        with self._lock:
+            self._checksums[self.key(st)] = sha256
+            self._added[self.key(st)] = sha256
+
+    def save(self):
+        """
+        Adds the new checksums to the cache file, keeping the ones other
+        processes have added in the meantime
+        """
+        with self._lock:
+            if not self._added:
+                return
+            checksums = self._load()
+            checksums.update(self._added)
+            dirname = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(prefix=".integrity-cache-", dir=dirname)
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(checksums, f)
+                os.rename(tmp_path, self.path)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+            self._checksums = checksums
+            self._added = {}
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except EnvironmentError as err:
+            if err.errno != errno.ENOENT:
+                logger.warning("Unable to read the checksum cache: %s" % err)
+        except ValueError:
+            logger.warning("Ignoring the invalid checksum cache %s" % self.path)
+        return {}
+
+
+class ChecksumReader(object):
+    """
+    A read-only file-like object computing the sha256 checksum of the data
+    read from the wrapped stream.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+        self.timing = 0.0  # seconds spent checksumming
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        ts_start = time.time()
+        self._sha256.update(data)
+        self.timing += time.time() - ts_start
+        self.size += len(data)
+        return data
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def close(self):
+        self._stream.close()
+
+    def hexdigest(self):
+        return self._sha256.hexdigest()
+
+
+def iso8601(ts):
+    """
+    Formats a UNIX timestamp in ISO 8601 format
+    """
+    dt = datetime.utcfromtimestamp(ts)
+    return dt.isoformat()
+
+
+def fullstat_yaml(lfn, pfn, sha256, timing, st=None, size=None):
+    """
+    Formats the kickstart yaml for a file. st is the stat result of pfn,
+    when it is a local file, otherwise only its size is given.
+    """
+    yaml = ""
+    yaml += '    "%s":\n' % (lfn)
+    yaml += "      comment: entry generated by pegasus-integrity\n"
+    yaml += '      file_name: "%s"\n' % (pfn)
+
+    if st is not None:
+        uname = ""
+        try:
+            uname = pwd.getpwuid(st.st_uid).pw_name
+        except Exception:
+            pass
+        gname = ""
+        try:
+            gname = grp.getgrgid(st.st_gid).gr_name
+        except Exception:
+            pass
+        yaml += (
+            "      mode: 0o%o\n"
+            "      size: %d\n"
+            "      inode: %d\n"
+            "      nlink: %d\n"
+            "      mtime: %s\n"
+            "      atime: %s\n"
+            "      ctime: %s\n"
+            "      uid: %d\n"
+            "      user: %s\n"
+            "      gid: %d\n"
+            "      group: %s\n"
+            % (
+                st.st_mode,
+                st.st_size,
+                st.st_ino,
+                st.st_nlink,
+                iso8601(st.st_mtime),
+                iso8601(st.st_atime),
+                iso8601(st.st_ctime),
+                st.st_uid,
+                uname,
+                st.st_gid,
+                gname,
+            )
+        )
+    elif size is not None:
+        yaml += "      size: %d\n" % (size)
+
+    yaml += "      output: True\n"
+    yaml += "      sha256: %s\n" "      checksum_timing: %.3f\n" % (sha256, timing)
+    return yaml
+
+
+def write_kickstart_data(yaml):
+    """
+    Appends yaml to the $KICKSTART_INTEGRITY_DATA file, for kickstart to
+    pick up at the end of the job. Returns False when the variable is not
+    set.
+    """
+    if "KICKSTART_INTEGRITY_DATA" not in os.environ:
+        return False
+    with open(os.environ["KICKSTART_INTEGRITY_DATA"], "a") as f:
+        f.write(yaml)
+    return True
@@ -0,0 +1,114 @@
+import errno
+import os
+
+import pytest
+
+from Pegasus.tools import file_copy
+
+
+@pytest.fixture
+def src(tmp_path):
+    src = tmp_path / "src"
+    src.write_bytes(os.urandom(3 * 1024 * 1024 + 17))
+    src.chmod(0o750)
+    return src
+
+
+def test_copy_file(src, tmp_path):
+    dst = tmp_path / "dst"
+    file_copy.copy(str(src), str(dst))
+
+    assert dst.read_bytes() == src.read_bytes()
+    assert dst.stat().st_mode & 0o777 == 0o750 & ~current_umask()
+
+    # an existing read-only file is replaced, like cp -f
+    dst.chmod(0o400)
+    src.write_bytes(b"new")
+    file_copy.copy(str(src), str(dst))
+    assert dst.read_bytes() == b"new"
+
+    # copied into an existing directory
+    (tmp_path / "dir").mkdir()
+    file_copy.copy(str(src), str(tmp_path / "dir"))
+    assert (tmp_path / "dir" / "src").read_bytes() == b"new"
+
+
+@pytest.mark.parametrize("unsupported", [[], ["copy_file_range"], ["sendfile"]])
+def test_copy_fallbacks(src, tmp_path, monkeypatch, unsupported):
+    def fail(*args):
+        raise OSError(errno.EXDEV, "unsupported")
+
+    for name in unsupported:
+        monkeypatch.setattr(os, name, fail, raising=False)
+    if "copy_file_range" in unsupported:
+        monkeypatch.setattr(os, "sendfile", fail, raising=False)
+
+    dst = tmp_path / "dst"
+    file_copy.copy_file(str(src), str(dst))
+    assert dst.read_bytes() == src.read_bytes()
+
+    # empty files too
+    (tmp_path / "empty").write_bytes(b"")
+    file_copy.copy_file(str(tmp_path / "empty"), str(dst))
+    assert dst.read_bytes() == b""
+
+
+def test_copy_tree(src, tmp_path):
+    tree = tmp_path / "tree"
+    (tree / "a" / "b").mkdir(parents=True)
+    (tree / "a" / "b" / "f").write_text("f")
+    (tree / "link").symlink_to(src)
+
+    file_copy.copy(str(tree), str(tmp_path / "copy"))
+
+    # symlinks are followed, like cp -L
+    assert (tmp_path / "copy" / "a" / "b" / "f").read_text() == "f"
+    assert not (tmp_path / "copy" / "link").is_symlink()
+    assert (tmp_path / "copy" / "link").read_bytes() == src.read_bytes()
+
+
+def test_symlink_makedirs_remove(src, tmp_path):
+    dst = tmp_path / "dir" / "dst"
+    file_copy.makedirs(str(dst.parent))
+    file_copy.makedirs(str(dst.parent))
+
+    dst.write_text("existing")
+    file_copy.symlink(str(src), str(dst))
+    assert os.readlink(str(dst)) == str(src)
+
+    file_copy.remove(str(dst))
+    file_copy.remove(str(dst))
+    assert not os.path.lexists(str(dst))
+    assert src.exists()
+
+    with pytest.raises(OSError):
+        file_copy.remove(str(dst.parent))
+    file_copy.remove(str(dst.parent), recursive=True)
+    assert not dst.parent.exists()
+
+
+def current_umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def test_write_stream(src, tmp_path):
+    dst = tmp_path / "dst"
+    dst.write_text("existing")
+    dst.chmod(0o400)
+
+    with open(str(src), "rb") as f:
+        file_copy.write_stream(f, str(dst))
+    assert dst.read_bytes() == src.read_bytes()
+
+
+def test_write_stream_failure(tmp_path):
+    class Broken(object):
+        def read(self, size):
+            raise IOError("broken")
+
+    dst = tmp_path / "dst"
+    with pytest.raises(IOError):
+        file_copy.write_stream(Broken(), str(dst))
+    assert not dst.exists()
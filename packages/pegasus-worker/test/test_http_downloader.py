@@ -0,0 +1,158 @@
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import pytest
+
+from Pegasus.tools import http_downloader
+
+DATA = bytes(range(256)) * 1000
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get("Range")))
+        # absolute URLs when used as a proxy
+        path = urlsplit(self.path).path
+        if path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "/data")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if path == "/missing":
+            self.send_error(404)
+            return
+
+        data = self.server.data
+        r = re.match(r"bytes=(\d+)-(\d+)", self.headers.get("Range") or "")
+        if path == "/norange" or r is None:
+            self.send_response(200)
+            body = data
+        elif self.server.fail and int(r.group(1)) >= self.server.fail:
+            self.send_response(500)
+            body = b""
+        else:
+            start, end = int(r.group(1)), min(int(r.group(2)), len(data) - 1)
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", "bytes %d-%d/%d" % (start, end, len(data))
+            )
+            self.send_header("ETag", '"v1"')
+            body = data[start : end + 1]
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.data = DATA
+    server.fail = None
+    server.connections = 0
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def url(server, path):
+    return "http://127.0.0.1:%d%s" % (server.server_address[1], path)
+
+
+def test_download_in_parts(server, tmp_path):
+    downloader = http_downloader.Downloader(parts=3, part_size=10000)
+
+    for i in range(3):
+        path = str(tmp_path / ("f%d" % i))
+        downloader.download(url(server, "/data"), path)
+        with open(path, "rb") as f:
+            assert f.read() == DATA
+
+    # 26 parts per file, over at most 3 connections reused by the files
+    assert len(server.requests) == 3 * 26
+    assert server.connections <= 3
+    assert not os.path.exists(path + http_downloader.PARTIAL_SUFFIX)
+
+
+def test_download_without_ranges(server, tmp_path):
+    downloader = http_downloader.Downloader(part_size=10000)
+    path = str(tmp_path / "f")
+
+    downloader.download(url(server, "/redirect"), path)
+    downloader.download(url(server, "/norange"), path)
+
+    with open(path, "rb") as f:
+        assert f.read() == DATA
+    # the parts are fetched from the URL redirected to
+    paths = [p for p, _ in server.requests]
+    assert paths == ["/redirect"] + ["/data"] * 26 + ["/norange"]
+
+
+def test_resume_download(server, tmp_path):
+    downloader = http_downloader.Downloader(parts=1, part_size=10000)
+    path = str(tmp_path / "f")
+
+    server.fail = 50000
+    with pytest.raises(RuntimeError):
+        downloader.download(url(server, "/data"), path)
+    assert not os.path.exists(path)
+
+    # only the missing parts are fetched by the next attempt
+    server.fail = None
+    del server.requests[:]
+    downloader.download(url(server, "/data"), path)
+    with open(path, "rb") as f:
+        assert f.read() == DATA
+    assert server.requests[0] == ("/data", "bytes=50000-59999")
+    assert len(server.requests) == 21
+
+
+def test_download_through_proxy(server, tmp_path, monkeypatch):
+    monkeypatch.delenv("no_proxy", raising=False)
+    downloader = http_downloader.Downloader()
+    path = str(tmp_path / "f")
+
+    # OSG_SQUID_LOCATION is given without a scheme
+    proxy = "127.0.0.1:%d" % server.server_address[1]
+    downloader.download("http://data.example.com/data", path, proxy)
+
+    with open(path, "rb") as f:
+        assert f.read() == DATA
+    assert server.requests[0][0] == "http://data.example.com/data"
+
+
+def test_open_stream(server):
+    downloader = http_downloader.Downloader()
+
+    for _ in range(2):
+        stream = downloader.open(url(server, "/redirect"))
+        data = b""
+        while True:
+            block = stream.read(10000)
+            if not block:
+                break
+            data += block
+        stream.close()
+        assert data == DATA
+
+    # the connection is reused once the body has been read
+    assert server.connections == 1
+
+    with pytest.raises(RuntimeError):
+        downloader.open(url(server, "/missing"))
@@ -0,0 +1,133 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+from Pegasus.tools import integrity
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = {}
+    for i, size in enumerate([0, 100, 3 * 1024 * 1024 + 1]):
+        data = os.urandom(size)
+        path = tmp_path / ("f%d" % i)
+        path.write_bytes(data)
+        paths[str(path)] = hashlib.sha256(data).hexdigest()
+    return paths
+
+
+@pytest.mark.parametrize("mmap_min_size", [integrity.MMAP_MIN_SIZE, 1])
+def test_sha256_file(files, monkeypatch, mmap_min_size):
+    monkeypatch.setattr(integrity, "MMAP_MIN_SIZE", mmap_min_size)
+    for path, sha256 in files.items():
+        assert integrity.sha256_file(path) == sha256
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_sha256_files(files, tmp_path, threads):
+    missing = str(tmp_path / "missing")
+    checksums = integrity.sha256_files(list(files) + [missing], threads=threads)
+
+    assert {path: checksums[path][0] for path in files} == files
+    assert checksums[missing][0] is None
+
+
+def test_checksum_cache(files, tmp_path, monkeypatch):
+    cache_file = str(tmp_path / "cache")
+    cache = integrity.ChecksumCache(cache_file)
+    integrity.sha256_files(files, cache=cache)
+    cache.save()
+
+    # the checksums are not computed again, by another process either
+    def fail(path):
+        raise AssertionError("hashed %s again" % path)
+
+    monkeypatch.setattr(integrity, "sha256_file", fail)
+    for cache in (cache, integrity.ChecksumCache(cache_file)):
+        checksums = integrity.sha256_files(files, cache=cache)
+        assert {path: checksums[path][0] for path in files} == files
+
+    # until the file changes
+    path = sorted(files)[1]
+    with open(path, "ab") as f:
+        f.write(b"more")
+    with pytest.raises(AssertionError):
+        integrity.sha256_files([path], cache=cache)
+
+
+def test_checksum_cache_no_lookup(files, tmp_path):
+    cache_file = str(tmp_path / "cache")
+    path = sorted(files)[0]
+    cache = integrity.ChecksumCache(cache_file)
+    cache.put(os.stat(path), "stale")
+    cache.save()
+
+    # files are hashed again, and the new checksums are kept
+    cache = integrity.ChecksumCache(cache_file, lookup=False)
+    checksums = integrity.sha256_files([path], cache=cache)
+    assert checksums[path][0] == files[path]
+    cache.save()
+    assert integrity.ChecksumCache(cache_file).get(os.stat(path)) == files[path]
+
+
+def test_checksum_cache_merge(files, tmp_path):
+    cache_file = str(tmp_path / "cache")
+    paths = sorted(files)
+    a = integrity.ChecksumCache(cache_file)
+    b = integrity.ChecksumCache(cache_file)
+    integrity.sha256_files(paths[:1], cache=a)
+    integrity.sha256_files(paths[1:], cache=b)
+    a.save()
+    b.save()
+
+    cache = integrity.ChecksumCache(cache_file)
+    for path in paths:
+        assert cache.get(os.stat(path)) == files[path]
+
+    # a corrupted cache is ignored
+    with open(cache_file, "w") as f:
+        f.write("{")
+    assert integrity.ChecksumCache(cache_file).get(os.stat(paths[0])) is None
+
+
+def test_checksum_reader():
+    data = os.urandom(100000)
+    reader = integrity.ChecksumReader(io.BytesIO(data))
+
+    assert reader.read(1000) == data[:1000]
+    assert reader.read() == data[1000:]
+    assert reader.read(1000) == b""
+    assert not reader.seekable()
+    assert reader.size == len(data)
+    assert reader.hexdigest() == hashlib.sha256(data).hexdigest()
+
+
+def test_fullstat_yaml(tmp_path):
+    path = tmp_path / "f"
+    path.write_bytes(b"data")
+
+    yaml = integrity.fullstat_yaml("lfn", str(path), "abc", 0.5, os.stat(str(path)))
+    assert yaml.startswith('    "lfn":\n')
+    assert "      size: 4\n" in yaml
+    assert "      inode: %d\n" % os.stat(str(path)).st_ino in yaml
+    assert yaml.endswith(
+        "      output: True\n      sha256: abc\n      checksum_timing: 0.500\n"
+    )
+
+    # remote files only have a size
+    yaml = integrity.fullstat_yaml("lfn", "s3://a@b/c", "abc", 0.5, size=4)
+    assert "      size: 4\n" in yaml
+    assert "inode" not in yaml
+
+
+def test_write_kickstart_data(tmp_path, monkeypatch):
+    monkeypatch.delenv("KICKSTART_INTEGRITY_DATA", raising=False)
+    assert not integrity.write_kickstart_data("a\n")
+
+    path = tmp_path / "integrity.yml"
+    monkeypatch.setenv("KICKSTART_INTEGRITY_DATA", str(path))
+    assert integrity.write_kickstart_data("a\n")
+    assert integrity.write_kickstart_data("b\n")
+    assert path.read_text() == "a\nb\n"
@@ -1,3 +1,5 @@
+import hashlib
+import io
 import logging
 import os
 import unittest
@@ -86,6 +88,451 @@ class TestPaths(unittest.TestCase):
         self.assertRaises(Exception, s3.get_key_for_path, "/foo", "/bar", "bar")
 
 
+# --- testing the in-process transfer helpers ----------------------------------
+@pytest.fixture
+def s3_config(tmp_path):
+    path = tmp_path / "s3cfg"
+    path.write_text(
+        "[osg]\n"
+        "endpoint = https://s3.example.com\n"
+        "max_concurrency = 4\n"
+        "[alice@osg]\n"
+        "access_key = a\n"
+        "secret_key = a-secret\n"
+        "[bob@osg]\n"
+        "access_key = b\n"
+        "secret_key = b-secret\n"
+    )
+    path.chmod(0o600)
+    return s3.read_config(str(path))
+
+
+def test_shared_s3_client(s3_config, monkeypatch):
+    monkeypatch.setenv("http_proxy", "http://proxy.example.com:3128")
+    monkeypatch.setenv("https_proxy", "http://proxy.example.com:3128")
+
+    alice = s3.get_shared_s3_client(s3_config, s3.parse_uri("s3://alice@osg"), 8)
+    bob = s3.get_shared_s3_client(s3_config, s3.parse_uri("s3://bob@osg/b/k"), 8)
+
+    # one client per identity, reused by the later transfers
+    assert alice is not bob
+    assert alice is s3.get_shared_s3_client(s3_config, s3.parse_uri("s3://alice@osg/b"))
+    assert alice.meta.config.max_pool_connections == 32
+    # http proxies are never used, but the environment is left alone
+    assert alice.meta.config.proxies == {"https": "http://proxy.example.com:3128"}
+    assert os.environ["http_proxy"] == "http://proxy.example.com:3128"
+
+
+def test_get_transfer_config(s3_config):
+    config = s3.get_transfer_config(s3_config, s3.parse_uri("s3://alice@osg"))
+    assert config.max_concurrency == 4
+
+    s3_config.remove_option("osg", "max_concurrency")
+    config = s3.get_transfer_config(s3_config, s3.parse_uri("s3://alice@osg"))
+    assert config.max_concurrency == 10
+
+
+def test_upload_and_download(mocker):
+    client = mocker.Mock()
+    transfer_config = s3.TransferConfig(max_concurrency=2)
+
+    uri = s3.parse_uri("s3://alice@osg/bucket/key")
+    s3.upload(client, "/tmp/f", uri, force=True, transfer_config=transfer_config)
+    client.upload_file.assert_called_once_with(
+        "/tmp/f", "bucket", "key", Config=transfer_config
+    )
+    client.head_object.assert_not_called()
+
+    s3.download(client, uri, "/tmp/g", transfer_config=transfer_config)
+    client.download_file.assert_called_once_with(
+        Bucket="bucket", Key="key", Filename="/tmp/g", Config=transfer_config
+    )
+
+    # identities have to match for copies
+    with pytest.raises(Exception):
+        s3.copy(client, [uri], s3.parse_uri("s3://bob@osg/bucket/copy"))
+    client.copy.assert_not_called()
+
+
+def test_upload_and_open_streams(mocker):
+    client = mocker.Mock()
+    uri = s3.parse_uri("s3://alice@osg/bucket/key")
+    stream = mocker.Mock()
+
+    s3.upload_stream(client, stream, uri, force=True)
+    client.upload_fileobj.assert_called_once_with(stream, "bucket", "key", Config=None)
+
+    client.get_object.return_value = {"Body": stream}
+    assert s3.open_object(client, uri) is stream
+    client.get_object.assert_called_once_with(Bucket="bucket", Key="key")
+
+
+def test_transfer_config_options(s3_config, monkeypatch):
+    uri = s3.parse_uri("s3://alice@osg")
+    config = s3.get_transfer_config(s3_config, uri)
+    assert config.multipart_threshold == 8 * s3.MB
+    assert config.resume
+    assert config.bulk_concurrency == 10
+
+    # site catalogs can override the configuration file with env profiles
+    s3_config.set("osg", "multipart_chunksize", "16M")
+    monkeypatch.setenv("PEGASUS_S3_MULTIPART_THRESHOLD", "1g")
+    monkeypatch.setenv("PEGASUS_S3_RESUME", "false")
+    config = s3.get_transfer_config(s3_config, uri)
+    assert config.multipart_chunksize == 16 * s3.MB
+    assert config.multipart_threshold == s3.GB
+    assert not config.resume
+
+    with pytest.raises(Exception):
+        s3.parse_size("8X")
+
+
+class FakeS3(object):
+    """
+    The multipart upload and ranged get calls of an S3 client, with the
+    objects kept in memory. The calls listed in fail raise an error.
+    """
+
+    class exceptions(object):
+        class NoSuchBucket(Exception):
+            pass
+
+        class NoSuchUpload(Exception):
+            pass
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.upload_ids = []
+        self.calls = []
+        self.fail = set()
+        self.error = IOError("Connection reset by peer")
+
+    def _call(self, call):
+        self.calls.append(call)
+        if call in self.fail:
+            raise self.error
+
+    def create_multipart_upload(self, Bucket, Key):
+        upload_id = "upload-%d" % len(self.upload_ids)
+        self.upload_ids.append(upload_id)
+        self.uploads[upload_id] = {"Key": Key}
+        return {"UploadId": upload_id}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId)
+
+    def list_parts(self, Bucket, Key, UploadId, PartNumberMarker=0):
+        if UploadId not in self.uploads:
+            raise self.exceptions.NoSuchUpload()
+        parts = sorted(
+            (n, data)
+            for n, data in self.uploads[UploadId].items()
+            if isinstance(n, int) and n > PartNumberMarker
+        )
+        # one part per page
+        return {
+            "Parts": [
+                {"PartNumber": n, "ETag": '"%s"' % md5(data), "Size": len(data)}
+                for n, data in parts[:1]
+            ],
+            "IsTruncated": len(parts) > 1,
+            "NextPartNumberMarker": parts[0][0] if parts else 0,
+        }
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self._call(("upload_part", PartNumber))
+        self.uploads[UploadId][PartNumber] = Body
+        return {"ETag": '"%s"' % md5(Body)}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        upload = self.uploads.pop(UploadId)
+        self.objects[Key] = b"".join(
+            upload[p["PartNumber"]] for p in MultipartUpload["Parts"]
+        )
+
+    def get_object(self, Bucket, Key, Range, IfMatch=None):
+        data = self.objects[Key]
+        start, end = [int(n) for n in Range[len("bytes=") :].split("-")]
+        end = min(end, len(data) - 1)
+        self._call(("get_object", start))
+        return {
+            "Body": io.BytesIO(data[start : end + 1]),
+            "ContentLength": end + 1 - start,
+            "ContentRange": "bytes %d-%d/%d" % (start, end, len(data)),
+            "ETag": '"%s"' % md5(data),
+        }
+
+
+def md5(data):
+    return hashlib.md5(data).hexdigest()
+
+
+@pytest.fixture
+def resumable_config():
+    # parts are never smaller than 5 MB
+    return s3.S3TransferConfig(
+        resume=True,
+        multipart_threshold=s3.MB,
+        multipart_chunksize=5 * s3.MB,
+        max_concurrency=2,
+    )
+
+
+def test_resume_upload(tmp_path, resumable_config):
+    client = FakeS3()
+    data = os.urandom(15 * s3.MB + 100)
+    path = tmp_path / "f"
+    path.write_bytes(data)
+    uri = s3.parse_uri("s3://alice@osg/bucket/key")
+
+    # the upload of another client is left alone
+    other = client.create_multipart_upload(Bucket="bucket", Key="key")["UploadId"]
+
+    client.fail.add(("upload_part", 3))
+    with pytest.raises(IOError):
+        s3.upload(client, str(path), uri, force=True, transfer_config=resumable_config)
+    assert "key" not in client.objects
+    assert len(client.uploads) == 2
+    (checkpoint,) = tmp_path.glob("f.*.upload.json")
+
+    # the parts already uploaded are not sent again
+    client.fail.clear()
+    client.calls = []
+    s3.upload(client, str(path), uri, force=True, transfer_config=resumable_config)
+    assert client.objects["key"] == data
+    assert client.calls == [("upload_part", 3)]
+    assert list(client.uploads) == [other]
+    assert not checkpoint.exists()
+
+
+def test_abort_upload(tmp_path, resumable_config):
+    client = FakeS3()
+    path = tmp_path / "f"
+    path.write_bytes(os.urandom(15 * s3.MB))
+    uri = s3.parse_uri("s3://alice@osg/bucket/key")
+
+    # an upload which was refused cannot be resumed
+    client.fail.add(("upload_part", 2))
+    client.error = botocore.exceptions.ClientError(
+        {
+            "Error": {"Code": "AccessDenied"},
+            "ResponseMetadata": {"HTTPStatusCode": 403},
+        },
+        "UploadPart",
+    )
+    with pytest.raises(botocore.exceptions.ClientError):
+        s3.upload(client, str(path), uri, force=True, transfer_config=resumable_config)
+    assert client.uploads == {}
+    assert os.listdir(str(tmp_path)) == ["f"]
+
+    # neither can the upload of a file which changed
+    client.error = IOError("Connection reset by peer")
+    with pytest.raises(IOError):
+        s3.upload(client, str(path), uri, force=True, transfer_config=resumable_config)
+    (upload_id,) = client.uploads
+    path.write_bytes(os.urandom(15 * s3.MB + 1))
+    client.fail.clear()
+    s3.upload(client, str(path), uri, force=True, transfer_config=resumable_config)
+    assert client.uploads == {}
+    assert client.objects["key"] == path.read_bytes()
+
+
+def test_resume_download(tmp_path, resumable_config):
+    client = FakeS3()
+    data = os.urandom(15 * s3.MB + 100)
+    client.objects["key"] = data
+    uri = s3.parse_uri("s3://alice@osg/bucket/key")
+    output = tmp_path / "f"
+
+    client.fail.add(("get_object", 5 * s3.MB))
+    with pytest.raises(IOError):
+        s3.download(client, uri, str(output), transfer_config=resumable_config)
+    assert not output.exists()
+
+    client.fail.clear()
+    client.calls = []
+    s3.download(client, uri, str(output), transfer_config=resumable_config)
+    assert output.read_bytes() == data
+    assert client.calls == [("get_object", 0), ("get_object", 5 * s3.MB)]
+    assert os.listdir(str(tmp_path)) == ["f"]
+
+    # small objects take one request
+    client.objects["key"] = b"small"
+    client.calls = []
+    s3.download(client, uri, str(output), transfer_config=resumable_config)
+    assert output.read_bytes() == b"small"
+    assert client.calls == [("get_object", 0)]
+
+
+def not_found():
+    return botocore.exceptions.ClientError(
+        {"Error": {"Code": "404"}, "ResponseMetadata": {"HTTPStatusCode": 404}},
+        "HeadObject",
+    )
+
+
+def test_bulk_copy_and_upload(tmp_path, mocker):
+    client = mocker.Mock()
+
+    def head_object(Bucket, Key):
+        if Key != "dir/a":
+            raise not_found()
+
+    client.head_object.side_effect = head_object
+    transfer_config = s3.S3TransferConfig(bulk_concurrency=4)
+
+    srcs = [s3.parse_uri("s3://alice@osg/bucket/dir/" + k) for k in "abc"]
+    dest = s3.parse_uri("s3://alice@osg/other")
+
+    with pytest.raises(Exception):
+        s3.copy(client, srcs, dest, transfer_config=transfer_config)
+    assert client.head_object.call_count == 3
+    client.copy.assert_not_called()
+
+    s3.copy(client, srcs, dest, force=True, transfer_config=transfer_config)
+    assert sorted(c[1]["Key"] for c in client.copy.call_args_list) == [
+        "dir/a",
+        "dir/b",
+        "dir/c",
+    ]
+
+    paths = []
+    for name in "bc":
+        (tmp_path / name).write_text(name)
+        paths.append(str(tmp_path / name))
+    s3.upload_many(
+        client, paths, s3.parse_uri("s3://alice@osg/other/dir/"), transfer_config=None
+    )
+    assert sorted(c[0][2] for c in client.upload_file.call_args_list) == [
+        "dir/b",
+        "dir/c",
+    ]
+
+
+class FakeBucket(object):
+    """
+    The listing, HEAD and bulk delete calls of an S3 client, on a bucket of
+    empty objects kept in memory. Listings return two objects per page.
+    """
+
+    exceptions = FakeS3.exceptions
+
+    def __init__(self, keys, protected=()):
+        self.keys = set(keys)
+        self.protected = set(protected)
+        self.batches = []
+        self.heads = []
+        self.listings = []
+
+    def get_paginator(self, name):
+        assert name == "list_objects_v2"
+        return self
+
+    def head_object(self, Bucket, Key):
+        self.heads.append(Key)
+        if Key not in self.keys:
+            raise not_found()
+        return {}
+
+    def paginate(self, Bucket, Prefix, Delimiter=None, **kwargs):
+        self.listings.append(Prefix)
+        keys = sorted(k for k in self.keys if k.startswith(Prefix))
+        prefixes = set()
+        if Delimiter is not None:
+            for k in list(keys):
+                i = k.find(Delimiter, len(Prefix))
+                if i >= 0:
+                    prefixes.add(k[: i + 1])
+                    keys.remove(k)
+        for i in range(0, max(len(keys), 1), 2):
+            yield {"Contents": [{"Key": k} for k in keys[i : i + 2]]}
+        yield {"CommonPrefixes": [{"Prefix": p} for p in sorted(prefixes)]}
+
+    def delete_objects(self, Bucket, Delete):
+        assert Delete["Quiet"]
+        batch = [o["Key"] for o in Delete["Objects"]]
+        self.batches.append(batch)
+        errors = []
+        for k in batch:
+            if k in self.protected:
+                errors.append({"Key": k, "Code": "AccessDenied"})
+            else:
+                self.keys.discard(k)
+        return {"Errors": errors}
+
+
+@pytest.fixture
+def scratch_keys():
+    return ["run/%s/f%d" % (d, i) for d in ("a", "b", "b/c", "d") for i in range(5)]
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_list_objects(scratch_keys, concurrency):
+    bucket = FakeBucket(scratch_keys + ["other"])
+    keys = [o["Key"] for o in s3.list_objects(bucket, "b", "run/", concurrency)]
+    assert sorted(keys) == sorted(scratch_keys)
+    if concurrency == 1:
+        assert keys == sorted(keys)
+
+    # the listing stops with the consumer
+    objects = s3.list_objects(bucket, "b", "run/", concurrency)
+    next(objects)
+    objects.close()
+
+
+@pytest.mark.parametrize("concurrency", [1, 4])
+def test_existing_keys(concurrency):
+    keys = ["dir/f%d" % i for i in range(s3.LIST_KEYS_THRESHOLD)]
+    bucket = FakeBucket(keys[1:] + ["dir/sub/f0", "a.txt", "b/c.txt"])
+
+    # keys sharing no prefix are checked one by one, the bucket is not listed
+    found = s3.existing_keys(bucket, "b", ["a.txt", "b/c.txt", "x"], concurrency)
+    assert found == {"a.txt", "b/c.txt"}
+    assert sorted(bucket.heads) == ["a.txt", "b/c.txt", "x"]
+    assert bucket.listings == []
+
+    # a "directory" with many of the keys is listed instead
+    bucket.heads = []
+    found = s3.existing_keys(bucket, "b", keys + ["dir/sub/f0", "a.txt"], concurrency)
+    assert found == set(keys[1:] + ["dir/sub/f0", "a.txt"])
+    assert bucket.listings == ["dir/"]
+    assert sorted(bucket.heads) == ["a.txt", "dir/sub/f0"]
+
+
+def test_delete_keys(scratch_keys):
+    bucket = FakeBucket(scratch_keys, protected=["run/d/f4"])
+    deleted, errors = s3.delete_keys(
+        bucket, "b", iter(scratch_keys), batch_size=3, concurrency=2
+    )
+    assert deleted == len(scratch_keys) - 1
+    assert errors == {"run/d/f4": "AccessDenied"}
+    assert bucket.keys == {"run/d/f4"}
+    assert max(len(batch) for batch in bucket.batches) == 3
+
+
+def test_remove(scratch_keys):
+    bucket = FakeBucket(scratch_keys + ["run/b", "run/bb"])
+    transfer_config = s3.S3TransferConfig(bulk_concurrency=4)
+
+    # the keys have to exist, unless forced
+    with pytest.raises(Exception):
+        s3.remove(bucket, "b", ["run/a/f0", "run/x"])
+    assert bucket.batches == []
+
+    errors = s3.remove(
+        bucket, "b", ["run/b/"], recursive=True, transfer_config=transfer_config
+    )
+    assert errors == {}
+    assert bucket.keys == set(k for k in scratch_keys if not k.startswith("run/b/")) | {
+        "run/b",
+        "run/bb",
+    }
+
+    s3.remove(bucket, "b", ["run/a/f0", "run/x"], force=True)
+    assert "run/a/f0" not in bucket.keys
+
+
 # --- testing pegasus-s3 commands ----------------------------------------------
 @pytest.fixture(scope="module")
 def s3_client():
@@ -0,0 +1,86 @@
+import hashlib
+import importlib
+import os
+
+import pytest
+
+pegasus_transfer = importlib.import_module("Pegasus.cli.pegasus-transfer")
+
+
+@pytest.fixture
+def integrity_data(tmp_path, monkeypatch):
+    path = tmp_path / "integrity.yml"
+    monkeypatch.setenv("KICKSTART_INTEGRITY_DATA", str(path))
+    monkeypatch.setattr(pegasus_transfer, "integrity_checksummed", [])
+    return path
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    handler = pegasus_transfer.FileHandler()
+    # pegasus-integrity is only run when the checksum cannot be computed
+    # during the transfer
+    handler.generated = []
+    monkeypatch.setattr(
+        handler,
+        "_generate_integrity_checksum",
+        lambda lfn, fname, linkage: handler.generated.append((lfn, fname)),
+    )
+    return handler
+
+
+def checksummed_transfer(src, dst):
+    t = pegasus_transfer.Transfer()
+    t.set_lfn("f.a")
+    t.add_src("a", "file://" + str(src))
+    t.add_dst("b", "file://" + str(dst))
+    t.generate_checksum = True
+    return t
+
+
+def test_copy_checksummed(tmp_path, handler, integrity_data):
+    src = tmp_path / "src"
+    src.write_bytes(os.urandom(3 * 1024 * 1024 + 17))
+    dst = tmp_path / "out" / "dst"
+
+    successful, failed = handler.do_transfers([checksummed_transfer(src, dst)])
+
+    assert (len(successful), failed) == (1, [])
+    assert dst.read_bytes() == src.read_bytes()
+    yaml = integrity_data.read_text()
+    assert yaml.startswith('    "f.a":\n')
+    assert '      file_name: "%s"\n' % dst in yaml
+    assert "      sha256: %s\n" % hashlib.sha256(src.read_bytes()).hexdigest() in yaml
+    assert handler.generated == []
+
+
+def test_copy_same_file(tmp_path, handler, integrity_data):
+    src = tmp_path / "src"
+    src.write_bytes(b"data")
+    dst = tmp_path / "dst"
+    os.link(str(src), str(dst))
+
+    # nothing is copied, the checksum of the file is generated instead
+    successful, failed = handler.do_transfers([checksummed_transfer(src, dst)])
+
+    assert (len(successful), failed) == (1, [])
+    assert handler.generated == [("f.a", str(dst))]
+    assert not integrity_data.exists()
+
+
+def test_copy_failure(tmp_path, handler, integrity_data, monkeypatch):
+    src = tmp_path / "src"
+    src.write_bytes(os.urandom(1024 * 1024))
+
+    def write_stream(stream, dst, mode=None):
+        stream.read(1024)
+        raise IOError("No space left on device")
+
+    monkeypatch.setattr(pegasus_transfer.file_copy, "write_stream", write_stream)
+    t = checksummed_transfer(src, tmp_path / "dst")
+    successful, failed = handler.do_transfers([t])
+
+    assert (successful, failed) == ([], [t])
+    assert not integrity_data.exists()
+    assert pegasus_transfer.integrity_checksummed == []
+    assert handler.generated == []
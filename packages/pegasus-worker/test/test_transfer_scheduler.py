@@ -0,0 +1,165 @@
+import importlib
+
+import pytest
+
+pegasus_transfer = importlib.import_module("Pegasus.cli.pegasus-transfer")
+
+
+def transfer(src, dst):
+    t = pegasus_transfer.Transfer()
+    t.add_src("a", src)
+    t.add_dst("b", dst)
+    return t
+
+
+@pytest.fixture
+def transfers():
+    return [
+        transfer("gsiftp://slow/f1", "file:///tmp/f1"),
+        transfer("gsiftp://slow/f2", "file:///tmp/f2"),
+        transfer("http://fast/f3", "file:///tmp/f3"),
+        transfer("http://fast/f4", "file:///tmp/f4"),
+    ]
+
+
+def test_similar_transfers_grouped(transfers):
+    scheduler = pegasus_transfer.TransferScheduler(transfers, 3, 100)
+
+    t_list, keys = scheduler.next_set()
+    assert t_list == transfers[:2]
+    assert ("host", "slow") in keys
+
+    t_list, keys = scheduler.next_set()
+    assert t_list == transfers[2:]
+
+
+def test_limits(transfers):
+    scheduler = pegasus_transfer.TransferScheduler(
+        transfers, 3, 1, protocol_limits={"gsiftp": 1}, host_limit=2
+    )
+
+    t_list, gsiftp_keys = scheduler.next_set()
+    assert t_list == [transfers[0]]
+
+    # the second gsiftp transfer has to wait for the first one
+    t_list, keys = scheduler.next_set()
+    assert t_list == [transfers[2]]
+    t_list, keys = scheduler.next_set()
+    assert t_list == [transfers[3]]
+
+    scheduler.set_done([transfers[0]], gsiftp_keys, [transfers[0]], [])
+    t_list, keys = scheduler.next_set()
+    assert t_list == [transfers[1]]
+
+
+def test_retries(transfers):
+    scheduler = pegasus_transfer.TransferScheduler(transfers[:1], 2, 1)
+
+    t_list, keys = scheduler.next_set()
+    scheduler.set_done(t_list, keys, [], t_list)
+
+    # retried later, without holding up anything else
+    assert transfers[0].attempt_current == 2
+    assert [item[2] for item in scheduler._delayed] == transfers[:1]
+    assert scheduler._running_sets == 0
+
+    scheduler._delayed[0] = (0,) + scheduler._delayed[0][1:]
+    t_list, keys = scheduler.next_set()
+    scheduler.set_done(t_list, keys, [], t_list)
+    assert scheduler.failed == transfers[:1]
+    assert scheduler.next_set() == (None, None)
+
+
+def test_alternate_sources_tried_first(transfers):
+    t = transfers[2]
+    t.add_src("c", "http://mirror/f3")
+    scheduler = pegasus_transfer.TransferScheduler([t, transfers[3]], 3, 1)
+
+    t_list, keys = scheduler.next_set()
+    scheduler.set_done(t_list, keys, [], t_list)
+
+    # the other source is tried right away, in the same attempt
+    t_list, keys = scheduler.next_set()
+    assert t_list == [t]
+    assert t.attempt_current == 1
+
+
+def test_retries_are_not_failures():
+    transfers = [
+        transfer("http://fast/f%d" % i, "file:///tmp/f%d" % i) for i in range(11)
+    ]
+    scheduler = pegasus_transfer.TransferScheduler(transfers, 3, 100)
+
+    t_list, keys = scheduler.next_set()
+    scheduler.set_done(t_list, keys, [], t_list)
+
+    # the failed first attempts are retried later
+    assert not scheduler.too_many_failures
+    assert scheduler.failed == []
+    assert len(scheduler._delayed) == 11
+
+
+def test_too_many_failures():
+    transfers = [
+        transfer("http://fast/f%d" % i, "file:///tmp/f%d" % i) for i in range(16)
+    ]
+    for t in transfers[:11]:
+        t.attempt_current = 2
+    scheduler = pegasus_transfer.TransferScheduler(transfers, 2, 1)
+
+    sets = [scheduler.next_set() for _ in range(15)]
+    for t_list, keys in sets[:11]:
+        scheduler.set_done(t_list, keys, [], t_list)
+    assert scheduler.too_many_failures
+
+    # the transfers still running are not retried once the scheduler gave
+    # up, even when the failure ratio drops
+    for t_list, keys in sets[11:14]:
+        scheduler.set_done(t_list, keys, t_list, [])
+    t_list, keys = sets[14]
+    scheduler.set_done(t_list, keys, [], t_list)
+    assert scheduler._delayed == []
+    assert scheduler.next_set() == (None, None)
+    assert sorted(map(str, scheduler.failed + scheduler.completed)) == sorted(
+        map(str, transfers)
+    )
+
+
+def test_abort(transfers):
+    scheduler = pegasus_transfer.TransferScheduler(transfers, 3, 1)
+
+    t_list, keys = scheduler.next_set()
+    scheduler.abort("Traceback", t_list)
+    scheduler.set_done(t_list, keys, [], [])
+
+    # the other threads stop, and all the transfers failed
+    assert scheduler.next_set() == (None, None)
+    assert scheduler._running_sets == 0
+    assert scheduler._running[("host", "slow")] == 0
+    assert sorted(map(str, scheduler.failed)) == sorted(map(str, transfers))
+
+
+def test_parse_protocol_limits():
+    assert pegasus_transfer.parse_protocol_limits("") == {}
+    assert pegasus_transfer.parse_protocol_limits("gsiftp=2, http=4") == {
+        "gsiftp": 2,
+        "http": 4,
+    }
+    with pytest.raises(ValueError):
+        pegasus_transfer.parse_protocol_limits("gsiftp")
+
+
+@pytest.mark.parametrize(
+    "value, parts", [("2", 2), ("four", 4), ("0", 4), ("-1", 4), ("", 4)]
+)
+def test_parse_http_parts(value, parts):
+    assert pegasus_transfer.parse_http_parts(value) == parts
+
+
+def test_http_downloader_created_on_first_use(monkeypatch):
+    monkeypatch.setattr(pegasus_transfer, "http_downloader", None)
+    monkeypatch.setattr(pegasus_transfer, "http_parts", 3)
+
+    downloader = pegasus_transfer.get_http_downloader()
+    assert downloader.parts == 3
+    assert pegasus_transfer.get_http_downloader() is downloader
@@ -0,0 +1,17 @@
+from Pegasus.tools import worker_utils as utils
+
+
+def test_tools_find_cached(tmp_path, monkeypatch):
+    tool = tmp_path / "pegasus-test-tool"
+    tool.write_text("#!/bin/sh\n")
+    tool.chmod(0o755)
+    monkeypatch.setenv("PATH", str(tmp_path))
+
+    tools = utils.Tools()
+    assert tools.find("pegasus-test-tool") == str(tool)
+    # found again from the cache, by any instance
+    assert utils.Tools().find("pegasus-test-tool") == str(tool)
+    assert tools.full_path("pegasus-test-tool") == str(tool)
+
+    assert tools.find("pegasus-missing-tool") is None
+    assert tools.find("pegasus-missing-tool") is None